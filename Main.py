@@ -1,167 +1,354 @@
-# 导入所需的模块
-# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-from dotenv import load_dotenv
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from Utils.Agents import Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam
-import json, os
-# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
-
-# 从 dotenv 文件中加载 API 密钥和网关配置
-load_dotenv(dotenv_path='apikey.env')
-
-
-def run_multi_agent_diagnosis(medical_report: str, model_name: str = None, language: str = "en") -> str:
-    """运行三个专科智能体 + 多学科团队智能体，返回**结构化的 markdown 结果**。
-
-    Args:
-        medical_report: 病历报告文本
-        model_name: 使用的AI模型名称（可选，如果为None则使用环境变量）
-        language: 输出语言 ('en' 或 'zh'，默认为 'en')
-
-    你可以在自己的项目中直接 import 使用，例如：
-
-        from Main import run_multi_agent_diagnosis
-        result_md = run_multi_agent_diagnosis(medical_report, model_name="claude-sonnet-4.5", language="zh")
-
-    返回值是一个包含以下结构的 markdown 字符串：
-
-    # Multidisciplinary Diagnosis
-
-    ## Final Diagnosis (Summary)
-    - ...
-
-    ## Specialist Reports
-    ### Cardiologist
-    ...
-    """
-    agents = {
-        "Cardiologist": Cardiologist(medical_report, model_name=model_name, language=language),
-        "Psychologist": Psychologist(medical_report, model_name=model_name, language=language),
-        "Pulmonologist": Pulmonologist(medical_report, model_name=model_name, language=language),
-    }
-
-    # 定义一个函数，用于运行单个智能体并获取返回结果
-    def get_response(agent_name, agent):
-        response = agent.run()
-        return agent_name, response
-
-    # 并发运行各个专科智能体，并收集它们的响应
-    responses = {}
-    with ThreadPoolExecutor() as executor:
-        futures = {
-            executor.submit(get_response, name, agent): name
-            for name, agent in agents.items()
-        }
-
-        for future in as_completed(futures):
-            agent_name, response = future.result()
-            responses[agent_name] = response
-
-    team_agent = MultidisciplinaryTeam(
-        cardiologist_report=responses.get("Cardiologist"),
-        psychologist_report=responses.get("Psychologist"),
-        pulmonologist_report=responses.get("Pulmonologist"),
-        model_name=model_name,
-        language=language,
-    )
-
-    # 运行多学科团队智能体，生成最终诊断总结
-    final_diagnosis = team_agent.run()
-
-    # 防御性处理：如果最终诊断为空或类型不正确，则给出说明性文本
-    if not isinstance(final_diagnosis, str) or not final_diagnosis.strip():
-        if language == "zh":
-            final_section = "由于上游模型错误，无法生成最终诊断。"
-        else:
-            final_section = "No final diagnosis could be generated due to upstream model errors."
-    else:
-        final_section = final_diagnosis.strip()
-
-    # 根据语言设置错误提示文本
-    if language == "zh":
-        no_cardio = "无心脏科报告（上游错误）。"
-        no_psycho = "无心理学报告（上游错误）。"
-        no_pulmo = "无呼吸科报告（上游错误）。"
-    else:
-        no_cardio = "No cardiologist report (upstream error)."
-        no_psycho = "No psychologist report (upstream error)."
-        no_pulmo = "No pulmonologist report (upstream error)."
-
-    cardiologist_md = (responses.get("Cardiologist") or no_cardio).strip()
-    psychologist_md = (responses.get("Psychologist") or no_psycho).strip()
-    pulmonologist_md = (responses.get("Pulmonologist") or no_pulmo).strip()
-
-    # 根据语言生成 markdown 标题
-    if language == "zh":
-        full_md = f"""# 多学科诊断
-
-## 最终诊断（摘要）
-
-{final_section}
-
-## 专科报告
-
-### 心脏科医生
-
-{cardiologist_md}
-
-### 心理学家
-
-{psychologist_md}
-
-### 呼吸科医生
-
-{pulmonologist_md}
-"""
-    else:
-        full_md = f"""# Multidisciplinary Diagnosis
-
-## Final Diagnosis (Summary)
-
-{final_section}
-
-## Specialist Reports
-
-### Cardiologist
-
-{cardiologist_md}
-
-### Psychologist
-
-{psychologist_md}
-
-### Pulmonologist
-
-{pulmonologist_md}
-"""
-
-    return full_md
-
-
-# 仅当直接运行此脚本时执行示例诊断，避免在 import 时执行
-if __name__ == "__main__":
-    # 构建医疗报告文件的绝对路径，以确保跨平台兼容
-    base_dir = os.path.dirname(__file__)
-    report_path = os.path.join(
-        base_dir,
-        "Medical Reports",
-        "Medical Rerort - Michael Johnson - Panic Attack Disorder.txt",
-    )
-
-    # 读取医疗报告内容
-    with open(report_path, "r", encoding="utf-8") as file:
-        medical_report = file.read()
-
-    # 使用上面的通用函数跑当前项目内置案例
-    final_diagnosis_text = run_multi_agent_diagnosis(medical_report)
-    txt_output_path = "results/final_diagnosis.txt"
-
-    # 确保结果输出目录存在
-    os.makedirs(os.path.dirname(txt_output_path), exist_ok=True)
-
-    # 将最终诊断结果写入文本文件
-    with open(txt_output_path, "w") as txt_file:
-        txt_file.write(final_diagnosis_text)
-
-    print(f"最终诊断结果已保存到 {txt_output_path}")
-
+# 导入所需的模块
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from Utils.Agents import Cardiologist, Psychologist, Pulmonologist, MultidisciplinaryTeam, ReportSummarizer
+from Utils.Deadline import Deadline
+from Utils.Tokens import estimate_tokens, split_into_chunks, truncate_to_tokens
+import asyncio, json, os
+# ~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~~
+
+# 从 dotenv 文件中加载 API 密钥和网关配置
+load_dotenv(dotenv_path='apikey.env')
+
+# 带截止时间运行时的阶段预算（秒）
+# 专科阶段最多使用"剩余时间 - MDT 预留时间"，为 MDT 汇总留出余量
+MDT_RESERVE_SECONDS = float(os.getenv("MDT_RESERVE_SECONDS", "20"))
+# MDT 阶段开始时剩余时间低于该值，则改用快速模型（LLM_FAST_MODEL）
+MDT_FAST_MODEL_THRESHOLD_SECONDS = float(os.getenv("MDT_FAST_MODEL_THRESHOLD_SECONDS", "30"))
+# MDT 阶段开始时剩余时间低于该值，则跳过 MDT 汇总
+MDT_MIN_SECONDS = float(os.getenv("MDT_MIN_SECONDS", "3"))
+
+# 超长病历的 map-reduce 处理（仅在已知模型上下文窗口时启用）
+# 为模型输出预留的 token 数（模型未配置 max_tokens 时使用）
+LLM_OUTPUT_RESERVE_TOKENS = int(os.getenv("LLM_OUTPUT_RESERVE_TOKENS", "2048"))
+# 每个分块的最大 token 数：分块越小，并发摘要的单次延迟越低
+REPORT_CHUNK_TOKENS = int(os.getenv("REPORT_CHUNK_TOKENS", "6000"))
+# 摘要结果仍超出预算时再次归约的最大轮数，超过后截断兜底
+REPORT_REDUCE_MAX_ROUNDS = 3
+# 摘要阶段最多使用剩余时间的比例
+REPORT_REDUCE_TIME_FRACTION = 0.3
+
+
+def run_multi_agent_diagnosis(medical_report: str, model_name: str = None, language: str = "en") -> str:
+    """运行三个专科智能体 + 多学科团队智能体，返回**结构化的 markdown 结果**。
+
+    Args:
+        medical_report: 病历报告文本
+        model_name: 使用的AI模型名称（可选，如果为None则使用环境变量）
+        language: 输出语言 ('en' 或 'zh'，默认为 'en')
+
+    你可以在自己的项目中直接 import 使用，例如：
+
+        from Main import run_multi_agent_diagnosis
+        result_md = run_multi_agent_diagnosis(medical_report, model_name="claude-sonnet-4.5", language="zh")
+
+    返回值是一个包含以下结构的 markdown 字符串：
+
+    # Multidisciplinary Diagnosis
+
+    ## Final Diagnosis (Summary)
+    - ...
+
+    ## Specialist Reports
+    ### Cardiologist
+    ...
+    """
+    agents = {
+        "Cardiologist": Cardiologist(medical_report, model_name=model_name, language=language),
+        "Psychologist": Psychologist(medical_report, model_name=model_name, language=language),
+        "Pulmonologist": Pulmonologist(medical_report, model_name=model_name, language=language),
+    }
+
+    # 定义一个函数，用于运行单个智能体并获取返回结果
+    def get_response(agent_name, agent):
+        response = agent.run()
+        return agent_name, response
+
+    # 并发运行各个专科智能体，并收集它们的响应
+    responses = {}
+    with ThreadPoolExecutor() as executor:
+        futures = {
+            executor.submit(get_response, name, agent): name
+            for name, agent in agents.items()
+        }
+
+        for future in as_completed(futures):
+            agent_name, response = future.result()
+            responses[agent_name] = response
+
+    team_agent = MultidisciplinaryTeam(
+        cardiologist_report=responses.get("Cardiologist"),
+        psychologist_report=responses.get("Psychologist"),
+        pulmonologist_report=responses.get("Pulmonologist"),
+        model_name=model_name,
+        language=language,
+    )
+
+    # 运行多学科团队智能体，生成最终诊断总结
+    final_diagnosis = team_agent.run()
+
+    return build_diagnosis_markdown(responses, final_diagnosis, language)
+
+
+def build_diagnosis_markdown(responses: dict, final_diagnosis, language: str = "en", mdt_skipped: bool = False) -> str:
+    """将专科报告与 MDT 最终诊断组装为 markdown 结果
+
+    Args:
+        responses: 专科名称 -> 报告文本（失败或超时为 None）
+        final_diagnosis: MDT 最终诊断文本
+        language: 输出语言
+        mdt_skipped: MDT 阶段是否因时间预算不足而被跳过
+    """
+    # 防御性处理：如果最终诊断为空或类型不正确，则给出说明性文本
+    if mdt_skipped:
+        if language == "zh":
+            final_section = "时间预算不足，已跳过多学科团队汇总，请参考下方专科报告。"
+        else:
+            final_section = "Multidisciplinary summary skipped: the request time budget was exhausted. See the specialist reports below."
+    elif not isinstance(final_diagnosis, str) or not final_diagnosis.strip():
+        if language == "zh":
+            final_section = "由于上游模型错误，无法生成最终诊断。"
+        else:
+            final_section = "No final diagnosis could be generated due to upstream model errors."
+    else:
+        final_section = final_diagnosis.strip()
+
+    # 根据语言设置错误提示文本
+    if language == "zh":
+        no_cardio = "无心脏科报告（上游错误）。"
+        no_psycho = "无心理学报告（上游错误）。"
+        no_pulmo = "无呼吸科报告（上游错误）。"
+    else:
+        no_cardio = "No cardiologist report (upstream error)."
+        no_psycho = "No psychologist report (upstream error)."
+        no_pulmo = "No pulmonologist report (upstream error)."
+
+    cardiologist_md = (responses.get("Cardiologist") or no_cardio).strip()
+    psychologist_md = (responses.get("Psychologist") or no_psycho).strip()
+    pulmonologist_md = (responses.get("Pulmonologist") or no_pulmo).strip()
+
+    # 根据语言生成 markdown 标题
+    if language == "zh":
+        full_md = f"""# 多学科诊断
+
+## 最终诊断（摘要）
+
+{final_section}
+
+## 专科报告
+
+### 心脏科医生
+
+{cardiologist_md}
+
+### 心理学家
+
+{psychologist_md}
+
+### 呼吸科医生
+
+{pulmonologist_md}
+"""
+    else:
+        full_md = f"""# Multidisciplinary Diagnosis
+
+## Final Diagnosis (Summary)
+
+{final_section}
+
+## Specialist Reports
+
+### Cardiologist
+
+{cardiologist_md}
+
+### Psychologist
+
+{psychologist_md}
+
+### Pulmonologist
+
+{pulmonologist_md}
+"""
+
+    return full_md
+
+
+async def fit_text_to_budget(text: str, budget_tokens: int, model_name: str = None, language: str = "en",
+                             chunk_tokens: int = None, deadline: Deadline = None, usage: list = None,
+                             provider: dict = None) -> str:
+    """文本估算 token 数超出预算时，分块并发摘要后合并（map-reduce），直到不超过预算
+
+    Args:
+        text: 原文（病历或专科报告）
+        budget_tokens: 允许的最大 token 数
+        model_name: 摘要使用的模型
+        language: 输出语言
+        chunk_tokens: 每个分块的最大 token 数（不超过摘要模型的输入预算）
+        deadline: 截止时间，摘要阶段最多使用剩余时间的 REPORT_REDUCE_TIME_FRACTION
+        usage: 传入列表时，追加摘要调用的耗时与 token 用量
+        provider: 模型供应商配置（见 Agent）
+    """
+    chunk_tokens = max(1, min(chunk_tokens or REPORT_CHUNK_TOKENS, REPORT_CHUNK_TOKENS))
+    for round_index in range(REPORT_REDUCE_MAX_ROUNDS):
+        text_tokens = estimate_tokens(text)
+        if text_tokens <= budget_tokens:
+            return text
+
+        chunks = split_into_chunks(text, chunk_tokens)
+        print(f"📄 文本约 {text_tokens} tokens，超出预算 {budget_tokens}，分为 {len(chunks)} 块并发摘要（第 {round_index + 1} 轮）")
+        summarizers = [ReportSummarizer(chunk, model_name=model_name, language=language, provider=provider)
+                       for chunk in chunks]
+        timeout = deadline.remaining() * REPORT_REDUCE_TIME_FRACTION if deadline is not None else None
+        summaries = await asyncio.gather(*[summarizer.arun(timeout=timeout) for summarizer in summarizers])
+        if usage is not None:
+            usage.extend(summarizer.usage for summarizer in summarizers)
+
+        # 摘要失败的分块按其在预算中的份额截断保留，避免丢失整段内容
+        share = max(1, budget_tokens // len(chunks))
+        text = "\n\n".join(
+            (summary or truncate_to_tokens(chunk, share)).strip()
+            for chunk, summary in zip(chunks, summaries)
+        )
+
+    return truncate_to_tokens(text, budget_tokens)
+
+
+def _input_budget(context_window: int = None, max_output_tokens: int = None):
+    """模型单次调用可用的输入 token 数（上下文窗口未知时返回 None）"""
+    if not context_window:
+        return None
+    input_budget = context_window - (max_output_tokens or LLM_OUTPUT_RESERVE_TOKENS)
+    return input_budget if input_budget > 0 else context_window // 2
+
+
+async def arun_multi_agent_diagnosis(medical_report: str, model_name: str = None, language: str = "en",
+                                     deadline: Deadline = None, usage: list = None,
+                                     context_window: int = None, max_output_tokens: int = None,
+                                     provider: dict = None, fast_model_runtime: dict = None) -> str:
+    """异步版本的 run_multi_agent_diagnosis，支持截止时间
+
+    - 三个专科智能体并发调用模型（ainvoke），超出预算的调用会被取消
+    - MDT 阶段剩余时间不足 MDT_FAST_MODEL_THRESHOLD_SECONDS 时改用 LLM_FAST_MODEL；
+      不足 MDT_MIN_SECONDS 时跳过汇总，仅返回已完成的专科报告
+    - 调用方取消该协程（如客户端断开）时，进行中的模型请求一并取消
+    - 已知模型上下文窗口时，每次调用前估算 token 数：病历（或专科报告）加提示词超出窗口时，
+      先分块并发摘要再交给专科（或 MDT）智能体，避免请求失败或被服务商静默截断
+
+    Args:
+        medical_report: 病历报告文本
+        model_name: 使用的AI模型名称（可选）
+        language: 输出语言 ('en' 或 'zh')
+        deadline: 截止时间（None 表示不限时）
+        usage: 传入列表时，追加各智能体调用的耗时与 token 用量（见 Agent.usage）
+        context_window: 模型上下文窗口（token 数，None 表示未知，不做分块）
+        max_output_tokens: 为模型输出预留的 token 数（None 时使用 LLM_OUTPUT_RESERVE_TOKENS）
+        provider: 模型供应商配置，如 {"provider_type": "ollama", "base_url": ...}（None 表示使用环境变量配置的 OpenAI 兼容网关）；
+                  所有阶段（含快速模型）都使用同一供应商，本地部署时数据不会发送到外部服务
+        fast_model_runtime: LLM_FAST_MODEL 的 context_window / max_output_tokens / provider（None 表示未配置，
+                  按环境变量网关、上下文窗口未知处理）；快速模型的供应商与 provider 不同时不切换
+    """
+    input_budget = _input_budget(context_window, max_output_tokens)
+
+    if input_budget is not None:
+        overhead = max(agent_class(None, model_name=model_name, language=language).prompt_overhead_tokens()
+                       for agent_class in (Cardiologist, Psychologist, Pulmonologist, ReportSummarizer))
+        report_budget = max(1, input_budget - overhead)
+        medical_report = await fit_text_to_budget(
+            medical_report, report_budget, model_name=model_name, language=language,
+            chunk_tokens=report_budget, deadline=deadline, usage=usage, provider=provider
+        )
+
+    agents = {
+        "Cardiologist": Cardiologist(medical_report, model_name=model_name, language=language, provider=provider),
+        "Psychologist": Psychologist(medical_report, model_name=model_name, language=language, provider=provider),
+        "Pulmonologist": Pulmonologist(medical_report, model_name=model_name, language=language, provider=provider),
+    }
+
+    specialist_timeout = None
+    if deadline is not None:
+        remaining = deadline.remaining()
+        specialist_timeout = max(remaining - MDT_RESERVE_SECONDS, remaining * 0.6)
+
+    results = await asyncio.gather(*[agent.arun(timeout=specialist_timeout) for agent in agents.values()])
+    responses = dict(zip(agents.keys(), results))
+    if usage is not None:
+        usage.extend(agent.usage for agent in agents.values())
+
+    mdt_model = model_name
+    mdt_input_budget = input_budget
+    mdt_timeout = None
+    if deadline is not None:
+        mdt_timeout = deadline.remaining()
+        if mdt_timeout < MDT_MIN_SECONDS:
+            print(f"⏱️  剩余时间 {mdt_timeout:.1f}s，跳过 MDT 汇总")
+            return build_diagnosis_markdown(responses, None, language, mdt_skipped=True)
+        fast_model = os.getenv("LLM_FAST_MODEL")
+        if fast_model and fast_model != model_name and mdt_timeout < MDT_FAST_MODEL_THRESHOLD_SECONDS:
+            fast_runtime = fast_model_runtime or {}
+            if fast_runtime.get("provider") != provider:
+                # 快速模型属于其他供应商（如本地部署时的远程模型）：不切换，避免请求发往错误的地址或数据外发
+                print(f"⏱️  剩余时间 {mdt_timeout:.1f}s，快速模型 {fast_model} 与当前模型供应商不同，MDT 仍使用 {model_name}")
+            else:
+                print(f"⏱️  剩余时间 {mdt_timeout:.1f}s，MDT 改用快速模型 {fast_model}")
+                mdt_model = fast_model
+                mdt_input_budget = _input_budget(fast_runtime.get("context_window"),
+                                                 fast_runtime.get("max_output_tokens"))
+
+    mdt_reports = dict(responses)
+    if mdt_input_budget is not None:
+        # 三份专科报告平分 MDT 的输入预算，超出的报告先摘要
+        overhead = MultidisciplinaryTeam(None, None, None, model_name=mdt_model, language=language).prompt_overhead_tokens()
+        reports_budget = max(1, mdt_input_budget - overhead)
+        per_report_budget = max(1, reports_budget // len(mdt_reports))
+        reduced = await asyncio.gather(*[
+            fit_text_to_budget(report, per_report_budget, model_name=mdt_model, language=language,
+                               chunk_tokens=reports_budget, deadline=deadline, usage=usage, provider=provider)
+            if report else asyncio.sleep(0, result=report)
+            for report in mdt_reports.values()
+        ])
+        mdt_reports = dict(zip(mdt_reports.keys(), reduced))
+
+    team_agent = MultidisciplinaryTeam(
+        cardiologist_report=mdt_reports.get("Cardiologist"),
+        psychologist_report=mdt_reports.get("Psychologist"),
+        pulmonologist_report=mdt_reports.get("Pulmonologist"),
+        model_name=mdt_model,
+        language=language,
+        provider=provider,
+    )
+    final_diagnosis = await team_agent.arun(timeout=mdt_timeout)
+    if usage is not None:
+        usage.append(team_agent.usage)
+
+    return build_diagnosis_markdown(responses, final_diagnosis, language)
+
+
+# 仅当直接运行此脚本时执行示例诊断，避免在 import 时执行
+if __name__ == "__main__":
+    # 构建医疗报告文件的绝对路径，以确保跨平台兼容
+    base_dir = os.path.dirname(__file__)
+    report_path = os.path.join(
+        base_dir,
+        "Medical Reports",
+        "Medical Rerort - Michael Johnson - Panic Attack Disorder.txt",
+    )
+
+    # 读取医疗报告内容
+    with open(report_path, "r", encoding="utf-8") as file:
+        medical_report = file.read()
+
+    # 使用上面的通用函数跑当前项目内置案例
+    final_diagnosis_text = run_multi_agent_diagnosis(medical_report)
+    txt_output_path = "results/final_diagnosis.txt"
+
+    # 确保结果输出目录存在
+    os.makedirs(os.path.dirname(txt_output_path), exist_ok=True)
+
+    # 将最终诊断结果写入文本文件
+    with open(txt_output_path, "w") as txt_file:
+        txt_file.write(final_diagnosis_text)
+
+    print(f"最终诊断结果已保存到 {txt_output_path}")
+
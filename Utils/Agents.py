@@ -1,13 +1,56 @@
+import asyncio
 import os
+import time
 from langchain_core.prompts import PromptTemplate
 from langchain_openai import ChatOpenAI
+from Utils.Concurrency import llm_slot
+from Utils.Tokens import estimate_tokens
+
+# (角色, 语言) -> 已解析的提示模板
+_PROMPT_TEMPLATE_CACHE = {}
+
+
+def get_prompt_template(role, language="en"):
+    """获取 (角色, 语言) 对应的提示模板（解析结果在进程内缓存复用）"""
+    cache_key = (role, language)
+    template = _PROMPT_TEMPLATE_CACHE.get(cache_key)
+    if template is None:
+        template = Agent._build_prompt_template(role, language)
+        _PROMPT_TEMPLATE_CACHE[cache_key] = template
+    return template
+
+
+def _prompt_variables(role, medical_report=None, extra_info=None):
+    if role == "MultidisciplinaryTeam":
+        extra_info = extra_info or {}
+        # 与改用模板变量之前的 f-string 渲染结果保持一致（未返回结果的专科报告渲染为 "None"）
+        return {
+            "cardiologist_report": extra_info.get("cardiologist_report", ""),
+            "psychologist_report": extra_info.get("psychologist_report", ""),
+            "pulmonologist_report": extra_info.get("pulmonologist_report", ""),
+        }
+    return {"medical_report": medical_report}
+
+
+def render_prompt(role, language="en", medical_report=None, extra_info=None):
+    """渲染某角色的完整提示词，不创建模型客户端（供批处理等离线场景使用）
+
+    Args:
+        role: 智能体角色，如 "Cardiologist"、"MultidisciplinaryTeam"
+        language: 'en' 或 'zh'
+        medical_report: 病历文本（专科角色）
+        extra_info: MDT 角色的专科报告，键为 cardiologist_report / psychologist_report / pulmonologist_report
+    """
+    return get_prompt_template(role, language).format(**_prompt_variables(role, medical_report, extra_info))
+
 
 class Agent:
-    def __init__(self, medical_report=None, role=None, extra_info=None, model_name=None, language="en"):
+    def __init__(self, medical_report=None, role=None, extra_info=None, model_name=None, language="en", provider=None):
         self.medical_report = medical_report
         self.role = role
         self.extra_info = extra_info
         self.language = language  # 'en' 或 'zh'
+        self.usage = None  # 最近一次 arun 的耗时与 token 用量
         # 根据角色和额外信息初始化提示模板
         self.prompt_template = self.create_prompt_template()
         # 使用自定义网关 / 环境变量配置初始化大模型
@@ -15,38 +58,106 @@ class Agent:
         # 如果传入了model_name参数，使用它；否则从环境变量读取
         if model_name is None:
             model_name = os.getenv("LLM_MODEL", "gemini-2.5-flash")
-        self.model = ChatOpenAI(
-            temperature=0,
-            model=model_name,
-            base_url=base_url,
-        )
+        self.model_name = model_name
+        # provider: 系统设置中的供应商配置，如 {"provider_type": "ollama", "base_url": "http://localhost:11434"}
+        self.provider_type = (provider or {}).get("provider_type", "openai")
+        self.base_url = (provider or {}).get("base_url") or base_url
+        if self.provider_type == "ollama":
+            from langchain_ollama import ChatOllama  # 仅本地推理时需要
+            self.model = ChatOllama(
+                temperature=0,
+                model=model_name,
+                base_url=self.base_url,
+            )
+        else:
+            self.model = ChatOpenAI(
+                temperature=0,
+                model=model_name,
+                base_url=base_url,
+            )
 
     def create_prompt_template(self):
-        if self.role == "MultidisciplinaryTeam":
-            if self.language == "zh":
-                templates = f"""
+        return get_prompt_template(self.role, self.language)
+
+    def prompt_variables(self):
+        """填充提示模板所需的变量"""
+        return _prompt_variables(self.role, self.medical_report, self.extra_info)
+
+    def prompt_overhead_tokens(self):
+        """提示模板本身（不含填充变量）的估算 token 数"""
+        return estimate_tokens(self.prompt_template.template)
+
+    @staticmethod
+    def _build_prompt_template(role, language):
+        if role == "ReportSummarizer":
+            if language == "zh":
+                templates = """
+                    你将收到一份较长病历的其中一个片段。
+                    任务：将该片段压缩为简洁的临床摘要，供心脏科、心理学和呼吸科专家阅读。
+                    必须保留：诊断与既往史、症状及其时间线、生命体征、检验与检查结果（含数值和单位）、用药及剂量、过敏史、重要阴性结果。
+                    删除重复内容、格式噪声和与临床无关的行政信息。不要推测或添加片段中没有的信息。
+                    仅返回摘要。
+
+                    病历片段：
+                    {medical_report}
+                """
+            else:
+                templates = """
+                    You will receive one excerpt of a long medical record.
+                    Task: Condense the excerpt into a concise clinical summary for a cardiologist, psychologist and pulmonologist.
+                    Always keep: diagnoses and history, symptoms and their timeline, vital signs, lab and test results (with values and units), medications and doses, allergies, and relevant negative findings.
+                    Drop duplicated content, formatting noise and non-clinical administrative details. Do not infer or add anything that is not in the excerpt.
+                    Only return the summary.
+
+                    Record Excerpt:
+                    {medical_report}
+                """
+        elif role == "Translator":
+            if language == "zh":
+                templates = """
+                    将以下 Markdown 格式的多学科诊断报告翻译成简体中文。
+                    要求：保持 Markdown 结构（标题层级、列表、粗体）不变；医学术语使用规范的中文译名，必要时在括号中保留英文原文；
+                    药物名称、剂量、检验数值与单位保持原样；不要添加、删减或解释任何内容。
+                    仅返回翻译后的 Markdown。
+
+                    诊断报告：
+                    {medical_report}
+                """
+            else:
+                templates = """
+                    Translate the following multidisciplinary diagnosis report in Markdown into English.
+                    Requirements: keep the Markdown structure (heading levels, lists, bold text) unchanged; use standard English medical terminology;
+                    keep drug names, dosages, lab values and units exactly as they are; do not add, remove or explain any content.
+                    Only return the translated Markdown.
+
+                    Diagnosis Report:
+                    {medical_report}
+                """
+        elif role == "MultidisciplinaryTeam":
+            if language == "zh":
+                templates = """
                     扮演一个由医疗保健专业人员组成的多学科团队。
                     你将收到心脏科医生、心理学家和呼吸科医生对患者的医疗报告。
                     任务：审查心脏科医生、心理学家和呼吸科医生的患者医疗报告，分析它们并列出患者的 3 个可能的健康问题。
                     仅返回患者 3 个可能的健康问题的要点列表，并为每个问题提供原因。
 
-                    心脏科医生报告：{self.extra_info.get('cardiologist_report', '')}
-                    心理学家报告：{self.extra_info.get('psychologist_report', '')}
-                    呼吸科医生报告：{self.extra_info.get('pulmonologist_report', '')}
+                    心脏科医生报告：{cardiologist_report}
+                    心理学家报告：{psychologist_report}
+                    呼吸科医生报告：{pulmonologist_report}
                 """
             else:
-                templates = f"""
+                templates = """
                     Act like a multidisciplinary team of healthcare professionals.
                     You will receive a medical report of a patient visited by a Cardiologist, Psychologist, and Pulmonologist.
                     Task: Review the patient's medical report from the Cardiologist, Psychologist, and Pulmonologist, analyze them and come up with a list of 3 possible health issues of the patient.
                     Just return a list of bullet points of 3 possible health issues of the patient and for each issue provide the reason.
 
-                    Cardiologist Report: {self.extra_info.get('cardiologist_report', '')}
-                    Psychologist Report: {self.extra_info.get('psychologist_report', '')}
-                    Pulmonologist Report: {self.extra_info.get('pulmonologist_report', '')}
+                    Cardiologist Report: {cardiologist_report}
+                    Psychologist Report: {psychologist_report}
+                    Pulmonologist Report: {pulmonologist_report}
                 """
         else:
-            if self.language == "zh":
+            if language == "zh":
                 templates_zh = {
                     "Cardiologist": """
                         扮演一名心脏科医生。你将收到患者的医疗报告。
@@ -73,7 +184,7 @@ class Agent:
                         患者报告：{medical_report}
                     """
                 }
-                templates = templates_zh[self.role]
+                templates = templates_zh[role]
             else:
                 templates_en = {
                     "Cardiologist": """
@@ -101,12 +212,12 @@ class Agent:
                         Patient's Report: {medical_report}
                     """
                 }
-                templates = templates_en[self.role]
+                templates = templates_en[role]
         return PromptTemplate.from_template(templates)
     
     def run(self):
         print(f"{self.role} 智能体开始运行...")
-        prompt = self.prompt_template.format(medical_report=self.medical_report)
+        prompt = self.prompt_template.format(**self.prompt_variables())
         try:
             response = self.model.invoke(prompt)
             result = response.content
@@ -121,24 +232,79 @@ class Agent:
             traceback.print_exc()
             return None
 
+    async def _ainvoke_in_slot(self, prompt):
+        """占用调用名额后调用模型（远程模型共享并发上限，本地模型按服务调度）"""
+        async with llm_slot(self.provider_type, self.base_url, self.model_name):
+            return await self.model.ainvoke(prompt)
+
+    async def arun(self, timeout=None):
+        """异步运行智能体
+
+        Args:
+            timeout: 本次调用的时间预算（秒，含排队等待名额的时间），超时后取消排队或进行中的模型请求并返回 None；
+                     调用方任务被取消（如客户端断开）时，模型请求随之取消
+        """
+        print(f"{self.role} 智能体开始运行（异步）...")
+        prompt = self.prompt_template.format(**self.prompt_variables())
+        self.usage = {"agent": self.role, "model": self.model_name, "status": "ok",
+                      "elapsed_ms": 0, "input_tokens": None, "output_tokens": None}
+        start_time = time.perf_counter()
+        try:
+            # 排队等待名额与模型调用共用同一时间预算，超时时无论处于哪个阶段都会被取消
+            response = await asyncio.wait_for(self._ainvoke_in_slot(prompt), timeout=timeout)
+            usage_metadata = getattr(response, "usage_metadata", None) or {}
+            self.usage["input_tokens"] = usage_metadata.get("input_tokens")
+            self.usage["output_tokens"] = usage_metadata.get("output_tokens")
+            result = response.content
+            if not result or not result.strip():
+                print(f"⚠️  {self.role} 返回了空结果")
+                self.usage["status"] = "empty"
+                return None
+            print(f"✓ {self.role} 成功返回结果（长度: {len(result)} 字符）")
+            return result
+        except asyncio.TimeoutError:
+            print(f"⏱️  {self.role} 超出时间预算（{timeout:.1f}s），已取消模型调用")
+            self.usage["status"] = "timeout"
+            return None
+        except Exception as e:
+            print(f"❌ {self.role} 运行过程中发生错误: {type(e).__name__}: {e}")
+            import traceback
+            traceback.print_exc()
+            self.usage["status"] = "error"
+            return None
+        finally:
+            self.usage["elapsed_ms"] = int((time.perf_counter() - start_time) * 1000)
+
 # 定义专科智能体类
 class Cardiologist(Agent):
-    def __init__(self, medical_report, model_name=None, language="en"):
-        super().__init__(medical_report, "Cardiologist", model_name=model_name, language=language)
+    def __init__(self, medical_report, model_name=None, language="en", provider=None):
+        super().__init__(medical_report, "Cardiologist", model_name=model_name, language=language, provider=provider)
 
 class Psychologist(Agent):
-    def __init__(self, medical_report, model_name=None, language="en"):
-        super().__init__(medical_report, "Psychologist", model_name=model_name, language=language)
+    def __init__(self, medical_report, model_name=None, language="en", provider=None):
+        super().__init__(medical_report, "Psychologist", model_name=model_name, language=language, provider=provider)
 
 class Pulmonologist(Agent):
-    def __init__(self, medical_report, model_name=None, language="en"):
-        super().__init__(medical_report, "Pulmonologist", model_name=model_name, language=language)
+    def __init__(self, medical_report, model_name=None, language="en", provider=None):
+        super().__init__(medical_report, "Pulmonologist", model_name=model_name, language=language, provider=provider)
 
 class MultidisciplinaryTeam(Agent):
-    def __init__(self, cardiologist_report, psychologist_report, pulmonologist_report, model_name=None, language="en"):
+    def __init__(self, cardiologist_report, psychologist_report, pulmonologist_report, model_name=None, language="en", provider=None):
         extra_info = {
             "cardiologist_report": cardiologist_report,
             "psychologist_report": psychologist_report,
             "pulmonologist_report": pulmonologist_report
         }
-        super().__init__(role="MultidisciplinaryTeam", extra_info=extra_info, model_name=model_name, language=language)
+        super().__init__(role="MultidisciplinaryTeam", extra_info=extra_info, model_name=model_name, language=language, provider=provider)
+
+class ReportSummarizer(Agent):
+    """超长病历分块摘要（map 阶段），language 为输出说明所用语言"""
+    def __init__(self, report_chunk, model_name=None, language="en", provider=None):
+        super().__init__(report_chunk, "ReportSummarizer", model_name=model_name, language=language, provider=provider)
+
+class Translator(Agent):
+    """将已有诊断结果翻译为目标语言（language 为目标语言）"""
+    def __init__(self, diagnosis_markdown, model_name=None, language="en", provider=None):
+        if model_name is None:
+            model_name = os.getenv("LLM_TRANSLATION_MODEL") or os.getenv("LLM_FAST_MODEL")
+        super().__init__(diagnosis_markdown, "Translator", model_name=model_name, language=language, provider=provider)
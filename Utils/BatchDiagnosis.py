@@ -0,0 +1,239 @@
+"""
+批处理（Batch API）诊断后端
+
+用于不着急拿结果的大批量诊断（如新模型上线后对全部病例重新诊断）：按 OpenAI 兼容的 Batch API
+把所有请求写成一个 JSONL 文件一次提交，由服务商离线执行（通常按交互调用的折扣计费，且不占用交互限流额度）。
+
+流程：
+1. 所有病例的专科提示词（心脏科 / 心理学 / 呼吸科）写入第一个批处理文件并提交，轮询至完成
+2. 用专科报告构建 MDT 提示词，作为第二个批处理提交，轮询至完成
+3. 按与交互诊断相同的格式组装 markdown（build_diagnosis_markdown）
+
+Batch API 端点（相对于 OPENAI_BASE_URL）：
+    POST /files                    上传 JSONL（purpose=batch）
+    POST /batches                  创建批处理任务
+    GET  /batches/{id}             查询任务状态
+    GET  /files/{id}/content       下载结果 / 错误文件
+"""
+import json
+import os
+import time
+
+import httpx
+
+from Utils.Agents import render_prompt
+
+SPECIALIST_ROLES = ("Cardiologist", "Psychologist", "Pulmonologist")
+MDT_ROLE = "MultidisciplinaryTeam"
+
+# 轮询批处理任务状态的间隔与总等待时长（秒）
+BATCH_POLL_INTERVAL_SECONDS = float(os.getenv("BATCH_POLL_INTERVAL_SECONDS", "30"))
+BATCH_MAX_WAIT_SECONDS = float(os.getenv("BATCH_MAX_WAIT_SECONDS", str(24 * 3600)))
+BATCH_COMPLETION_WINDOW = os.getenv("BATCH_COMPLETION_WINDOW", "24h")
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# 终止状态
+_FINISHED_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+class BatchError(Exception):
+    """批处理任务失败、过期或等待超时"""
+
+
+class BatchAPIClient:
+    """OpenAI 兼容 Batch API 的最小客户端
+
+    Args:
+        base_url: API 基础地址（默认 OPENAI_BASE_URL）
+        api_key: API Key（默认 OPENAI_API_KEY）
+        transport: 自定义 httpx 传输层（测试时传入 httpx.MockTransport 作为本地桩服务）
+    """
+
+    def __init__(self, base_url=None, api_key=None, transport=None, timeout=60.0):
+        base_url = (base_url or os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/")
+        api_key = api_key if api_key is not None else os.getenv("OPENAI_API_KEY", "")
+        self._client = httpx.Client(
+            base_url=base_url,
+            headers={"Authorization": f"Bearer {api_key}"},
+            transport=transport,
+            timeout=timeout,
+        )
+
+    def close(self):
+        self._client.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def upload_file(self, content: bytes, filename="batch.jsonl") -> str:
+        response = self._client.post(
+            "/files",
+            data={"purpose": "batch"},
+            files={"file": (filename, content, "application/jsonl")},
+        )
+        response.raise_for_status()
+        return response.json()["id"]
+
+    def create_batch(self, input_file_id: str, metadata: dict = None) -> dict:
+        payload = {
+            "input_file_id": input_file_id,
+            "endpoint": BATCH_ENDPOINT,
+            "completion_window": BATCH_COMPLETION_WINDOW,
+        }
+        if metadata:
+            payload["metadata"] = metadata
+        response = self._client.post("/batches", json=payload)
+        response.raise_for_status()
+        return response.json()
+
+    def get_batch(self, batch_id: str) -> dict:
+        response = self._client.get(f"/batches/{batch_id}")
+        response.raise_for_status()
+        return response.json()
+
+    def download_file(self, file_id: str) -> str:
+        response = self._client.get(f"/files/{file_id}/content")
+        response.raise_for_status()
+        return response.text
+
+    def wait_for_batch(self, batch_id: str, poll_interval=None, max_wait=None) -> dict:
+        """轮询直到批处理任务进入终止状态，返回最终任务信息"""
+        poll_interval = BATCH_POLL_INTERVAL_SECONDS if poll_interval is None else poll_interval
+        max_wait = BATCH_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        deadline = time.monotonic() + max_wait
+        while True:
+            batch = self.get_batch(batch_id)
+            status = batch.get("status")
+            if status in _FINISHED_STATUSES:
+                return batch
+            if time.monotonic() >= deadline:
+                raise BatchError(f"批处理任务 {batch_id} 等待超时（状态: {status}）")
+            time.sleep(poll_interval)
+
+
+def build_request_line(custom_id: str, model_name: str, prompt: str) -> dict:
+    """构造批处理文件中的一行请求（与交互调用一致：temperature=0，单条 user 消息）"""
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {
+            "model": model_name,
+            "temperature": 0,
+            "messages": [{"role": "user", "content": prompt}],
+        },
+    }
+
+
+def _custom_id(case_key, role):
+    return f"{case_key}:{role}"
+
+
+def _split_custom_id(custom_id):
+    case_key, _, role = custom_id.rpartition(":")
+    return case_key, role
+
+
+def parse_output_lines(text: str) -> dict:
+    """解析结果文件，返回 custom_id -> 回复文本（失败或空回复为 None）"""
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        content = None
+        response = item.get("response") or {}
+        if not item.get("error") and response.get("status_code", 200) == 200:
+            choices = (response.get("body") or {}).get("choices") or []
+            if choices:
+                content = (choices[0].get("message") or {}).get("content")
+        results[item["custom_id"]] = content if content and content.strip() else None
+    return results
+
+
+def run_batch(client: BatchAPIClient, lines: list, poll_interval=None, max_wait=None, metadata=None) -> dict:
+    """提交一个批处理并等待完成，返回 custom_id -> 回复文本
+
+    任务整体失败 / 过期 / 取消时抛出 BatchError；单条请求失败记为 None。
+    """
+    content = "\n".join(json.dumps(line, ensure_ascii=False) for line in lines).encode("utf-8")
+    file_id = client.upload_file(content)
+    batch = client.create_batch(file_id, metadata=metadata)
+    print(f"⏳ 已提交批处理 {batch['id']}（{len(lines)} 个请求）")
+    batch = client.wait_for_batch(batch["id"], poll_interval=poll_interval, max_wait=max_wait)
+    if batch.get("status") != "completed":
+        raise BatchError(f"批处理任务 {batch['id']} 未完成（状态: {batch.get('status')}）")
+
+    results = {line["custom_id"]: None for line in lines}
+    if batch.get("output_file_id"):
+        results.update(parse_output_lines(client.download_file(batch["output_file_id"])))
+    failed = sum(1 for value in results.values() if value is None)
+    print(f"✓ 批处理 {batch['id']} 完成（成功 {len(lines) - failed}，失败 {failed}）")
+    return results
+
+
+def run_batch_diagnosis(client: BatchAPIClient, reports: dict, model_name: str, language: str = "en",
+                        poll_interval=None, max_wait=None) -> dict:
+    """用两轮批处理完成一批病例的多学科诊断
+
+    Args:
+        client: Batch API 客户端
+        reports: 病例标识 -> 病历文本（标识按字符串处理）
+        model_name: 模型名称
+        language: 输出语言 ('en' 或 'zh')
+        poll_interval / max_wait: 轮询间隔与最长等待时间（秒）
+
+    Returns:
+        病例标识 -> {"diagnosis_markdown": str, "responses": dict, "final_diagnosis": str | None}；
+        三个专科全部失败的病例不提交 MDT，也不包含在返回结果中
+    """
+    # 延迟导入：Main 在导入时加载 apikey.env
+    from Main import build_diagnosis_markdown
+
+    reports = {str(case_key): report for case_key, report in reports.items()}
+    if not reports:
+        return {}
+
+    specialist_lines = [
+        build_request_line(_custom_id(case_key, role), model_name,
+                           render_prompt(role, language, medical_report=report))
+        for case_key, report in reports.items()
+        for role in SPECIALIST_ROLES
+    ]
+    specialist_results = run_batch(client, specialist_lines, poll_interval, max_wait,
+                                   metadata={"stage": "specialists", "model": model_name})
+
+    responses = {case_key: {role: None for role in SPECIALIST_ROLES} for case_key in reports}
+    for custom_id, content in specialist_results.items():
+        case_key, role = _split_custom_id(custom_id)
+        responses[case_key][role] = content
+
+    mdt_lines = [
+        build_request_line(_custom_id(case_key, MDT_ROLE), model_name, render_prompt(
+            MDT_ROLE, language, extra_info={
+                "cardiologist_report": case_responses["Cardiologist"],
+                "psychologist_report": case_responses["Psychologist"],
+                "pulmonologist_report": case_responses["Pulmonologist"],
+            }))
+        for case_key, case_responses in responses.items()
+        if any(case_responses.values())
+    ]
+    mdt_results = {}
+    if mdt_lines:
+        mdt_results = run_batch(client, mdt_lines, poll_interval, max_wait,
+                                metadata={"stage": "mdt", "model": model_name})
+
+    results = {}
+    for case_key, case_responses in responses.items():
+        if not any(case_responses.values()):
+            continue
+        final_diagnosis = mdt_results.get(_custom_id(case_key, MDT_ROLE))
+        results[case_key] = {
+            "diagnosis_markdown": build_diagnosis_markdown(case_responses, final_diagnosis, language),
+            "responses": case_responses,
+            "final_diagnosis": final_diagnosis,
+        }
+    return results
@@ -0,0 +1,389 @@
+import asyncio
+import itertools
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import asynccontextmanager
+
+# 进程内同时进行的远程模型调用上限（所有请求、所有模型共享）
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+# 本地 Ollama：同一模型同时进行的请求数（与 Ollama 的 OLLAMA_NUM_PARALLEL 保持一致）
+OLLAMA_MAX_CONCURRENCY_PER_MODEL = int(os.getenv("OLLAMA_MAX_CONCURRENCY_PER_MODEL", "1"))
+# 本地 Ollama：有其他模型在排队时，当前模型最多连续处理的请求数（避免其他模型饿死）
+OLLAMA_MAX_BATCH_PER_MODEL = int(os.getenv("OLLAMA_MAX_BATCH_PER_MODEL", "8"))
+
+# 远程接口自适应并发（AIMD）：每个 (服务地址, 模型) 单独维护并发上限，不超过 LLM_MAX_CONCURRENCY
+LLM_ADAPTIVE_CONCURRENCY = os.getenv("LLM_ADAPTIVE_CONCURRENCY", "true").lower() in ("1", "true", "yes")
+LLM_AIMD_INITIAL_LIMIT = float(os.getenv("LLM_AIMD_INITIAL_LIMIT", "4"))
+LLM_AIMD_MIN_LIMIT = float(os.getenv("LLM_AIMD_MIN_LIMIT", "1"))
+# 每个上限窗口内的调用都健康时上限 +1（每次成功增加 1/limit）
+LLM_AIMD_INCREASE = float(os.getenv("LLM_AIMD_INCREASE", "1"))
+# 限流（429）、超时、服务过载或延迟突增时上限乘以该系数
+LLM_AIMD_DECREASE_FACTOR = float(os.getenv("LLM_AIMD_DECREASE_FACTOR", "0.5"))
+# 调用耗时超过基线延迟（健康调用的指数移动平均）的该倍数视为延迟突增
+LLM_AIMD_LATENCY_SPIKE_FACTOR = float(os.getenv("LLM_AIMD_LATENCY_SPIKE_FACTOR", "3"))
+# 基线延迟至少积累该数量的样本后才判断延迟突增
+LATENCY_BASELINE_MIN_SAMPLES = 5
+LATENCY_EWMA_ALPHA = 0.2
+
+# 视为服务端拥塞的 HTTP 状态码
+RATE_LIMIT_STATUS_CODES = {429}
+OVERLOAD_STATUS_CODES = {502, 503, 504, 529}
+# 视为服务端超时的异常类名（httpx / openai；按类名匹配，不强制安装对应依赖）
+PROVIDER_TIMEOUT_ERRORS = {"TimeoutException", "APITimeoutError"}
+
+# asyncio 同步原语绑定事件循环，按事件循环各建一份
+_semaphores = weakref.WeakKeyDictionary()
+_local_schedulers = weakref.WeakKeyDictionary()
+
+
+def _get_semaphore():
+    loop = asyncio.get_running_loop()
+    semaphore = _semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(LLM_MAX_CONCURRENCY)
+        _semaphores[loop] = semaphore
+    return semaphore
+
+
+class ModelBatchScheduler:
+    """本地推理服务的请求调度器
+
+    本地服务（Ollama）同一时间通常只能高效地加载一个模型，多个模型的请求交替到达时
+    会反复换入换出模型权重，GPU/CPU 资源在切换中被浪费。调度器按模型分队列：
+    - 同一时间只运行一个模型的请求，该模型最多 per_model_concurrency 个并发
+    - 当前模型的排队请求成批连续处理，最多 max_batch 个后（若有其他模型在等待）才切换
+    - 切换时选择等待最久的模型，保证公平
+    """
+
+    def __init__(self, per_model_concurrency=1, max_batch=8):
+        self.per_model_concurrency = max(1, per_model_concurrency)
+        self.max_batch = max(1, max_batch)
+        self._queues = {}  # 模型 -> deque[(序号, Future)]
+        self._sequence = itertools.count()
+        self._active_model = None
+        self._running = 0
+        self._served_in_batch = 0
+
+    def stats(self):
+        return {
+            "active_model": self._active_model,
+            "running": self._running,
+            "queued": {model: len(queue) for model, queue in self._queues.items() if queue},
+        }
+
+    def _prune(self, model):
+        queue = self._queues.get(model)
+        while queue and queue[0][1].cancelled():
+            queue.popleft()
+        return bool(queue)
+
+    def _next_model(self):
+        """选择队首请求等待最久的模型（当前批次已满时优先切换到其他模型）"""
+        candidates = [model for model in list(self._queues) if self._prune(model)]
+        if not candidates:
+            return None
+        if self._active_model in candidates and len(candidates) > 1 and self._served_in_batch >= self.max_batch:
+            candidates.remove(self._active_model)
+        return min(candidates, key=lambda model: self._queues[model][0][0])
+
+    def _dispatch(self):
+        while True:
+            active = self._active_model
+            if active is not None and self._prune(active) and (
+                self._served_in_batch < self.max_batch or self._next_model() == active
+            ):
+                if self._running >= self.per_model_concurrency:
+                    return
+                _, future = self._queues[active].popleft()
+                self._running += 1
+                self._served_in_batch += 1
+                future.set_result(None)
+                continue
+
+            # 需要切换模型：等当前模型的请求全部完成后再切换
+            if self._running > 0:
+                return
+            next_model = self._next_model()
+            if next_model is None:
+                self._active_model = None
+                return
+            self._active_model = next_model
+            self._served_in_batch = 0
+
+    def _release(self):
+        self._running -= 1
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, model):
+        future = asyncio.get_running_loop().create_future()
+        self._queues.setdefault(model, deque()).append((next(self._sequence), future))
+        self._dispatch()
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # 已获得名额但调用方同时被取消，归还名额
+                self._release()
+            else:
+                future.cancel()
+                self._dispatch()
+            raise
+        try:
+            yield
+        finally:
+            self._release()
+
+
+def _error_status_code(exc):
+    """从 openai / httpx / ollama 的异常中取出 HTTP 状态码"""
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    return status if isinstance(status, int) else None
+
+
+def _is_provider_timeout(exc):
+    """是否为服务端 / HTTP 超时（httpx.TimeoutException、openai.APITimeoutError 等）
+
+    asyncio.TimeoutError（即内置 TimeoutError）来自调用方自己的时间预算（asyncio.wait_for），
+    不反映服务端状态，不在此列
+    """
+    return any(cls.__name__ in PROVIDER_TIMEOUT_ERRORS for cls in type(exc).__mro__)
+
+
+class _CallTimer:
+    """记录一次调用真正开始的时间"""
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+
+    def start(self):
+        self.started_at = time.monotonic()
+
+
+class AIMDLimiter:
+    """按服务端反馈自适应调整并发上限（加性增、乘性减）
+
+    - 调用健康（未超过延迟基线的 LLM_AIMD_LATENCY_SPIKE_FACTOR 倍）且并发已用满时，
+      上限每次增加 increase / limit，即每轮满窗口的调用后约 +increase
+    - 收到 429、服务过载（5xx）、服务端 / HTTP 超时或延迟突增时，上限乘以 decrease_factor
+      （调用方自己的时间预算用完与取消一样不计入）
+    - 同一次拥塞往往让一批并发调用同时失败，只有在上次下调之后才开始的调用能再次触发下调
+
+    状态在进程内共享（与事件循环无关），排队的调用按到达顺序放行。
+    """
+
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=8, increase=1.0,
+                 decrease_factor=0.5, latency_spike_factor=3.0):
+        self.min_limit = max(1.0, float(min_limit))
+        self.max_limit = max(self.min_limit, float(max_limit))
+        self.limit = min(max(float(initial_limit), self.min_limit), self.max_limit)
+        self.increase = increase
+        self.decrease_factor = decrease_factor
+        self.latency_spike_factor = latency_spike_factor
+        self.in_flight = 0
+        self.baseline_latency = None
+        self.last_latency = None
+        self.counts = {"ok": 0, "rate_limited": 0, "timeout": 0, "overloaded": 0,
+                       "latency_spike": 0, "error": 0, "increases": 0, "decreases": 0}
+        self._samples = 0
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self._waiters = deque()  # (事件循环, Future)
+
+    def _capacity(self):
+        return max(1, int(self.limit))
+
+    def stats(self):
+        with self._lock:
+            return {
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "queued": sum(1 for _, future in self._waiters if not future.done()),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "baseline_latency_ms": None if self.baseline_latency is None else int(self.baseline_latency * 1000),
+                "last_latency_ms": None if self.last_latency is None else int(self.last_latency * 1000),
+                **self.counts,
+            }
+
+    def _grant_waiters(self):
+        """在持有锁时调用：按顺序放行排队的调用，直到占满当前上限"""
+        while self._waiters and self.in_flight < self._capacity():
+            loop, future = self._waiters.popleft()
+            if future.done():
+                continue
+            self.in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._deliver, future)
+            except RuntimeError:
+                # 事件循环已关闭，名额收回
+                self.in_flight -= 1
+
+    def _deliver(self, future):
+        if future.cancelled():
+            # 放行前调用方已取消，归还名额
+            self._release()
+        else:
+            future.set_result(None)
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+            self._grant_waiters()
+
+    async def acquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.in_flight < self._capacity():
+                self.in_flight += 1
+                return
+            future = loop.create_future()
+            self._waiters.append((loop, future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = future.done() and not future.cancelled()
+                future.cancel()
+            if granted:
+                self._release()
+            raise
+
+    def record(self, outcome, started_at, latency=None):
+        """记录一次调用的结果并调整上限
+
+        Args:
+            outcome: ok / rate_limited / timeout / overloaded / error
+            started_at: 获得名额的时间（time.monotonic()）
+            latency: 调用耗时（秒，仅 ok 时使用）
+        """
+        with self._lock:
+            if outcome == "ok" and latency is not None:
+                self.last_latency = latency
+                spike = (
+                    self._samples >= LATENCY_BASELINE_MIN_SAMPLES
+                    and latency > self.baseline_latency * self.latency_spike_factor
+                )
+                if self.baseline_latency is None:
+                    self.baseline_latency = latency
+                else:
+                    self.baseline_latency += LATENCY_EWMA_ALPHA * (latency - self.baseline_latency)
+                self._samples += 1
+                if spike:
+                    outcome = "latency_spike"
+            self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+            if outcome == "ok":
+                # 并发未用满时上限不是瓶颈，不继续增长
+                if self.in_flight >= self._capacity() and self.limit < self.max_limit:
+                    self.limit = min(self.max_limit, self.limit + self.increase / self.limit)
+                    self.counts["increases"] += 1
+            elif outcome != "error" and started_at >= self._last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = time.monotonic()
+                self.counts["decreases"] += 1
+            self._grant_waiters()
+
+    @asynccontextmanager
+    async def slot(self):
+        """占用一个名额，并根据调用结果（耗时或异常）调整上限
+
+        产出一个计时器，调用方在真正发出请求前调用 timer.start()，
+        使后续排队（如全局并发上限）的时间不计入延迟。
+        """
+        await self.acquire()
+        timer = _CallTimer()
+        outcome = None
+        try:
+            yield timer
+            outcome = "ok"
+        except (asyncio.CancelledError, asyncio.TimeoutError):
+            # 调用方取消（如客户端断开）或调用方自己的时间预算用完，不反映服务端状态
+            raise
+        except Exception as exc:
+            status = _error_status_code(exc)
+            if _is_provider_timeout(exc):
+                outcome = "timeout"
+            elif status in RATE_LIMIT_STATUS_CODES:
+                outcome = "rate_limited"
+            elif status in OVERLOAD_STATUS_CODES:
+                outcome = "overloaded"
+            else:
+                outcome = "error"
+            raise
+        finally:
+            if outcome is not None:
+                self.record(outcome, timer.started_at, time.monotonic() - timer.started_at)
+            self._release()
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(base_url, model):
+    """获取 (服务地址, 模型) 对应的自适应并发控制器"""
+    key = (base_url or "default", model or "default")
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = AIMDLimiter(
+                initial_limit=LLM_AIMD_INITIAL_LIMIT,
+                min_limit=LLM_AIMD_MIN_LIMIT,
+                max_limit=LLM_MAX_CONCURRENCY,
+                increase=LLM_AIMD_INCREASE,
+                decrease_factor=LLM_AIMD_DECREASE_FACTOR,
+                latency_spike_factor=LLM_AIMD_LATENCY_SPIKE_FACTOR,
+            )
+            _limiters[key] = limiter
+        return limiter
+
+
+def concurrency_stats():
+    """各 (服务地址, 模型) 自适应并发控制器的当前状态"""
+    with _limiters_lock:
+        items = list(_limiters.items())
+    return [
+        {"base_url": base_url, "model": model, **limiter.stats()}
+        for (base_url, model), limiter in sorted(items)
+    ]
+
+
+def _get_local_scheduler(base_url):
+    loop = asyncio.get_running_loop()
+    schedulers = _local_schedulers.get(loop)
+    if schedulers is None:
+        schedulers = {}
+        _local_schedulers[loop] = schedulers
+    scheduler = schedulers.get(base_url)
+    if scheduler is None:
+        scheduler = ModelBatchScheduler(OLLAMA_MAX_CONCURRENCY_PER_MODEL, OLLAMA_MAX_BATCH_PER_MODEL)
+        schedulers[base_url] = scheduler
+    return scheduler
+
+
+@asynccontextmanager
+async def llm_slot(provider_type="openai", base_url=None, model=None):
+    """占用一个模型调用名额
+
+    - 远程接口：每个 (服务地址, 模型) 按 AIMD 自适应调整并发上限，
+      所有调用同时共享 LLM_MAX_CONCURRENCY 总上限，超出时排队
+    - 本地 Ollama：按服务地址调度，同一服务按模型成批串行处理
+    """
+    if provider_type == "ollama":
+        async with _get_local_scheduler(base_url).slot(model):
+            yield
+        return
+    if not LLM_ADAPTIVE_CONCURRENCY:
+        async with _get_semaphore():
+            yield
+        return
+    async with get_limiter(base_url, model).slot() as timer:
+        async with _get_semaphore():
+            timer.start()
+            yield
@@ -0,0 +1,27 @@
+import time
+
+
+class Deadline:
+    """请求截止时间（基于单调时钟），在诊断流水线的各阶段之间传递剩余时间预算"""
+
+    def __init__(self, timeout_seconds: float):
+        self.timeout_seconds = timeout_seconds
+        self.expires_at = time.monotonic() + timeout_seconds
+
+    @classmethod
+    def from_timeout_ms(cls, timeout_ms):
+        """根据毫秒超时创建截止时间；未指定超时时返回 None（不限时）"""
+        if timeout_ms is None:
+            return None
+        return cls(timeout_ms / 1000.0)
+
+    def remaining(self) -> float:
+        """剩余时间（秒），已过期时为 0"""
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def __repr__(self):
+        return f"<Deadline(remaining={self.remaining():.1f}s)>"
@@ -0,0 +1,76 @@
+import re
+
+# 中日韩字符（含全角标点）：大多数分词器约 1 个字符对应 1 个 token 甚至更多，按 1 估算
+_CJK_PATTERN = re.compile(r"[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+# 其他文本（英文、数字、符号）：约 4 个字符对应 1 个 token
+_CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text):
+    """粗略估算文本的 token 数（偏保守，用于判断是否超出上下文窗口，不需要精确的分词器）"""
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + _CHARS_PER_TOKEN - 1) // _CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text, max_tokens):
+    """截断文本，使估算 token 数不超过 max_tokens（仅作为无法摘要时的兜底）"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= max_tokens:
+            low = mid
+        else:
+            high = mid - 1
+    return text[:low]
+
+
+def split_into_chunks(text, max_tokens):
+    """按段落 → 行 → 字符的优先级切分文本，每块估算 token 数不超过 max_tokens"""
+    if max_tokens <= 0:
+        raise ValueError("max_tokens 必须大于 0")
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("".join(current))
+        current = []
+        current_tokens = 0
+
+    def add_piece(piece, piece_tokens):
+        nonlocal current_tokens
+        if current_tokens + piece_tokens > max_tokens:
+            flush()
+        current.append(piece)
+        current_tokens += piece_tokens
+
+    for paragraph in re.split(r"(?<=\n\n)", text):
+        paragraph_tokens = estimate_tokens(paragraph)
+        if paragraph_tokens <= max_tokens:
+            add_piece(paragraph, paragraph_tokens)
+            continue
+        # 段落过长：按行切分
+        for line in paragraph.splitlines(keepends=True):
+            line_tokens = estimate_tokens(line)
+            if line_tokens <= max_tokens:
+                add_piece(line, line_tokens)
+                continue
+            # 单行过长：按字符硬切
+            remaining = line
+            while remaining:
+                piece = truncate_to_tokens(remaining, max_tokens)
+                if not piece:
+                    piece = remaining[:1]
+                add_piece(piece, estimate_tokens(piece))
+                remaining = remaining[len(piece):]
+
+    flush()
+    return [chunk for chunk in chunks if chunk.strip()]
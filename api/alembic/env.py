@@ -0,0 +1,57 @@
+"""Alembic 迁移环境
+
+数据库地址优先取 alembic 配置中的 sqlalchemy.url（测试时设置），否则使用 DATABASE_URL。
+SQLite 不支持大部分 ALTER TABLE 操作，迁移使用 batch 模式（重建表）。
+"""
+from alembic import context
+from sqlalchemy import create_engine, pool
+
+from api.db.database import Base, DATABASE_URL
+from api.db.migrate import include_name
+import api.models.case  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.content  # noqa: F401
+import api.models.user  # noqa: F401
+import api.models.settings  # noqa: F401
+import api.models.idempotency  # noqa: F401
+import api.models.single_flight  # noqa: F401
+
+config = context.config
+target_metadata = Base.metadata
+
+
+def get_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or DATABASE_URL
+
+
+def run_migrations_offline():
+    """生成 SQL 脚本而不连接数据库（alembic upgrade head --sql）"""
+    url = get_url()
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        render_as_batch=url.startswith("sqlite"),
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connectable = create_engine(get_url(), poolclass=pool.NullPool)
+    with connectable.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            render_as_batch=connection.dialect.name == "sqlite",
+            include_name=include_name,
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+    connectable.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,148 @@
+"""初始表结构（用户权限、病例、诊断历史、系统设置）
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "users",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("username", sa.String(50), nullable=False, comment="用户名"),
+        sa.Column("email", sa.String(100), nullable=False, comment="邮箱"),
+        sa.Column("hashed_password", sa.String(255), nullable=False, comment="加密后的密码"),
+        sa.Column("full_name", sa.String(100), comment="姓名"),
+        sa.Column("is_active", sa.Boolean(), comment="账户是否激活"),
+        sa.Column("is_superuser", sa.Boolean(), comment="是否为超级管理员"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+        sa.Column("updated_at", sa.DateTime(), comment="更新时间"),
+        sa.Column("last_login", sa.DateTime(), nullable=True, comment="最后登录时间"),
+    )
+    op.create_index("ix_users_id", "users", ["id"])
+    op.create_index("ix_users_username", "users", ["username"], unique=True)
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    op.create_table(
+        "roles",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(50), nullable=False, comment="角色名称"),
+        sa.Column("display_name", sa.String(100), comment="角色显示名称"),
+        sa.Column("description", sa.String(255), comment="角色描述"),
+        sa.Column("is_active", sa.Boolean(), comment="角色是否激活"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+    )
+    op.create_index("ix_roles_id", "roles", ["id"])
+    op.create_index("ix_roles_name", "roles", ["name"], unique=True)
+
+    op.create_table(
+        "user_roles",
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), primary_key=True),
+        sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id", ondelete="CASCADE"), primary_key=True),
+    )
+
+    op.create_table(
+        "permissions",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("role_id", sa.Integer(), sa.ForeignKey("roles.id", ondelete="CASCADE"), nullable=False,
+                  comment="关联角色ID"),
+        sa.Column("resource", sa.String(50), nullable=False, comment="资源名称（如 case, diagnosis, user）"),
+        sa.Column("action", sa.String(20), nullable=False, comment="操作类型（create, read, update, delete, execute）"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+    )
+    op.create_index("ix_permissions_id", "permissions", ["id"])
+    op.create_index("ix_permissions_role_id", "permissions", ["role_id"])
+
+    op.create_table(
+        "medical_cases",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("patient_id", sa.String(50), nullable=False, comment="患者病历号"),
+        sa.Column("patient_name", sa.String(100), comment="患者姓名"),
+        sa.Column("age", sa.Integer(), comment="年龄"),
+        sa.Column("gender", sa.String(10), comment="性别: male/female/other"),
+        sa.Column("chief_complaint", sa.Text(), comment="主诉"),
+        sa.Column("raw_report", sa.Text(), nullable=False, comment="原始病历全文"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+        sa.Column("updated_at", sa.DateTime(), comment="更新时间"),
+    )
+    op.create_index("ix_medical_cases_id", "medical_cases", ["id"])
+    op.create_index("ix_medical_cases_patient_id", "medical_cases", ["patient_id"], unique=True)
+
+    op.create_table(
+        "diagnosis_history",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("case_id", sa.Integer(), sa.ForeignKey("medical_cases.id", ondelete="CASCADE"), nullable=False,
+                  comment="关联病例ID"),
+        sa.Column("diagnosis_markdown", sa.Text(), nullable=False, comment="AI 诊断结果（Markdown格式）"),
+        sa.Column("model_name", sa.String(50), comment="使用的模型名称"),
+        sa.Column("run_timestamp", sa.DateTime(), comment="诊断运行时间"),
+        sa.Column("execution_time_ms", sa.Integer(), comment="执行耗时（毫秒）"),
+    )
+    op.create_index("ix_diagnosis_history_id", "diagnosis_history", ["id"])
+    op.create_index("ix_diagnosis_history_case_id", "diagnosis_history", ["case_id"])
+    op.create_index("ix_diagnosis_history_run_timestamp", "diagnosis_history", ["run_timestamp"])
+
+    op.create_table(
+        "providers",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("name", sa.String(100), nullable=False, comment="供应商名称"),
+        sa.Column("base_url", sa.String(500), nullable=False, comment="API 基础 URL"),
+        sa.Column("api_key_encrypted", sa.Text(), nullable=False, comment="加密的 API Key"),
+        sa.Column("is_enabled", sa.Boolean(), comment="是否启用"),
+        sa.Column("is_default", sa.Boolean(), comment="是否为默认供应商"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+        sa.Column("updated_at", sa.DateTime(), comment="更新时间"),
+    )
+    op.create_index("ix_providers_id", "providers", ["id"])
+    op.create_index("ix_providers_is_enabled", "providers", ["is_enabled"])
+    op.create_index("ix_providers_is_default", "providers", ["is_default"])
+
+    op.create_table(
+        "models",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("provider_id", sa.Integer(), sa.ForeignKey("providers.id", ondelete="CASCADE"), nullable=False,
+                  comment="关联供应商ID"),
+        sa.Column("model_id", sa.String(100), nullable=False, comment="模型标识，如 gpt-4o"),
+        sa.Column("display_name", sa.String(200), nullable=False, comment="显示名称"),
+        sa.Column("is_enabled", sa.Boolean(), comment="是否启用"),
+        sa.Column("is_default", sa.Boolean(), comment="是否为默认模型"),
+        sa.Column("max_tokens", sa.Integer(), nullable=True, comment="最大 Token 数"),
+        sa.Column("context_window", sa.Integer(), nullable=True, comment="上下文窗口大小"),
+        sa.Column("supports_vision", sa.Boolean(), comment="是否支持图像输入"),
+        sa.Column("supports_function_call", sa.Boolean(), comment="是否支持函数调用"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+        sa.Column("updated_at", sa.DateTime(), comment="更新时间"),
+    )
+    op.create_index("ix_models_id", "models", ["id"])
+    op.create_index("ix_models_provider_id", "models", ["provider_id"])
+    op.create_index("ix_models_is_enabled", "models", ["is_enabled"])
+    op.create_index("ix_models_is_default", "models", ["is_default"])
+
+    op.create_table(
+        "system_config",
+        sa.Column("key", sa.String(100), primary_key=True, comment="配置键"),
+        sa.Column("value", sa.Text(), nullable=False, comment="配置值"),
+        sa.Column("value_type", sa.String(20), comment="值类型: string/number/boolean/json"),
+        sa.Column("description", sa.String(500), nullable=True, comment="配置描述"),
+        sa.Column("updated_at", sa.DateTime(), comment="更新时间"),
+    )
+
+
+def downgrade():
+    op.drop_table("system_config")
+    op.drop_table("models")
+    op.drop_table("providers")
+    op.drop_table("diagnosis_history")
+    op.drop_table("medical_cases")
+    op.drop_table("permissions")
+    op.drop_table("user_roles")
+    op.drop_table("roles")
+    op.drop_table("users")
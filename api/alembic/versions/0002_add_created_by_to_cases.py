@@ -0,0 +1,27 @@
+"""medical_cases 添加创建者字段 created_by
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # SQLite 无法 ALTER TABLE 添加外键约束，batch 模式下重建表
+    with op.batch_alter_table("medical_cases") as batch_op:
+        batch_op.add_column(sa.Column("created_by", sa.Integer(), nullable=True, comment="创建者用户ID"))
+        batch_op.create_foreign_key("fk_medical_cases_created_by_users", "users", ["created_by"], ["id"])
+    op.create_index("ix_medical_cases_created_by", "medical_cases", ["created_by"])
+
+
+def downgrade():
+    op.drop_index("ix_medical_cases_created_by", table_name="medical_cases")
+    with op.batch_alter_table("medical_cases") as batch_op:
+        batch_op.drop_column("created_by")
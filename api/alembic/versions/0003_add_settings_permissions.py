@@ -0,0 +1,51 @@
+"""为 admin 添加 settings:read/write 权限，为 doctor 添加 settings:read 权限
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 00:00:00
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+roles = sa.table("roles", sa.column("id", sa.Integer), sa.column("name", sa.String))
+permissions = sa.table(
+    "permissions",
+    sa.column("role_id", sa.Integer),
+    sa.column("resource", sa.String),
+    sa.column("action", sa.String),
+    sa.column("created_at", sa.DateTime),
+)
+
+NEW_PERMISSIONS = {
+    "admin": ["read", "write"],
+    "doctor": ["read"],
+}
+
+
+def upgrade():
+    bind = op.get_bind()
+    for role_name, actions in NEW_PERMISSIONS.items():
+        role_id = bind.execute(sa.select(roles.c.id).where(roles.c.name == role_name)).scalar()
+        if role_id is None:
+            # 角色尚未初始化（全新数据库），由 init_auth_db.py 按 ROLE_PERMISSIONS 创建
+            continue
+        has_settings = bind.execute(sa.select(sa.func.count()).select_from(permissions).where(
+            permissions.c.role_id == role_id, permissions.c.resource == "settings"
+        )).scalar()
+        if has_settings:
+            continue
+        op.bulk_insert(permissions, [
+            {"role_id": role_id, "resource": "settings", "action": action, "created_at": datetime.utcnow()}
+            for action in actions
+        ])
+
+
+def downgrade():
+    op.execute(permissions.delete().where(permissions.c.resource == "settings"))
@@ -0,0 +1,70 @@
+"""允许 viewer 角色创建病例和运行诊断
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 00:00:00
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+roles = sa.table(
+    "roles",
+    sa.column("id", sa.Integer),
+    sa.column("name", sa.String),
+    sa.column("display_name", sa.String),
+    sa.column("description", sa.String),
+)
+permissions = sa.table(
+    "permissions",
+    sa.column("role_id", sa.Integer),
+    sa.column("resource", sa.String),
+    sa.column("action", sa.String),
+    sa.column("created_at", sa.DateTime),
+)
+
+NEW_PERMISSIONS = [
+    ("case", "create"),
+    ("diagnosis", "create"),
+    ("diagnosis", "execute"),
+]
+
+
+def upgrade():
+    bind = op.get_bind()
+    viewer_id = bind.execute(sa.select(roles.c.id).where(roles.c.name == "viewer")).scalar()
+    if viewer_id is None:
+        return
+    for resource, action in NEW_PERMISSIONS:
+        exists = bind.execute(sa.select(sa.func.count()).select_from(permissions).where(
+            permissions.c.role_id == viewer_id,
+            permissions.c.resource == resource,
+            permissions.c.action == action,
+        )).scalar()
+        if not exists:
+            op.bulk_insert(permissions, [{
+                "role_id": viewer_id, "resource": resource, "action": action, "created_at": datetime.utcnow()
+            }])
+    op.execute(roles.update().where(roles.c.id == viewer_id).values(
+        display_name="普通用户",
+        description="可以创建病例，查看自己的病例和诊断结果",
+    ))
+
+
+def downgrade():
+    bind = op.get_bind()
+    viewer_id = bind.execute(sa.select(roles.c.id).where(roles.c.name == "viewer")).scalar()
+    if viewer_id is None:
+        return
+    for resource, action in NEW_PERMISSIONS:
+        op.execute(permissions.delete().where(
+            permissions.c.role_id == viewer_id,
+            permissions.c.resource == resource,
+            permissions.c.action == action,
+        ))
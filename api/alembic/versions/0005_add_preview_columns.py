@@ -0,0 +1,55 @@
+"""添加预览列并回填历史数据
+
+- medical_cases.report_summary：病历摘要（raw_report 前200字符）
+- diagnosis_history.diagnosis_preview：诊断预览（diagnosis_markdown 前200字符）
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+# 与 api.models.case.PREVIEW_LENGTH 一致（迁移脚本不依赖模型代码）
+PREVIEW_LENGTH = 200
+# 每批回填的行数（按 id 区间分批，避免长事务）
+BATCH_SIZE = 1000
+
+PREVIEW_COLUMNS = [
+    # (表名, 预览列, 源文本列, 注释)
+    ("medical_cases", "report_summary", "raw_report", "病历摘要（raw_report 前200字符，写入时生成）"),
+    ("diagnosis_history", "diagnosis_preview", "diagnosis_markdown", "诊断预览（前200字符，写入时生成）"),
+]
+
+
+def backfill(table_name: str, preview_column: str, source_column: str) -> None:
+    bind = op.get_bind()
+    table = sa.table(table_name, sa.column("id", sa.Integer), sa.column(preview_column, sa.String),
+                     sa.column(source_column, sa.Text))
+    source = table.c[source_column]
+    preview = sa.case(
+        (sa.func.length(source) > PREVIEW_LENGTH, sa.func.substr(source, 1, PREVIEW_LENGTH).concat("...")),
+        else_=source,
+    )
+    max_id = bind.execute(sa.select(sa.func.max(table.c.id))).scalar() or 0
+    for start in range(0, max_id + 1, BATCH_SIZE):
+        bind.execute(table.update().where(
+            table.c[preview_column].is_(None), table.c.id > start, table.c.id <= start + BATCH_SIZE
+        ).values({preview_column: preview}))
+
+
+def upgrade():
+    for table_name, preview_column, source_column, comment in PREVIEW_COLUMNS:
+        op.add_column(table_name, sa.Column(preview_column, sa.String(255), comment=comment))
+        backfill(table_name, preview_column, source_column)
+
+
+def downgrade():
+    for table_name, preview_column, _, _ in PREVIEW_COLUMNS:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.drop_column(preview_column)
@@ -0,0 +1,37 @@
+"""创建幂等键表 idempotency_keys
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "idempotency_keys",
+        sa.Column("id", sa.Integer(), primary_key=True, autoincrement=True),
+        sa.Column("idempotency_key", sa.String(255), nullable=False, comment="客户端提供的幂等键"),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id", ondelete="CASCADE"), nullable=False,
+                  comment="发起请求的用户ID"),
+        sa.Column("endpoint", sa.String(200), nullable=False, comment="接口标识（方法 + 路由模板）"),
+        sa.Column("fingerprint", sa.String(64), nullable=False, comment="请求指纹（SHA-256）"),
+        sa.Column("status", sa.String(20), nullable=False, comment="状态: in_progress/completed"),
+        sa.Column("status_code", sa.Integer(), nullable=True, comment="原始响应状态码"),
+        sa.Column("response_body", sa.Text(), nullable=True, comment="原始响应体（JSON）"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+        sa.Column("expires_at", sa.DateTime(), nullable=False, comment="过期时间"),
+        sa.UniqueConstraint("user_id", "endpoint", "idempotency_key", name="uq_idempotency_user_endpoint_key"),
+    )
+    op.create_index("ix_idempotency_keys_id", "idempotency_keys", ["id"])
+    op.create_index("ix_idempotency_keys_expires_at", "idempotency_keys", ["expires_at"])
+
+
+def downgrade():
+    op.drop_table("idempotency_keys")
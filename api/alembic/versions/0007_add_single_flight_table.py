@@ -0,0 +1,30 @@
+"""创建跨进程单飞锁表 single_flight_locks
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "single_flight_locks",
+        sa.Column("flight_key", sa.String(64), primary_key=True, comment="请求键（SHA-256）"),
+        sa.Column("owner", sa.String(100), nullable=False, comment="持有者（进程ID + 随机串）"),
+        sa.Column("status", sa.String(20), nullable=False, comment="状态: running/done"),
+        sa.Column("result", sa.Text(), nullable=True, comment="执行结果（JSON）"),
+        sa.Column("created_at", sa.DateTime(), comment="加锁时间"),
+        sa.Column("expires_at", sa.DateTime(), nullable=True, comment="结果过期时间（status=done 时有效）"),
+    )
+    op.create_index("ix_single_flight_locks_expires_at", "single_flight_locks", ["expires_at"])
+
+
+def downgrade():
+    op.drop_table("single_flight_locks")
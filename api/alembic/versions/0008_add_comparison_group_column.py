@@ -0,0 +1,26 @@
+"""diagnosis_history 添加多模型对比分组字段 comparison_group_id
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0008"
+down_revision = "0007"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("diagnosis_history", sa.Column(
+        "comparison_group_id", sa.String(32), nullable=True, comment="多模型对比分组ID（同一次对比的记录相同）"
+    ))
+    op.create_index("ix_diagnosis_history_comparison_group_id", "diagnosis_history", ["comparison_group_id"])
+
+
+def downgrade():
+    op.drop_index("ix_diagnosis_history_comparison_group_id", table_name="diagnosis_history")
+    with op.batch_alter_table("diagnosis_history") as batch_op:
+        batch_op.drop_column("comparison_group_id")
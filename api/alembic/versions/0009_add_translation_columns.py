@@ -0,0 +1,33 @@
+"""diagnosis_history 添加诊断语言与翻译来源字段
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0009"
+down_revision = "0008"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table("diagnosis_history") as batch_op:
+        batch_op.add_column(sa.Column(
+            "language", sa.String(10), nullable=True, comment="诊断结果语言: en/zh（历史数据为空）"
+        ))
+        batch_op.add_column(sa.Column(
+            "source_diagnosis_id", sa.Integer(), nullable=True, comment="翻译来源诊断ID（翻译记录才有值）"
+        ))
+        batch_op.create_foreign_key("fk_diagnosis_history_source_diagnosis_id", "diagnosis_history",
+                                    ["source_diagnosis_id"], ["id"], ondelete="CASCADE")
+    op.create_index("ix_diagnosis_history_source_diagnosis_id", "diagnosis_history", ["source_diagnosis_id"])
+
+
+def downgrade():
+    op.drop_index("ix_diagnosis_history_source_diagnosis_id", table_name="diagnosis_history")
+    with op.batch_alter_table("diagnosis_history") as batch_op:
+        batch_op.drop_column("source_diagnosis_id")
+        batch_op.drop_column("language")
@@ -0,0 +1,25 @@
+"""providers 添加接口类型字段 provider_type（openai / ollama）
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("providers", sa.Column(
+        "provider_type", sa.String(20), nullable=False, server_default="openai",
+        comment="接口类型: openai（OpenAI 兼容）/ollama（本地 Ollama）"
+    ))
+
+
+def downgrade():
+    with op.batch_alter_table("providers") as batch_op:
+        batch_op.drop_column("provider_type")
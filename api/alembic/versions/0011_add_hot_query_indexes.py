@@ -0,0 +1,35 @@
+"""为高频查询添加组合索引
+
+- diagnosis_history (case_id, run_timestamp)：病例诊断历史（按时间倒序）、最新诊断
+- medical_cases (created_by, created_at)：普通用户的病例列表（只看自己创建的，按创建时间排序）
+- diagnosis_history (model_name, run_timestamp)：全局诊断列表按模型筛选、按时间排序
+
+前两个组合索引以原单列索引为前缀，单列索引 ix_diagnosis_history_case_id、ix_medical_cases_created_by 随之删除。
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_diagnosis_history_case_id_run_timestamp", "diagnosis_history", ["case_id", "run_timestamp"])
+    op.create_index("ix_medical_cases_created_by_created_at", "medical_cases", ["created_by", "created_at"])
+    op.create_index("ix_diagnosis_history_model_name_run_timestamp", "diagnosis_history",
+                    ["model_name", "run_timestamp"])
+    op.drop_index("ix_diagnosis_history_case_id", table_name="diagnosis_history")
+    op.drop_index("ix_medical_cases_created_by", table_name="medical_cases")
+
+
+def downgrade():
+    op.create_index("ix_medical_cases_created_by", "medical_cases", ["created_by"])
+    op.create_index("ix_diagnosis_history_case_id", "diagnosis_history", ["case_id"])
+    op.drop_index("ix_diagnosis_history_model_name_run_timestamp", table_name="diagnosis_history")
+    op.drop_index("ix_medical_cases_created_by_created_at", table_name="medical_cases")
+    op.drop_index("ix_diagnosis_history_case_id_run_timestamp", table_name="diagnosis_history")
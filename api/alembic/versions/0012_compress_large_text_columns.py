@@ -0,0 +1,56 @@
+"""病历全文与诊断结果改为压缩存储
+
+- medical_cases.raw_report、diagnosis_history.diagnosis_markdown：TEXT -> BLOB（api.db.compressed_text 格式）
+- 按 id 分批重写已有数据，并在日志中输出压缩前后的大小
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-19 00:00:00
+"""
+import logging
+
+from alembic import op
+import sqlalchemy as sa
+
+# 存储格式与应用读写共用同一套编解码（字典文件按 ID 加载）
+from api.db.compressed_text import compress_text, format_reduction, rewrite_column
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+COMPRESSED_COLUMNS = [
+    # (表名, 列名, 注释)
+    ("medical_cases", "raw_report", "原始病历全文"),
+    ("diagnosis_history", "diagnosis_markdown", "AI 诊断结果（Markdown格式）"),
+]
+
+
+def _plain_text(text: str) -> bytes:
+    return text.encode("utf-8")
+
+
+def upgrade():
+    bind = op.get_bind()
+    for table_name, column_name, comment in COMPRESSED_COLUMNS:
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column_name, type_=sa.LargeBinary(), existing_type=sa.Text(), existing_nullable=False,
+                existing_comment=comment, postgresql_using=f"convert_to({column_name}, 'UTF8')",
+            )
+        rows, raw_bytes, stored_bytes = rewrite_column(bind, table_name, column_name, encode=compress_text)
+        logger.info("压缩 %s.%s: %d 行，%s", table_name, column_name, rows, format_reduction(raw_bytes, stored_bytes))
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table_name, column_name, comment in COMPRESSED_COLUMNS:
+        rewrite_column(bind, table_name, column_name, encode=_plain_text)
+        with op.batch_alter_table(table_name) as batch_op:
+            batch_op.alter_column(
+                column_name, type_=sa.Text(), existing_type=sa.LargeBinary(), existing_nullable=False,
+                existing_comment=comment, postgresql_using=f"convert_from({column_name}, 'UTF8')",
+            )
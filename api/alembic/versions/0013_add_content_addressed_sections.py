@@ -0,0 +1,154 @@
+"""诊断结果改为内容寻址的分段存储
+
+- 新建 content_blobs（按内容哈希去重的内容块，带引用计数）与 diagnosis_sections（诊断 -> 有序分段引用）
+- 按 id 分批把 diagnosis_history.diagnosis_markdown 切分为分段写入，并在日志中输出去重效果
+- 删除 diagnosis_history.diagnosis_markdown
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-19 00:00:00
+"""
+import logging
+from collections import Counter
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+# 分段规则与哈希必须与应用写入时一致
+from api.db.compressed_text import compress_text, decompress_text, format_reduction
+from api.models.content import content_hash, split_sections
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+# 每批处理的诊断记录数
+BATCH_SIZE = 500
+
+diagnosis_history = sa.table(
+    "diagnosis_history", sa.column("id", sa.Integer), sa.column("diagnosis_markdown")
+)
+content_blobs = sa.table(
+    "content_blobs", sa.column("hash", sa.String), sa.column("content"), sa.column("size", sa.Integer),
+    sa.column("ref_count", sa.Integer), sa.column("created_at", sa.DateTime),
+)
+diagnosis_sections = sa.table(
+    "diagnosis_sections", sa.column("diagnosis_id", sa.Integer), sa.column("position", sa.Integer),
+    sa.column("blob_hash", sa.String),
+)
+
+
+def _store_batch(bind, rows) -> None:
+    texts = {}
+    counts = Counter()
+    section_rows = []
+    for diagnosis_id, value in rows:
+        for position, text in enumerate(split_sections(decompress_text(value))):
+            blob_hash = content_hash(text)
+            texts[blob_hash] = text
+            counts[blob_hash] += 1
+            section_rows.append({"diagnosis_id": diagnosis_id, "position": position, "blob_hash": blob_hash})
+    if not section_rows:
+        return
+    existing = set(bind.execute(
+        sa.select(content_blobs.c.hash).where(content_blobs.c.hash.in_(list(texts)))
+    ).scalars())
+    now = datetime.utcnow()
+    new_blobs = [
+        {"hash": blob_hash, "content": compress_text(text), "size": len(text.encode("utf-8")),
+         "ref_count": counts[blob_hash], "created_at": now}
+        for blob_hash, text in texts.items() if blob_hash not in existing
+    ]
+    if new_blobs:
+        bind.execute(content_blobs.insert(), new_blobs)
+    if existing:
+        bind.execute(
+            content_blobs.update().where(content_blobs.c.hash == sa.bindparam("blob_hash"))
+            .values(ref_count=content_blobs.c.ref_count + sa.bindparam("delta")),
+            [{"blob_hash": blob_hash, "delta": counts[blob_hash]} for blob_hash in existing],
+        )
+    bind.execute(diagnosis_sections.insert(), section_rows)
+
+
+def upgrade():
+    op.create_table(
+        "content_blobs",
+        sa.Column("hash", sa.String(64), primary_key=True, comment="内容 SHA-256（十六进制）"),
+        sa.Column("content", sa.LargeBinary(), nullable=False, comment="内容（压缩存储）"),
+        sa.Column("size", sa.Integer(), nullable=False, comment="原文字节数"),
+        sa.Column("ref_count", sa.Integer(), nullable=False, comment="引用该内容块的分段数"),
+        sa.Column("created_at", sa.DateTime(), comment="创建时间"),
+    )
+    op.create_table(
+        "diagnosis_sections",
+        sa.Column("diagnosis_id", sa.Integer(), sa.ForeignKey("diagnosis_history.id", ondelete="CASCADE"),
+                  primary_key=True, comment="关联诊断ID"),
+        sa.Column("position", sa.Integer(), primary_key=True, comment="分段序号（从 0 开始）"),
+        sa.Column("blob_hash", sa.String(64), sa.ForeignKey("content_blobs.hash"), nullable=False,
+                  comment="内容块哈希"),
+    )
+    op.create_index("ix_diagnosis_sections_blob_hash", "diagnosis_sections", ["blob_hash"])
+
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(diagnosis_history.c.id, diagnosis_history.c.diagnosis_markdown)
+            .where(diagnosis_history.c.id > last_id).order_by(diagnosis_history.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        _store_batch(bind, rows)
+        last_id = rows[-1][0]
+
+    blobs, references, logical_bytes, unique_bytes = bind.execute(sa.select(
+        sa.func.count(), sa.func.coalesce(sa.func.sum(content_blobs.c.ref_count), 0),
+        sa.func.coalesce(sa.func.sum(content_blobs.c.size * content_blobs.c.ref_count), 0),
+        sa.func.coalesce(sa.func.sum(content_blobs.c.size), 0),
+    )).one()
+    logger.info("诊断分段去重: %d 个分段引用 %d 个内容块，%s", references, blobs,
+                format_reduction(logical_bytes, unique_bytes))
+
+    with op.batch_alter_table("diagnosis_history") as batch_op:
+        batch_op.drop_column("diagnosis_markdown")
+
+
+def downgrade():
+    with op.batch_alter_table("diagnosis_history") as batch_op:
+        batch_op.add_column(sa.Column("diagnosis_markdown", sa.LargeBinary(), nullable=True,
+                                      comment="AI 诊断结果（Markdown格式）"))
+
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        ids = bind.execute(
+            sa.select(diagnosis_history.c.id).where(diagnosis_history.c.id > last_id)
+            .order_by(diagnosis_history.c.id).limit(BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        parts = {diagnosis_id: [] for diagnosis_id in ids}
+        for diagnosis_id, content in bind.execute(
+            sa.select(diagnosis_sections.c.diagnosis_id, content_blobs.c.content)
+            .join(content_blobs, content_blobs.c.hash == diagnosis_sections.c.blob_hash)
+            .where(diagnosis_sections.c.diagnosis_id.in_(ids))
+            .order_by(diagnosis_sections.c.diagnosis_id, diagnosis_sections.c.position)
+        ):
+            parts[diagnosis_id].append(decompress_text(content))
+        bind.execute(
+            diagnosis_history.update().where(diagnosis_history.c.id == sa.bindparam("row_id"))
+            .values(diagnosis_markdown=sa.bindparam("markdown")),
+            [{"row_id": diagnosis_id, "markdown": compress_text("".join(texts))} for diagnosis_id, texts in parts.items()],
+        )
+        last_id = ids[-1]
+
+    with op.batch_alter_table("diagnosis_history") as batch_op:
+        batch_op.alter_column("diagnosis_markdown", existing_type=sa.LargeBinary(), nullable=False,
+                              existing_comment="AI 诊断结果（Markdown格式）")
+    op.drop_index("ix_diagnosis_sections_blob_hash", table_name="diagnosis_sections")
+    op.drop_table("diagnosis_sections")
+    op.drop_table("content_blobs")
@@ -0,0 +1,30 @@
+"""病例与诊断全文检索索引（SQLite FTS5）
+
+- 新建 cases_fts、diagnoses_fts 虚拟表并从现有数据构建索引（非 SQLite 数据库跳过）
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-19 00:00:00
+"""
+import logging
+
+from alembic import op
+
+# 分词预处理与写入时一致
+from api.db.fulltext import drop_fulltext_tables, rebuild_fulltext_index
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+logger = logging.getLogger("alembic.runtime.migration")
+
+
+def upgrade():
+    case_count, diagnosis_count = rebuild_fulltext_index(op.get_bind())
+    logger.info("全文索引: %d 个病例，%d 条诊断", case_count, diagnosis_count)
+
+
+def downgrade():
+    drop_fulltext_tables(op.get_bind())
@@ -0,0 +1,66 @@
+"""medical_cases 添加诊断统计冗余字段并回填
+
+- diagnosis_count：诊断记录数
+- last_diagnosis_at / latest_diagnosis_id：最新诊断（按 run_timestamp、id 取最新）的运行时间与ID
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+# 每批回填的病例数（按 id 区间分批，避免长事务）
+BATCH_SIZE = 1000
+
+medical_cases = sa.table(
+    "medical_cases", sa.column("id", sa.Integer), sa.column("diagnosis_count", sa.Integer),
+    sa.column("last_diagnosis_at", sa.DateTime), sa.column("latest_diagnosis_id", sa.Integer),
+)
+diagnosis_history = sa.table(
+    "diagnosis_history", sa.column("id", sa.Integer), sa.column("case_id", sa.Integer),
+    sa.column("run_timestamp", sa.DateTime),
+)
+
+
+def _latest(column):
+    return (
+        sa.select(column).where(diagnosis_history.c.case_id == medical_cases.c.id)
+        .order_by(diagnosis_history.c.run_timestamp.desc(), diagnosis_history.c.id.desc())
+        .limit(1).scalar_subquery()
+    )
+
+
+def upgrade():
+    with op.batch_alter_table("medical_cases") as batch_op:
+        batch_op.add_column(sa.Column("diagnosis_count", sa.Integer(), nullable=False, server_default="0",
+                                      comment="诊断记录数"))
+        batch_op.add_column(sa.Column("last_diagnosis_at", sa.DateTime(), nullable=True, comment="最新诊断运行时间"))
+        batch_op.add_column(sa.Column("latest_diagnosis_id", sa.Integer(), nullable=True,
+                                      comment="最新诊断ID（按运行时间、ID 取最新）"))
+
+    bind = op.get_bind()
+    values = {
+        "diagnosis_count": sa.select(sa.func.count()).where(
+            diagnosis_history.c.case_id == medical_cases.c.id
+        ).scalar_subquery(),
+        "last_diagnosis_at": _latest(diagnosis_history.c.run_timestamp),
+        "latest_diagnosis_id": _latest(diagnosis_history.c.id),
+    }
+    max_id = bind.execute(sa.select(sa.func.max(medical_cases.c.id))).scalar() or 0
+    for start in range(0, max_id + 1, BATCH_SIZE):
+        bind.execute(medical_cases.update().where(
+            medical_cases.c.id > start, medical_cases.c.id <= start + BATCH_SIZE
+        ).values(values))
+
+
+def downgrade():
+    with op.batch_alter_table("medical_cases") as batch_op:
+        batch_op.drop_column("latest_diagnosis_id")
+        batch_op.drop_column("last_diagnosis_at")
+        batch_op.drop_column("diagnosis_count")
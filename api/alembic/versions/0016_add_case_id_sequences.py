@@ -0,0 +1,28 @@
+"""创建病例编号序号表 case_id_sequences
+
+病例编号在 年月日时分 + 性别 + 年龄 前缀后追加按前缀原子递增的序号（见 api/utils/case_id_generator.py），
+已有的 15 位编号保持不变。
+
+Revision ID: 0016
+Revises: 0015
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0016"
+down_revision = "0015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "case_id_sequences",
+        sa.Column("prefix", sa.String(20), primary_key=True, comment="病例编号前缀（年月日时分 + 性别 + 年龄）"),
+        sa.Column("last_value", sa.Integer(), nullable=False, comment="该前缀已分配的最大序号"),
+    )
+
+
+def downgrade():
+    op.drop_table("case_id_sequences")
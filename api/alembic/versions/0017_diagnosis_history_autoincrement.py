@@ -0,0 +1,36 @@
+"""diagnosis_history 改为 AUTOINCREMENT（仅 SQLite）
+
+未使用 AUTOINCREMENT 时 SQLite 按 max(rowid) + 1 分配新ID：诊断归档后删除最新的诊断记录，
+新诊断会复用已归档的ID，病例的 latest_diagnosis_id 与按ID读取诊断会指向其他病例的记录。
+重建表并把序号提高到不低于归档库中的最大诊断ID。
+
+Revision ID: 0017
+Revises: 0016
+Create Date: 2026-10-19 00:00:00
+"""
+from alembic import op
+
+from api.models.archive import reserve_archived_ids
+
+revision = "0017"
+down_revision = "0016"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != "sqlite":
+        return
+    # 复制数据时 sqlite_sequence 自动记录为现有的最大ID
+    with op.batch_alter_table("diagnosis_history", recreate="always",
+                              table_kwargs={"sqlite_autoincrement": True}):
+        pass
+    reserve_archived_ids(bind)
+
+
+def downgrade():
+    if op.get_bind().dialect.name != "sqlite":
+        return
+    with op.batch_alter_table("diagnosis_history", recreate="always"):
+        pass
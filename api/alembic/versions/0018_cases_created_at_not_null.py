@@ -0,0 +1,39 @@
+"""medical_cases.created_at 回填并改为 NOT NULL
+
+病例列表按 (created_at, id) 键集分页：created_at 为 NULL 的病例在游标比较中既不大于也不小于游标值，
+翻页时会被跳过。回填为 updated_at（同样为空时取迁移时间）后加非空约束，排序与过滤仍可走
+(created_by, created_at) 组合索引。
+
+Revision ID: 0018
+Revises: 0017
+Create Date: 2026-10-19 00:00:00
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0018"
+down_revision = "0017"
+branch_labels = None
+depends_on = None
+
+medical_cases = sa.table(
+    "medical_cases", sa.column("created_at", sa.DateTime), sa.column("updated_at", sa.DateTime),
+)
+
+
+def upgrade():
+    # 绑定 Python datetime 参数，与 ORM 写入的时间格式一致
+    op.get_bind().execute(medical_cases.update().where(medical_cases.c.created_at.is_(None)).values(
+        created_at=sa.func.coalesce(medical_cases.c.updated_at, sa.bindparam("now", datetime.utcnow(), sa.DateTime))
+    ))
+    with op.batch_alter_table("medical_cases") as batch_op:
+        batch_op.alter_column("created_at", existing_type=sa.DateTime(), nullable=False,
+                              existing_comment="创建时间")
+
+
+def downgrade():
+    with op.batch_alter_table("medical_cases") as batch_op:
+        batch_op.alter_column("created_at", existing_type=sa.DateTime(), nullable=True,
+                              existing_comment="创建时间")
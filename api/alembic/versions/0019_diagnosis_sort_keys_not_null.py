@@ -0,0 +1,74 @@
+"""diagnosis_history.model_name / run_timestamp 回填并改为 NOT NULL
+
+全局诊断历史按 (run_timestamp 或 model_name, id) 键集分页：排序字段为 NULL 的诊断在游标比较中
+既不大于也不小于游标值，翻页时会被跳过。回填后加非空约束，排序与过滤仍可走组合索引：
+- run_timestamp：取病例创建时间（病例不存在时取迁移时间），并重新计算受影响病例的最新诊断
+- model_name：取 'unknown'
+
+Revision ID: 0019
+Revises: 0018
+Create Date: 2026-10-19 00:00:00
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+from api.models.archive import reserve_archived_ids
+from api.models.case import refresh_case_counters
+
+revision = "0019"
+down_revision = "0018"
+branch_labels = None
+depends_on = None
+
+UNKNOWN_MODEL_NAME = "unknown"
+
+medical_cases = sa.table("medical_cases", sa.column("id", sa.Integer), sa.column("created_at", sa.DateTime))
+diagnosis_history = sa.table(
+    "diagnosis_history", sa.column("id", sa.Integer), sa.column("case_id", sa.Integer),
+    sa.column("model_name", sa.String), sa.column("run_timestamp", sa.DateTime),
+)
+
+
+def _alter_sort_keys(nullable):
+    """重建 diagnosis_history 修改两列的可空性，保留 AUTOINCREMENT 序号（重建后序号会回落到现有最大ID）"""
+    bind = op.get_bind()
+    seq = None
+    if bind.dialect.name == "sqlite":
+        seq = bind.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'diagnosis_history'").scalar()
+    with op.batch_alter_table("diagnosis_history", table_kwargs={"sqlite_autoincrement": True}) as batch_op:
+        batch_op.alter_column("model_name", existing_type=sa.String(50), nullable=nullable,
+                              existing_comment="使用的模型名称")
+        batch_op.alter_column("run_timestamp", existing_type=sa.DateTime(), nullable=nullable,
+                              existing_comment="诊断运行时间")
+    if seq is not None:
+        bind.execute(sa.text("UPDATE sqlite_sequence SET seq = max(seq, :seq) WHERE name = 'diagnosis_history'"),
+                     {"seq": seq})
+    if bind.dialect.name == "sqlite":
+        reserve_archived_ids(bind)
+
+
+def upgrade():
+    bind = op.get_bind()
+    case_ids = bind.execute(
+        sa.select(diagnosis_history.c.case_id).where(diagnosis_history.c.run_timestamp.is_(None)).distinct()
+    ).scalars().all()
+    # 绑定 Python datetime 参数，与 ORM 写入的时间格式一致
+    case_created_at = sa.select(medical_cases.c.created_at).where(
+        medical_cases.c.id == diagnosis_history.c.case_id
+    ).scalar_subquery()
+    bind.execute(diagnosis_history.update().where(diagnosis_history.c.run_timestamp.is_(None)).values(
+        run_timestamp=sa.func.coalesce(case_created_at, sa.bindparam("now", datetime.utcnow(), sa.DateTime))
+    ))
+    bind.execute(diagnosis_history.update().where(diagnosis_history.c.model_name.is_(None)).values(
+        model_name=UNKNOWN_MODEL_NAME
+    ))
+    if case_ids:
+        # 最新诊断按 (run_timestamp, id) 取，回填的运行时间可能改变病例的最新诊断
+        refresh_case_counters(bind, case_ids)
+    _alter_sort_keys(nullable=False)
+
+
+def downgrade():
+    _alter_sort_keys(nullable=True)
@@ -0,0 +1,94 @@
+"""诊断历史归档工具
+
+把运行时间超过保留期的诊断记录移入归档库（见 api/models/archive.py、api/utils/archive.py），
+随后执行增量 VACUUM 释放主库空闲页。可由定时任务（cron 等）每天运行：
+    python api/archive_diagnoses.py [--days 365] [--batch-size 500]     归档并释放空闲页
+    python api/archive_diagnoses.py --dry-run                           只统计待归档的记录数
+    python api/archive_diagnoses.py --convert                           一次性将已有主库转换为增量 VACUUM 模式
+
+--convert 执行全量 VACUUM（期间阻塞写入），只需在引入归档前创建的数据库上执行一次。
+"""
+import argparse
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import func
+
+from api.db.database import SessionLocal, engine
+from api.models.archive import archive_database_path
+from api.models.case import DiagnosisHistory
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+from api.utils.archive import ARCHIVE_AFTER_DAYS, ARCHIVE_BATCH_SIZE, archive_diagnoses, reclaim_free_pages
+
+
+def database_size(connection) -> str:
+    page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+    pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+    free = connection.exec_driver_sql("PRAGMA freelist_count").scalar()
+    return f"{pages * page_size / 1024 / 1024:.1f} MB（空闲 {free * page_size / 1024 / 1024:.1f} MB）"
+
+
+def convert():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2:
+            print("✅ 主库已是增量 VACUUM 模式")
+            return
+        print("执行全量 VACUUM（期间阻塞写入）...")
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.exec_driver_sql("VACUUM")
+        print(f"✅ 已转换，主库大小: {database_size(connection)}")
+
+
+def run(days: int, batch_size: int, dry_run: bool):
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    db = SessionLocal()
+    try:
+        hot, eligible = db.query(
+            func.count(DiagnosisHistory.id),
+            func.count(DiagnosisHistory.id).filter(DiagnosisHistory.run_timestamp < cutoff),
+        ).one()
+        print(f"主库诊断记录: {hot}，运行时间早于 {cutoff:%Y-%m-%d} 的: {eligible}")
+        print(f"归档库: {archive_database_path(db.connection())}")
+        if dry_run:
+            return
+        print(f"主库大小: {database_size(db.connection())}")
+        try:
+            archived = archive_diagnoses(db, cutoff, batch_size)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        print(f"✅ 已归档 {archived} 条诊断记录")
+    finally:
+        db.close()
+
+    reclaimed = reclaim_free_pages(engine)
+    if "main" not in reclaimed:
+        print("⚠️  主库未启用增量 VACUUM，空闲页不会归还给文件系统（执行 --convert 转换）")
+    print(f"增量 VACUUM 释放页数: {reclaimed}")
+    with engine.connect() as connection:
+        print(f"主库大小: {database_size(connection)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="诊断历史归档工具")
+    parser.add_argument("--days", type=int, default=ARCHIVE_AFTER_DAYS, help="保留期（天），更早的诊断记录被归档")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="每批归档的记录数")
+    parser.add_argument("--dry-run", action="store_true", help="只统计待归档的记录数")
+    parser.add_argument("--convert", action="store_true", help="将已有主库转换为增量 VACUUM 模式（全量 VACUUM）")
+    args = parser.parse_args()
+
+    if engine.dialect.name != "sqlite":
+        print("❌ 诊断归档仅支持 SQLite 数据库")
+        sys.exit(1)
+    if args.convert:
+        convert()
+    else:
+        run(args.days, args.batch_size, args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""病例诊断统计一致性检查工具
+
+medical_cases 的 diagnosis_count / last_diagnosis_at / latest_diagnosis_id 为冗余字段，
+由诊断记录增删时的 ORM 事件维护；绕过 ORM 直接修改 diagnosis_history（手工 SQL、数据库级联删除等）会导致不一致。
+    python api/check_case_counters.py            列出不一致的病例
+    python api/check_case_counters.py --fix      按诊断记录重新计算并修复
+"""
+import argparse
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.db.database import engine
+from api.models.case import check_case_counters, refresh_case_counters
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+
+# 最多列出的不一致病例数
+REPORT_LIMIT = 50
+
+
+def main():
+    parser = argparse.ArgumentParser(description="病例诊断统计一致性检查")
+    parser.add_argument("--fix", action="store_true", help="修复不一致的病例")
+    args = parser.parse_args()
+
+    with engine.begin() as connection:
+        rows = check_case_counters(connection)
+        if not rows:
+            print("✅ 所有病例的诊断统计一致")
+            return
+
+        print(f"⚠️  {len(rows)} 个病例的诊断统计不一致:")
+        print(f"{'case_id':>8}  {'count':>13}  {'latest_id':>13}  last_diagnosis_at")
+        for row in rows[:REPORT_LIMIT]:
+            print(
+                f"{row['id']:>8}  {row['diagnosis_count']:>5} -> {row['actual_diagnosis_count']:<5}  "
+                f"{str(row['latest_diagnosis_id']):>5} -> {str(row['actual_latest_diagnosis_id']):<5}  "
+                f"{row['last_diagnosis_at']} -> {row['actual_last_diagnosis_at']}"
+            )
+        if len(rows) > REPORT_LIMIT:
+            print(f"... 另有 {len(rows) - REPORT_LIMIT} 个")
+
+        if args.fix:
+            refresh_case_counters(connection, [row["id"] for row in rows])
+            print(f"✅ 已修复 {len(rows)} 个病例")
+        else:
+            print("使用 --fix 修复")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
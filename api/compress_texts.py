@@ -0,0 +1,126 @@
+"""大文本列压缩工具
+
+病历全文与诊断结果以压缩格式存储（见 api/db/compressed_text.py），本脚本用于：
+    python api/compress_texts.py stats                          各列原文 / 存储大小
+    python api/compress_texts.py train [--from-dir DIR ...]     训练新的预置字典（默认从数据库抽样）
+    python api/compress_texts.py rewrite                        按当前配置重写全部数据并报告压缩效果
+
+更换字典的步骤：train 生成字典文件 → 设置 TEXT_COMPRESSION_DICT=<字典ID> → rewrite。
+旧字典文件需保留，直到 rewrite 完成（未重写的数据仍引用旧字典）。
+"""
+import argparse
+import glob
+import os
+import sys
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import sqlalchemy as sa
+
+from api.db.database import engine
+from api.db.compressed_text import (
+    DEFAULT_DICTIONARY_SIZE, column_stats, decompress_text, format_reduction, rewrite_column, save_dictionary,
+    train_dictionary,
+)
+
+# 压缩存储的列：(表名, 列名, 主键列)
+COMPRESSED_COLUMNS = [
+    ("medical_cases", "raw_report", "id"),
+    ("content_blobs", "content", "hash"),
+]
+# 从数据库训练字典时每列的抽样行数
+SAMPLE_ROWS = 2000
+
+
+def print_report(results):
+    """打印每列及合计的压缩效果，results 为 {(表名, 列名): (行数, 原文字节, 存储字节)}"""
+    total_raw = total_stored = 0
+    for (table_name, column_name), (rows, raw_bytes, stored_bytes) in results.items():
+        print(f"  {table_name}.{column_name}: {rows} 行，{format_reduction(raw_bytes, stored_bytes)}")
+        total_raw += raw_bytes
+        total_stored += stored_bytes
+    print(f"  合计: {format_reduction(total_raw, total_stored)}")
+
+
+def stats():
+    with engine.connect() as connection:
+        print_report({
+            (table_name, column_name): column_stats(connection, table_name, column_name, key_column=key_column)
+            for table_name, column_name, key_column in COMPRESSED_COLUMNS
+        })
+        # 诊断分段去重效果：各诊断引用的分段总大小 vs 去重后的内容块总大小
+        blobs, references, logical_bytes, unique_bytes = connection.execute(sa.text(
+            "SELECT COUNT(*), COALESCE(SUM(ref_count), 0), COALESCE(SUM(size * ref_count), 0), "
+            "COALESCE(SUM(size), 0) FROM content_blobs"
+        )).one()
+    print(f"  诊断分段去重: {references} 个分段引用 {blobs} 个内容块，{format_reduction(logical_bytes, unique_bytes)}")
+
+
+def rewrite(batch_size=1000):
+    results = {}
+    for table_name, column_name, key_column in COMPRESSED_COLUMNS:
+        # 每列一个事务，避免长时间持有写锁
+        with engine.begin() as connection:
+            results[(table_name, column_name)] = rewrite_column(
+                connection, table_name, column_name, batch_size=batch_size, key_column=key_column
+            )
+    print_report(results)
+
+
+def load_samples(directories):
+    """读取样本：指定目录下的 .txt / .md 文件，未指定时从数据库抽样"""
+    if directories:
+        samples = []
+        for directory in directories:
+            for path in sorted(glob.glob(os.path.join(directory, "*.txt")) + glob.glob(os.path.join(directory, "*.md"))):
+                with open(path, encoding="utf-8", errors="replace") as f:
+                    samples.append(f.read())
+        return samples
+
+    samples = []
+    with engine.connect() as connection:
+        for table_name, column_name, key_column in COMPRESSED_COLUMNS:
+            table = sa.table(table_name, sa.column(key_column), sa.column(column_name))
+            rows = connection.execute(
+                sa.select(table.c[column_name]).where(table.c[column_name].isnot(None))
+                .order_by(table.c[key_column].desc()).limit(SAMPLE_ROWS)
+            ).scalars()
+            samples.extend(decompress_text(value) for value in rows)
+    return samples
+
+
+def train(directories, size):
+    samples = load_samples(directories)
+    if not samples:
+        print("❌ 没有可用的样本")
+        return None
+    dictionary = train_dictionary(samples, size=size)
+    dict_id = save_dictionary(dictionary)
+    print(f"✓ 已从 {len(samples)} 个样本训练字典 {dict_id:08x}（{len(dictionary)} 字节）")
+    print(f"  启用：设置 TEXT_COMPRESSION_DICT={dict_id:08x} 后执行 python api/compress_texts.py rewrite")
+    return dict_id
+
+
+def main():
+    parser = argparse.ArgumentParser(description="病历 / 诊断文本压缩存储工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("stats", help="统计各列原文与存储大小")
+    rewrite_parser = subparsers.add_parser("rewrite", help="按当前压缩配置重写全部数据")
+    rewrite_parser.add_argument("--batch-size", type=int, default=1000, help="每批处理的行数")
+    train_parser = subparsers.add_parser("train", help="训练预置字典")
+    train_parser.add_argument("--from-dir", action="append", default=[], help="样本目录（可多次指定，默认从数据库抽样）")
+    train_parser.add_argument("--size", type=int, default=DEFAULT_DICTIONARY_SIZE, help="字典大小（字节）")
+    args = parser.parse_args()
+
+    if args.command == "stats":
+        stats()
+    elif args.command == "rewrite":
+        rewrite(args.batch_size)
+    else:
+        train(args.from_dir, args.size)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""大文本列压缩存储
+
+病历全文（raw_report）和诊断结果分段（content_blobs.content）体积大、结构重复，以压缩后的二进制形式存储，
+ORM 读写时透明解压 / 压缩（列类型 CompressedText）。
+
+存储格式：
+    0xFF | 编码(1字节) | 字典ID(4字节，0 表示不使用字典) | 压缩数据
+UTF-8 文本不会以 0xFF 开头，因此不带该前缀的值按原文读取：压缩后反而变大的短文本直接存原文，
+迁移前的历史数据在重写完成前也能正常读取。
+
+预置字典：
+- 字典是从病例语料中挑选的高频片段（raw content 字典），zlib 与 zstd 均可使用
+- 字典文件位于 api/db/dictionaries/<字典ID>.dict，按 ID 加载；新字典只影响之后写入的数据，旧字典需保留
+- 训练新字典与重写历史数据见 api/compress_texts.py
+
+配置（环境变量）：
+- TEXT_COMPRESSION_CODEC: zlib（默认）/ zstd（需安装可选依赖 zstandard）/ none（存原文）
+- TEXT_COMPRESSION_LEVEL: 压缩级别（默认 zlib 9，zstd 19；只在写入时消耗 CPU）
+- TEXT_COMPRESSION_DICT: 写入时使用的字典ID（十六进制），none 表示不使用字典；默认为内置字典
+"""
+import hashlib
+import os
+import re
+import struct
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, Optional, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+try:
+    import zstandard  # 可选依赖
+except ImportError:  # pragma: no cover - 未安装时只能使用 zlib
+    zstandard = None
+
+MAGIC = 0xFF
+CODEC_ZLIB = 1
+CODEC_ZSTD = 2
+CODEC_IDS = {"zlib": CODEC_ZLIB, "zstd": CODEC_ZSTD}
+HEADER = struct.Struct(">BBI")
+
+DICTIONARY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dictionaries")
+# 内置字典（由 Medical Reports 语料训练）
+DEFAULT_DICTIONARY_ID = "2e108ce7"
+# zlib 预置字典最多使用 32KB
+DEFAULT_DICTIONARY_SIZE = 32 * 1024
+# 训练时参与统计的最短片段（字节）
+MIN_SEGMENT_BYTES = 8
+
+TEXT_COMPRESSION_CODEC = os.getenv("TEXT_COMPRESSION_CODEC", "zlib").lower()
+TEXT_COMPRESSION_LEVEL = os.getenv("TEXT_COMPRESSION_LEVEL")
+TEXT_COMPRESSION_DICT = os.getenv("TEXT_COMPRESSION_DICT", DEFAULT_DICTIONARY_ID).lower()
+
+# 训练时的切分位置：换行和句末 / 冒号 / 分号之后
+SEGMENT_PATTERN = re.compile(r"(?<=[\n.:;。：；])")
+WORD_PATTERN = re.compile(r"\S+")
+
+_dictionaries: Dict[int, bytes] = {}
+
+
+def dictionary_id(data: bytes) -> int:
+    """字典ID：内容 SHA-256 的前 4 字节（同一份字典在任何环境下 ID 相同）"""
+    return int.from_bytes(hashlib.sha256(data).digest()[:4], "big")
+
+
+def load_dictionary(dict_id: int) -> bytes:
+    """按 ID 读取字典文件（进程内缓存）"""
+    data = _dictionaries.get(dict_id)
+    if data is None:
+        path = os.path.join(DICTIONARY_DIR, f"{dict_id:08x}.dict")
+        if not os.path.exists(path):
+            raise ValueError(f"压缩字典不存在: {dict_id:08x}（{path}）")
+        with open(path, "rb") as f:
+            data = f.read()
+        _dictionaries[dict_id] = data
+    return data
+
+
+def save_dictionary(data: bytes) -> int:
+    """写入字典文件，返回字典ID"""
+    dict_id = dictionary_id(data)
+    os.makedirs(DICTIONARY_DIR, exist_ok=True)
+    with open(os.path.join(DICTIONARY_DIR, f"{dict_id:08x}.dict"), "wb") as f:
+        f.write(data)
+    _dictionaries[dict_id] = data
+    return dict_id
+
+
+def _compress(payload: bytes, codec: int, dictionary: Optional[bytes], level: Optional[int]) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("TEXT_COMPRESSION_CODEC=zstd 需要安装 zstandard")
+        zstd_dict = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT) \
+            if dictionary else None
+        return zstandard.ZstdCompressor(level=level or 19, dict_data=zstd_dict).compress(payload)
+    if dictionary:
+        compressor = zlib.compressobj(level or 9, zlib.DEFLATED, zlib.MAX_WBITS, 9, zlib.Z_DEFAULT_STRATEGY,
+                                      dictionary)
+    else:
+        compressor = zlib.compressobj(level or 9)
+    return compressor.compress(payload) + compressor.flush()
+
+
+def _decompress(data: bytes, codec: int, dictionary: Optional[bytes]) -> bytes:
+    if codec == CODEC_ZSTD:
+        if zstandard is None:
+            raise RuntimeError("读取 zstd 压缩的数据需要安装 zstandard")
+        zstd_dict = zstandard.ZstdCompressionDict(dictionary, dict_type=zstandard.DICT_TYPE_RAWCONTENT) \
+            if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=zstd_dict).decompressobj().decompress(data)
+    if codec == CODEC_ZLIB:
+        decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+    raise ValueError(f"未知的压缩编码: {codec}")
+
+
+def compress_text(text: str, codec: str = None, dict_id: str = None, level: int = None) -> bytes:
+    """
+    压缩文本为存储格式（参数为空时使用环境变量配置）
+
+    压缩后不小于原文时直接返回 UTF-8 原文。
+    """
+    raw = text.encode("utf-8")
+    codec = (codec or TEXT_COMPRESSION_CODEC).lower()
+    if codec == "none" or not raw:
+        return raw
+    if codec not in CODEC_IDS:
+        raise ValueError(f"不支持的压缩编码: {codec}")
+    dict_id = (dict_id or TEXT_COMPRESSION_DICT).lower()
+    dict_number = 0 if dict_id == "none" else int(dict_id, 16)
+    dictionary = load_dictionary(dict_number) if dict_number else None
+    if level is None and TEXT_COMPRESSION_LEVEL:
+        level = int(TEXT_COMPRESSION_LEVEL)
+    stored = HEADER.pack(MAGIC, CODEC_IDS[codec], dict_number) + _compress(raw, CODEC_IDS[codec], dictionary, level)
+    return stored if len(stored) < len(raw) else raw
+
+
+def decompress_text(value) -> str:
+    """读取存储格式（兼容未压缩的原文，包括 SQLite 中以 TEXT 存储的历史数据）"""
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    if not value or value[0] != MAGIC:
+        return value.decode("utf-8")
+    _, codec, dict_number = HEADER.unpack_from(value)
+    dictionary = load_dictionary(dict_number) if dict_number else None
+    return _decompress(value[HEADER.size:], codec, dictionary).decode("utf-8")
+
+
+class CompressedText(TypeDecorator):
+    """压缩存储的文本列：数据库中为二进制，Python 中为 str"""
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+
+def _segments(text: str):
+    """样本中的候选片段：整行 / 整句，以及 3~6 个词的短语"""
+    segments = {segment.strip() for segment in SEGMENT_PATTERN.split(text)}
+    words = WORD_PATTERN.findall(text)
+    for n in range(3, 7):
+        segments.update(" ".join(words[i:i + n]) for i in range(len(words) - n + 1))
+    return {segment for segment in segments if len(segment.encode("utf-8")) >= MIN_SEGMENT_BYTES}
+
+
+def train_dictionary(samples: Iterable[str], size: int = DEFAULT_DICTIONARY_SIZE) -> bytes:
+    """
+    从样本文本训练预置字典
+
+    统计每个候选片段（行、句、短语）出现在多少个样本中，按（出现次数 × 长度）估算可节省的字节数，
+    选取收益最高、且未被已选片段包含的片段直到达到字典大小。
+    zlib 对距离近的匹配编码更短，收益最高的片段放在字典末尾。
+    """
+    counts = Counter()
+    for text in samples:
+        counts.update(_segments(text or ""))
+    candidates = [(count * len(segment.encode("utf-8")), segment) for segment, count in counts.items() if count > 1]
+    candidates.sort(key=lambda item: (-item[0], item[1]))
+
+    selected = []
+    selected_text = ""
+    total = 0
+    for _, segment in candidates:
+        encoded = segment.encode("utf-8") + b"\n"
+        if total + len(encoded) > size or segment in selected_text:
+            continue
+        selected.append(encoded)
+        selected_text += segment + "\n"
+        total += len(encoded)
+    return b"".join(reversed(selected))
+
+
+def rewrite_column(connection, table_name: str, column_name: str, encode=compress_text,
+                   batch_size: int = 1000, key_column: str = "id") -> Tuple[int, int, int]:
+    """
+    按主键（key_column）分批读取列值并用 encode 重新编码写回（迁移、更换字典后重写历史数据）
+
+    Returns:
+        (行数, 原文总字节数, 写回后总字节数)
+    """
+    # 不指定列类型，读写原始值（兼容 TEXT 与 BLOB 混存）
+    table = sa.table(table_name, sa.column(key_column), sa.column(column_name))
+    key = table.c[key_column]
+    update = table.update().where(key == sa.bindparam("row_key")).values(
+        {column_name: sa.bindparam("stored")}
+    )
+    rows_total = raw_bytes = stored_bytes = 0
+    last_key = None
+    while True:
+        query = sa.select(key, table.c[column_name]).where(table.c[column_name].isnot(None))
+        if last_key is not None:
+            query = query.where(key > last_key)
+        rows = connection.execute(query.order_by(key).limit(batch_size)).all()
+        if not rows:
+            break
+        params = []
+        for row_key, value in rows:
+            text = decompress_text(value)
+            stored = encode(text)
+            raw_bytes += len(text.encode("utf-8"))
+            stored_bytes += len(stored)
+            params.append({"row_key": row_key, "stored": stored})
+        connection.execute(update, params)
+        rows_total += len(rows)
+        last_key = rows[-1][0]
+    return rows_total, raw_bytes, stored_bytes
+
+
+def column_stats(connection, table_name: str, column_name: str, batch_size: int = 1000,
+                 key_column: str = "id") -> Tuple[int, int, int]:
+    """统计列的 (行数, 原文总字节数, 存储总字节数)，不修改数据"""
+    table = sa.table(table_name, sa.column(key_column), sa.column(column_name))
+    key = table.c[key_column]
+    rows_total = raw_bytes = stored_bytes = 0
+    last_key = None
+    while True:
+        query = sa.select(key, table.c[column_name]).where(table.c[column_name].isnot(None))
+        if last_key is not None:
+            query = query.where(key > last_key)
+        rows = connection.execute(query.order_by(key).limit(batch_size)).all()
+        if not rows:
+            break
+        for _, value in rows:
+            raw_bytes += len(decompress_text(value).encode("utf-8"))
+            stored_bytes += len(value.encode("utf-8")) if isinstance(value, str) else len(value)
+        rows_total += len(rows)
+        last_key = rows[-1][0]
+    return rows_total, raw_bytes, stored_bytes
+
+
+def format_reduction(raw_bytes: int, stored_bytes: int) -> str:
+    """如 "1.2 MB -> 310.5 KB（减少 74.3%）" """
+
+    def human(size):
+        for unit in ("B", "KB", "MB", "GB"):
+            if size < 1024 or unit == "GB":
+                return f"{size:.1f} {unit}" if unit != "B" else f"{size} B"
+            size /= 1024
+
+    saved = (1 - stored_bytes / raw_bytes) * 100 if raw_bytes else 0.0
+    return f"{human(raw_bytes)} -> {human(stored_bytes)}（减少 {saved:.1f}%）"
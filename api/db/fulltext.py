@@ -0,0 +1,260 @@
+"""全文检索索引（SQLite FTS5）
+
+两张 FTS5 虚拟表：
+- cases_fts：rowid = medical_cases.id，列 patient_id / patient_name / chief_complaint / raw_report
+- diagnoses_fts：rowid = diagnosis_history.id，列 content（诊断全文）
+
+病历全文压缩存储、诊断全文按分段去重存储（见 compressed_text.py、api/models/content.py），
+数据库触发器读不到原文，索引由 api/models/case.py 中的 ORM 事件在写入时同步；
+批量删除（Query.delete）不触发 ORM 事件，需先调用 remove_cases / remove_diagnoses。
+
+中英文混合分词：FTS5 自带的 unicode61 分词器会把连续的中文当作一个词，
+写入索引前在每个中日韩字符两侧加空格，使每个字单独成词；查询时中文词转为逐字短语（相邻匹配），
+效果等同子串匹配，英文词按前缀匹配。
+
+非 SQLite 数据库不建索引，以下写入函数均为空操作。
+"""
+import html
+import re
+from typing import Iterable, Optional, Tuple
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from api.db.database import Base
+from api.db.compressed_text import decompress_text
+
+CASES_FTS = "cases_fts"
+DIAGNOSES_FTS = "diagnoses_fts"
+CASE_COLUMNS = ["patient_id", "patient_name", "chief_complaint", "raw_report"]
+FTS_TOKENIZE = "unicode61 remove_diacritics 2"
+# 重建索引时每批处理的行数
+REBUILD_BATCH_SIZE = 500
+# 参与相关度排序的命中数上限：常见词几乎命中所有行，bm25 需逐行打分，
+# 超过上限时只对最新（rowid 最大）的这些命中排序，检索耗时不随数据量增长
+RANK_WINDOW = 1000
+
+# 中日韩字符（汉字、假名、谚文）
+CJK_CHAR = r"[぀-ヿ㐀-䶿一-鿿豈-﫿가-힯]"
+CJK_PATTERN = re.compile(f"({CJK_CHAR})")
+# segment 加入的空格（摘要中命中标记紧贴字符）
+CJK_SPACING_PATTERN = re.compile(f" ?(\x02?{CJK_CHAR}\x03?) ?")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# 摘要中命中词的标记（FTS5 snippet 输出，随后转为 HTML）
+_HIT_START = "\x02"
+_HIT_END = "\x03"
+
+
+def is_supported(connection) -> bool:
+    return connection.dialect.name == "sqlite"
+
+
+def is_fulltext_table(name: str) -> bool:
+    """FTS5 虚拟表及其影子表（不在 ORM 模型中，迁移比对时忽略）"""
+    return any(name == table or name.startswith(f"{table}_") for table in (CASES_FTS, DIAGNOSES_FTS))
+
+
+def segment(text: Optional[str]) -> str:
+    """写入索引前的分词预处理：中日韩字符两侧加空格"""
+    return CJK_PATTERN.sub(r" \1 ", text or "")
+
+
+def desegment(text: str) -> str:
+    """去掉 segment 加入的空格（用于展示摘要）"""
+    return CJK_SPACING_PATTERN.sub(r"\1", text)
+
+
+def build_match_query(q: str) -> Optional[str]:
+    """
+    用户输入转为 FTS5 MATCH 表达式（各词之间为 AND）
+
+    "胸痛 arrhyth" -> "胸 痛" AND "arrhyth"*；无可检索的词时返回 None
+    """
+    terms = []
+    for word in q.split():
+        tokens = TOKEN_PATTERN.findall(segment(word))
+        if not tokens:
+            continue
+        phrase = '"' + " ".join(tokens) + '"'
+        # 英文词（最后一个词元不是中日韩字符）按前缀匹配
+        if not CJK_PATTERN.fullmatch(tokens[-1]):
+            phrase += "*"
+        terms.append(phrase)
+    return " AND ".join(terms) or None
+
+
+def format_snippet(snippet: str) -> str:
+    """FTS5 snippet 输出转为 HTML：命中词包裹 <mark>，其余文本转义"""
+    # 相邻的命中字合并为一个标记
+    parts = re.split(f"({_HIT_START}|{_HIT_END})", desegment(snippet).replace(_HIT_END + _HIT_START, ""))
+    out = []
+    for part in parts:
+        if part == _HIT_START:
+            out.append("<mark>")
+        elif part == _HIT_END:
+            out.append("</mark>")
+        else:
+            out.append(html.escape(part))
+    return "".join(out)
+
+
+def snippet_sql(table: str, column_index: int, tokens: int = 24) -> str:
+    return f"snippet({table}, {column_index}, '{_HIT_START}', '{_HIT_END}', '…', {tokens})"
+
+
+def rank_window_start(connection, table: str, match: str, window: int = RANK_WINDOW) -> Optional[int]:
+    """
+    命中数超过 window 时返回第 window 新的命中的 rowid（检索时加 rowid >= 该值，只对最新的命中排序），
+    否则返回 None
+    """
+    return connection.execute(
+        sa.text(f"SELECT rowid FROM {table} WHERE {table} MATCH :match ORDER BY rowid DESC LIMIT 1 OFFSET :offset"),
+        {"match": match, "offset": window - 1},
+    ).scalar()
+
+
+def create_fulltext_tables(connection) -> None:
+    if not is_supported(connection):
+        return
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {CASES_FTS} USING fts5("
+        f"{', '.join(CASE_COLUMNS)}, tokenize='{FTS_TOKENIZE}')"
+    )
+    connection.exec_driver_sql(
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {DIAGNOSES_FTS} USING fts5(content, tokenize='{FTS_TOKENIZE}')"
+    )
+
+
+def drop_fulltext_tables(connection) -> None:
+    if not is_supported(connection):
+        return
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {CASES_FTS}")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {DIAGNOSES_FTS}")
+
+
+# create_all / drop_all（测试、未受 Alembic 管理的旧数据库）时一并创建 / 删除索引表
+event.listen(Base.metadata, "after_create", lambda target, connection, **kw: create_fulltext_tables(connection))
+event.listen(Base.metadata, "before_drop", lambda target, connection, **kw: drop_fulltext_tables(connection))
+
+
+_INSERT_CASE = sa.text(
+    f"INSERT INTO {CASES_FTS} (rowid, {', '.join(CASE_COLUMNS)}) "
+    f"VALUES (:case_id, {', '.join(':' + column for column in CASE_COLUMNS)})"
+)
+_INSERT_DIAGNOSIS = sa.text(f"INSERT INTO {DIAGNOSES_FTS} (rowid, content) VALUES (:id, :content)")
+
+
+def index_case(connection, case_id: int, values: dict) -> None:
+    """
+    写入或更新病例索引
+
+    values 为 CASE_COLUMNS 中需要更新的列；新病例需包含全部列
+    """
+    if not is_supported(connection) or not values:
+        return
+    params = {column: segment(value) for column, value in values.items()}
+    params["case_id"] = case_id
+    exists = connection.exec_driver_sql(
+        f"SELECT 1 FROM {CASES_FTS} WHERE rowid = ?", (case_id,)
+    ).first()
+    if exists:
+        assignments = ", ".join(f"{column} = :{column}" for column in values)
+        connection.execute(sa.text(f"UPDATE {CASES_FTS} SET {assignments} WHERE rowid = :case_id"), params)
+    else:
+        for column in CASE_COLUMNS:
+            params.setdefault(column, "")
+        connection.execute(_INSERT_CASE, params)
+
+
+def index_new_cases(connection, rows: Iterable[dict]) -> None:
+    """批量写入新病例索引（批量插入不触发 ORM 事件时使用），rows 包含 id 与 CASE_COLUMNS 中的列"""
+    if not is_supported(connection):
+        return
+    params = [
+        {"case_id": row["id"], **{column: segment(row.get(column)) for column in CASE_COLUMNS}}
+        for row in rows
+    ]
+    if params:
+        connection.execute(_INSERT_CASE, params)
+
+
+def index_diagnosis(connection, diagnosis_id: int, markdown: str) -> None:
+    if not is_supported(connection):
+        return
+    connection.execute(sa.text(f"DELETE FROM {DIAGNOSES_FTS} WHERE rowid = :id"), {"id": diagnosis_id})
+    connection.execute(_INSERT_DIAGNOSIS, {"id": diagnosis_id, "content": segment(markdown)})
+
+
+def _remove(connection, table: str, ids: Iterable[int]) -> None:
+    ids = list(ids)
+    if not is_supported(connection) or not ids:
+        return
+    connection.execute(sa.text(f"DELETE FROM {table} WHERE rowid IN :ids").bindparams(
+        sa.bindparam("ids", expanding=True)
+    ), {"ids": ids})
+
+
+def remove_cases(connection, case_ids: Iterable[int]) -> None:
+    _remove(connection, CASES_FTS, case_ids)
+
+
+def remove_diagnoses(connection, diagnosis_ids: Iterable[int]) -> None:
+    _remove(connection, DIAGNOSES_FTS, diagnosis_ids)
+
+
+def rebuild_fulltext_index(connection) -> Tuple[int, int]:
+    """清空并从数据库重建全部索引（迁移、索引异常时使用），返回 (病例数, 诊断数)"""
+    if not is_supported(connection):
+        return 0, 0
+    create_fulltext_tables(connection)
+    connection.exec_driver_sql(f"DELETE FROM {CASES_FTS}")
+    connection.exec_driver_sql(f"DELETE FROM {DIAGNOSES_FTS}")
+
+    cases = sa.table("medical_cases", sa.column("id", sa.Integer), *[sa.column(c) for c in CASE_COLUMNS])
+    diagnoses = sa.table("diagnosis_history", sa.column("id", sa.Integer))
+    sections = sa.table("diagnosis_sections", sa.column("diagnosis_id", sa.Integer),
+                        sa.column("position", sa.Integer), sa.column("blob_hash"))
+    blobs = sa.table("content_blobs", sa.column("hash"), sa.column("content"))
+
+    case_count = 0
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(cases.c.id, *[cases.c[c] for c in CASE_COLUMNS])
+            .where(cases.c.id > last_id).order_by(cases.c.id).limit(REBUILD_BATCH_SIZE)
+        ).all()
+        if not rows:
+            break
+        params = []
+        for row in rows:
+            values = {column: getattr(row, column) for column in CASE_COLUMNS}
+            if values["raw_report"] is not None:
+                values["raw_report"] = decompress_text(values["raw_report"])
+            params.append({"case_id": row.id, **{column: segment(value) for column, value in values.items()}})
+        connection.execute(_INSERT_CASE, params)
+        case_count += len(rows)
+        last_id = rows[-1].id
+
+    diagnosis_count = 0
+    last_id = 0
+    while True:
+        ids = connection.execute(
+            sa.select(diagnoses.c.id).where(diagnoses.c.id > last_id).order_by(diagnoses.c.id).limit(REBUILD_BATCH_SIZE)
+        ).scalars().all()
+        if not ids:
+            break
+        parts = {diagnosis_id: [] for diagnosis_id in ids}
+        for diagnosis_id, content in connection.execute(
+            sa.select(sections.c.diagnosis_id, blobs.c.content)
+            .join(blobs, blobs.c.hash == sections.c.blob_hash)
+            .where(sections.c.diagnosis_id.in_(ids))
+            .order_by(sections.c.diagnosis_id, sections.c.position)
+        ):
+            parts[diagnosis_id].append(decompress_text(content))
+        connection.execute(_INSERT_DIAGNOSIS, [
+            {"id": diagnosis_id, "content": segment("".join(texts))} for diagnosis_id, texts in parts.items()
+        ])
+        diagnosis_count += len(ids)
+        last_id = ids[-1]
+    return case_count, diagnosis_count
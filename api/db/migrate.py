@@ -0,0 +1,51 @@
+"""数据库迁移（Alembic）
+
+表结构变更统一通过 api/alembic/versions 下的迁移脚本管理：
+    alembic upgrade head                   升级到最新版本
+    alembic revision --autogenerate -m ""  根据模型变更生成新迁移
+
+在 Alembic 引入之前用 create_all / 旧迁移脚本建立的数据库没有版本记录，需要先标记当前版本再升级：
+    alembic stamp 0010 && alembic upgrade head
+（0010 对应旧迁移脚本全部执行过的表结构；如有脚本未执行，标记为对应的更早版本）
+"""
+import os
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import create_engine, inspect
+
+from api.db.database import DATABASE_URL
+from api.db.fulltext import is_fulltext_table
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+
+
+def alembic_config(url: str = None) -> Config:
+    """Alembic 配置（url 为空时使用 DATABASE_URL）"""
+    config = Config(ALEMBIC_INI)
+    if url:
+        config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    return config
+
+
+def include_name(name, type_, parent_names) -> bool:
+    """迁移比对（autogenerate）时忽略全文检索虚拟表，它们不在 ORM 模型中"""
+    return not (type_ == "table" and is_fulltext_table(name))
+
+
+def upgrade_database(url: str = None) -> bool:
+    """
+    将数据库升级到最新版本
+
+    Returns:
+        False 表示数据库已有数据表但未受 Alembic 管理（需先 alembic stamp），未做任何修改
+    """
+    engine = create_engine(url or DATABASE_URL)
+    try:
+        tables = set(inspect(engine).get_table_names())
+    finally:
+        engine.dispose()
+    if tables and "alembic_version" not in tables:
+        return False
+    command.upgrade(alembic_config(url), "head")
+    return True
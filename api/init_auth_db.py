@@ -8,8 +8,11 @@
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from api.db.database import Base, DATABASE_URL
+from api.db.migrate import upgrade_database
 from api.models.user import User, Role, Permission, ROLE_PERMISSIONS
 from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.idempotency import IdempotencyRecord  # noqa: F401  注册幂等键表
+from api.models.single_flight import SingleFlightLock  # noqa: F401  注册单飞锁表
 from api.auth.security import get_password_hash
 import os
 
@@ -25,7 +28,10 @@ def init_auth_database():
 
     # 创建所有表（包括用户权限相关表和病例表）
     print("\n[1/4] 创建数据库表...")
-    Base.metadata.create_all(bind=engine)
+    if not upgrade_database():
+        # 未受 Alembic 管理的旧数据库：只补建缺失的表，表结构变更请先 alembic stamp 后升级
+        print("⚠ 数据库未受 Alembic 管理，仅补建缺失的表（参见 api/db/migrate.py）")
+        Base.metadata.create_all(bind=engine)
     print("✓ 数据库表创建成功")
 
     # 创建会话
@@ -10,14 +10,20 @@ from pathlib import Path
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
 from api.db.database import engine, Base, SessionLocal
+from api.db.migrate import upgrade_database
 from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.idempotency import IdempotencyRecord  # noqa: F401  注册幂等键表
+from api.models.single_flight import SingleFlightLock  # noqa: F401  注册单飞锁表
 from datetime import datetime
 
 
 def create_tables():
     """创建所有数据库表"""
     print("正在创建数据库表...")
-    Base.metadata.create_all(bind=engine)
+    if not upgrade_database():
+        # 未受 Alembic 管理的旧数据库：只补建缺失的表，表结构变更请先 alembic stamp 后升级
+        print("⚠ 数据库未受 Alembic 管理，仅补建缺失的表（参见 api/db/migrate.py）")
+        Base.metadata.create_all(bind=engine)
     print("✓ 数据库表创建成功！")
 
 
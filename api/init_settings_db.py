@@ -6,6 +6,7 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from api.db.database import engine, Base, SessionLocal
+from api.db.migrate import upgrade_database
 from api.models.settings import Provider, Model, SystemConfig, DEFAULT_SYSTEM_CONFIG
 from api.utils.encryption import encrypt_api_key
 
@@ -16,7 +17,10 @@ def init_settings_tables():
     from api.models.settings import Provider, Model, SystemConfig
 
     print("正在创建系统设置表...")
-    Base.metadata.create_all(bind=engine)
+    if not upgrade_database():
+        # 未受 Alembic 管理的旧数据库：只补建缺失的表，表结构变更请先 alembic stamp 后升级
+        print("⚠ 数据库未受 Alembic 管理，仅补建缺失的表（参见 api/db/migrate.py）")
+        Base.metadata.create_all(bind=engine)
     print("✓ 系统设置表创建完成")
 
 
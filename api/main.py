@@ -1,33 +1,55 @@
-from fastapi import FastAPI, Depends, HTTPException, UploadFile, File
+from fastapi import FastAPI, Depends, HTTPException, UploadFile, File, Request, Query, Header
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.concurrency import run_in_threadpool
 from fastapi.responses import Response
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional
-from sqlalchemy.orm import Session, joinedload
+from sqlalchemy.orm import Session, joinedload, contains_eager, aliased, object_session
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import func
+from sqlalchemy import event, func, or_
 from datetime import datetime
 import time
+import asyncio
+import uuid
 import os
 import json
 import zipfile
 import io
 
-from Main import run_multi_agent_diagnosis
-from api.db.database import get_db
+from Main import arun_multi_agent_diagnosis
+from Utils.Agents import Translator
+from Utils.Deadline import Deadline
+from api.db.database import get_db, ReadSessionLocal
 from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.archive import ArchivedDiagnosis
+from api.models.content import release_diagnoses
+from api.db.fulltext import remove_diagnoses
 from api.models.user import User
 from api.models.settings import Provider, Model as SettingsModel
 from api.utils.case_formatter import CaseFormatter
 from api.utils.txt_parser import parse_txt_file
 from api.utils.export import DiagnosisExporter
-from api.utils.case_id_generator import generate_case_id
+from api.utils.case_id_generator import allocate_case_id
+from api.utils.case_import import import_case_records
+from api.utils.http_cache import compute_etag, not_modified_response, set_etag_headers
+from api.utils.compression import CompressionMiddleware
+from api.utils.fast_json import FastJSONResponse, rows_to_dicts
+from api.utils.single_flight import DIAGNOSIS_SINGLE_FLIGHT
+from api.utils.disconnect import cancel_on_disconnect
+from api.utils.similarity import get_similar_case_index
+from api.utils.archive import delete_archived_diagnoses, get_case_diagnosis, get_diagnoses_by_ids, list_case_diagnoses
+from api.utils.idempotency import (
+    begin_idempotent_request, complete_idempotent_request, abandon_idempotent_request, compute_fingerprint
+)
+from api.utils.pagination import (
+    encode_cursor, decode_cursor, keyset_filter, keyset_order_by, normalize_order, CountCache
+)
 from api.config_loader import ConfigLoader
 from api.auth.permissions import (
     require_case_create, require_case_read, require_case_update, require_case_delete,
     require_diagnosis_create, require_diagnosis_read, require_diagnosis_execute
 )
-from api.routes import auth, users, roles, analytics, settings
+from api.routes import auth, users, roles, analytics, settings, search
 
 app = FastAPI(title="AI Medical Diagnostics API")
 
@@ -37,6 +59,7 @@ app.include_router(users.router)
 app.include_router(roles.router)
 app.include_router(analytics.router)
 app.include_router(settings.router)
+app.include_router(search.router)
 
 # 从配置文件加载支持的AI模型列表
 AVAILABLE_MODELS = ConfigLoader.load_models()
@@ -48,8 +71,12 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor"],
 )
 
+# 响应压缩（Brotli/gzip，超过阈值才压缩）
+app.add_middleware(CompressionMiddleware)
+
 
 # ---- Pydantic 响应模型 ----
 
@@ -70,10 +97,13 @@ class Case(BaseModel):
     age: Optional[int] = None
     gender: Optional[str] = None
     chief_complaint: Optional[str] = None
+    report_summary: Optional[str] = None
     created_at: datetime
     creator: Optional[CaseCreatorInfo] = None
     diagnosis_count: int = 0
     has_diagnosis: bool = False
+    last_diagnosis_at: Optional[datetime] = None
+    latest_diagnosis_id: Optional[int] = None
 
     class Config:
         from_attributes = True  # 允许从 ORM 模型转换
@@ -87,8 +117,56 @@ async def get_available_models():
     return {"models": AVAILABLE_MODELS}
 
 
+# 性别筛选别名（与 analytics 中的性别标准化保持一致）
+GENDER_ALIASES = {
+    "male": ["male", "男", "m", "男性"],
+    "female": ["female", "女", "f", "女性"],
+}
+
+# 病例列表支持的排序字段（均以 id 作为第二排序键保证稳定）
+CASE_SORT_FIELDS = {
+    "created_at": MedicalCase.created_at,
+    "patient_id": MedicalCase.patient_id,
+    "age": func.coalesce(MedicalCase.age, -1),
+}
+
+CASE_LIST_MAX_LIMIT = 500
+
+# 病例列表快速路径所需的列（标签名与 Case 响应字段一致）
+CASE_LIST_FAST_COLUMNS = (
+    MedicalCase.id,
+    MedicalCase.patient_name,
+    MedicalCase.patient_id,
+    MedicalCase.age,
+    MedicalCase.gender,
+    MedicalCase.chief_complaint,
+    MedicalCase.report_summary,
+    MedicalCase.created_at,
+    MedicalCase.diagnosis_count,
+    MedicalCase.last_diagnosis_at,
+    MedicalCase.latest_diagnosis_id,
+    User.id.label("creator_id"),
+    User.username.label("creator_username"),
+    User.full_name.label("creator_full_name"),
+)
+
+
 @app.get("/api/cases", response_model=List[Case])
 async def list_cases(
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=CASE_LIST_MAX_LIMIT, description="每页数量（不传则返回全部）"),
+    cursor: Optional[str] = Query(None, description="上一页响应头 X-Next-Cursor 返回的游标"),
+    sort: str = Query("created_at", description="排序字段: created_at/patient_id/age"),
+    order: str = Query("desc", description="排序方向: asc/desc"),
+    creator_id: Optional[int] = Query(None, description="按创建者用户ID筛选"),
+    has_diagnosis: Optional[bool] = Query(None, description="是否已有诊断记录"),
+    created_from: Optional[str] = Query(None, description="创建时间起始（ISO格式）"),
+    created_to: Optional[str] = Query(None, description="创建时间结束（ISO格式）"),
+    gender: Optional[str] = Query(None, description="性别: male/female/其他"),
+    age_min: Optional[int] = Query(None, ge=0, description="最小年龄（含）"),
+    age_max: Optional[int] = Query(None, ge=0, description="最大年龄（含）"),
+    q: Optional[str] = Query(None, description="关键字（匹配姓名、病例号、主诉）"),
+    fast: bool = Query(False, description="快速序列化路径（跳过 Pydantic 模型校验，使用 orjson）"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_case_read)
 ) -> List[Case]:
@@ -102,7 +180,20 @@ async def list_cases(
     - creator: 创建者信息（id/username/full_name）
     - diagnosis_count: 诊断记录数量
     - has_diagnosis: 是否已有诊断记录
+    - last_diagnosis_at / latest_diagnosis_id: 最新诊断的运行时间与ID
+
+    服务端分页/筛选/排序：
+    - 传入 limit 时按 (排序字段, id) 进行游标分页，下一页游标通过响应头 X-Next-Cursor 返回，
+      最后一页不返回该响应头；不传 limit 时保持原行为返回全部病例
+    - 列表查询不加载 raw_report（延迟加载列），摘要取自写入时生成的 report_summary；
+      诊断统计取自病例表的冗余字段（诊断增删时维护），只查询病例表，不聚合诊断记录
+    - fast=true 时只查询所需列并直接序列化行数据，响应结构与标准路径一致
     """
+    if sort not in CASE_SORT_FIELDS:
+        raise HTTPException(status_code=400, detail=f"不支持的排序字段: {sort}")
+    order = normalize_order(order)
+    sort_column = CASE_SORT_FIELDS[sort]
+
     # 检查用户角色
     is_admin_or_doctor = False
     if current_user.is_superuser:
@@ -111,34 +202,107 @@ async def list_cases(
         user_role_names = [role.name for role in current_user.roles]
         is_admin_or_doctor = 'admin' in user_role_names or 'doctor' in user_role_names
 
-    diagnosis_count_subq = (
-        db.query(
-            DiagnosisHistory.case_id,
-            func.count(DiagnosisHistory.id).label("diagnosis_count")
-        )
-        .group_by(DiagnosisHistory.case_id)
-        .subquery()
-    )
-
-    base_query = (
-        db.query(
-            MedicalCase,
-            func.coalesce(diagnosis_count_subq.c.diagnosis_count, 0).label("diagnosis_count")
-        )
-        .outerjoin(diagnosis_count_subq, MedicalCase.id == diagnosis_count_subq.c.case_id)
-        .options(joinedload(MedicalCase.creator))
-    )
+    query = db.query(MedicalCase)
 
     # 根据角色过滤病例
-    if is_admin_or_doctor:
-        query = base_query
-    else:
-        query = base_query.filter(MedicalCase.created_by == current_user.id)
+    if not is_admin_or_doctor:
+        query = query.filter(MedicalCase.created_by == current_user.id)
 
-    results = query.order_by(MedicalCase.created_at.desc()).all()
+    # 应用筛选条件
+    if creator_id is not None:
+        query = query.filter(MedicalCase.created_by == creator_id)
+
+    if has_diagnosis is not None:
+        query = query.filter(MedicalCase.diagnosis_count > 0 if has_diagnosis else MedicalCase.diagnosis_count == 0)
+
+    if created_from:
+        try:
+            from_date = datetime.fromisoformat(created_from.replace('Z', '+00:00'))
+            query = query.filter(MedicalCase.created_at >= from_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="created_from 日期格式错误")
+
+    if created_to:
+        try:
+            to_date = datetime.fromisoformat(created_to.replace('Z', '+00:00'))
+            query = query.filter(MedicalCase.created_at <= to_date)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="created_to 日期格式错误")
+
+    if gender:
+        gender_values = GENDER_ALIASES.get(gender.lower().strip(), [gender.lower().strip()])
+        query = query.filter(func.lower(MedicalCase.gender).in_(gender_values))
+
+    if age_min is not None:
+        query = query.filter(MedicalCase.age >= age_min)
+
+    if age_max is not None:
+        query = query.filter(MedicalCase.age <= age_max)
+
+    if q:
+        keyword = f"%{q.strip()}%"
+        query = query.filter(or_(
+            MedicalCase.patient_name.like(keyword),
+            MedicalCase.patient_id.like(keyword),
+            MedicalCase.chief_complaint.like(keyword),
+        ))
+
+    # 游标定位 + 稳定排序
+    if cursor:
+        position = decode_cursor(cursor, sort, order)
+        query = query.filter(keyset_filter(sort_column, MedicalCase.id, order, position["value"], position["id"]))
+    query = query.order_by(*keyset_order_by(sort_column, MedicalCase.id, order))
+
+    if fast:
+        # 快速路径：只取列表所需列（行元组），创建者信息通过外连接一并取出
+        query = query.outerjoin(User, MedicalCase.created_by == User.id).with_entities(
+            *CASE_LIST_FAST_COLUMNS
+        )
+    else:
+        query = query.options(joinedload(MedicalCase.creator))
+
+    next_cursor = None
+    if limit is not None:
+        medical_cases = query.limit(limit + 1).all()
+        has_more = len(medical_cases) > limit
+        medical_cases = medical_cases[:limit]
+        if has_more:
+            last = medical_cases[-1]
+            last_value = getattr(last, sort)
+            if sort == "age" and last_value is None:
+                last_value = -1  # 与排序表达式 coalesce(age, -1) 保持一致
+            next_cursor = encode_cursor(sort, order, last_value, last.id)
+            response.headers["X-Next-Cursor"] = next_cursor
+    else:
+        medical_cases = query.all()
+
+    if fast:
+        content = []
+        for row in medical_cases:
+            content.append({
+                "id": row.id,
+                "patient_name": row.patient_name,
+                "patient_id": row.patient_id,
+                "age": row.age,
+                "gender": row.gender,
+                "chief_complaint": row.chief_complaint,
+                "report_summary": row.report_summary,
+                "created_at": row.created_at,
+                "creator": {
+                    "id": row.creator_id,
+                    "username": row.creator_username,
+                    "full_name": row.creator_full_name,
+                } if row.creator_id is not None else None,
+                "diagnosis_count": row.diagnosis_count,
+                "has_diagnosis": row.diagnosis_count > 0,
+                "last_diagnosis_at": row.last_diagnosis_at,
+                "latest_diagnosis_id": row.latest_diagnosis_id,
+            })
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return FastJSONResponse(content=content, headers=headers)
 
     cases_response: List[Case] = []
-    for medical_case, diagnosis_count in results:
+    for medical_case in medical_cases:
         creator_info: Optional[CaseCreatorInfo] = None
         if medical_case.creator:
             creator_info = CaseCreatorInfo(
@@ -155,19 +319,18 @@ async def list_cases(
                 age=medical_case.age,
                 gender=medical_case.gender,
                 chief_complaint=medical_case.chief_complaint,
+                report_summary=medical_case.report_summary,
                 created_at=medical_case.created_at,
                 creator=creator_info,
-                diagnosis_count=int(diagnosis_count or 0),
-                has_diagnosis=bool((diagnosis_count or 0) > 0),
+                diagnosis_count=medical_case.diagnosis_count or 0,
+                has_diagnosis=(medical_case.diagnosis_count or 0) > 0,
+                last_diagnosis_at=medical_case.last_diagnosis_at,
+                latest_diagnosis_id=medical_case.latest_diagnosis_id,
             )
         )
 
     return cases_response
 
-# TODO: 后续如需支持后端分页/筛选，可在此处扩展 query 条件
-
-
-
 
 class CaseDetail(BaseModel):
     id: int
@@ -186,6 +349,8 @@ class CaseDetail(BaseModel):
 @app.get("/api/cases/{case_id}", response_model=CaseDetail)
 async def get_case_detail(
     case_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_case_read)
 ) -> CaseDetail:
@@ -193,6 +358,9 @@ async def get_case_detail(
     获取单个病例的详细信息（需要 case:read 权限）
     - 管理员和医生：可以查看所有病例
     - 普通用户：只能查看自己创建的病例
+
+    支持条件请求：响应携带基于 updated_at 的 ETag，
+    客户端携带 If-None-Match 且未变更时返回 304（不序列化响应体）
     """
     case = db.query(MedicalCase).filter(MedicalCase.id == case_id).first()
     if not case:
@@ -210,6 +378,12 @@ async def get_case_detail(
     if not is_admin_or_doctor and case.created_by != current_user.id:
         raise HTTPException(status_code=403, detail="无权访问此病例")
 
+    etag = compute_etag("case", case.id, case.updated_at)
+    cached = not_modified_response(request, etag)
+    if cached:
+        return cached
+    set_etag_headers(response, etag)
+
     return case
 
 
@@ -246,21 +420,11 @@ async def create_case(
     """
     新增病例（需要 case:create 权限）
 
-    病例编号将自动生成：年月日时分(12位) + 性别(男1女0) + 年龄(2位)
+    病例编号将自动生成：年月日时分(12位) + 性别(男1女0) + 年龄(2位) + "-" + 序号
     支持中文、英文和双语格式
     """
-    # 生成病例编号（基于当前时间、性别和年龄）
-    current_time = datetime.now()
-    patient_id = generate_case_id(request.gender, request.age, current_time)
-
-    # 检查生成的 patient_id 是否已存在（理论上不会冲突，除非同一秒创建相同性别年龄的病例）
-    existing_case = db.query(MedicalCase).filter(MedicalCase.patient_id == patient_id).first()
-    if existing_case:
-        # 如果冲突，等待1秒后重新生成
-        import time
-        time.sleep(1)
-        current_time = datetime.now()
-        patient_id = generate_case_id(request.gender, request.age, current_time)
+    # 分配病例编号（基于当前时间、性别和年龄；序号由数据库原子递增，同一分钟内不会冲突）
+    patient_id = allocate_case_id(db, request.gender, request.age)
 
     # 使用格式化器生成标准病例报告
     raw_report = CaseFormatter.format_case_report(
@@ -310,18 +474,126 @@ async def create_case(
 class DiagnosisResponse(BaseModel):
     case_id: int
     diagnosis_markdown: str
+    # reuse_similar 模式下复用相似病例已有诊断时返回来源信息
+    reused_from_case_id: Optional[int] = None
+    reused_from_diagnosis_id: Optional[int] = None
+    similarity: Optional[float] = None
+
+
+def can_access_all_cases(current_user: User) -> bool:
+    """管理员和医生可以访问所有病例，普通用户只能访问自己创建的病例"""
+    if current_user.is_superuser:
+        return True
+    user_role_names = [role.name for role in current_user.roles]
+    return 'admin' in user_role_names or 'doctor' in user_role_names
+
+
+def check_diagnosis_access(case: MedicalCase, current_user: User) -> None:
+    """检查当前用户能否对病例运行诊断（管理员和医生：所有病例；普通用户：自己创建的病例）"""
+    if not can_access_all_cases(current_user) and case.created_by != current_user.id:
+        raise HTTPException(status_code=403, detail="无权对此病例进行诊断")
+
+
+def find_similar_cases(db: Session, case_id: int, raw_report: Optional[str], creator_id: Optional[int], k: int,
+                       min_score: float = 0.0) -> List[tuple]:
+    """
+    在相似病例索引中查找与病例最相似的 k 个病例，返回 [(病例ID, 相似度)]
+
+    creator_id 不为空时只返回该用户创建的病例（普通用户只能访问自己创建的病例）
+    """
+    allowed_ids = None
+    if creator_id is not None:
+        allowed_ids = {row[0] for row in db.query(MedicalCase.id).filter(MedicalCase.created_by == creator_id)}
+    index = get_similar_case_index(db)
+    matches = index.query(raw_report or "", k=k, exclude_id=case_id, allowed_ids=allowed_ids)
+    return [(similar_id, score) for similar_id, score in matches if score >= min_score]
+
+
+def find_similar_cases_readonly(*args) -> List[tuple]:
+    """在只读会话中执行 find_similar_cases（供写请求使用：检索及首次构建索引期间不占用写连接）"""
+    read_db = ReadSessionLocal()
+    try:
+        return find_similar_cases(read_db, *args)
+    finally:
+        read_db.close()
+
+
+def similar_case_scope(current_user: User) -> Optional[int]:
+    """相似病例检索范围：可访问所有病例时为 None，否则为当前用户ID"""
+    return None if can_access_all_cases(current_user) else current_user.id
+
+
+def validate_model_names(db: Session, model_names: List[str]) -> None:
+    """校验模型是否在系统设置中启用（数据库未配置模型时回退到配置文件中的模型列表）"""
+    enabled_models = db.query(SettingsModel).join(Provider).filter(
+        SettingsModel.is_enabled == True,
+        Provider.is_enabled == True
+    ).all()
+
+    if enabled_models:
+        valid_model_ids = [m.model_id for m in enabled_models]
+    else:
+        valid_model_ids = [m["id"] for m in AVAILABLE_MODELS]
+
+    for model_name in model_names:
+        if model_name not in valid_model_ids:
+            raise HTTPException(status_code=400, detail=f"不支持的模型: {model_name}。支持的模型: {', '.join(valid_model_ids)}")
 
 
 class RunDiagnosisRequest(BaseModel):
     """运行诊断请求参数"""
     model: Optional[str] = None  # 使用的模型，如果为None则使用默认模型
     language: Optional[str] = "en"  # 输出语言 ('en' 或 'zh'，默认为 'en')
+    timeout_ms: Optional[int] = Field(None, gt=0)  # 时间预算（毫秒），也可通过 X-Request-Timeout-Ms 请求头指定
+    reuse_similar: bool = False  # 存在高度相似且已诊断的病例时直接复用其诊断（同模型、同语言）
+    similarity_threshold: Optional[float] = Field(None, ge=0, le=1)  # 复用阈值，默认 SIMILARITY_REUSE_THRESHOLD
+
+
+# 历史诊断记录未保存语言（language 为空），按 run-diagnosis 的默认输出语言处理
+LEGACY_DIAGNOSIS_LANGUAGE = "en"
+
+# reuse_similar 模式的默认相似度阈值与候选病例数
+SIMILARITY_REUSE_THRESHOLD = float(os.getenv("SIMILARITY_REUSE_THRESHOLD", "0.95"))
+SIMILARITY_REUSE_CANDIDATES = 5
+
+# 系统设置中未配置上下文窗口的模型使用该默认值（0 表示未知，不对超长病历分块）
+LLM_DEFAULT_CONTEXT_WINDOW = int(os.getenv("LLM_DEFAULT_CONTEXT_WINDOW", "0"))
+
+
+def get_model_runtime(db: Session, model_name: str, with_fast_model: bool = True) -> dict:
+    """
+    查询模型的运行参数（作为 arun_multi_agent_diagnosis 的关键字参数）：
+    上下文窗口、最大输出 token 数，以及本地 Ollama 供应商的连接配置
+    （OpenAI 兼容供应商仍使用环境变量配置的网关）；
+    with_fast_model=True 时一并查询截止时间不足时 MDT 改用的快速模型（LLM_FAST_MODEL）的运行参数
+    """
+    model = db.query(SettingsModel).join(Provider).filter(
+        SettingsModel.model_id == model_name,
+        SettingsModel.is_enabled == True,
+        Provider.is_enabled == True
+    ).first()
+    context_window = model.context_window if model and model.context_window else LLM_DEFAULT_CONTEXT_WINDOW
+    provider = None
+    if model and model.provider.provider_type == "ollama":
+        provider = {"provider_type": "ollama", "base_url": model.provider.base_url}
+    runtime = {
+        "context_window": context_window or None,
+        "max_output_tokens": model.max_tokens if model else None,
+        "provider": provider,
+    }
+    fast_model = os.getenv("LLM_FAST_MODEL")
+    if with_fast_model and fast_model and fast_model != model_name:
+        runtime["fast_model_runtime"] = get_model_runtime(db, fast_model, with_fast_model=False)
+    return runtime
 
 
 @app.post("/api/cases/{case_id}/run-diagnosis", response_model=DiagnosisResponse)
 async def run_diagnosis(
     case_id: int,
+    http_request: Request,
     request: RunDiagnosisRequest = RunDiagnosisRequest(),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
+    request_timeout_ms: Optional[int] = Header(None, alias="X-Request-Timeout-Ms", gt=0),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_diagnosis_execute)
 ) -> DiagnosisResponse:
@@ -332,64 +604,324 @@ async def run_diagnosis(
 
     流程：
     1. 从数据库读取病例的 raw_report
-    2. 使用指定模型调用 run_multi_agent_diagnosis 生成诊断结果
+    2. 使用指定模型调用 arun_multi_agent_diagnosis 生成诊断结果
     3. 将诊断结果保存到 diagnosis_history 表
     4. 返回诊断结果给前端
+
+    支持 Idempotency-Key 请求头：客户端重试时携带相同的键，
+    将直接返回（或等待）首次请求的结果，不会重复运行诊断流水线
+
+    多个用户同时对同一病例发起相同参数的诊断时，只运行一次流水线并共享结果
+
+    时间预算：通过 X-Request-Timeout-Ms 请求头或 timeout_ms 参数指定（取较小值），
+    流水线各阶段按剩余时间调整（超时的模型调用被取消，MDT 可切换快速模型或跳过）；
+    客户端断开时取消进行中的模型调用
     """
+    # 请求截止时间从收到请求时开始计算
+    timeouts = [t for t in (request_timeout_ms, request.timeout_ms) if t]
+    deadline = Deadline.from_timeout_ms(min(timeouts)) if timeouts else None
+
     # 1. 查询病例
     case = db.query(MedicalCase).filter(MedicalCase.id == case_id).first()
     if not case:
         raise HTTPException(status_code=404, detail=f"病例 ID {case_id} 不存在")
 
     # 检查访问权限
-    is_admin_or_doctor = False
-    if current_user.is_superuser:
-        is_admin_or_doctor = True
-    else:
-        user_role_names = [role.name for role in current_user.roles]
-        is_admin_or_doctor = 'admin' in user_role_names or 'doctor' in user_role_names
-
-    # 如果不是管理员或医生，检查是否是创建者
-    if not is_admin_or_doctor and case.created_by != current_user.id:
-        raise HTTPException(status_code=403, detail="无权对此病例进行诊断")
+    check_diagnosis_access(case, current_user)
 
     # 2. 确定使用的模型
     model_name = request.model if request.model else os.getenv("LLM_MODEL", "gpt-4o")
+    validate_model_names(db, [model_name])
 
-    # 从数据库查询系统设置中已启用的模型
-    enabled_models = db.query(SettingsModel).join(Provider).filter(
-        SettingsModel.is_enabled == True,
-        Provider.is_enabled == True
-    ).all()
+    language = request.language or "en"
+    raw_report = case.raw_report
+    model_runtime = get_model_runtime(db, model_name)
 
-    # 如果数据库中没有配置模型，回退到配置文件中的模型列表
-    if enabled_models:
-        valid_model_ids = [m.model_id for m in enabled_models]
-    else:
-        valid_model_ids = [m["id"] for m in AVAILABLE_MODELS]
+    # 复用模式：相似度超过阈值的已诊断病例直接返回其诊断，不运行流水线（也不保存新的诊断记录）
+    if request.reuse_similar:
+        threshold = request.similarity_threshold if request.similarity_threshold is not None else SIMILARITY_REUSE_THRESHOLD
+        creator_id = similar_case_scope(current_user)
+        # 结束读事务、归还写连接后再等待检索（写连接池默认只有一个连接，其他写请求不必排队等待）
+        db.commit()
+        matches = await run_in_threadpool(
+            find_similar_cases_readonly, case_id, raw_report, creator_id, SIMILARITY_REUSE_CANDIDATES, threshold
+        )
+        for similar_case_id, score in matches:
+            prior = db.query(DiagnosisHistory).filter(
+                DiagnosisHistory.case_id == similar_case_id,
+                DiagnosisHistory.model_name == model_name,
+                func.coalesce(DiagnosisHistory.language, LEGACY_DIAGNOSIS_LANGUAGE) == language
+            ).order_by(DiagnosisHistory.run_timestamp.desc()).first()
+            if prior:
+                return DiagnosisResponse(
+                    case_id=case_id,
+                    diagnosis_markdown=prior.diagnosis_markdown,
+                    reused_from_case_id=similar_case_id,
+                    reused_from_diagnosis_id=prior.id,
+                    similarity=round(score, 4)
+                )
+
+    # 幂等处理：相同幂等键的重试直接返回（或等待）首次请求的结果
+    idem = await begin_idempotent_request(
+        db, idempotency_key, current_user.id,
+        "POST /api/cases/{case_id}/run-diagnosis",
+        compute_fingerprint(case_id, model_name, language)
+    )
+    if idem.replay is not None:
+        return idem.replay
+
+    async def execute_diagnosis() -> dict:
+        # 3. 运行诊断（记录执行时间；异步执行，按截止时间调整各阶段）
+        start_time = time.time()
+        diagnosis_md = await arun_multi_agent_diagnosis(
+            raw_report, model_name=model_name, language=language, deadline=deadline, **model_runtime
+        )
+        execution_time_ms = int((time.time() - start_time) * 1000)
+
+        # 4. 保存诊断历史
+        diagnosis_record = DiagnosisHistory(
+            case_id=case_id,
+            diagnosis_markdown=diagnosis_md,
+            model_name=model_name,
+            run_timestamp=datetime.utcnow(),
+            execution_time_ms=execution_time_ms,
+            language=language
+        )
+        db.add(diagnosis_record)
+        db.commit()
+        return {"case_id": case_id, "diagnosis_markdown": diagnosis_md}
+
+    # 结束读事务、归还写连接：模型调用期间不占用连接（写连接池默认只有一个连接）
+    db.commit()
 
-    if model_name not in valid_model_ids:
-        raise HTTPException(status_code=400, detail=f"不支持的模型: {model_name}。支持的模型: {', '.join(valid_model_ids)}")
+    try:
+        # 同时到达的相同请求（病例 + 模型 + 语言 + 病历原文）只执行一次，共享同一条诊断记录
+        flight_key = compute_fingerprint(case_id, model_name, language, raw_report)
+        result_data, _ = await cancel_on_disconnect(
+            http_request, DIAGNOSIS_SINGLE_FLIGHT.do(flight_key, execute_diagnosis)
+        )
 
-    # 3. 运行诊断（记录执行时间）
-    start_time = time.time()
-    diagnosis_md = run_multi_agent_diagnosis(case.raw_report, model_name=model_name, language=request.language or "en")
-    execution_time_ms = int((time.time() - start_time) * 1000)
+        # 5. 返回结果
+        result = DiagnosisResponse(**result_data)
+        complete_idempotent_request(db, idem, 200, result.model_dump(mode="json"))
+    finally:
+        # 执行失败或被取消（CancelledError 不是 Exception 的子类）时删除幂等登记记录，允许使用同一幂等键重试
+        abandon_idempotent_request(db, idem)
+    return result
 
-    # 4. 保存诊断历史
-    diagnosis_record = DiagnosisHistory(
-        case_id=case_id,
-        diagnosis_markdown=diagnosis_md,
-        model_name=model_name,
-        run_timestamp=datetime.utcnow(),
-        execution_time_ms=execution_time_ms
+
+class SimilarCaseItem(BaseModel):
+    """相似病例项"""
+    case_id: int
+    patient_id: str
+    patient_name: Optional[str] = None
+    chief_complaint: Optional[str] = None
+    similarity: float  # 余弦相似度（0 ~ 1）
+    latest_diagnosis_id: Optional[int] = None
+    latest_diagnosis_model: Optional[str] = None
+    latest_diagnosis_preview: Optional[str] = None
+
+
+@app.get("/api/cases/{case_id}/similar", response_model=List[SimilarCaseItem])
+async def get_similar_cases(
+    case_id: int,
+    k: int = Query(5, ge=1, le=50, description="返回数量"),
+    min_score: float = Query(0.0, ge=0, le=1, description="最低相似度"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_case_read)
+) -> List[SimilarCaseItem]:
+    """
+    查找与病例最相似的已有病例（需要 case:read 权限，只返回当前用户可访问的病例）
+
+    基于本地 TF-IDF 向量索引（CPU 计算，不调用外部服务），并附带每个相似病例的最新诊断，
+    便于医生参考或复用已有诊断。
+    """
+    case = db.query(MedicalCase).filter(MedicalCase.id == case_id).first()
+    if not case:
+        raise HTTPException(status_code=404, detail=f"病例 ID {case_id} 不存在")
+    if not can_access_all_cases(current_user) and case.created_by != current_user.id:
+        raise HTTPException(status_code=403, detail="无权访问此病例")
+
+    matches = await run_in_threadpool(
+        find_similar_cases, db, case.id, case.raw_report, similar_case_scope(current_user), k, min_score
     )
-    db.add(diagnosis_record)
+    if not matches:
+        return []
+
+    scores = dict(matches)
+    cases = {c.id: c for c in db.query(MedicalCase).filter(MedicalCase.id.in_(scores.keys()))}
+
+    # 每个相似病例的最新诊断（按病例表的 latest_diagnosis_id 主键查询，含已归档的记录）
+    latest_ids = [c.latest_diagnosis_id for c in cases.values() if c.latest_diagnosis_id is not None]
+    latest = {d.case_id: d for d in get_diagnoses_by_ids(db, latest_ids).values()}
+
+    items = []
+    for similar_case_id, score in matches:
+        similar_case = cases.get(similar_case_id)
+        if similar_case is None:
+            continue
+        diagnosis = latest.get(similar_case_id)
+        items.append(SimilarCaseItem(
+            case_id=similar_case.id,
+            patient_id=similar_case.patient_id,
+            patient_name=similar_case.patient_name,
+            chief_complaint=similar_case.chief_complaint,
+            similarity=round(score, 4),
+            latest_diagnosis_id=diagnosis.id if diagnosis else None,
+            latest_diagnosis_model=diagnosis.model_name if diagnosis else None,
+            latest_diagnosis_preview=diagnosis.preview if diagnosis else None
+        ))
+    return items
+
+
+# 单次对比请求最多包含的模型数
+COMPARE_MAX_MODELS = int(os.getenv("COMPARE_MAX_MODELS", "5"))
+
+
+class CompareDiagnosisRequest(BaseModel):
+    """多模型对比诊断请求参数"""
+    models: List[str] = Field(..., min_length=2)  # 参与对比的模型（去重后至少 2 个）
+    language: Optional[str] = "en"  # 输出语言 ('en' 或 'zh')
+    timeout_ms: Optional[int] = Field(None, gt=0)  # 时间预算（毫秒），所有模型共享
+
+
+class AgentUsageItem(BaseModel):
+    """单个智能体调用的耗时与 token 用量"""
+    agent: str
+    model: str
+    status: str
+    elapsed_ms: int
+    input_tokens: Optional[int] = None
+    output_tokens: Optional[int] = None
+
+
+class CompareDiagnosisItem(BaseModel):
+    """单个模型的对比结果（该模型失败时 diagnosis_id / diagnosis_markdown 为 None，error 为错误信息）"""
+    diagnosis_id: Optional[int] = None
+    model_name: str
+    diagnosis_markdown: Optional[str] = None
+    error: Optional[str] = None
+    execution_time_ms: int
+    input_tokens: Optional[int] = None  # 各智能体用量之和（服务商未返回用量时为 None）
+    output_tokens: Optional[int] = None
+    stages: List[AgentUsageItem]
+
+
+class CompareDiagnosisResponse(BaseModel):
+    """多模型对比诊断响应"""
+    case_id: int
+    comparison_group_id: str
+    total_time_ms: int
+    results: List[CompareDiagnosisItem]
+
+
+def _sum_tokens(usage: List[dict], key: str) -> Optional[int]:
+    """汇总 token 用量，全部缺失时返回 None"""
+    values = [u[key] for u in usage if u.get(key) is not None]
+    return sum(values) if values else None
+
+
+@app.post("/api/cases/{case_id}/compare", response_model=CompareDiagnosisResponse)
+async def compare_diagnosis(
+    case_id: int,
+    http_request: Request,
+    request: CompareDiagnosisRequest,
+    request_timeout_ms: Optional[int] = Header(None, alias="X-Request-Timeout-Ms", gt=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_diagnosis_execute)
+) -> CompareDiagnosisResponse:
+    """
+    多模型并排对比诊断（需要 diagnosis:execute 权限，访问规则同 run-diagnosis）
+
+    在一次请求中用多个模型并发运行完整的专科 + MDT 流水线（共享模型并发上限），
+    每个模型保存一条诊断历史，通过 comparison_group_id 关联，
+    并返回各模型各阶段的耗时与 token 用量。
+
+    模型名称在调用任何模型之前校验（不支持的模型返回 400）。
+    单个模型失败不影响其他模型：成功的模型照常保存并返回（调用费用已产生），
+    失败的模型不保存诊断记录，在结果中返回 error；全部模型失败时返回 502。
+    """
+    timeouts = [t for t in (request_timeout_ms, request.timeout_ms) if t]
+    deadline = Deadline.from_timeout_ms(min(timeouts)) if timeouts else None
+
+    case = db.query(MedicalCase).filter(MedicalCase.id == case_id).first()
+    if not case:
+        raise HTTPException(status_code=404, detail=f"病例 ID {case_id} 不存在")
+    check_diagnosis_access(case, current_user)
+
+    model_names = list(dict.fromkeys(request.models))
+    if len(model_names) < 2:
+        raise HTTPException(status_code=400, detail="对比至少需要 2 个不同的模型")
+    if len(model_names) > COMPARE_MAX_MODELS:
+        raise HTTPException(status_code=400, detail=f"单次对比最多 {COMPARE_MAX_MODELS} 个模型")
+    validate_model_names(db, model_names)
+
+    language = request.language or "en"
+    raw_report = case.raw_report
+    model_runtime = {model_name: get_model_runtime(db, model_name) for model_name in model_names}
+    # 结束读事务、归还写连接：模型调用期间不占用连接（写连接池默认只有一个连接）
     db.commit()
-    db.refresh(diagnosis_record)
 
-    # 5. 返回结果
-    return DiagnosisResponse(case_id=case_id, diagnosis_markdown=diagnosis_md)
+    async def run_one(model_name: str):
+        usage = []
+        start_time = time.time()
+        diagnosis_md, error = None, None
+        try:
+            diagnosis_md = await arun_multi_agent_diagnosis(
+                raw_report, model_name=model_name, language=language, deadline=deadline, usage=usage,
+                **model_runtime[model_name]
+            )
+        except Exception as e:
+            # 取消（CancelledError）不在此捕获，客户端断开时所有模型一起取消
+            print(f"❌ 对比诊断中模型 {model_name} 运行失败: {type(e).__name__}: {e}")
+            error = f"{type(e).__name__}: {e}"
+        return diagnosis_md, error, int((time.time() - start_time) * 1000), usage
+
+    start_time = time.time()
+    outputs = await cancel_on_disconnect(
+        http_request, asyncio.gather(*[run_one(model_name) for model_name in model_names])
+    )
+    total_time_ms = int((time.time() - start_time) * 1000)
+    if all(error is not None for _, error, _, _ in outputs):
+        raise HTTPException(status_code=502, detail="所有模型诊断均失败，请稍后重试")
+
+    comparison_group_id = uuid.uuid4().hex
+    run_timestamp = datetime.utcnow()
+    records = {}
+    for model_name, (diagnosis_md, error, execution_time_ms, _) in zip(model_names, outputs):
+        if error is None:
+            records[model_name] = DiagnosisHistory(
+                case_id=case_id,
+                diagnosis_markdown=diagnosis_md,
+                model_name=model_name,
+                run_timestamp=run_timestamp,
+                execution_time_ms=execution_time_ms,
+                comparison_group_id=comparison_group_id,
+                language=language
+            )
+    db.add_all(records.values())
+    db.commit()
+
+    results = []
+    for model_name, (diagnosis_md, error, execution_time_ms, usage) in zip(model_names, outputs):
+        record = records.get(model_name)
+        results.append(CompareDiagnosisItem(
+            diagnosis_id=record.id if record else None,
+            model_name=model_name,
+            diagnosis_markdown=diagnosis_md,
+            error=error,
+            execution_time_ms=execution_time_ms,
+            input_tokens=_sum_tokens(usage, "input_tokens"),
+            output_tokens=_sum_tokens(usage, "output_tokens"),
+            stages=[AgentUsageItem(**u) for u in usage]
+        ))
+
+    return CompareDiagnosisResponse(
+        case_id=case_id,
+        comparison_group_id=comparison_group_id,
+        total_time_ms=total_time_ms,
+        results=results
+    )
 
 
 class DiagnosisHistoryItem(BaseModel):
@@ -400,6 +932,10 @@ class DiagnosisHistoryItem(BaseModel):
     execution_time_ms: int
     diagnosis_preview: str
     diagnosis_full: Optional[str] = None
+    comparison_group_id: Optional[str] = None  # 多模型对比分组ID
+    language: Optional[str] = None  # 诊断结果语言（历史数据为空）
+    source_diagnosis_id: Optional[int] = None  # 翻译来源诊断ID
+    archived: bool = False  # 是否已移入归档库
 
     class Config:
         from_attributes = True
@@ -417,6 +953,8 @@ class DiagnosisHistoryResponse(BaseModel):
 @app.get("/api/cases/{case_id}/diagnoses", response_model=DiagnosisHistoryResponse)
 async def get_diagnosis_history(
     case_id: int,
+    request: Request,
+    response: Response,
     include_full: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_diagnosis_read)
@@ -429,6 +967,9 @@ async def get_diagnosis_history(
     参数:
     - case_id: 病例ID
     - include_full: 是否包含完整的诊断内容（默认只返回预览）
+
+    支持条件请求：ETag 由病例 updated_at、病例诊断统计（含已归档记录）与主库诊断记录数/最大ID计算，
+    命中 If-None-Match 时返回 304，不加载诊断全文
     """
     case = db.query(MedicalCase).filter(MedicalCase.id == case_id).first()
     if not case:
@@ -446,20 +987,38 @@ async def get_diagnosis_history(
     if not is_admin_or_doctor and case.created_by != current_user.id:
         raise HTTPException(status_code=403, detail="无权查看此病例的诊断历史")
 
-    diagnoses = db.query(DiagnosisHistory).filter(
-        DiagnosisHistory.case_id == case_id
-    ).order_by(DiagnosisHistory.run_timestamp.desc()).all()
+    # 诊断记录只增删不修改：病例的诊断统计覆盖主库与归档库中的增删，
+    # 主库记录数与最大ID的变化反映归档（记录移入归档库后 archived 标记改变）
+    hot_count, hot_max_id = db.query(
+        func.count(DiagnosisHistory.id),
+        func.max(DiagnosisHistory.id)
+    ).filter(DiagnosisHistory.case_id == case_id).one()
+    etag = compute_etag(
+        "diagnoses", case.id, case.updated_at,
+        case.diagnosis_count, case.latest_diagnosis_id, case.last_diagnosis_at,
+        hot_count, hot_max_id, include_full
+    )
+    cached = not_modified_response(request, etag)
+    if cached:
+        return cached
+    set_etag_headers(response, etag)
+
+    # 含已归档的诊断记录
+    diagnoses = list_case_diagnoses(db, case_id, include_full)
 
     history_items = []
     for d in diagnoses:
-        diagnosis_preview = d.diagnosis_markdown[:200] + "..." if len(d.diagnosis_markdown) > 200 else d.diagnosis_markdown
         item = DiagnosisHistoryItem(
             id=d.id,
             timestamp=d.run_timestamp,
             model=d.model_name,
             execution_time_ms=d.execution_time_ms,
-            diagnosis_preview=diagnosis_preview,
-            diagnosis_full=d.diagnosis_markdown if include_full else None
+            diagnosis_preview=d.preview,
+            diagnosis_full=d.diagnosis_markdown if include_full else None,
+            comparison_group_id=d.comparison_group_id,
+            language=d.language,
+            source_diagnosis_id=d.source_diagnosis_id,
+            archived=isinstance(d, ArchivedDiagnosis)
         )
         history_items.append(item)
 
@@ -476,28 +1035,154 @@ async def get_diagnosis_history(
 async def get_diagnosis_detail(
     case_id: int,
     diagnosis_id: int,
+    request: Request,
+    response: Response,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_diagnosis_read)
 ):
-    """获取单个诊断的完整详情（需要 diagnosis:read 权限）"""
-    diagnosis = db.query(DiagnosisHistory).filter(
-        DiagnosisHistory.id == diagnosis_id,
-        DiagnosisHistory.case_id == case_id
-    ).first()
+    """获取单个诊断的完整详情（需要 diagnosis:read 权限，支持 ETag 条件请求；含已归档的记录）"""
+    diagnosis = get_case_diagnosis(db, case_id, diagnosis_id)
 
     if not diagnosis:
         raise HTTPException(status_code=404, detail=f"诊断记录不存在")
 
+    # 诊断记录生成后不再修改，ID + 运行时间即可作为强校验值
+    etag = compute_etag("diagnosis", diagnosis.id, diagnosis.run_timestamp)
+    cached = not_modified_response(request, etag)
+    if cached:
+        return cached
+    set_etag_headers(response, etag)
+
     return {
         "id": diagnosis.id,
         "case_id": diagnosis.case_id,
         "timestamp": diagnosis.run_timestamp.isoformat(),
         "model": diagnosis.model_name,
         "execution_time_ms": diagnosis.execution_time_ms,
-        "diagnosis_markdown": diagnosis.diagnosis_markdown
+        "diagnosis_markdown": diagnosis.diagnosis_markdown,
+        "language": diagnosis.language,
+        "source_diagnosis_id": diagnosis.source_diagnosis_id
     }
 
 
+class TranslateDiagnosisRequest(BaseModel):
+    """翻译诊断请求参数"""
+    target_language: str = Field(..., pattern="^(en|zh)$")  # 目标语言
+
+
+class TranslateDiagnosisResponse(BaseModel):
+    """翻译诊断响应"""
+    diagnosis_id: int  # 翻译记录ID
+    source_diagnosis_id: int
+    case_id: int
+    language: str
+    model_name: str
+    diagnosis_markdown: str
+    execution_time_ms: Optional[int] = None
+    cached: bool  # 是否直接返回了已有的翻译
+
+
+def _translation_response(record: DiagnosisHistory, cached: bool) -> TranslateDiagnosisResponse:
+    return TranslateDiagnosisResponse(
+        diagnosis_id=record.id,
+        source_diagnosis_id=record.source_diagnosis_id,
+        case_id=record.case_id,
+        language=record.language,
+        model_name=record.model_name,
+        diagnosis_markdown=record.diagnosis_markdown,
+        execution_time_ms=record.execution_time_ms,
+        cached=cached
+    )
+
+
+@app.post("/api/cases/{case_id}/diagnoses/{diagnosis_id}/translate", response_model=TranslateDiagnosisResponse)
+async def translate_diagnosis(
+    case_id: int,
+    diagnosis_id: int,
+    http_request: Request,
+    request: TranslateDiagnosisRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_diagnosis_execute)
+) -> TranslateDiagnosisResponse:
+    """
+    将已有诊断翻译为另一种语言（需要 diagnosis:execute 权限，访问规则同 run-diagnosis）
+
+    只调用一次翻译模型（LLM_TRANSLATION_MODEL，未配置时依次回退到 LLM_FAST_MODEL、LLM_MODEL），
+    而不是用另一种语言重新运行四个智能体。翻译结果作为关联的诊断记录保存
+    （source_diagnosis_id 指向原诊断），同一 (原诊断, 目标语言) 只翻译一次，之后直接返回已有记录。
+    未记录语言的历史诊断视为英文（LEGACY_DIAGNOSIS_LANGUAGE）；原诊断已归档或删除时返回 404。
+    """
+    source = db.query(DiagnosisHistory).filter(
+        DiagnosisHistory.id == diagnosis_id,
+        DiagnosisHistory.case_id == case_id
+    ).first()
+    if not source:
+        raise HTTPException(status_code=404, detail="诊断记录不存在")
+    check_diagnosis_access(source.case, current_user)
+
+    # 对翻译记录再次翻译时，以原始诊断为来源（缓存键统一）
+    if source.source_diagnosis_id is not None:
+        source = db.query(DiagnosisHistory).filter(DiagnosisHistory.id == source.source_diagnosis_id).first()
+        if not source:
+            raise HTTPException(status_code=404, detail="原诊断记录不存在（可能已归档或删除）")
+
+    target_language = request.target_language
+    if (source.language or LEGACY_DIAGNOSIS_LANGUAGE) == target_language:
+        raise HTTPException(status_code=400, detail="诊断结果已是目标语言")
+
+    def find_translation() -> Optional[DiagnosisHistory]:
+        return db.query(DiagnosisHistory).filter(
+            DiagnosisHistory.source_diagnosis_id == source.id,
+            DiagnosisHistory.language == target_language
+        ).order_by(DiagnosisHistory.id.asc()).first()
+
+    existing = find_translation()
+    if existing:
+        return _translation_response(existing, cached=True)
+
+    source_id = source.id
+    source_markdown = source.diagnosis_markdown
+    source_model_name = source.model_name
+
+    # 原诊断使用本地模型时，翻译也使用同一本地模型，数据不发送到外部服务
+    local_provider = get_model_runtime(db, source.model_name, with_fast_model=False)["provider"]
+    # 结束读事务、归还写连接：模型调用期间不占用连接（写连接池默认只有一个连接）
+    db.commit()
+
+    async def execute_translation() -> int:
+        if local_provider:
+            translator = Translator(source_markdown, model_name=source_model_name, language=target_language,
+                                    provider=local_provider)
+        else:
+            translator = Translator(source_markdown, language=target_language)
+        start_time = time.time()
+        translated_md = await translator.arun()
+        execution_time_ms = int((time.time() - start_time) * 1000)
+        if not translated_md:
+            raise HTTPException(status_code=502, detail="翻译失败，请稍后重试")
+
+        record = DiagnosisHistory(
+            case_id=case_id,
+            diagnosis_markdown=translated_md.strip(),
+            model_name=translator.model_name,
+            run_timestamp=datetime.utcnow(),
+            execution_time_ms=execution_time_ms,
+            language=target_language,
+            source_diagnosis_id=source_id
+        )
+        db.add(record)
+        db.commit()
+        return record.id
+
+    # 并发的相同翻译请求只调用一次模型
+    translation_id, shared = await cancel_on_disconnect(
+        http_request,
+        DIAGNOSIS_SINGLE_FLIGHT.do(compute_fingerprint("translate", source_id, target_language), execute_translation)
+    )
+    record = db.query(DiagnosisHistory).filter(DiagnosisHistory.id == translation_id).first()
+    return _translation_response(record, cached=shared)
+
+
 class AllDiagnosisItem(BaseModel):
     """全局诊断历史列表项"""
     id: int
@@ -519,16 +1204,52 @@ class AllDiagnosisItem(BaseModel):
 
 class AllDiagnosisResponse(BaseModel):
     """全局诊断历史响应"""
-    total: int
+    total: int  # count_mode=none 时为 -1（未计数）
     page: int
     page_size: int
     items: List[AllDiagnosisItem]
+    next_cursor: Optional[str] = None  # 下一页游标，最后一页为 None
+
+
+# 全局诊断历史快速路径的字段顺序（与 AllDiagnosisItem 一致）
+ALL_DIAGNOSIS_FAST_FIELDS = (
+    "id", "case_id", "patient_id", "patient_name", "age", "gender", "model_name",
+    "run_timestamp", "execution_time_ms", "diagnosis_preview", "creator_username", "creator_full_name",
+)
+
+# 全局诊断历史总数缓存（count_mode=cached 时使用）
+DIAGNOSIS_COUNT_CACHE = CountCache(ttl_seconds=float(os.getenv("COUNT_CACHE_TTL_SECONDS", "60")))
+
+
+def _mark_diagnosis_counts_stale(mapper, connection, target):
+    """诊断增删、病例修改或删除会改变计数结果，标记所在会话，提交后清空总数缓存"""
+    session = object_session(target)
+    if session is not None:
+        session.info["diagnosis_counts_stale"] = True
+
+
+for _model, _event in ((DiagnosisHistory, "after_insert"), (DiagnosisHistory, "after_delete"),
+                       (MedicalCase, "after_update"), (MedicalCase, "after_delete")):
+    event.listen(_model, _event, _mark_diagnosis_counts_stale)
+
+
+@event.listens_for(Session, "after_commit")
+def _clear_stale_diagnosis_counts(session):
+    if session.info.pop("diagnosis_counts_stale", False):
+        DIAGNOSIS_COUNT_CACHE.clear()
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stale_diagnosis_counts(session):
+    session.info.pop("diagnosis_counts_stale", None)
 
 
 @app.get("/api/diagnoses/all", response_model=AllDiagnosisResponse)
 async def get_all_diagnoses(
-    page: int = 1,
-    page_size: int = 20,
+    page: int = Query(1, ge=1),
+    page_size: int = Query(20, ge=1, le=200),
+    cursor: Optional[str] = None,
+    count_mode: str = "exact",
     patient_id: Optional[str] = None,
     patient_name: Optional[str] = None,
     model: Optional[str] = None,
@@ -537,6 +1258,7 @@ async def get_all_diagnoses(
     creator_username: Optional[str] = None,
     sort: str = "run_timestamp",
     order: str = "desc",
+    fast: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_diagnosis_read)
 ):
@@ -546,8 +1268,10 @@ async def get_all_diagnoses(
     - 普通用户：只能查看自己创建的病例的诊断历史
 
     参数:
-    - page: 页码（从1开始）
+    - page: 页码（从1开始，未传 cursor 时使用 OFFSET 分页，兼容旧客户端）
     - page_size: 每页数量（默认20）
+    - cursor: 上一页响应中的 next_cursor；传入后按游标定位，忽略 page，深度翻页与第一页代价相同
+    - count_mode: 总数计算方式（exact: 精确计数；cached: 缓存计数，TTL 内复用；none: 不计数，total 返回 -1）
     - patient_id: 按病例号筛选
     - patient_name: 按患者姓名筛选（模糊匹配）
     - model: 按AI模型筛选
@@ -556,7 +1280,11 @@ async def get_all_diagnoses(
     - creator_username: 按创建者用户名筛选
     - sort: 排序字段（run_timestamp, model_name, patient_id）
     - order: 排序方向（asc, desc）
+    - fast: 快速序列化路径（只查询所需列，跳过 Pydantic 模型校验，使用 orjson）
     """
+    if count_mode not in ("exact", "cached", "none"):
+        raise HTTPException(status_code=400, detail="count_mode 必须是 'exact', 'cached' 或 'none'")
+
     # 检查用户权限级别
     is_admin_or_doctor = False
     if current_user.is_superuser:
@@ -565,17 +1293,12 @@ async def get_all_diagnoses(
         user_role_names = [role.name for role in current_user.roles]
         is_admin_or_doctor = 'admin' in user_role_names or 'doctor' in user_role_names
 
-    # 构建基础查询 - 使用 joinedload 优化关联查询
-    query = db.query(DiagnosisHistory).options(
-        joinedload(DiagnosisHistory.case).joinedload(MedicalCase.creator)
-    )
+    # 构建基础查询（筛选条件与计数共用，不附带预加载选项）
+    query = db.query(DiagnosisHistory).join(MedicalCase, DiagnosisHistory.case_id == MedicalCase.id)
 
     # 如果不是管理员或医生，只能查看自己创建的病例的诊断
     if not is_admin_or_doctor:
-        query = query.join(MedicalCase).filter(MedicalCase.created_by == current_user.id)
-    else:
-        # 确保已经 join MedicalCase（后续筛选需要）
-        query = query.join(MedicalCase)
+        query = query.filter(MedicalCase.created_by == current_user.id)
 
     # 应用筛选条件
     if patient_id:
@@ -606,32 +1329,89 @@ async def get_all_diagnoses(
             User.username.like(f"%{creator_username}%")
         )
 
-    # 获取总数
-    total = query.count()
+    # 获取总数（只计数诊断ID，不做预加载）
+    def count_total() -> int:
+        return query.with_entities(func.count(DiagnosisHistory.id)).order_by(None).scalar() or 0
 
-    # 应用排序
+    if count_mode == "exact":
+        total = count_total()
+    elif count_mode == "cached":
+        cache_key = (
+            "all" if is_admin_or_doctor else current_user.id,
+            patient_id, patient_name, model, created_from, created_to, creator_username
+        )
+        total = DIAGNOSIS_COUNT_CACHE.get_or_compute(cache_key, count_total)
+    else:
+        total = -1
+
+    # 应用排序（id 作为第二排序键，保证游标分页稳定）
     valid_sort_fields = {
         "run_timestamp": DiagnosisHistory.run_timestamp,
         "model_name": DiagnosisHistory.model_name,
         "patient_id": MedicalCase.patient_id,
     }
 
-    sort_field = valid_sort_fields.get(sort, DiagnosisHistory.run_timestamp)
-    if order.lower() == "asc":
-        query = query.order_by(sort_field.asc())
+    if sort not in valid_sort_fields:
+        sort = "run_timestamp"
+    order = normalize_order(order)
+    sort_field = valid_sort_fields[sort]
+
+    if cursor:
+        position = decode_cursor(cursor, sort, order)
+        query = query.filter(keyset_filter(sort_field, DiagnosisHistory.id, order, position["value"], position["id"]))
+    query = query.order_by(*keyset_order_by(sort_field, DiagnosisHistory.id, order))
+
+    if fast:
+        # 快速路径：只取列表所需列，创建者通过别名外连接取出（避免与 creator_username 筛选的 join 冲突）
+        creator = aliased(User)
+        query = query.outerjoin(creator, MedicalCase.created_by == creator.id).with_entities(
+            DiagnosisHistory.id,
+            DiagnosisHistory.case_id,
+            MedicalCase.patient_id,
+            MedicalCase.patient_name,
+            MedicalCase.age,
+            MedicalCase.gender,
+            DiagnosisHistory.model_name,
+            DiagnosisHistory.run_timestamp,
+            DiagnosisHistory.execution_time_ms,
+            # 诊断全文压缩存储，无法在 SQL 中截取；历史数据的预览已由迁移回填
+            func.coalesce(DiagnosisHistory.diagnosis_preview, "").label("diagnosis_preview"),
+            creator.username.label("creator_username"),
+            creator.full_name.label("creator_full_name"),
+        )
     else:
-        query = query.order_by(sort_field.desc())
+        # 复用已 join 的病例表填充关联对象，避免 joinedload 再次关联
+        query = query.options(
+            contains_eager(DiagnosisHistory.case).joinedload(MedicalCase.creator)
+        )
 
-    # 应用分页
-    offset = (page - 1) * page_size
-    diagnoses = query.offset(offset).limit(page_size).all()
+    # 应用分页（多取一行用于判断是否还有下一页）
+    if not cursor:
+        query = query.offset((page - 1) * page_size)
+    diagnoses = query.limit(page_size + 1).all()
+
+    next_cursor = None
+    if len(diagnoses) > page_size:
+        diagnoses = diagnoses[:page_size]
+        last = diagnoses[-1]
+        if sort == "patient_id" and not fast:
+            last_value = last.case.patient_id
+        else:
+            last_value = getattr(last, sort)
+        next_cursor = encode_cursor(sort, order, last_value, last.id)
+
+    if fast:
+        return FastJSONResponse(content={
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "items": rows_to_dicts(diagnoses, ALL_DIAGNOSIS_FAST_FIELDS),
+            "next_cursor": next_cursor,
+        })
 
     # 构建响应数据
     items = []
     for d in diagnoses:
-        # 生成诊断预览（前200字符）
-        diagnosis_preview = d.diagnosis_markdown[:200] + "..." if len(d.diagnosis_markdown) > 200 else d.diagnosis_markdown
-
         item = AllDiagnosisItem(
             id=d.id,
             case_id=d.case_id,
@@ -642,7 +1422,7 @@ async def get_all_diagnoses(
             model_name=d.model_name,
             run_timestamp=d.run_timestamp,
             execution_time_ms=d.execution_time_ms,
-            diagnosis_preview=diagnosis_preview,
+            diagnosis_preview=d.preview,
             creator_username=d.case.creator.username if d.case.creator else None,
             creator_full_name=d.case.creator.full_name if d.case.creator else None
         )
@@ -652,7 +1432,8 @@ async def get_all_diagnoses(
         total=total,
         page=page,
         page_size=page_size,
-        items=items
+        items=items,
+        next_cursor=next_cursor
     )
 
 
@@ -668,6 +1449,7 @@ class ImportCasesResponse(BaseModel):
 @app.post("/api/cases/import", response_model=ImportCasesResponse)
 async def import_cases(
     file: UploadFile = File(...),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key"),
     db: Session = Depends(get_db),
     current_user: User = Depends(require_case_create)
 ) -> ImportCasesResponse:
@@ -677,102 +1459,55 @@ async def import_cases(
     支持的文件格式：
     - JSON 文件：包含病例数组，每个病例需包含必要字段
     - TXT 文件：纯文本病历报告（每个文件作为一个病例）
+
+    支持 Idempotency-Key 请求头：重试时携带相同的键将返回首次导入的结果，不会重复导入
     """
     if not file.filename:
         raise HTTPException(status_code=400, detail="未选择文件")
 
-    filename = file.filename.lower()
+    # 结束权限校验的读事务、归还写连接后再读取上传文件
+    db.commit()
+    content = await file.read()
+
+    idem = await begin_idempotent_request(
+        db, idempotency_key, current_user.id,
+        "POST /api/cases/import",
+        compute_fingerprint(file.filename, content)
+    )
+    if idem.replay is not None:
+        return idem.replay
+
+    try:
+        result = _import_cases_content(file.filename, content, db, current_user)
+        complete_idempotent_request(db, idem, 200, result.model_dump(mode="json"))
+    finally:
+        # 导入失败或被取消时删除幂等登记记录
+        abandon_idempotent_request(db, idem)
+    return result
+
+
+def _import_cases_content(
+    original_filename: str,
+    content: bytes,
+    db: Session,
+    current_user: User
+) -> ImportCasesResponse:
+    """解析上传文件内容并导入病例"""
+    filename = original_filename.lower()
     success_count = 0
     failed_count = 0
     failed_cases = []
 
     try:
-        content = await file.read()
-
         # 处理 JSON 文件
         if filename.endswith('.json'):
             try:
                 data = json.loads(content.decode('utf-8'))
                 cases_data = data if isinstance(data, list) else [data]
 
-                for idx, case_data in enumerate(cases_data):
-                    try:
-                        # 验证必填字段（patient_id 不再必填，将自动生成）
-                        required_fields = ['patient_name', 'age', 'gender', 'chief_complaint']
-                        missing_fields = [f for f in required_fields if f not in case_data]
-                        if missing_fields:
-                            failed_cases.append({
-                                "index": idx,
-                                "patient_name": case_data.get('patient_name', 'unknown'),
-                                "error": f"缺少必填字段: {', '.join(missing_fields)}"
-                            })
-                            failed_count += 1
-                            continue
-
-                        # 生成病例编号（如果未提供）
-                        if 'patient_id' not in case_data or not case_data['patient_id']:
-                            patient_id = generate_case_id(
-                                case_data['gender'],
-                                case_data['age'],
-                                datetime.now()
-                            )
-                        else:
-                            patient_id = case_data['patient_id']
-
-                        # 检查是否已存在
-                        existing = db.query(MedicalCase).filter(
-                            MedicalCase.patient_id == patient_id
-                        ).first()
-                        if existing:
-                            # 如果冲突，重新生成
-                            patient_id = generate_case_id(
-                                case_data['gender'],
-                                case_data['age'],
-                                datetime.now()
-                            )
-
-                        # 使用格式化器生成报告（如果提供了 raw_report 则直接使用）
-                        if 'raw_report' in case_data and case_data['raw_report']:
-                            raw_report = case_data['raw_report']
-                        else:
-                            raw_report = CaseFormatter.format_case_report(
-                                patient_id=patient_id,
-                                patient_name=case_data['patient_name'],
-                                age=case_data['age'],
-                                gender=case_data['gender'],
-                                chief_complaint=case_data['chief_complaint'],
-                                medical_history=case_data.get('medical_history'),
-                                family_history=case_data.get('family_history'),
-                                lifestyle_factors=case_data.get('lifestyle_factors'),
-                                medications=case_data.get('medications'),
-                                lab_results=case_data.get('lab_results'),
-                                physical_exam=case_data.get('physical_exam'),
-                                vital_signs=case_data.get('vital_signs'),
-                                language=case_data.get('language', 'en')
-                            )
-
-                        # 创建病例
-                        new_case = MedicalCase(
-                            patient_id=patient_id,
-                            patient_name=case_data['patient_name'],
-                            age=case_data['age'],
-                            gender=case_data['gender'],
-                            chief_complaint=case_data['chief_complaint'],
-                            raw_report=raw_report,
-                            created_by=current_user.id  # 记录创建者ID
-                        )
-                        db.add(new_case)
-                        db.commit()
-                        success_count += 1
-
-                    except Exception as e:
-                        db.rollback()
-                        failed_cases.append({
-                            "index": idx,
-                            "patient_name": case_data.get('patient_name', 'unknown'),
-                            "error": str(e)
-                        })
-                        failed_count += 1
+                # 批量导入：先校验全部记录、批量分配编号，再分块插入（见 api/utils/case_import.py）
+                success_count, failed_cases = import_case_records(db, cases_data, current_user.id)
+                failed_count = len(failed_cases)
 
             except json.JSONDecodeError:
                 raise HTTPException(status_code=400, detail="无效的 JSON 文件格式")
@@ -794,26 +1529,13 @@ async def import_cases(
                     })
                     failed_count = 1
                 else:
-                    # 生成病例编号（忽略TXT中可能存在的patient_id）
-                    patient_id = generate_case_id(
+                    # 分配病例编号（忽略TXT中可能存在的patient_id）
+                    patient_id = allocate_case_id(
+                        db,
                         parse_result.data['gender'],
-                        parse_result.data['age'],
-                        datetime.now()
+                        parse_result.data['age']
                     )
 
-                    # 检查是否冲突
-                    existing = db.query(MedicalCase).filter(
-                        MedicalCase.patient_id == patient_id
-                    ).first()
-
-                    if existing:
-                        # 冲突时重新生成
-                        patient_id = generate_case_id(
-                            parse_result.data['gender'],
-                            parse_result.data['age'],
-                            datetime.now()
-                        )
-
                     # 生成格式化报告
                     raw_report = CaseFormatter.format_case_report(
                         patient_id=patient_id,
@@ -964,21 +1686,8 @@ async def update_case(
         effective_age = request.age if request.age is not None else case.age
         effective_gender = request.gender if request.gender is not None else case.gender
 
-        # 生成新的病例号（基于更新时间）
-        current_time = datetime.now()
-        new_patient_id = generate_case_id(effective_gender or "", int(effective_age or 0), current_time)
-
-        # 极低概率冲突：等待1秒后重试一次
-        existing_case = db.query(MedicalCase).filter(
-            MedicalCase.patient_id == new_patient_id,
-            MedicalCase.id != case_id
-        ).first()
-        if existing_case:
-            time.sleep(1)
-            current_time = datetime.now()
-            new_patient_id = generate_case_id(effective_gender or "", int(effective_age or 0), current_time)
-
-        update_data['patient_id'] = new_patient_id
+        # 分配新的病例号（基于更新时间）
+        update_data['patient_id'] = allocate_case_id(db, effective_gender or "", int(effective_age or 0))
         need_regenerate = True
 
     # 如果有任何字段更新，重新生成报告
@@ -1035,8 +1744,12 @@ async def delete_case(
     if not is_admin:
         raise HTTPException(status_code=403, detail="只有管理员可以删除病例")
 
-    # 删除相关的诊断历史
+    # 删除相关的诊断历史（批量删除不触发 ORM 事件，先释放诊断分段引用的内容块并移出全文索引）
+    diagnosis_ids = [row.id for row in db.query(DiagnosisHistory.id).filter(DiagnosisHistory.case_id == case_id)]
+    release_diagnoses(db.connection(), diagnosis_ids)
+    remove_diagnoses(db.connection(), diagnosis_ids)
     db.query(DiagnosisHistory).filter(DiagnosisHistory.case_id == case_id).delete()
+    delete_archived_diagnoses(db, case_id)
 
     # 删除病例
     db.delete(case)
@@ -1064,10 +1777,8 @@ async def export_latest_diagnosis(
     if not case:
         raise HTTPException(status_code=404, detail=f"病例 ID {case_id} 不存在")
 
-    # 查询最新的诊断记录
-    latest_diagnosis = db.query(DiagnosisHistory).filter(
-        DiagnosisHistory.case_id == case_id
-    ).order_by(DiagnosisHistory.run_timestamp.desc()).first()
+    # 最新的诊断记录（病例表维护的 latest_diagnosis_id，主键查询，含已归档的记录）
+    latest_diagnosis = get_case_diagnosis(db, case_id, case.latest_diagnosis_id) if case.latest_diagnosis_id else None
 
     if not latest_diagnosis:
         raise HTTPException(status_code=404, detail=f"病例 {case_id} 还没有诊断记录")
@@ -1155,11 +1866,8 @@ async def export_specific_diagnosis(
     if not case:
         raise HTTPException(status_code=404, detail=f"病例 ID {case_id} 不存在")
 
-    # 查询指定的诊断记录
-    diagnosis = db.query(DiagnosisHistory).filter(
-        DiagnosisHistory.id == diagnosis_id,
-        DiagnosisHistory.case_id == case_id
-    ).first()
+    # 查询指定的诊断记录（含已归档的记录）
+    diagnosis = get_case_diagnosis(db, case_id, diagnosis_id)
 
     if not diagnosis:
         raise HTTPException(status_code=404, detail=f"诊断记录 ID {diagnosis_id} 不存在")
@@ -1262,11 +1970,8 @@ async def export_diagnoses_batch(
         with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
             # 遍历每个诊断ID
             for diagnosis_id in request.diagnosis_ids:
-                # 查询诊断记录
-                diagnosis = db.query(DiagnosisHistory).filter(
-                    DiagnosisHistory.id == diagnosis_id,
-                    DiagnosisHistory.case_id == case_id
-                ).first()
+                # 查询诊断记录（含已归档的记录）
+                diagnosis = get_case_diagnosis(db, case_id, diagnosis_id)
 
                 if not diagnosis:
                     continue  # 跳过不存在的诊断记录
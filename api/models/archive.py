@@ -0,0 +1,119 @@
+"""诊断历史归档库（冷数据）
+
+超过保留期的诊断记录由 api/archive_diagnoses.py 移入单独的 SQLite 文件（默认与主库同目录的
+<主库名>_archive.db，可用 ARCHIVE_DATABASE_PATH 指定），主库的 diagnosis_history 及其索引只保留近期数据。
+
+- 归档库按需以 archive 模式名 ATTACH 到当前连接（attach_archive），不存在时视为没有归档数据
+- 归档记录保留原诊断ID，诊断全文完整压缩存储（不再引用主库的分段与内容块），不参与全文检索
+- 主库 diagnosis_history 使用 AUTOINCREMENT（迁移 0017），新诊断ID不会复用已归档的ID（reserve_archived_ids）
+- 归档表不在 Base.metadata 中（不由 Alembic 管理，首次归档时创建）
+- 非 SQLite 数据库不支持归档
+"""
+import os
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import Column, Integer, String, DateTime, Index, func, select, text
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import deferred
+
+from api.db.compressed_text import CompressedText
+
+ARCHIVE_SCHEMA = "archive"
+# 归档库路径（为空时由主库路径推导）
+ARCHIVE_DATABASE_PATH = os.getenv("ARCHIVE_DATABASE_PATH") or None
+
+# 归档库单独的元数据（不随 Base.metadata 建表，也不参与迁移比对）
+ArchiveBase = declarative_base()
+
+
+class ArchivedDiagnosis(ArchiveBase):
+    """已归档的诊断记录（字段与 DiagnosisHistory 一致）"""
+    __tablename__ = "diagnosis_history"
+    __table_args__ = (
+        Index("ix_archived_diagnosis_case_id_run_timestamp", "case_id", "run_timestamp"),
+        {"schema": ARCHIVE_SCHEMA},
+    )
+
+    id = Column(Integer, primary_key=True, autoincrement=False, comment="原诊断ID")
+    case_id = Column(Integer, nullable=False, comment="关联病例ID")
+    diagnosis_markdown = deferred(Column(CompressedText, nullable=False, comment="AI 诊断结果（压缩存储）"))
+    diagnosis_preview = Column(String(255), comment="诊断预览")
+    model_name = Column(String(50), comment="使用的模型名称")
+    run_timestamp = Column(DateTime, comment="诊断运行时间")
+    execution_time_ms = Column(Integer, comment="执行耗时（毫秒）")
+    comparison_group_id = Column(String(32), comment="多模型对比分组ID")
+    language = Column(String(10), comment="诊断结果语言")
+    source_diagnosis_id = Column(Integer, comment="翻译来源诊断ID")
+    archived_at = Column(DateTime, default=datetime.utcnow, comment="归档时间")
+
+    @property
+    def preview(self) -> str:
+        return self.diagnosis_preview or ""
+
+    def __repr__(self):
+        return f"<ArchivedDiagnosis(id={self.id}, case_id={self.case_id}, model='{self.model_name}')>"
+
+
+def archive_database_path(connection) -> Optional[str]:
+    """归档库文件路径；主库为内存数据库且未配置 ARCHIVE_DATABASE_PATH 时返回 None"""
+    if connection.dialect.name != "sqlite":
+        return None
+    if ARCHIVE_DATABASE_PATH:
+        return ARCHIVE_DATABASE_PATH
+    main_file = next((row[2] for row in connection.exec_driver_sql("PRAGMA database_list") if row[1] == "main"), "")
+    if not main_file:
+        return None
+    stem, ext = os.path.splitext(main_file)
+    return f"{stem}_archive{ext or '.db'}"
+
+
+def is_archive_attached(connection) -> bool:
+    if connection.dialect.name != "sqlite":
+        return False
+    return any(row[1] == ARCHIVE_SCHEMA for row in connection.exec_driver_sql("PRAGMA database_list"))
+
+
+def attach_archive(connection, create: bool = False) -> bool:
+    """
+    将归档库 ATTACH 到当前连接（连接归还连接池后保持 ATTACH），返回归档库是否可用
+
+    create=False 时归档库文件不存在即返回 False；create=True 时创建归档库与归档表
+    """
+    if is_archive_attached(connection):
+        if create:
+            ArchiveBase.metadata.create_all(bind=connection)
+        return True
+    path = archive_database_path(connection)
+    if path is None or not (create or os.path.exists(path)):
+        return False
+    connection.execute(text(f"ATTACH DATABASE :path AS {ARCHIVE_SCHEMA}"), {"path": path})
+    if create:
+        # auto_vacuum 只能在建表前设置
+        connection.exec_driver_sql(f"PRAGMA {ARCHIVE_SCHEMA}.auto_vacuum = INCREMENTAL")
+        ArchiveBase.metadata.create_all(bind=connection)
+    return True
+
+
+def has_autoincrement(connection) -> bool:
+    """主库 diagnosis_history 是否使用 AUTOINCREMENT（未使用时 SQLite 按 max(rowid) + 1 分配ID，会复用已归档的ID）"""
+    sql = connection.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'diagnosis_history'"
+    ).scalar()
+    return "AUTOINCREMENT" in (sql or "").upper()
+
+
+def reserve_archived_ids(connection) -> None:
+    """将主库 diagnosis_history 的 AUTOINCREMENT 序号提高到不低于归档库中的最大诊断ID"""
+    if not attach_archive(connection):
+        return
+    archived_max = connection.execute(select(func.max(ArchivedDiagnosis.id))).scalar()
+    if archived_max is None:
+        return
+    seq = connection.exec_driver_sql("SELECT seq FROM sqlite_sequence WHERE name = 'diagnosis_history'").first()
+    if seq is None:
+        connection.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('diagnosis_history', :seq)"),
+                           {"seq": archived_max})
+    elif seq[0] < archived_max:
+        connection.execute(text("UPDATE sqlite_sequence SET seq = :seq WHERE name = 'diagnosis_history'"),
+                           {"seq": archived_max})
@@ -1,13 +1,36 @@
 """数据库模型定义"""
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
-from sqlalchemy.orm import relationship
+from typing import Iterable, List, Optional
+
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Index, event, inspect as sa_inspect, \
+    and_, case, or_, select, update, func
+from sqlalchemy.orm import relationship, deferred, validates
+from sqlalchemy.orm.attributes import flag_modified
 from datetime import datetime
 from api.db.database import Base
+from api.db.compressed_text import CompressedText
+from api.db.fulltext import CASE_COLUMNS as FULLTEXT_CASE_COLUMNS, index_case, index_diagnosis, remove_cases, \
+    remove_diagnoses
+from api.models.archive import ArchivedDiagnosis, attach_archive
+from api.models.content import DiagnosisSection, release_diagnoses, split_sections, store_sections
+
+# 列表页预览长度（字符数）
+PREVIEW_LENGTH = 200
+
+
+def make_preview(text, length: int = PREVIEW_LENGTH):
+    """截取文本前 length 个字符作为预览，超出部分以省略号表示"""
+    if text is None:
+        return None
+    return text[:length] + "..." if len(text) > length else text
 
 
 class MedicalCase(Base):
     """医疗病例表"""
     __tablename__ = "medical_cases"
+    __table_args__ = (
+        # 普通用户的病例列表：只看自己创建的病例，按创建时间排序
+        Index("ix_medical_cases_created_by_created_at", "created_by", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     patient_id = Column(String(50), unique=True, nullable=False, index=True, comment="患者病历号")
@@ -15,10 +38,16 @@ class MedicalCase(Base):
     age = Column(Integer, comment="年龄")
     gender = Column(String(10), comment="性别: male/female/other")
     chief_complaint = Column(Text, comment="主诉")
-    raw_report = Column(Text, nullable=False, comment="原始病历全文")
-    created_by = Column(Integer, ForeignKey("users.id"), nullable=True, index=True, comment="创建者用户ID")
-    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    # 大文本列默认延迟加载：列表查询只读取小字段，访问属性时才单独加载；压缩存储，读写时透明解压
+    raw_report = deferred(Column(CompressedText, nullable=False, comment="原始病历全文"))
+    report_summary = Column(String(255), comment="病历摘要（raw_report 前200字符，写入时生成）")
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=True, comment="创建者用户ID")
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow, comment="创建时间")
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment="更新时间")
+    # 诊断统计（冗余字段）：诊断记录增删时由下方 ORM 事件在同一事务内维护，可用 api/check_case_counters.py 校验
+    diagnosis_count = Column(Integer, nullable=False, default=0, server_default="0", comment="诊断记录数")
+    last_diagnosis_at = Column(DateTime, nullable=True, comment="最新诊断运行时间")
+    latest_diagnosis_id = Column(Integer, nullable=True, comment="最新诊断ID（按运行时间、ID 取最新）")
 
     # 关联诊断历史（一对多）
     diagnoses = relationship("DiagnosisHistory", back_populates="case", cascade="all, delete-orphan")
@@ -26,23 +55,201 @@ class MedicalCase(Base):
     # 关联创建者（多对一）
     creator = relationship("User", foreign_keys=[created_by])
 
+    @validates("raw_report")
+    def _sync_report_summary(self, key, value):
+        """写入病历全文时同步生成摘要"""
+        self.report_summary = make_preview(value)
+        return value
+
     def __repr__(self):
         return f"<MedicalCase(id={self.id}, patient_name='{self.patient_name}', patient_id='{self.patient_id}')>"
 
 
+class CaseIdSequence(Base):
+    """病例编号序号表（每个 年月日时分+性别+年龄 前缀一行，由 api/utils/case_id_generator.py 原子递增）"""
+    __tablename__ = "case_id_sequences"
+
+    prefix = Column(String(20), primary_key=True, comment="病例编号前缀（年月日时分 + 性别 + 年龄）")
+    last_value = Column(Integer, nullable=False, default=0, comment="该前缀已分配的最大序号")
+
+    def __repr__(self):
+        return f"<CaseIdSequence(prefix='{self.prefix}', last_value={self.last_value})>"
+
+
 class DiagnosisHistory(Base):
     """诊断历史记录表"""
     __tablename__ = "diagnosis_history"
+    __table_args__ = (
+        # 病例诊断历史（按时间倒序）与最新诊断查询
+        Index("ix_diagnosis_history_case_id_run_timestamp", "case_id", "run_timestamp"),
+        # 全局诊断列表按模型筛选、按时间排序
+        Index("ix_diagnosis_history_model_name_run_timestamp", "model_name", "run_timestamp"),
+        # SQLite 默认按 max(rowid) + 1 分配ID，会复用已归档或已删除的诊断ID（见 api/models/archive.py）
+        {"sqlite_autoincrement": True},
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    case_id = Column(Integer, ForeignKey("medical_cases.id", ondelete="CASCADE"), nullable=False, index=True, comment="关联病例ID")
-    diagnosis_markdown = Column(Text, nullable=False, comment="AI 诊断结果（Markdown格式）")
-    model_name = Column(String(50), default="gemini-2.5-flash", comment="使用的模型名称")
-    run_timestamp = Column(DateTime, default=datetime.utcnow, index=True, comment="诊断运行时间")
+    case_id = Column(Integer, ForeignKey("medical_cases.id", ondelete="CASCADE"), nullable=False, comment="关联病例ID")
+    diagnosis_preview = Column(String(255), comment="诊断预览（前200字符，写入时生成）")
+    model_name = Column(String(50), nullable=False, default="gemini-2.5-flash", comment="使用的模型名称")
+    run_timestamp = Column(DateTime, nullable=False, default=datetime.utcnow, index=True, comment="诊断运行时间")
     execution_time_ms = Column(Integer, comment="执行耗时（毫秒）")
+    comparison_group_id = Column(String(32), nullable=True, index=True, comment="多模型对比分组ID（同一次对比的记录相同）")
+    language = Column(String(10), nullable=True, comment="诊断结果语言: en/zh（历史数据为空）")
+    source_diagnosis_id = Column(Integer, ForeignKey("diagnosis_history.id", ondelete="CASCADE"), nullable=True, index=True,
+                                 comment="翻译来源诊断ID（翻译记录才有值）")
 
     # 关联病例（多对一）
     case = relationship("MedicalCase", back_populates="diagnoses")
 
+    # 诊断全文的分段（内容寻址去重存储，见 api/models/content.py）；只读，写入由下方 ORM 事件完成
+    sections = relationship(DiagnosisSection, order_by=DiagnosisSection.position, viewonly=True)
+
+    @property
+    def diagnosis_markdown(self) -> str:
+        """AI 诊断结果（Markdown格式），由分段拼接还原"""
+        if "_diagnosis_markdown" not in self.__dict__:
+            self._diagnosis_markdown = "".join(section.blob.content for section in self.sections)
+        return self._diagnosis_markdown
+
+    @diagnosis_markdown.setter
+    def diagnosis_markdown(self, value: str):
+        """写入诊断全文：同步生成预览，分段在 flush 时写入"""
+        self._diagnosis_markdown = value
+        self._pending_sections = split_sections(value)
+        self.diagnosis_preview = make_preview(value)
+        if sa_inspect(self).persistent:
+            # 预览不变时也要触发 UPDATE，以便 after_update 事件替换分段
+            flag_modified(self, "diagnosis_preview")
+
+    @property
+    def preview(self) -> str:
+        """诊断预览（历史数据未回填时回退为截取全文）"""
+        return self.diagnosis_preview or make_preview(self.diagnosis_markdown) or ""
+
     def __repr__(self):
         return f"<DiagnosisHistory(id={self.id}, case_id={self.case_id}, model='{self.model_name}')>"
+
+
+def _latest_diagnosis(table, column):
+    """病例在 table 中最新一条诊断的指定列（关联子查询，走 (case_id, run_timestamp) 索引）"""
+    return (
+        select(column).where(table.c.case_id == MedicalCase.__table__.c.id)
+        .order_by(table.c.run_timestamp.desc(), table.c.id.desc()).limit(1).scalar_subquery()
+    )
+
+
+def _actual_counters(connection):
+    """
+    由诊断记录重新计算的 (诊断数, 最新诊断时间, 最新诊断ID)
+
+    归档库存在时一并统计已归档的记录（两张表分别走索引查询，再合并）
+    """
+    hot = DiagnosisHistory.__table__
+    count = select(func.count()).where(hot.c.case_id == MedicalCase.__table__.c.id).scalar_subquery()
+    last_at = _latest_diagnosis(hot, hot.c.run_timestamp)
+    latest_id = _latest_diagnosis(hot, hot.c.id)
+    if not attach_archive(connection):
+        return count, last_at, latest_id
+
+    archived = ArchivedDiagnosis.__table__
+    archived_count = select(func.count()).where(archived.c.case_id == MedicalCase.__table__.c.id).scalar_subquery()
+    archived_last_at = _latest_diagnosis(archived, archived.c.run_timestamp)
+    archived_latest_id = _latest_diagnosis(archived, archived.c.id)
+    archived_is_latest = and_(archived_latest_id.isnot(None), or_(
+        latest_id.is_(None), archived_last_at > last_at, and_(archived_last_at == last_at, archived_latest_id > latest_id)
+    ))
+    return (
+        count + archived_count,
+        case((archived_is_latest, archived_last_at), else_=last_at),
+        case((archived_is_latest, archived_latest_id), else_=latest_id),
+    )
+
+
+def refresh_case_counters(connection, case_ids: Optional[Iterable[int]] = None) -> int:
+    """由诊断记录重新计算病例的诊断统计（case_ids 为空时处理全部病例），返回更新的病例数"""
+    cases = MedicalCase.__table__
+    diagnosis_count, last_diagnosis_at, latest_diagnosis_id = _actual_counters(connection)
+    stmt = update(cases).values(
+        diagnosis_count=diagnosis_count, last_diagnosis_at=last_diagnosis_at,
+        latest_diagnosis_id=latest_diagnosis_id,
+        # 统计字段不是病例内容的修改，不更新 updated_at
+        updated_at=cases.c.updated_at,
+    )
+    if case_ids is not None:
+        stmt = stmt.where(cases.c.id.in_(list(case_ids)))
+    return connection.execute(stmt).rowcount
+
+
+def check_case_counters(connection, limit: Optional[int] = None) -> List[dict]:
+    """返回诊断统计与诊断记录不一致的病例（存储值与实际值）"""
+    cases = MedicalCase.__table__
+    actual = _actual_counters(connection)
+    stored = (cases.c.diagnosis_count, cases.c.last_diagnosis_at, cases.c.latest_diagnosis_id)
+    query = select(cases.c.id, *stored, *[value.label(f"actual_{column.name}") for column, value in zip(stored, actual)]) \
+        .where(or_(*[column.is_distinct_from(value) for column, value in zip(stored, actual)])) \
+        .order_by(cases.c.id).limit(limit)
+    return [dict(row._mapping) for row in connection.execute(query)]
+
+
+@event.listens_for(MedicalCase, "after_insert")
+def _index_inserted_case(mapper, connection, target):
+    index_case(connection, target.id, {column: target.__dict__.get(column) for column in FULLTEXT_CASE_COLUMNS})
+
+
+@event.listens_for(MedicalCase, "after_update")
+def _index_updated_case(mapper, connection, target):
+    state = sa_inspect(target)
+    index_case(connection, target.id, {
+        column: target.__dict__.get(column) for column in FULLTEXT_CASE_COLUMNS
+        if state.attrs[column].history.has_changes()
+    })
+
+
+@event.listens_for(MedicalCase, "after_delete")
+def _unindex_deleted_case(mapper, connection, target):
+    remove_cases(connection, [target.id])
+
+
+def _store_pending_sections(connection, target) -> None:
+    sections = target.__dict__.pop("_pending_sections", None)
+    if sections is not None:
+        store_sections(connection, {target.id: sections})
+        index_diagnosis(connection, target.id, target.__dict__["_diagnosis_markdown"])
+
+
+def _count_inserted_diagnosis(connection, target) -> None:
+    """诊断数加一，新诊断不早于当前最新诊断时替换最新诊断（单条 UPDATE，并发写入也不会丢失计数）"""
+    cases = MedicalCase.__table__
+    is_latest = or_(cases.c.latest_diagnosis_id.is_(None), cases.c.last_diagnosis_at <= target.run_timestamp)
+    connection.execute(update(cases).where(cases.c.id == target.case_id).values(
+        diagnosis_count=cases.c.diagnosis_count + 1,
+        last_diagnosis_at=case((is_latest, target.run_timestamp), else_=cases.c.last_diagnosis_at),
+        latest_diagnosis_id=case((is_latest, target.id), else_=cases.c.latest_diagnosis_id),
+        updated_at=cases.c.updated_at,
+    ))
+
+
+@event.listens_for(DiagnosisHistory, "after_insert")
+def _store_inserted_sections(mapper, connection, target):
+    _store_pending_sections(connection, target)
+    _count_inserted_diagnosis(connection, target)
+
+
+@event.listens_for(DiagnosisHistory, "after_update")
+def _replace_updated_sections(mapper, connection, target):
+    if "_pending_sections" in target.__dict__:
+        release_diagnoses(connection, [target.id])
+        _store_pending_sections(connection, target)
+
+
+@event.listens_for(DiagnosisHistory, "before_delete")
+def _release_deleted_sections(mapper, connection, target):
+    release_diagnoses(connection, [target.id])
+    remove_diagnoses(connection, [target.id])
+
+
+@event.listens_for(DiagnosisHistory, "after_delete")
+def _recount_deleted_diagnosis(mapper, connection, target):
+    # 删除较少见，直接按剩余诊断记录重新计算该病例的统计
+    refresh_case_counters(connection, [target.case_id])
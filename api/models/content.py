@@ -0,0 +1,130 @@
+"""内容寻址的诊断分段存储
+
+同一病历、同一模型（temperature=0）重复诊断时，专科报告与 MDT 汇总往往逐字节相同。
+诊断结果按 markdown 标题（1~3 级）切分为分段，每个分段以内容的 SHA-256 为键存入 content_blobs
+（压缩存储、带引用计数）；诊断记录只保存有序的分段引用（diagnosis_sections），读取时拼接还原。
+重复诊断只新增引用行，不再重复存储全文。
+
+- 写入 / 删除诊断记录时由 api/models/case.py 中的 ORM 事件维护分段与引用计数
+- 批量删除诊断记录（Query.delete）不会触发 ORM 事件，需先调用 release_diagnoses
+- 引用计数的增加与内容块的插入在同一条 upsert 中完成：PostgreSQL 等多写者数据库上，
+  并发的 release_diagnoses 可能恰好删除了引用计数归零的内容块，先插入再单独加计数会更新不到行，
+  随后写入分段引用违反外键；upsert 在冲突行被并发删除时会改为插入
+"""
+import hashlib
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List
+
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, delete, insert, select, update, func, bindparam
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import relationship
+
+from api.db.database import Base
+from api.db.compressed_text import CompressedText
+
+# 在 1~3 级标题行之前切分（切分后的分段依次拼接即为原文）
+SECTION_BOUNDARY = re.compile(r"(?m)^(?=#{1,3} )")
+
+
+def split_sections(markdown: str) -> List[str]:
+    """按 1~3 级标题切分 markdown，"".join(结果) == markdown"""
+    return [section for section in SECTION_BOUNDARY.split(markdown) if section]
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ContentBlob(Base):
+    """内容块表（按内容哈希去重）"""
+    __tablename__ = "content_blobs"
+
+    hash = Column(String(64), primary_key=True, comment="内容 SHA-256（十六进制）")
+    content = Column(CompressedText, nullable=False, comment="内容（压缩存储）")
+    size = Column(Integer, nullable=False, comment="原文字节数")
+    ref_count = Column(Integer, nullable=False, default=0, comment="引用该内容块的分段数")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+
+    def __repr__(self):
+        return f"<ContentBlob(hash='{self.hash[:12]}', size={self.size}, ref_count={self.ref_count})>"
+
+
+class DiagnosisSection(Base):
+    """诊断分段表（诊断记录 -> 有序的内容块引用）"""
+    __tablename__ = "diagnosis_sections"
+
+    diagnosis_id = Column(Integer, ForeignKey("diagnosis_history.id", ondelete="CASCADE"), primary_key=True,
+                          comment="关联诊断ID")
+    position = Column(Integer, primary_key=True, comment="分段序号（从 0 开始）")
+    blob_hash = Column(String(64), ForeignKey("content_blobs.hash"), nullable=False, index=True,
+                       comment="内容块哈希")
+
+    blob = relationship("ContentBlob", lazy="joined", viewonly=True)
+
+    def __repr__(self):
+        return f"<DiagnosisSection(diagnosis_id={self.diagnosis_id}, position={self.position})>"
+
+
+def _upsert_add_refs(connection):
+    """插入内容块（ref_count 为本次引用数），已存在（含并发写入）时只增加引用计数"""
+    table = ContentBlob.__table__
+    if connection.dialect.name in ("sqlite", "postgresql"):
+        stmt = (sqlite if connection.dialect.name == "sqlite" else postgresql).insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=["hash"], set_={"ref_count": table.c.ref_count + stmt.excluded.ref_count}
+        )
+    stmt = mysql.insert(table)  # MySQL
+    return stmt.on_duplicate_key_update(ref_count=table.c.ref_count + stmt.inserted.ref_count)
+
+
+def _adjust_ref_counts(connection, counts: Counter, sign: int) -> None:
+    blobs = ContentBlob.__table__
+    # 按哈希顺序加锁，避免并发事务交叉等待行锁造成死锁
+    connection.execute(
+        update(blobs).where(blobs.c.hash == bindparam("blob_hash"))
+        .values(ref_count=blobs.c.ref_count + bindparam("delta")),
+        [{"blob_hash": blob_hash, "delta": sign * count} for blob_hash, count in sorted(counts.items())],
+    )
+
+
+def store_sections(connection, sections_by_diagnosis: Dict[int, List[str]]) -> None:
+    """写入诊断分段：新内容块入库、已有内容块增加引用计数（同一条 upsert）、写入分段引用"""
+    texts = {}
+    counts = Counter()
+    section_rows = []
+    for diagnosis_id, sections in sections_by_diagnosis.items():
+        for position, text in enumerate(sections):
+            blob_hash = content_hash(text)
+            texts[blob_hash] = text
+            counts[blob_hash] += 1
+            section_rows.append({"diagnosis_id": diagnosis_id, "position": position, "blob_hash": blob_hash})
+    if not section_rows:
+        return
+
+    now = datetime.utcnow()
+    connection.execute(_upsert_add_refs(connection), [
+        {"hash": blob_hash, "content": texts[blob_hash], "size": len(texts[blob_hash].encode("utf-8")),
+         "ref_count": count, "created_at": now}
+        for blob_hash, count in sorted(counts.items())
+    ])
+    connection.execute(insert(DiagnosisSection.__table__), section_rows)
+
+
+def release_diagnoses(connection, diagnosis_ids: Iterable[int]) -> None:
+    """删除诊断记录的分段引用，减少引用计数并删除不再被引用的内容块"""
+    diagnosis_ids = list(diagnosis_ids)
+    if not diagnosis_ids:
+        return
+    sections = DiagnosisSection.__table__
+    blobs = ContentBlob.__table__
+    counts = Counter(dict(connection.execute(
+        select(sections.c.blob_hash, func.count())
+        .where(sections.c.diagnosis_id.in_(diagnosis_ids))
+        .group_by(sections.c.blob_hash)
+    ).all()))
+    connection.execute(delete(sections).where(sections.c.diagnosis_id.in_(diagnosis_ids)))
+    if counts:
+        _adjust_ref_counts(connection, counts, -1)
+        connection.execute(delete(blobs).where(blobs.c.hash.in_(list(counts)), blobs.c.ref_count <= 0))
@@ -0,0 +1,26 @@
+"""幂等请求记录模型"""
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, UniqueConstraint
+from datetime import datetime
+from api.db.database import Base
+
+
+class IdempotencyRecord(Base):
+    """幂等键记录表（Idempotency-Key 请求头对应的请求指纹与执行结果）"""
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (
+        UniqueConstraint("user_id", "endpoint", "idempotency_key", name="uq_idempotency_user_endpoint_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    idempotency_key = Column(String(255), nullable=False, comment="客户端提供的幂等键")
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, comment="发起请求的用户ID")
+    endpoint = Column(String(200), nullable=False, comment="接口标识（方法 + 路由模板）")
+    fingerprint = Column(String(64), nullable=False, comment="请求指纹（SHA-256）")
+    status = Column(String(20), nullable=False, default="in_progress", comment="状态: in_progress/completed")
+    status_code = Column(Integer, nullable=True, comment="原始响应状态码")
+    response_body = Column(Text, nullable=True, comment="原始响应体（JSON）")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="创建时间")
+    expires_at = Column(DateTime, nullable=False, index=True, comment="过期时间")
+
+    def __repr__(self):
+        return f"<IdempotencyRecord(id={self.id}, key='{self.idempotency_key}', status='{self.status}')>"
@@ -12,6 +12,7 @@ class Provider(Base):
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     name = Column(String(100), nullable=False, comment="供应商名称")
     base_url = Column(String(500), nullable=False, comment="API 基础 URL")
+    provider_type = Column(String(20), nullable=False, default="openai", server_default="openai", comment="接口类型: openai（OpenAI 兼容）/ollama（本地 Ollama）")
     api_key_encrypted = Column(Text, nullable=False, comment="加密的 API Key")
     is_enabled = Column(Boolean, default=True, index=True, comment="是否启用")
     is_default = Column(Boolean, default=False, index=True, comment="是否为默认供应商")
@@ -74,6 +75,9 @@ class SystemConfig(Base):
         return self.value
 
 
+# 供应商接口类型
+PROVIDER_TYPES = ("openai", "ollama")
+
 # 预置供应商模板
 PROVIDER_TEMPLATES = [
     {"name": "OpenAI", "base_url": "https://api.openai.com/v1"},
@@ -86,6 +90,7 @@ PROVIDER_TEMPLATES = [
     {"name": "月之暗面", "base_url": "https://api.moonshot.cn/v1"},
     {"name": "阿里云百炼", "base_url": "https://dashscope.aliyuncs.com/api/v1"},
     {"name": "xAI", "base_url": "https://api.x.ai/v1"},
+    {"name": "Ollama（本地）", "base_url": "http://localhost:11434", "provider_type": "ollama"},
     {"name": "自定义", "base_url": ""},
 ]
 
@@ -0,0 +1,19 @@
+"""单飞（single-flight）跨进程锁记录模型"""
+from sqlalchemy import Column, String, Text, DateTime
+from datetime import datetime
+from api.db.database import Base
+
+
+class SingleFlightLock(Base):
+    """单飞锁表：同一键同时只有一个进程执行，其余进程等待并读取其结果"""
+    __tablename__ = "single_flight_locks"
+
+    flight_key = Column(String(64), primary_key=True, comment="请求键（SHA-256）")
+    owner = Column(String(100), nullable=False, comment="持有者（进程ID + 随机串）")
+    status = Column(String(20), nullable=False, default="running", comment="状态: running/done")
+    result = Column(Text, nullable=True, comment="执行结果（JSON）")
+    created_at = Column(DateTime, default=datetime.utcnow, comment="加锁时间")
+    expires_at = Column(DateTime, nullable=True, index=True, comment="结果过期时间（status=done 时有效）")
+
+    def __repr__(self):
+        return f"<SingleFlightLock(key='{self.flight_key}', status='{self.status}')>"
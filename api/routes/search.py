@@ -0,0 +1,132 @@
+"""全文检索API路由（病历全文、主诉与诊断结果）"""
+import time
+from datetime import datetime
+from typing import List, Optional
+
+import sqlalchemy as sa
+from fastapi import APIRouter, Depends, HTTPException, Query
+from pydantic import BaseModel
+from sqlalchemy.orm import Session
+
+from api.db.database import get_db
+from api.db.fulltext import (
+    CASES_FTS, DIAGNOSES_FTS, build_match_query, format_snippet, is_supported, rank_window_start, snippet_sql
+)
+from api.auth.permissions import check_permission, require_case_read
+from api.models.user import User
+from api.models.case import MedicalCase, DiagnosisHistory
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+# 相关度权重（bm25 列权重，顺序同 CASE_COLUMNS）：病历号、姓名、主诉命中比正文命中更相关
+CASE_COLUMN_WEIGHTS = "2.0, 2.0, 5.0, 1.0"
+
+_cases_fts = sa.table(CASES_FTS, sa.column("rowid", sa.Integer))
+_diagnoses_fts = sa.table(DIAGNOSES_FTS, sa.column("rowid", sa.Integer))
+
+
+class SearchHit(BaseModel):
+    type: str  # case / diagnosis
+    case_id: int
+    diagnosis_id: Optional[int] = None
+    patient_id: str
+    patient_name: Optional[str] = None
+    model_name: Optional[str] = None
+    language: Optional[str] = None
+    run_timestamp: Optional[datetime] = None
+    snippet: str  # HTML，命中词以 <mark> 标出
+    score: float  # 越大越相关
+
+
+class SearchResponse(BaseModel):
+    query: str
+    items: List[SearchHit]
+    took_ms: float
+
+
+def _can_access_all_cases(user: User) -> bool:
+    """管理员和医生可检索所有病例，普通用户只能检索自己创建的病例"""
+    if user.is_superuser:
+        return True
+    user_roles = [role.name for role in user.roles if role.is_active]
+    return "admin" in user_roles or "doctor" in user_roles
+
+
+def _restrict(query, db: Session, fts, match: str, user: User):
+    """按权限过滤；可检索所有病例时只对最新的 RANK_WINDOW 个命中排序（普通用户的命中本就有限，不截断）"""
+    if not _can_access_all_cases(user):
+        return query.filter(MedicalCase.created_by == user.id)
+    start = rank_window_start(db, fts.name, match)
+    return query if start is None else query.filter(fts.c.rowid >= start)
+
+
+def _search_cases(db: Session, match: str, user: User, limit: int) -> List[SearchHit]:
+    rank = sa.literal_column(f"bm25({CASES_FTS}, {CASE_COLUMN_WEIGHTS})").label("rank")
+    # 列号 -1：由 FTS5 选择命中最多的列生成摘要
+    snippet = sa.literal_column(snippet_sql(CASES_FTS, -1)).label("snippet")
+    query = (
+        db.query(MedicalCase.id, MedicalCase.patient_id, MedicalCase.patient_name, rank, snippet)
+        .select_from(_cases_fts)
+        .join(MedicalCase, MedicalCase.id == _cases_fts.c.rowid)
+        .filter(sa.text(f"{CASES_FTS} MATCH :match"))
+    )
+    rows = _restrict(query, db, _cases_fts, match, user).order_by(rank).limit(limit).params(match=match).all()
+    return [
+        SearchHit(type="case", case_id=row.id, patient_id=row.patient_id, patient_name=row.patient_name,
+                  snippet=format_snippet(row.snippet), score=-row.rank)
+        for row in rows
+    ]
+
+
+def _search_diagnoses(db: Session, match: str, user: User, limit: int) -> List[SearchHit]:
+    rank = sa.literal_column(f"bm25({DIAGNOSES_FTS})").label("rank")
+    snippet = sa.literal_column(snippet_sql(DIAGNOSES_FTS, 0)).label("snippet")
+    query = (
+        db.query(DiagnosisHistory.id, DiagnosisHistory.case_id, DiagnosisHistory.model_name,
+                 DiagnosisHistory.language, DiagnosisHistory.run_timestamp,
+                 MedicalCase.patient_id, MedicalCase.patient_name, rank, snippet)
+        .select_from(_diagnoses_fts)
+        .join(DiagnosisHistory, DiagnosisHistory.id == _diagnoses_fts.c.rowid)
+        .join(MedicalCase, MedicalCase.id == DiagnosisHistory.case_id)
+        .filter(sa.text(f"{DIAGNOSES_FTS} MATCH :match"))
+    )
+    rows = _restrict(query, db, _diagnoses_fts, match, user).order_by(rank).limit(limit).params(match=match).all()
+    return [
+        SearchHit(type="diagnosis", case_id=row.case_id, diagnosis_id=row.id, patient_id=row.patient_id,
+                  patient_name=row.patient_name, model_name=row.model_name, language=row.language,
+                  run_timestamp=row.run_timestamp, snippet=format_snippet(row.snippet), score=-row.rank)
+        for row in rows
+    ]
+
+
+@router.get("", response_model=SearchResponse)
+async def search(
+    q: str = Query(..., min_length=1, max_length=200, description="检索词（空格分隔，各词均需命中；中文按子串匹配，英文按前缀匹配）"),
+    type: str = Query("all", pattern="^(all|cases|diagnoses)$", description="检索范围: all/cases/diagnoses"),
+    limit: int = Query(20, ge=1, le=50, description="返回条数上限"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(require_case_read)
+):
+    """
+    全文检索病历（病历号、姓名、主诉、病历全文）与诊断结果
+
+    按相关度（bm25）排序，返回带命中高亮的摘要；只返回当前用户有权访问的病例。
+    检索诊断结果还需要 diagnosis:read 权限，否则只返回病例命中。
+
+    权限要求：case:read
+    """
+    if not is_supported(db.get_bind()):
+        raise HTTPException(status_code=501, detail="当前数据库不支持全文检索")
+    match = build_match_query(q)
+    if match is None:
+        raise HTTPException(status_code=400, detail="检索词不能为空")
+
+    started = time.perf_counter()
+    items = []
+    if type in ("all", "cases"):
+        items += _search_cases(db, match, current_user, limit)
+    if type in ("all", "diagnoses") and check_permission(current_user, "diagnosis", "read", db):
+        items += _search_diagnoses(db, match, current_user, limit)
+    items = sorted(items, key=lambda item: item.score, reverse=True)[:limit]
+
+    return SearchResponse(query=q, items=items, took_ms=round((time.perf_counter() - started) * 1000, 2))
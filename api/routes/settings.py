@@ -16,6 +16,7 @@ from api.models.settings import (
     PROVIDER_TEMPLATES, PRESET_MODELS, DEFAULT_SYSTEM_CONFIG
 )
 from api.utils.encryption import encrypt_api_key, decrypt_api_key, mask_api_key
+from Utils.Concurrency import LLM_ADAPTIVE_CONCURRENCY, LLM_MAX_CONCURRENCY, concurrency_stats
 
 router = APIRouter(prefix="/api/settings", tags=["settings"])
 
@@ -29,7 +30,8 @@ require_settings_write = PermissionChecker("settings", "write")
 class ProviderCreate(BaseModel):
     name: str = Field(..., min_length=1, max_length=100, description="供应商名称")
     base_url: str = Field(..., min_length=1, max_length=500, description="API 基础 URL")
-    api_key: str = Field(..., min_length=1, description="API Key")
+    provider_type: str = Field(default="openai", pattern="^(openai|ollama)$", description="接口类型")
+    api_key: str = Field(default="", description="API Key（本地 Ollama 可不填）")
     is_enabled: bool = Field(default=True, description="是否启用")
     is_default: bool = Field(default=False, description="是否为默认")
 
@@ -37,6 +39,7 @@ class ProviderCreate(BaseModel):
 class ProviderUpdate(BaseModel):
     name: Optional[str] = Field(None, min_length=1, max_length=100, description="供应商名称")
     base_url: Optional[str] = Field(None, min_length=1, max_length=500, description="API 基础 URL")
+    provider_type: Optional[str] = Field(None, pattern="^(openai|ollama)$", description="接口类型")
     api_key: Optional[str] = Field(None, description="API Key（不传则不更新）")
     is_enabled: Optional[bool] = Field(None, description="是否启用")
     is_default: Optional[bool] = Field(None, description="是否为默认")
@@ -46,6 +49,7 @@ class ProviderResponse(BaseModel):
     id: int
     name: str
     base_url: str
+    provider_type: str
     api_key_masked: str
     is_enabled: bool
     is_default: bool
@@ -134,6 +138,7 @@ async def list_providers(
             "id": p.id,
             "name": p.name,
             "base_url": p.base_url,
+            "provider_type": p.provider_type,
             "api_key_masked": mask_api_key(decrypt_api_key(p.api_key_encrypted)),
             "is_enabled": p.is_enabled,
             "is_default": p.is_default,
@@ -152,6 +157,9 @@ async def create_provider(
     current_user: User = Depends(require_settings_write)
 ):
     """创建供应商"""
+    if provider.provider_type != "ollama" and not provider.api_key:
+        raise HTTPException(status_code=400, detail="API Key 不能为空")
+
     # 如果设为默认，先取消其他默认
     if provider.is_default:
         db.query(Provider).filter(Provider.is_default == True).update({"is_default": False})
@@ -159,6 +167,7 @@ async def create_provider(
     new_provider = Provider(
         name=provider.name,
         base_url=provider.base_url.rstrip("/"),
+        provider_type=provider.provider_type,
         api_key_encrypted=encrypt_api_key(provider.api_key),
         is_enabled=provider.is_enabled,
         is_default=provider.is_default
@@ -173,6 +182,7 @@ async def create_provider(
             "id": new_provider.id,
             "name": new_provider.name,
             "base_url": new_provider.base_url,
+            "provider_type": new_provider.provider_type,
             "is_enabled": new_provider.is_enabled,
             "is_default": new_provider.is_default
         }
@@ -202,6 +212,8 @@ async def update_provider(
         db_provider.name = provider.name
     if provider.base_url is not None:
         db_provider.base_url = provider.base_url.rstrip("/")
+    if provider.provider_type is not None:
+        db_provider.provider_type = provider.provider_type
     if provider.api_key is not None:
         db_provider.api_key_encrypted = encrypt_api_key(provider.api_key)
     if provider.is_enabled is not None:
@@ -218,6 +230,7 @@ async def update_provider(
             "id": db_provider.id,
             "name": db_provider.name,
             "base_url": db_provider.base_url,
+            "provider_type": db_provider.provider_type,
             "is_enabled": db_provider.is_enabled,
             "is_default": db_provider.is_default
         }
@@ -255,6 +268,9 @@ async def test_provider_connection(
 
     api_key = decrypt_api_key(db_provider.api_key_encrypted)
     base_url = db_provider.base_url
+    provider_type = db_provider.provider_type
+    # 结束读事务、归还写连接后再请求供应商接口（写连接池默认只有一个连接，外部请求可能耗时数十秒）
+    db.commit()
 
     try:
         import time
@@ -268,7 +284,10 @@ async def test_provider_connection(
             }
 
             # 根据供应商类型调整测试端点
-            if "anthropic" in base_url.lower():
+            if provider_type == "ollama":
+                # 本地 Ollama：/api/tags 返回已下载的模型
+                response = await client.get(f"{base_url}/api/tags")
+            elif "anthropic" in base_url.lower():
                 # Anthropic 使用不同的认证头
                 headers = {
                     "x-api-key": api_key,
@@ -296,6 +315,8 @@ async def test_provider_connection(
                     data = response.json()
                     if "data" in data:
                         available_models = [m.get("id", "") for m in data["data"][:20]]
+                    elif "models" in data:
+                        available_models = [m.get("name", "") for m in data["models"][:20]]
                 except Exception:
                     pass
 
@@ -373,6 +394,7 @@ async def fetch_remote_models(
     - Anthropic
     - Google AI (Gemini)
     - 智谱 AI
+    - 本地 Ollama
     """
     db_provider = db.query(Provider).filter(Provider.id == provider_id).first()
     if not db_provider:
@@ -380,7 +402,11 @@ async def fetch_remote_models(
 
     api_key = decrypt_api_key(db_provider.api_key_encrypted)
     base_url = db_provider.base_url
+    provider_type = db_provider.provider_type
+    provider_display_name = db_provider.name
     provider_name = db_provider.name.lower()
+    # 结束读事务、归还写连接后再请求供应商接口（写连接池默认只有一个连接，外部请求可能耗时数十秒）
+    db.commit()
 
     try:
         async with httpx.AsyncClient(timeout=30.0) as client:
@@ -388,7 +414,11 @@ async def fetch_remote_models(
             source = "api"  # 默认来源
 
             # 根据供应商类型调用不同的 API
-            if "anthropic" in provider_name or "anthropic" in base_url.lower():
+            if provider_type == "ollama":
+                models = await _fetch_ollama_models(client, base_url)
+                source = "api"
+
+            elif "anthropic" in provider_name or "anthropic" in base_url.lower():
                 # Anthropic 没有 models 列表 API，返回预置模型
                 models = _get_anthropic_models()
                 source = "preset"
@@ -412,7 +442,7 @@ async def fetch_remote_models(
                 "success": True,
                 "data": {
                     "provider_id": provider_id,
-                    "provider_name": db_provider.name,
+                    "provider_name": provider_display_name,
                     "models": models,
                     "total_count": len(models),
                     "source": source
@@ -446,14 +476,19 @@ async def import_fetched_models(
 
     api_key = decrypt_api_key(db_provider.api_key_encrypted)
     base_url = db_provider.base_url
+    provider_type = db_provider.provider_type
     provider_name = db_provider.name.lower()
+    # 结束读事务、归还写连接后再请求供应商接口（写连接池默认只有一个连接，外部请求可能耗时数十秒）
+    db.commit()
 
     # 获取完整的模型信息
     try:
         async with httpx.AsyncClient(timeout=30.0) as client:
             all_models = []
 
-            if "anthropic" in provider_name or "anthropic" in base_url.lower():
+            if provider_type == "ollama":
+                all_models = await _fetch_ollama_models(client, base_url)
+            elif "anthropic" in provider_name or "anthropic" in base_url.lower():
                 all_models = _get_anthropic_models()
             elif "google" in provider_name or "gemini" in provider_name or "generativelanguage" in base_url.lower():
                 all_models = await _fetch_google_models(client, base_url, api_key)
@@ -563,6 +598,32 @@ async def _fetch_openai_compatible_models(client: httpx.AsyncClient, base_url: s
     return models
 
 
+async def _fetch_ollama_models(client: httpx.AsyncClient, base_url: str) -> List[dict]:
+    """获取本地 Ollama 已下载的模型列表（/api/tags）"""
+    response = await client.get(f"{base_url}/api/tags")
+
+    if response.status_code != 200:
+        raise HTTPException(status_code=response.status_code, detail=f"Ollama 返回错误: {response.status_code}")
+
+    models = []
+    for m in response.json().get("models", []):
+        model_id = m.get("name", "")
+        if not model_id or "embed" in model_id.lower():
+            continue
+        models.append({
+            "model_id": model_id,
+            "display_name": model_id,
+            "max_tokens": None,
+            "context_window": None,
+            "supports_vision": False,
+            "supports_function_call": False,
+            "owned_by": "ollama"
+        })
+
+    models.sort(key=lambda x: x["model_id"])
+    return models
+
+
 async def _fetch_google_models(client: httpx.AsyncClient, base_url: str, api_key: str) -> List[dict]:
     """获取 Google AI (Gemini) 的模型列表"""
     # Google AI 使用 API key 作为查询参数
@@ -990,6 +1051,28 @@ def _update_config(db: Session, key: str, value: str, value_type: str):
         db.add(config)
 
 
+# ============ 模型调用并发状态 API ============
+
+@router.get("/concurrency")
+async def get_concurrency_state(
+    current_user: User = Depends(require_settings_read)
+):
+    """
+    获取模型调用的自适应并发状态
+
+    每个 (服务地址, 模型) 一项：当前并发上限、进行中/排队的调用数、基线延迟，
+    以及成功、限流（429）、超时、过载、延迟突增的累计次数
+    """
+    return {
+        "success": True,
+        "data": {
+            "adaptive": LLM_ADAPTIVE_CONCURRENCY,
+            "max_concurrency": LLM_MAX_CONCURRENCY,
+            "limiters": concurrency_stats(),
+        }
+    }
+
+
 # ============ 可用模型 API（供诊断模块使用）============
 
 @router.get("/available-models")
@@ -1012,6 +1095,7 @@ async def get_available_models(
             provider_data = {
                 "provider_id": provider.id,
                 "provider_name": provider.name,
+                "provider_type": provider.provider_type,
                 "is_default": provider.is_default,
                 "models": []
             }
@@ -4,12 +4,14 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel, EmailStr
 from typing import List, Optional
 from datetime import datetime
+from collections import defaultdict
 
 from api.db.database import get_db
-from api.models.user import User, Role
+from api.models.user import User, Role, user_roles
 from api.auth.security import get_password_hash
 from api.auth.dependencies import get_current_superuser
 from api.auth.permissions import require_user_read, require_user_create, require_user_update, require_user_delete, get_user_permissions
+from api.utils.fast_json import FastJSONResponse
 
 router = APIRouter(prefix="/api/users", tags=["用户管理"])
 
@@ -77,15 +79,39 @@ class UserUpdate(BaseModel):
 async def list_users(
     skip: int = 0,
     limit: int = 100,
+    fast: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(require_user_read)
 ) -> List[UserListItem]:
     """
     获取用户列表（需要 user:read 权限）
 
-    支持分页查询
+    支持分页查询；fast=true 时按列查询并直接序列化（跳过 Pydantic 模型校验），
+    角色名通过一次批量查询取得
     """
-    users = db.query(User).offset(skip).limit(limit).all()
+    if fast:
+        rows = db.query(
+            User.id, User.username, User.email, User.full_name, User.is_active,
+            User.is_superuser, User.created_at, User.last_login
+        ).order_by(User.id).offset(skip).limit(limit).all()
+
+        roles_by_user = defaultdict(list)
+        user_ids = [row.id for row in rows]
+        if user_ids:
+            role_rows = db.query(user_roles.c.user_id, Role.name).join(
+                Role, Role.id == user_roles.c.role_id
+            ).filter(user_roles.c.user_id.in_(user_ids)).all()
+            for user_id, role_name in role_rows:
+                roles_by_user[user_id].append(role_name)
+
+        content = []
+        for row in rows:
+            item = dict(row._mapping)
+            item["roles"] = roles_by_user.get(row.id, [])
+            content.append(item)
+        return FastJSONResponse(content=content)
+
+    users = db.query(User).order_by(User.id).offset(skip).limit(limit).all()
 
     result = []
     for user in users:
@@ -0,0 +1,112 @@
+"""批量重新诊断脚本（Batch API）
+
+将病例以批处理方式提交给 OpenAI 兼容的 Batch API（专科一轮、MDT 一轮），
+完成后把诊断结果写入诊断历史。适合夜间对全部病例用新模型重新诊断等不着急拿结果的任务。
+
+运行方式：
+    python api/run_batch_diagnosis.py --model gpt-4o [--language zh] [--case-ids 1,2,3] [--skip-existing]
+"""
+import argparse
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from api.db.database import SessionLocal
+from api.models.case import MedicalCase, DiagnosisHistory
+from Utils.BatchDiagnosis import BatchAPIClient, BatchError, run_batch_diagnosis
+
+
+def select_cases(db, model_name, language, case_ids=None, skip_existing=False):
+    """选出需要诊断的病例，返回 [(病例ID, 病历文本)]"""
+    query = db.query(MedicalCase.id, MedicalCase.raw_report).filter(MedicalCase.raw_report != "")
+    if case_ids:
+        query = query.filter(MedicalCase.id.in_(case_ids))
+    if skip_existing:
+        diagnosed = db.query(DiagnosisHistory.case_id).filter(
+            DiagnosisHistory.model_name == model_name,
+            DiagnosisHistory.language == language,
+        )
+        query = query.filter(MedicalCase.id.notin_(diagnosed))
+    return query.order_by(MedicalCase.id).all()
+
+
+def ingest_results(db, results, model_name, language):
+    """将批处理结果写入诊断历史（批处理期间已删除的病例跳过），返回写入条数"""
+    case_ids = [int(case_key) for case_key in results]
+    existing = {row.id for row in db.query(MedicalCase.id).filter(MedicalCase.id.in_(case_ids))}
+    run_timestamp = datetime.utcnow()
+    records = [
+        DiagnosisHistory(
+            case_id=int(case_key),
+            diagnosis_markdown=result["diagnosis_markdown"],
+            model_name=model_name,
+            run_timestamp=run_timestamp,
+            execution_time_ms=None,  # 批处理没有单个病例的耗时
+            language=language,
+        )
+        for case_key, result in results.items()
+        if int(case_key) in existing
+    ]
+    db.add_all(records)
+    db.commit()
+    return len(records)
+
+
+def run(model_name, language="en", case_ids=None, skip_existing=False, chunk_size=500,
+        poll_interval=None, max_wait=None, client=None, session_factory=SessionLocal):
+    """按 chunk_size 个病例一组提交批处理并写入结果，返回写入的诊断条数"""
+    db = session_factory()
+    try:
+        cases = select_cases(db, model_name, language, case_ids, skip_existing)
+    finally:
+        db.close()
+    print(f"共 {len(cases)} 个病例待诊断（模型: {model_name}，语言: {language}）")
+
+    own_client = client is None
+    client = client or BatchAPIClient()
+    saved = 0
+    try:
+        for start in range(0, len(cases), chunk_size):
+            chunk = cases[start:start + chunk_size]
+            try:
+                results = run_batch_diagnosis(
+                    client, {case_id: report for case_id, report in chunk}, model_name, language,
+                    poll_interval=poll_interval, max_wait=max_wait,
+                )
+            except BatchError as e:
+                print(f"❌ 第 {start // chunk_size + 1} 组病例批处理失败: {e}")
+                continue
+            db = session_factory()
+            try:
+                count = ingest_results(db, results, model_name, language)
+            finally:
+                db.close()
+            saved += count
+            print(f"✓ 已保存 {count}/{len(chunk)} 条诊断")
+    finally:
+        if own_client:
+            client.close()
+    return saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="通过 Batch API 批量重新诊断病例")
+    parser.add_argument("--model", default=os.getenv("LLM_MODEL", "gemini-2.5-flash"), help="模型名称")
+    parser.add_argument("--language", default="en", choices=["en", "zh"], help="诊断输出语言")
+    parser.add_argument("--case-ids", default="", help="逗号分隔的病例ID（默认全部病例）")
+    parser.add_argument("--skip-existing", action="store_true", help="跳过已用同一模型和语言诊断过的病例")
+    parser.add_argument("--chunk-size", type=int, default=500, help="每个批处理包含的病例数")
+    parser.add_argument("--poll-interval", type=float, default=None, help="状态轮询间隔（秒）")
+    args = parser.parse_args()
+
+    case_ids = [int(value) for value in args.case_ids.split(",") if value.strip()] or None
+    saved = run(args.model, args.language, case_ids, args.skip_existing, args.chunk_size, args.poll_interval)
+    print(f"完成，共保存 {saved} 条诊断")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 """数据分析工具函数：数据聚合和统计计算"""
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, extract, case as sql_case
+from sqlalchemy import func, and_, extract, cast, Integer, String, case as sql_case
 from typing import Optional, Dict, List, Any
 from datetime import datetime, date, timedelta
 from collections import defaultdict
@@ -237,6 +237,46 @@ def calculate_case_demographics(
     }
 
 
+def period_expression(date_column, granularity: str, dialect_name: str):
+    """
+    按粒度把时间列格式化为统计周期的跨数据库表达式
+
+    - day: YYYY-MM-DD
+    - week: YYYY-Www（周一为每周第一天，年内第一个周一之前为第 00 周，与 SQLite 的 %W 一致）
+    - month: YYYY-MM
+
+    SQLite 使用 strftime，MySQL 使用 DATE_FORMAT，PostgreSQL 及其他数据库使用 to_char。
+    """
+    if granularity not in ("day", "week", "month"):
+        raise ValueError("granularity 必须是 'day', 'week' 或 'month'")
+
+    if dialect_name == "sqlite":
+        if granularity == "day":
+            return func.date(date_column)
+        if granularity == "week":
+            return func.strftime('%Y-W%W', date_column)
+        return func.strftime('%Y-%m', date_column)
+
+    if dialect_name in ("mysql", "mariadb"):
+        if granularity == "day":
+            return func.date_format(date_column, '%Y-%m-%d')
+        if granularity == "week":
+            # WEEKDAY: 周一为 0
+            week = func.floor((func.dayofyear(date_column) + 6 - func.weekday(date_column)) / 7)
+            return func.concat(func.date_format(date_column, '%Y'), '-W', func.lpad(week, 2, '0'))
+        return func.date_format(date_column, '%Y-%m')
+
+    if granularity == "day":
+        return func.to_char(date_column, 'YYYY-MM-DD')
+    if granularity == "week":
+        # isodow: 周一为 1
+        week = func.floor((extract('doy', date_column) + 7 - extract('isodow', date_column)) / 7)
+        return func.concat(
+            func.to_char(date_column, 'YYYY'), '-W', func.lpad(cast(cast(week, Integer), String), 2, '0')
+        )
+    return func.to_char(date_column, 'YYYY-MM')
+
+
 def calculate_time_series(
     db: Session,
     entity_type: str,  # "case" 或 "diagnosis"
@@ -278,28 +318,12 @@ def calculate_time_series(
     else:
         raise ValueError("entity_type 必须是 'case' 或 'diagnosis'")
 
-    # 根据粒度聚合
-    if granularity == "day":
-        time_series = query.with_entities(
-            func.date(date_column).label("period"),
-            func.count().label("count")
-        ).group_by("period").order_by("period").all()
-
-    elif granularity == "week":
-        # 按周聚合（ISO周）
-        time_series = query.with_entities(
-            func.strftime('%Y-W%W', date_column).label("period"),
-            func.count().label("count")
-        ).group_by("period").order_by("period").all()
-
-    elif granularity == "month":
-        # 按月聚合
-        time_series = query.with_entities(
-            func.strftime('%Y-%m', date_column).label("period"),
-            func.count().label("count")
-        ).group_by("period").order_by("period").all()
-    else:
-        raise ValueError("granularity 必须是 'day', 'week' 或 'month'")
+    # 根据粒度聚合（周期表达式按数据库方言生成）
+    period = period_expression(date_column, granularity, db.get_bind().dialect.name)
+    time_series = query.with_entities(
+        period.label("period"),
+        func.count().label("count")
+    ).group_by("period").order_by("period").all()
 
     series_data = [{"date": str(period), "count": count} for period, count in time_series]
 
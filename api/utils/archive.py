@@ -0,0 +1,180 @@
+"""
+诊断历史冷热分离
+
+- archive_diagnoses：把运行时间早于截止时间的诊断记录移入归档库（见 api/models/archive.py）
+- reclaim_free_pages：归档后对主库和归档库执行增量 VACUUM，释放删除记录留下的空闲页
+- get_case_diagnosis / get_diagnoses_by_ids / list_case_diagnoses：先查主库、再查归档库，
+  接口读取诊断记录时无需区分是否已归档（返回的 ArchivedDiagnosis 与 DiagnosisHistory 字段一致）
+
+病例表的诊断统计（diagnosis_count / latest_diagnosis_id 等）包含已归档的记录，归档不改变统计。
+"""
+import os
+from datetime import datetime
+from typing import Dict, Iterable, List, Union
+
+from sqlalchemy import exists, insert
+from sqlalchemy.orm import Session, aliased, selectinload, undefer
+
+from api.db.fulltext import remove_diagnoses
+from api.models.archive import ARCHIVE_SCHEMA, ArchivedDiagnosis, attach_archive, has_autoincrement, \
+    reserve_archived_ids
+from api.models.case import DiagnosisHistory
+from api.models.content import release_diagnoses
+
+# 诊断记录的保留期（天），超过后归档
+ARCHIVE_AFTER_DAYS = int(os.getenv("ARCHIVE_AFTER_DAYS", "365"))
+# 每批归档的诊断记录数（每批两个短事务，避免长时间占用写连接）
+ARCHIVE_BATCH_SIZE = 500
+
+DiagnosisRecord = Union[DiagnosisHistory, ArchivedDiagnosis]
+
+
+def _archived_row(record: DiagnosisHistory, archived_at: datetime) -> dict:
+    return {
+        "id": record.id,
+        "case_id": record.case_id,
+        "diagnosis_markdown": record.diagnosis_markdown,
+        "diagnosis_preview": record.diagnosis_preview,
+        "model_name": record.model_name,
+        "run_timestamp": record.run_timestamp,
+        "execution_time_ms": record.execution_time_ms,
+        "comparison_group_id": record.comparison_group_id,
+        "language": record.language,
+        "source_diagnosis_id": record.source_diagnosis_id,
+        "archived_at": archived_at,
+    }
+
+
+def archive_diagnoses(db: Session, cutoff: datetime, batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    把 run_timestamp 早于 cutoff 的诊断记录移入归档库，返回归档的记录数
+
+    - 翻译记录随来源诊断一起归档；仍有未到期翻译的来源诊断暂不归档（主库外键会级联删除翻译）
+    - 主库 diagnosis_history 须为 AUTOINCREMENT（迁移 0017），并在复制后把序号提高到归档库的最大ID，
+      新诊断不会复用已归档的ID；否则抛出 RuntimeError
+    - 每批先复制到归档库并提交，再从主库删除：WAL 模式下跨库事务不保证原子性，
+      中途中断时记录可能同时存在于两个库（读取以主库为准），重新运行即可完成；
+      归档库中同ID的记录不是同一条诊断（病例或运行时间不同）时抛出 RuntimeError，不删除主库记录
+    """
+    if not has_autoincrement(db.connection()):
+        raise RuntimeError("diagnosis_history 未使用 AUTOINCREMENT，归档后诊断ID可能被复用，请先执行 alembic upgrade head")
+    translation = aliased(DiagnosisHistory)
+    has_pending_translation = exists().where(
+        translation.source_diagnosis_id == DiagnosisHistory.id,
+        translation.run_timestamp >= cutoff,
+    )
+
+    archived = 0
+    last_id = 0
+    while True:
+        source_ids = [row.id for row in db.query(DiagnosisHistory.id).filter(
+            DiagnosisHistory.id > last_id,
+            DiagnosisHistory.run_timestamp < cutoff,
+            ~has_pending_translation,
+        ).order_by(DiagnosisHistory.id).limit(batch_size)]
+        if not source_ids:
+            break
+        last_id = source_ids[-1]
+        translation_ids = [row.id for row in db.query(DiagnosisHistory.id).filter(
+            DiagnosisHistory.source_diagnosis_id.in_(source_ids)
+        )]
+        ids = sorted(set(source_ids) | set(translation_ids))
+
+        records = db.query(DiagnosisHistory).options(selectinload(DiagnosisHistory.sections)).filter(
+            DiagnosisHistory.id.in_(ids)
+        ).all()
+        now = datetime.utcnow()
+        attach_archive(db.connection(), create=True)
+        # 上次中断时已复制的记录跳过；同ID的其他诊断说明ID被复用过，需人工核对
+        copied = {row.id: row for row in db.query(
+            ArchivedDiagnosis.id, ArchivedDiagnosis.case_id, ArchivedDiagnosis.run_timestamp
+        ).filter(ArchivedDiagnosis.id.in_(ids))}
+        for record in records:
+            row = copied.get(record.id)
+            if row is not None and (row.case_id, row.run_timestamp) != (record.case_id, record.run_timestamp):
+                db.rollback()
+                raise RuntimeError(f"归档库中已存在ID为 {record.id} 的其他诊断记录（病例 {row.case_id}），请人工核对")
+        pending = [_archived_row(record, now) for record in records if record.id not in copied]
+        if pending:
+            db.execute(insert(ArchivedDiagnosis.__table__), pending)
+        reserve_archived_ids(db.connection())
+        db.commit()
+
+        # 批量删除不触发 ORM 事件：先释放分段引用、移出全文索引；病例的诊断统计包含归档记录，无需更新
+        connection = db.connection()
+        release_diagnoses(connection, ids)
+        remove_diagnoses(connection, ids)
+        db.query(DiagnosisHistory).filter(DiagnosisHistory.id.in_(ids)).delete(synchronize_session=False)
+        db.commit()
+        db.expunge_all()
+        archived += len(ids)
+    return archived
+
+
+def reclaim_free_pages(engine) -> Dict[str, int]:
+    """
+    对主库和归档库执行增量 VACUUM（使用单独的连接，不在事务中执行），返回各库释放的页数
+
+    只对 auto_vacuum=INCREMENTAL 的库生效（新建的数据库默认如此；已有数据库需先执行一次
+    PRAGMA auto_vacuum = INCREMENTAL 与 VACUUM，见 api/archive_diagnoses.py --convert）
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        schemas = ["main"] + ([ARCHIVE_SCHEMA] if attach_archive(connection) else [])
+        reclaimed = {}
+        for schema in schemas:
+            if connection.exec_driver_sql(f"PRAGMA {schema}.auto_vacuum").scalar() != 2:
+                continue
+            before = connection.exec_driver_sql(f"PRAGMA {schema}.freelist_count").scalar()
+            # sqlite3 的 execute 每次只执行一步（释放一页），executescript 一次执行完整
+            connection.connection.driver_connection.executescript(f"PRAGMA {schema}.incremental_vacuum;")
+            reclaimed[schema] = before - connection.exec_driver_sql(f"PRAGMA {schema}.freelist_count").scalar()
+    return reclaimed
+
+
+def get_case_diagnosis(db: Session, case_id: int, diagnosis_id: int):
+    """查询病例的指定诊断记录（主库或归档库），不存在时返回 None"""
+    record = db.query(DiagnosisHistory).filter(
+        DiagnosisHistory.id == diagnosis_id,
+        DiagnosisHistory.case_id == case_id
+    ).first()
+    if record is None and attach_archive(db.connection()):
+        record = db.query(ArchivedDiagnosis).filter(
+            ArchivedDiagnosis.id == diagnosis_id,
+            ArchivedDiagnosis.case_id == case_id
+        ).first()
+    return record
+
+
+def get_diagnoses_by_ids(db: Session, diagnosis_ids: Iterable[int]) -> Dict[int, DiagnosisRecord]:
+    """按 ID 批量查询诊断记录（主库或归档库）"""
+    diagnosis_ids = set(diagnosis_ids)
+    if not diagnosis_ids:
+        return {}
+    records = {d.id: d for d in db.query(DiagnosisHistory).filter(DiagnosisHistory.id.in_(diagnosis_ids))}
+    missing = diagnosis_ids - records.keys()
+    if missing and attach_archive(db.connection()):
+        records.update({d.id: d for d in db.query(ArchivedDiagnosis).filter(ArchivedDiagnosis.id.in_(missing))})
+    return records
+
+
+def list_case_diagnoses(db: Session, case_id: int, include_full: bool = False) -> List[DiagnosisRecord]:
+    """病例的全部诊断记录（含已归档），按运行时间倒序"""
+    query = db.query(DiagnosisHistory).filter(DiagnosisHistory.case_id == case_id)
+    # 诊断全文由分段拼接，仅在需要时随列表一次性加载全部分段
+    if include_full:
+        query = query.options(selectinload(DiagnosisHistory.sections))
+    records = query.all()
+    if attach_archive(db.connection()):
+        archived_query = db.query(ArchivedDiagnosis).filter(ArchivedDiagnosis.case_id == case_id)
+        if include_full:
+            archived_query = archived_query.options(undefer(ArchivedDiagnosis.diagnosis_markdown))
+        hot_ids = {d.id for d in records}
+        # 归档中断时同一记录可能同时存在于两个库，以主库为准
+        records += [d for d in archived_query if d.id not in hot_ids]
+    return sorted(records, key=lambda d: (d.run_timestamp or datetime.min, d.id), reverse=True)
+
+
+def delete_archived_diagnoses(db: Session, case_id: int) -> None:
+    """删除病例已归档的诊断记录（删除病例时调用）"""
+    if attach_archive(db.connection()):
+        db.query(ArchivedDiagnosis).filter(ArchivedDiagnosis.case_id == case_id).delete(synchronize_session=False)
@@ -1,10 +1,27 @@
 """
 病例编号生成器
 
-生成格式：年月日时分（12位数字） + 性别（1位：男1女0） + 年龄（2位）
-示例：202512111530155  表示 2025年12月11日15:30 + 男(1) + 55岁
+编号格式：年月日时分（12位数字） + 性别（1位：男1女0） + 年龄（至少2位，100岁及以上为3位） + "-" + 序号（至少2位）
+示例：202512111530155-01  表示 2025年12月11日15:30 + 男(1) + 55岁，该分钟内第1个同性别同年龄的病例
+
+序号由数据库表 case_id_sequences 按前缀原子递增分配（allocate_case_id / reserve_case_ids），
+同一分钟内创建相同性别年龄的病例不再冲突，也无需等待重试。
+早期生成的 15 位编号（不带序号）仍然有效，parse_case_id 两种格式都能解析。
 """
 from datetime import datetime
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.models.case import CaseIdSequence
+
+# 前缀与序号之间的分隔符（年龄可能超过2位，用分隔符保证编号可解析）
+SEQUENCE_SEPARATOR = "-"
+# 序号最少位数（不足补零，超过时自然增长）
+SEQUENCE_WIDTH = 2
 
 
 def generate_case_id(gender: str, age: int, timestamp: datetime = None) -> str:
@@ -17,7 +34,7 @@ def generate_case_id(gender: str, age: int, timestamp: datetime = None) -> str:
         timestamp: 时间戳（如果不提供则使用当前时间）
 
     Returns:
-        病例编号字符串，格式：YYYYMMDDHHmm + 性别(1/0) + 年龄(2位)
+        病例编号字符串，格式：YYYYMMDDHHmm + 性别(1/0) + 年龄(至少2位)
 
     Examples:
         >>> generate_case_id("male", 55, datetime(2025, 12, 11, 15, 30))
@@ -43,33 +60,113 @@ def generate_case_id(gender: str, age: int, timestamp: datetime = None) -> str:
     # 年龄：补齐为2位数字
     age_part = str(age).zfill(2)
 
-    # 组合：时间(12) + 性别(1) + 年龄(2) = 15位
+    # 组合：时间(12) + 性别(1) + 年龄(2，100岁及以上为3) = 15位（或16位）
     case_id = f"{time_part}{gender_code}{age_part}"
 
     return case_id
 
 
+def _increment_sequence(db: Session, prefix: str, count: int) -> int:
+    """将前缀的序号原子地增加 count，返回增加后的值（即本次分配的最后一个序号）"""
+    table = CaseIdSequence.__table__
+    dialect = db.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table).values(prefix=prefix, last_value=count).on_conflict_do_update(
+            index_elements=["prefix"], set_={"last_value": table.c.last_value + count}
+        ).returning(table.c.last_value)
+        return db.execute(stmt).scalar_one()
+
+    # 其他数据库：先更新（行锁保证原子性），前缀不存在时插入；并发插入冲突时回到更新
+    while True:
+        updated = db.execute(
+            update(table).where(table.c.prefix == prefix).values(last_value=table.c.last_value + count)
+        ).rowcount
+        if updated:
+            return db.execute(select(table.c.last_value).where(table.c.prefix == prefix)).scalar_one()
+        try:
+            with db.begin_nested():
+                db.execute(insert(table).values(prefix=prefix, last_value=count))
+            return count
+        except IntegrityError:
+            continue
+
+
+def reserve_case_ids(
+    db: Session,
+    patients: Iterable[Tuple[str, int]],
+    timestamp: datetime = None
+) -> List[str]:
+    """
+    为一批病例分配编号（批量导入使用）
+
+    按前缀分组，每个前缀只执行一条语句预留一段连续序号；序号在当前事务中分配，
+    事务回滚时一并回滚（已提交的编号不会被重复分配）。
+
+    Args:
+        db: 数据库会话
+        patients: (性别, 年龄) 序列
+        timestamp: 时间戳（如果不提供则使用当前时间）
+
+    Returns:
+        与 patients 顺序一致的病例编号列表
+    """
+    if timestamp is None:
+        timestamp = datetime.now()
+    prefixes = [generate_case_id(gender, age, timestamp) for gender, age in patients]
+
+    counts: Dict[str, int] = {}
+    for prefix in prefixes:
+        counts[prefix] = counts.get(prefix, 0) + 1
+    # 每个前缀下一个可用的序号
+    next_values = {
+        prefix: _increment_sequence(db, prefix, count) - count + 1
+        for prefix, count in counts.items()
+    }
+
+    case_ids = []
+    for prefix in prefixes:
+        case_ids.append(f"{prefix}{SEQUENCE_SEPARATOR}{next_values[prefix]:0{SEQUENCE_WIDTH}d}")
+        next_values[prefix] += 1
+    return case_ids
+
+
+def allocate_case_id(db: Session, gender: str, age: int, timestamp: datetime = None) -> str:
+    """
+    分配一个病例编号（前缀由 generate_case_id 生成，序号由数据库原子递增）
+
+    Examples:
+        >>> allocate_case_id(db, "male", 55, datetime(2025, 12, 11, 15, 30))
+        '202512111530155-01'
+    """
+    return reserve_case_ids(db, [(gender, age)], timestamp)[0]
+
+
 def parse_case_id(case_id: str) -> dict:
     """
     解析病例编号（用于调试和验证）
 
     Args:
-        case_id: 病例编号
+        case_id: 病例编号（带序号的新格式，或早期不带序号的编号）
 
     Returns:
         包含解析结果的字典
     """
-    if len(case_id) != 15:
+    prefix, separator, sequence = case_id.partition(SEQUENCE_SEPARATOR)
+    # 时间(12) + 性别(1) 之后的部分均为年龄（至少2位，100岁及以上为3位）
+    if len(prefix) < 15 or not prefix.isdigit():
         return {"error": "无效的病例编号长度"}
+    if separator and not sequence.isdigit():
+        return {"error": "无效的病例编号序号"}
 
     try:
-        year = case_id[0:4]
-        month = case_id[4:6]
-        day = case_id[6:8]
-        hour = case_id[8:10]
-        minute = case_id[10:12]
-        gender_code = case_id[12]
-        age = case_id[13:15]
+        year = prefix[0:4]
+        month = prefix[4:6]
+        day = prefix[6:8]
+        hour = prefix[8:10]
+        minute = prefix[10:12]
+        gender_code = prefix[12]
+        age = prefix[13:]
 
         gender_map = {"1": "男", "0": "女", "9": "未知"}
 
@@ -77,6 +174,7 @@ def parse_case_id(case_id: str) -> dict:
             "timestamp": f"{year}-{month}-{day} {hour}:{minute}",
             "gender": gender_map.get(gender_code, "未知"),
             "age": int(age),
+            "sequence": int(sequence) if separator else None,
             "raw": case_id
         }
     except Exception as e:
@@ -101,3 +199,4 @@ if __name__ == "__main__":
     case_id = generate_case_id('male', 55, test_time)
     print(f"原始编号: {case_id}")
     print(f"解析结果: {parse_case_id(case_id)}")
+    print(f"带序号: {parse_case_id(case_id + '-01')}")
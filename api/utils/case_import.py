@@ -0,0 +1,190 @@
+"""
+病例批量导入（JSON 文件）
+
+逐条 SELECT 查重 + commit 的导入方式每个病例需要两次数据库往返和一次提交（fsync），
+一万个病例的文件就要两万次往返、一万次提交。批量导入按以下步骤进行：
+
+1. 校验全部记录（必填字段、类型），不合格的记录单独报告，不影响其余记录
+2. 按块批量查询找出与已有病例（或文件中前面的病例）重复的 patient_id；重复及未提供编号的病例
+   按编号前缀成段预留编号（见 api/utils/case_id_generator.py 的 reserve_case_ids）
+3. 按 IMPORT_CHUNK_SIZE 分块，每块一个事务、一条 executemany 插入，并同步全文索引与相似病例索引
+   （Core 批量插入不触发 MedicalCase 的 ORM 事件）
+4. 某块插入失败（如并发导入写入了相同的 patient_id）时回滚该块，改为逐条插入，只报告出错的记录
+
+使用方式：
+    success_count, failed_cases = import_case_records(db, records, current_user.id)
+"""
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+
+from api.db.fulltext import CASE_COLUMNS as FULLTEXT_CASE_COLUMNS, index_new_cases, is_supported as fulltext_supported
+from api.models.case import MedicalCase, make_preview
+from api.utils.case_formatter import CaseFormatter
+from api.utils.case_id_generator import reserve_case_ids
+from api.utils.similarity import similar_case_index
+
+# 每个事务插入的病例数
+IMPORT_CHUNK_SIZE = 500
+# 必填字段（patient_id 可选，未提供时自动生成）
+REQUIRED_FIELDS = ['patient_name', 'age', 'gender', 'chief_complaint']
+
+
+def _failure(index: int, case_data: Any, error: str) -> dict:
+    patient_name = case_data.get('patient_name', 'unknown') if isinstance(case_data, dict) else 'unknown'
+    return {"index": index, "patient_name": patient_name, "error": error}
+
+
+def _validate(case_data: Any) -> Optional[str]:
+    """校验一条病例记录，返回错误信息（合格时返回 None）"""
+    if not isinstance(case_data, dict):
+        return "病例数据必须为 JSON 对象"
+    missing_fields = [f for f in REQUIRED_FIELDS if f not in case_data]
+    if missing_fields:
+        return f"缺少必填字段: {', '.join(missing_fields)}"
+    # 年龄允许为数字字符串（如 "45"），写入时转为整数
+    if isinstance(case_data['age'], bool) or not str(case_data['age']).isdigit():
+        return "age 必须为非负整数"
+    if not isinstance(case_data['gender'], str):
+        return "gender 必须为字符串"
+    if not isinstance(case_data.get('patient_id') or "", str):
+        return "patient_id 必须为字符串"
+    return None
+
+
+def _assign_patient_ids(db: Session, valid_cases: List[Tuple[int, dict]]) -> Dict[int, str]:
+    """
+    确定每条记录的病例编号：提供的编号未被占用时直接使用，否则自动分配
+
+    占用检查按块执行 IN 查询（每 IMPORT_CHUNK_SIZE 个编号一次）；自动分配的编号每个前缀一条语句成段预留，预留后立即提交，
+    之后任一分块回滚都不会让已预留的编号被重复分配
+    """
+    provided_ids = sorted({c['patient_id'] for _, c in valid_cases if c.get('patient_id')})
+    taken_ids = set()
+    # 分块查询，避免超出 SQLite 的绑定参数个数上限
+    for start in range(0, len(provided_ids), IMPORT_CHUNK_SIZE):
+        taken_ids.update(row.patient_id for row in db.query(MedicalCase.patient_id).filter(
+            MedicalCase.patient_id.in_(provided_ids[start:start + IMPORT_CHUNK_SIZE])
+        ))
+
+    patient_ids = {}
+    for idx, case_data in valid_cases:
+        provided_id = case_data.get('patient_id')
+        if provided_id and provided_id not in taken_ids:
+            patient_ids[idx] = provided_id
+            taken_ids.add(provided_id)
+    needs_id = [(idx, c) for idx, c in valid_cases if idx not in patient_ids]
+    if needs_id:
+        reserved_ids = reserve_case_ids(db, [(c['gender'], c['age']) for _, c in needs_id])
+        db.commit()
+        patient_ids.update(zip((idx for idx, _ in needs_id), reserved_ids))
+    return patient_ids
+
+
+def _case_row(case_data: dict, patient_id: str, created_by: int, now: datetime) -> dict:
+    """生成 medical_cases 的插入行（含 ORM 写入时才会生成的摘要与时间戳）"""
+    # 使用格式化器生成报告（如果提供了 raw_report 则直接使用）
+    raw_report = case_data.get('raw_report') or CaseFormatter.format_case_report(
+        patient_id=patient_id,
+        patient_name=case_data['patient_name'],
+        age=case_data['age'],
+        gender=case_data['gender'],
+        chief_complaint=case_data['chief_complaint'],
+        medical_history=case_data.get('medical_history'),
+        family_history=case_data.get('family_history'),
+        lifestyle_factors=case_data.get('lifestyle_factors'),
+        medications=case_data.get('medications'),
+        lab_results=case_data.get('lab_results'),
+        physical_exam=case_data.get('physical_exam'),
+        vital_signs=case_data.get('vital_signs'),
+        language=case_data.get('language', 'en')
+    )
+    return {
+        "patient_id": patient_id,
+        "patient_name": case_data['patient_name'],
+        "age": int(case_data['age']),
+        "gender": case_data['gender'],
+        "chief_complaint": case_data['chief_complaint'],
+        "raw_report": raw_report,
+        "report_summary": make_preview(raw_report),
+        "created_by": created_by,
+        "created_at": now,
+        "updated_at": now,
+        "diagnosis_count": 0,
+    }
+
+
+def _insert_rows(db: Session, rows: List[dict]) -> List[Tuple[int, str]]:
+    """在当前事务中插入病例并写入全文索引，返回 (病例ID, 病历全文)"""
+    connection = db.connection()
+    connection.execute(insert(MedicalCase.__table__), rows)
+    ids = dict(connection.execute(select(MedicalCase.patient_id, MedicalCase.id).where(
+        MedicalCase.patient_id.in_([row["patient_id"] for row in rows])
+    )).all())
+    if fulltext_supported(connection):
+        index_new_cases(connection, [
+            {"id": ids[row["patient_id"]], **{column: row[column] for column in FULLTEXT_CASE_COLUMNS}}
+            for row in rows
+        ])
+    return [(ids[row["patient_id"]], row["raw_report"]) for row in rows]
+
+
+def _index_similar(inserted: List[Tuple[int, str]]) -> None:
+    if similar_case_index.built:
+        for case_id, raw_report in inserted:
+            similar_case_index.upsert(case_id, raw_report or "")
+
+
+def import_case_records(
+    db: Session,
+    records: List[Any],
+    created_by: int,
+    chunk_size: int = IMPORT_CHUNK_SIZE
+) -> Tuple[int, List[dict]]:
+    """
+    批量导入病例记录，返回 (成功数, 失败记录列表)
+
+    失败记录为 {"index", "patient_name", "error"}，按记录在文件中的位置排序
+    """
+    failed_cases = []
+    valid_cases = []
+    for idx, case_data in enumerate(records):
+        error = _validate(case_data)
+        if error:
+            failed_cases.append(_failure(idx, case_data, error))
+        else:
+            valid_cases.append((idx, case_data))
+
+    patient_ids = _assign_patient_ids(db, valid_cases)
+    now = datetime.utcnow()
+    rows = []
+    for idx, case_data in valid_cases:
+        try:
+            rows.append((idx, _case_row(case_data, patient_ids[idx], created_by, now)))
+        except Exception as e:
+            failed_cases.append(_failure(idx, case_data, str(e)))
+
+    success_count = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        try:
+            inserted = _insert_rows(db, [row for _, row in chunk])
+            db.commit()
+        except Exception:
+            db.rollback()
+            # 分块失败时逐条插入，找出出错的记录
+            inserted = []
+            for idx, row in chunk:
+                try:
+                    inserted += _insert_rows(db, [row])
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    failed_cases.append(_failure(idx, records[idx], str(e)))
+        success_count += len(inserted)
+        _index_similar(inserted)
+
+    failed_cases.sort(key=lambda failure: failure["index"])
+    return success_count, failed_cases
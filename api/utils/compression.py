@@ -0,0 +1,164 @@
+"""
+响应压缩中间件
+
+根据 Accept-Encoding 对超过阈值的响应体进行 Brotli 或 gzip 压缩：
+- 优先使用 Brotli（需安装可选依赖 brotli），否则回退到 gzip
+- 已压缩的格式（zip/pdf/docx/图片等）、304/204 响应、已带 Content-Encoding 的响应不再压缩
+- 只压缩带 Content-Length 的响应：流式响应（StreamingResponse、SSE 等长度未知）原样转发，不缓冲
+- 可压缩的响应无论本次是否压缩都带 Vary: Accept-Encoding，避免共享缓存把未压缩版本返回给其他客户端
+- 压缩后的 ETag 追加编码后缀（如 "abc-gzip"），api/utils/http_cache.py 比较时会自动去除
+
+配置（环境变量）：
+- COMPRESSION_MIN_SIZE: 压缩阈值（字节，默认 1024）
+"""
+import gzip
+import os
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli  # 可选依赖
+except ImportError:  # pragma: no cover - 未安装时回退到 gzip
+    brotli = None
+
+DEFAULT_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+
+# 本身已压缩或不适合再次压缩的媒体类型
+EXCLUDED_MEDIA_PREFIXES = (
+    "application/zip",
+    "application/pdf",
+    "application/vnd.openxmlformats-officedocument",
+    "image/",
+    "video/",
+    "audio/",
+    "text/event-stream",
+)
+
+
+def select_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    根据 Accept-Encoding 选择压缩算法
+
+    Returns:
+        "br" / "gzip"，客户端均不支持时返回 None
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(","):
+        parts = item.strip().split(";")
+        name = parts[0].strip()
+        if not name:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            param = param.strip()
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[name] = quality
+
+    if brotli is not None and accepted.get("br", 0) > 0:
+        return "br"
+    if accepted.get("gzip", 0) > 0:
+        return "gzip"
+    return None
+
+
+def compress_body(body: bytes, encoding: str, gzip_level: int = 6, brotli_quality: int = 5) -> bytes:
+    """使用指定算法压缩响应体"""
+    if encoding == "br":
+        return brotli.compress(body, quality=brotli_quality)
+    return gzip.compress(body, compresslevel=gzip_level)
+
+
+def _content_length(headers: Headers) -> Optional[int]:
+    """响应头中的 Content-Length（缺失或无法解析时返回 None，视为长度未知）"""
+    try:
+        return int(headers["content-length"])
+    except (KeyError, ValueError):
+        return None
+
+
+class CompressionMiddleware:
+    """Brotli / gzip 响应压缩中间件（纯 ASGI 实现）"""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = DEFAULT_MIN_SIZE,
+        gzip_level: int = 6,
+        brotli_quality: int = 5,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = select_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        responder = _CompressionResponder(self, encoding, scope["method"] == "HEAD", send)
+        await self.app(scope, receive, responder)
+
+
+class _CompressionResponder:
+    """在响应头阶段决定是否压缩：需要压缩时缓冲响应体（长度已知），完整后一次性压缩发送"""
+
+    def __init__(self, middleware: CompressionMiddleware, encoding: Optional[str], head: bool, send: Send) -> None:
+        self.middleware = middleware
+        self.encoding = encoding
+        self.head = head
+        self.send = send
+        self.start_message: Optional[Message] = None
+        self.body_parts: List[bytes] = []
+        self.passthrough = True
+
+    async def __call__(self, message: Message) -> None:
+        if message["type"] == "http.response.start":
+            headers = MutableHeaders(scope=message)
+            media_type = headers.get("content-type", "")
+            content_length = _content_length(headers)
+            if (
+                message["status"] in (204, 304)
+                or "content-encoding" in headers
+                or media_type.startswith(EXCLUDED_MEDIA_PREFIXES)
+                or content_length is None
+            ):
+                await self.send(message)
+                return
+            headers.add_vary_header("Accept-Encoding")
+            if self.encoding is None or self.head or content_length < self.middleware.minimum_size:
+                await self.send(message)
+                return
+            self.start_message = message
+            self.passthrough = False
+            return
+
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        self.body_parts.append(message.get("body", b""))
+        if message.get("more_body", False):
+            return
+
+        body = compress_body(
+            b"".join(self.body_parts), self.encoding,
+            gzip_level=self.middleware.gzip_level,
+            brotli_quality=self.middleware.brotli_quality,
+        )
+        headers = MutableHeaders(scope=self.start_message)
+        headers["Content-Encoding"] = self.encoding
+        headers["Content-Length"] = str(len(body))
+        etag = headers.get("etag")
+        if etag and etag.endswith('"'):
+            headers["ETag"] = f'{etag[:-1]}-{self.encoding}"'
+
+        await self.send(self.start_message)
+        await self.send({"type": "http.response.body", "body": body})
@@ -0,0 +1,43 @@
+"""
+客户端断开检测
+
+长时间运行的接口（如多智能体诊断）在客户端断开后继续执行只会白白消耗模型 token。
+cancel_on_disconnect 在执行协程的同时轮询连接状态，客户端断开时取消协程
+（进行中的异步模型请求随之取消），并返回 499。
+"""
+import asyncio
+from typing import Any, Awaitable
+
+from fastapi import HTTPException, Request
+
+# 轮询连接状态的间隔（秒）
+DISCONNECT_POLL_INTERVAL = 1.0
+
+# 客户端关闭请求（沿用 nginx 的非标准状态码）
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(request: Request, awaitable: Awaitable[Any],
+                               poll_interval: float = DISCONNECT_POLL_INTERVAL) -> Any:
+    """
+    执行 awaitable，客户端断开时将其取消
+
+    Raises:
+        HTTPException: 客户端已断开（499）
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise HTTPException(status_code=CLIENT_CLOSED_REQUEST, detail="客户端已断开连接，诊断已取消")
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,51 @@
+"""
+高吞吐列表接口的快速 JSON 序列化
+
+标准路径：ORM 对象 → 逐行构造 Pydantic 模型 → FastAPI 按 response_model 再校验一次 → json 序列化
+快速路径：查询只取所需列（行元组）→ 直接组装 dict → orjson 序列化，跳过两次模型校验
+
+快速路径由各列表接口的 fast=true 参数开启（默认关闭），字段名与标准响应保持一致。
+未安装 orjson 时回退到标准库 json。
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson  # 可选依赖
+except ImportError:  # pragma: no cover - 未安装时回退到标准库
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """标准库 json 回退路径的类型转换（与 Pydantic 的 JSON 输出格式一致）"""
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(content: Any) -> bytes:
+    """将 dict/list 序列化为 JSON 字节串"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_default).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """基于 orjson 的 JSON 响应（直接返回时绕过 response_model 校验）"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+def rows_to_dicts(rows, fields) -> list:
+    """
+    将查询返回的行元组按字段名组装为 dict 列表
+
+    Args:
+        rows: Query.all() / Result.all() 返回的行序列
+        fields: 与行中各列顺序一致的字段名
+    """
+    return [dict(zip(fields, row)) for row in rows]
@@ -0,0 +1,85 @@
+"""
+HTTP 条件请求工具
+
+为大体积只读接口（病例详情、诊断历史全文等）提供：
+- 强 ETag 生成（基于 updated_at / 内容摘要等廉价字段，而非序列化后的响应体）
+- If-None-Match 比较，命中时直接返回 304，跳过响应体序列化
+"""
+import hashlib
+from datetime import datetime
+from typing import Any, Optional
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# 压缩中间件会给 ETag 追加的编码后缀（见 api/utils/compression.py）
+ENCODING_ETAG_SUFFIXES = ("-gzip", "-br")
+
+
+def compute_etag(*parts: Any) -> str:
+    """
+    根据若干廉价字段计算强 ETag
+
+    Args:
+        *parts: 参与计算的字段（如实体ID、updated_at、记录数、查询参数等）
+
+    Returns:
+        带双引号的强 ETag 字符串，如 '"3f2a..."'
+    """
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, datetime):
+            part = part.isoformat()
+        hasher.update(repr(part).encode("utf-8"))
+        hasher.update(b"\x1f")
+    return f'"{hasher.hexdigest()[:32]}"'
+
+
+def _normalize_etag(tag: str) -> str:
+    """去掉弱校验前缀和压缩编码后缀，便于与原始 ETag 比较"""
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    for suffix in ENCODING_ETAG_SUFFIXES:
+        if tag.endswith(f'{suffix}"'):
+            tag = tag[: -len(suffix) - 1] + '"'
+            break
+    return tag
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    判断 If-None-Match 请求头是否与当前 ETag 匹配（弱比较，RFC 9110 §13.1.2）
+
+    Args:
+        if_none_match: 请求头原始值（可能包含多个以逗号分隔的 ETag 或 *）
+        etag: 当前资源的 ETag
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = _normalize_etag(etag)
+    return any(_normalize_etag(candidate) == current for candidate in if_none_match.split(",") if candidate.strip())
+
+
+def not_modified_response(request: Request, etag: str) -> Optional[Response]:
+    """
+    若客户端缓存仍然有效则返回 304 响应，否则返回 None
+
+    使用方式：
+        etag = compute_etag(case.id, case.updated_at)
+        cached = not_modified_response(request, etag)
+        if cached:
+            return cached
+        response.headers["ETag"] = etag
+    """
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+    return None
+
+
+def set_etag_headers(response: Response, etag: str) -> None:
+    """为正常响应写入 ETag 与缓存控制头（私有缓存，每次使用前需重新校验）"""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
@@ -0,0 +1,215 @@
+"""
+幂等请求处理（Idempotency-Key 请求头）
+
+客户端在网络抖动后重试时携带同一个 Idempotency-Key，服务端据此避免重复执行昂贵操作：
+- 首次请求：登记请求指纹，状态为 in_progress，执行完成后保存响应结果
+- 重复请求（原请求已完成）：直接返回保存的原始响应（响应头 Idempotent-Replayed: true）
+- 重复请求（原请求仍在执行）：等待原请求完成后返回其结果，而不是再执行一次
+- 同一幂等键携带不同的请求参数：返回 422
+- 原请求执行失败或被取消（如客户端断开）：删除登记记录，等待中的重复请求将重新执行
+
+幂等键按 (用户, 接口) 隔离，记录保留 IDEMPOTENCY_TTL_SECONDS 秒（默认 24 小时）。
+
+使用方式：
+    idem = await begin_idempotent_request(db, key, current_user.id, "POST /api/...", fingerprint)
+    if idem.replay is not None:
+        return idem.replay
+    try:
+        result = ...
+        complete_idempotent_request(db, idem, 200, result.model_dump(mode="json"))
+    finally:
+        # 未完成（异常或 CancelledError）时删除登记记录；已完成时为空操作
+        abandon_idempotent_request(db, idem)
+"""
+import asyncio
+import hashlib
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from api.models.idempotency import IdempotencyRecord
+
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# in_progress 记录超过该时长仍未完成视为原请求已中断（如进程崩溃），允许接管执行
+IDEMPOTENCY_IN_FLIGHT_TIMEOUT = int(os.getenv("IDEMPOTENCY_IN_FLIGHT_TIMEOUT", "900"))
+# 等待原请求完成时轮询数据库的间隔（跨进程场景）
+POLL_INTERVAL_SECONDS = 0.5
+MAX_KEY_LENGTH = 255
+
+# 本进程内正在执行的请求：记录ID -> (事件循环, 完成事件)（同一事件循环内的重复请求无需轮询即可被唤醒）
+_in_flight_events: Dict[int, Tuple[asyncio.AbstractEventLoop, asyncio.Event]] = {}
+
+
+@dataclass
+class IdempotentRequest:
+    """begin_idempotent_request 的返回结果"""
+    record_id: Optional[int] = None  # 本请求负责执行时为登记记录ID，否则为 None
+    replay: Optional[JSONResponse] = None  # 需要直接返回的原始响应
+    completed: bool = False  # 执行结果已保存（之后 abandon_idempotent_request 为空操作）
+
+
+def compute_fingerprint(*parts: Any) -> str:
+    """根据请求的关键参数计算请求指纹（SHA-256）"""
+    hasher = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            hasher.update(part)
+        else:
+            hasher.update(repr(part).encode("utf-8"))
+        hasher.update(b"\x1f")
+    return hasher.hexdigest()
+
+
+def _replay(record: IdempotencyRecord) -> JSONResponse:
+    """根据保存的结果构造重放响应"""
+    return JSONResponse(
+        status_code=record.status_code or 200,
+        content=json.loads(record.response_body) if record.response_body else None,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def _wait_for_completion(record_id: int) -> None:
+    """等待正在执行的原请求（同进程用事件唤醒，跨进程按间隔轮询）"""
+    entry = _in_flight_events.get(record_id)
+    event = None
+    if entry is not None and entry[0] is asyncio.get_running_loop():
+        event = entry[1]
+    if event is None:
+        await asyncio.sleep(POLL_INTERVAL_SECONDS)
+        return
+    try:
+        await asyncio.wait_for(event.wait(), timeout=POLL_INTERVAL_SECONDS * 10)
+    except asyncio.TimeoutError:
+        pass
+
+
+async def begin_idempotent_request(
+    db: Session,
+    key: Optional[str],
+    user_id: int,
+    endpoint: str,
+    fingerprint: str,
+) -> IdempotentRequest:
+    """
+    登记幂等请求，或返回已有请求的结果
+
+    Args:
+        db: 数据库会话
+        key: Idempotency-Key 请求头（为空时不做幂等处理）
+        user_id: 当前用户ID
+        endpoint: 接口标识
+        fingerprint: 请求指纹
+
+    Raises:
+        HTTPException: 幂等键过长（400）或与不同的请求参数复用（422）
+    """
+    if not key:
+        return IdempotentRequest()
+    if len(key) > MAX_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key 长度不能超过 {MAX_KEY_LENGTH}")
+
+    while True:
+        now = datetime.utcnow()
+        # 顺带清理过期记录（expires_at 有索引）
+        db.query(IdempotencyRecord).filter(IdempotencyRecord.expires_at < now).delete(synchronize_session=False)
+
+        record = db.query(IdempotencyRecord).filter(
+            IdempotencyRecord.user_id == user_id,
+            IdempotencyRecord.endpoint == endpoint,
+            IdempotencyRecord.idempotency_key == key
+        ).first()
+
+        if record is None:
+            record = IdempotencyRecord(
+                idempotency_key=key,
+                user_id=user_id,
+                endpoint=endpoint,
+                fingerprint=fingerprint,
+                status="in_progress",
+                created_at=now,
+                expires_at=now + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            )
+            db.add(record)
+            try:
+                db.commit()
+            except IntegrityError:
+                # 并发的重复请求抢先登记，重新读取其状态
+                db.rollback()
+                continue
+            _in_flight_events[record.id] = (asyncio.get_running_loop(), asyncio.Event())
+            return IdempotentRequest(record_id=record.id)
+
+        if record.fingerprint != fingerprint:
+            db.commit()
+            raise HTTPException(status_code=422, detail="Idempotency-Key 已用于参数不同的请求，请更换幂等键")
+
+        if record.status == "completed":
+            replay = _replay(record)
+            db.commit()
+            return IdempotentRequest(replay=replay)
+
+        if record.created_at and record.created_at < now - timedelta(seconds=IDEMPOTENCY_IN_FLIGHT_TIMEOUT):
+            # 原请求长时间未完成（进程中断等），删除记录后由本请求接管
+            db.delete(record)
+            db.commit()
+            continue
+
+        # 原请求仍在执行：结束当前读事务后等待，再重新检查
+        record_id = record.id
+        db.commit()
+        await _wait_for_completion(record_id)
+
+
+def complete_idempotent_request(db: Session, request: IdempotentRequest, status_code: int, body: Any) -> None:
+    """保存执行结果并唤醒等待中的重复请求"""
+    if request.record_id is None:
+        return
+    db.query(IdempotencyRecord).filter(IdempotencyRecord.id == request.record_id).update({
+        "status": "completed",
+        "status_code": status_code,
+        "response_body": json.dumps(body, ensure_ascii=False),
+    }, synchronize_session=False)
+    db.commit()
+    request.completed = True
+    _notify(request.record_id)
+
+
+def abandon_idempotent_request(db: Session, request: IdempotentRequest) -> None:
+    """
+    执行失败或被取消时删除登记记录（允许客户端使用同一幂等键重试），并唤醒等待者
+
+    结果已保存（complete_idempotent_request 已执行）时为空操作，可直接放在 finally 中调用
+    """
+    if request.record_id is None or request.completed:
+        return
+    try:
+        db.rollback()
+        db.query(IdempotencyRecord).filter(IdempotencyRecord.id == request.record_id).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        # 删除失败时等待者也需要被唤醒（重新读取记录，超过 IDEMPOTENCY_IN_FLIGHT_TIMEOUT 后接管）
+        _notify(request.record_id)
+
+
+def _notify(record_id: int) -> None:
+    """唤醒本进程内等待该记录的请求"""
+    entry = _in_flight_events.pop(record_id, None)
+    if entry is None:
+        return
+    loop, event = entry
+    try:
+        if loop is asyncio.get_running_loop():
+            event.set()
+            return
+    except RuntimeError:
+        pass
+    if not loop.is_closed():
+        loop.call_soon_threadsafe(event.set)
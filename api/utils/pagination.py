@@ -0,0 +1,131 @@
+"""
+游标（Keyset）分页工具
+
+以 (排序字段, id) 作为游标，替代 OFFSET 分页：
+- 每页查询只需沿索引定位到游标位置后读取 limit 行，深度翻页与第一页代价相同
+- id 作为第二排序键，保证排序字段取值相同时结果仍然稳定
+
+游标为 base64url 编码的 JSON，内容包含排序字段、排序方向、最后一行的排序值和 id，
+客户端应将其视为不透明字符串原样回传。
+"""
+import base64
+import json
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(sort: str, order: str, value: Any, row_id: int) -> str:
+    """
+    编码分页游标
+
+    Args:
+        sort: 排序字段名
+        order: 排序方向（asc/desc）
+        value: 当前页最后一行的排序字段值
+        row_id: 当前页最后一行的 id
+    """
+    if isinstance(value, datetime):
+        payload_value = {"dt": value.isoformat()}
+    else:
+        payload_value = value
+    payload = {"s": sort, "o": order, "v": payload_value, "id": row_id}
+    raw = json.dumps(payload, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str, order: str) -> Dict[str, Any]:
+    """
+    解码分页游标并校验其与当前排序参数一致
+
+    Returns:
+        {"value": 排序值, "id": 行ID}
+
+    Raises:
+        HTTPException: 游标格式错误或与当前排序参数不一致（400）
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8"))
+        value = payload["v"]
+        if isinstance(value, dict) and "dt" in value:
+            value = datetime.fromisoformat(value["dt"])
+        row_id = int(payload["id"])
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=400, detail="无效的分页游标")
+
+    if payload.get("s") != sort or payload.get("o") != order:
+        raise HTTPException(status_code=400, detail="分页游标与当前排序参数不一致，请重新从第一页开始")
+
+    return {"value": value, "id": row_id}
+
+
+def keyset_filter(sort_column, id_column, order: str, value: Any, row_id: int):
+    """
+    构造“位于游标之后”的过滤条件
+
+    降序：(sort_column, id) < (value, row_id)
+    升序：(sort_column, id) > (value, row_id)
+
+    使用 OR/AND 展开而非行值比较，兼容 SQLite 与 PostgreSQL。
+    排序字段需为非空列（或已用 coalesce 处理的表达式）。
+    """
+    if order == "asc":
+        return or_(sort_column > value, and_(sort_column == value, id_column > row_id))
+    return or_(sort_column < value, and_(sort_column == value, id_column < row_id))
+
+
+def keyset_order_by(sort_column, id_column, order: str):
+    """返回与 keyset_filter 配套的排序子句"""
+    if order == "asc":
+        return (sort_column.asc(), id_column.asc())
+    return (sort_column.desc(), id_column.desc())
+
+
+def normalize_order(order: Optional[str]) -> str:
+    """将排序方向规范为 asc/desc（默认 desc）"""
+    return "asc" if (order or "").lower() == "asc" else "desc"
+
+
+class CountCache:
+    """
+    总数缓存（进程内，带过期时间）
+
+    用于分页列表的 total 字段：同一筛选条件在 TTL 内复用上次的 COUNT 结果，
+    避免每次翻页都对多表关联结果做一次全量计数。数据变更后由使用方调用 clear() 失效。
+    """
+
+    def __init__(self, ttl_seconds: float = 60.0, max_entries: int = 256):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: Dict[Any, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, key: Any, compute: Callable[[], int]) -> int:
+        """命中且未过期时返回缓存值，否则调用 compute 计算并缓存"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > now:
+                return entry[0]
+
+        value = compute()
+
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                # 先清理过期项，仍然超限则淘汰最早过期的一项
+                self._entries = {k: v for k, v in self._entries.items() if v[1] > now}
+                if len(self._entries) >= self.max_entries:
+                    oldest = min(self._entries, key=lambda k: self._entries[k][1])
+                    self._entries.pop(oldest, None)
+            self._entries[key] = (value, now + self.ttl_seconds)
+        return value
+
+    def clear(self) -> None:
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,239 @@
+"""
+相似病例索引（本地 TF-IDF 向量索引）
+
+很多新病例与已诊断过的病例几乎相同（如模板化的转诊单）。本模块在进程内为
+MedicalCase.raw_report 维护一个基于 NumPy 的向量索引，完全在 CPU 上运行，不调用任何外部服务：
+
+- 分词：英文/数字按词切分，中日韩文字按相邻两字（bigram）切分
+- 特征哈希：词项哈希到 SIMILARITY_INDEX_DIM 维（无需维护词表，可增量更新）
+- 权重：对数词频（1 + log tf）存入矩阵，文档频率 df 增量维护，查询时乘以 IDF 并计算余弦相似度
+
+索引在首次查询时从数据库构建，之后通过 MedicalCase 的 ORM 事件（新增 / 修改 raw_report / 删除）增量更新：
+flush 时只把变更记在会话上，事务提交后才写入索引，回滚的事务不会在索引中留下向量。
+"""
+import hashlib
+import math
+import os
+import re
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import event, inspect as sa_inspect
+from sqlalchemy.orm import Session, object_session
+
+from api.models.case import MedicalCase
+
+# 向量维度（越大哈希冲突越少，内存占用为 病例数 × 维度 × 4 字节）
+SIMILARITY_INDEX_DIM = int(os.getenv("SIMILARITY_INDEX_DIM", "1024"))
+# 从数据库构建索引时每批读取的行数
+BUILD_BATCH_SIZE = 500
+
+_WORD_PATTERN = re.compile(r"[a-z0-9]+(?:\.[0-9]+)?")
+_CJK_RUN_PATTERN = re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\u3040-\u30ff\uac00-\ud7af]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """将病历文本切分为词项（英文单词 / 数字 / 中日韩文字 bigram）"""
+    if not text:
+        return []
+    text = text.lower()
+    tokens = _WORD_PATTERN.findall(text)
+    for run in _CJK_RUN_PATTERN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _bucket(token: str, dim: int) -> int:
+    """稳定的词项哈希（不受 PYTHONHASHSEED 影响）"""
+    digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little") % dim
+
+
+def vectorize(text: str, dim: int = SIMILARITY_INDEX_DIM) -> np.ndarray:
+    """计算文本的对数词频向量（未乘 IDF）"""
+    vector = np.zeros(dim, dtype=np.float32)
+    counts = Counter(_bucket(token, dim) for token in tokenize(text))
+    for index, count in counts.items():
+        vector[index] = 1.0 + math.log(count)
+    return vector
+
+
+class SimilarCaseIndex:
+    """基于 NumPy 矩阵的相似病例索引（线程安全）"""
+
+    def __init__(self, dim: int = SIMILARITY_INDEX_DIM):
+        self.dim = dim
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        """清空索引（不替换锁：其他线程可能正在等待或持有它）"""
+        self._matrix = np.zeros((0, self.dim), dtype=np.float32)
+        self._row_ids = np.zeros(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}  # 病例ID -> 矩阵行号
+        self._size = 0
+        self._doc_freq = np.zeros(self.dim, dtype=np.float64)
+        self.built = False
+
+    def __len__(self):
+        return self._size
+
+    def _ensure_capacity(self, size: int) -> None:
+        capacity = self._matrix.shape[0]
+        if size <= capacity:
+            return
+        new_capacity = max(size, capacity * 2, 64)
+        matrix = np.zeros((new_capacity, self.dim), dtype=np.float32)
+        matrix[:self._size] = self._matrix[:self._size]
+        row_ids = np.zeros(new_capacity, dtype=np.int64)
+        row_ids[:self._size] = self._row_ids[:self._size]
+        self._matrix, self._row_ids = matrix, row_ids
+
+    def upsert(self, case_id: int, text: str) -> None:
+        """新增或更新病例向量"""
+        vector = vectorize(text, self.dim)
+        with self._lock:
+            row = self._rows.get(case_id)
+            if row is None:
+                self._ensure_capacity(self._size + 1)
+                row = self._size
+                self._size += 1
+                self._rows[case_id] = row
+                self._row_ids[row] = case_id
+            else:
+                self._doc_freq -= self._matrix[row] > 0
+            self._matrix[row] = vector
+            self._doc_freq += vector > 0
+
+    def remove(self, case_id: int) -> None:
+        """删除病例向量（用最后一行填补空位）"""
+        with self._lock:
+            row = self._rows.pop(case_id, None)
+            if row is None:
+                return
+            self._doc_freq -= self._matrix[row] > 0
+            last = self._size - 1
+            if row != last:
+                self._matrix[row] = self._matrix[last]
+                self._row_ids[row] = self._row_ids[last]
+                self._rows[int(self._row_ids[row])] = row
+            self._matrix[last] = 0
+            self._size = last
+
+    def query(self, text: str, k: int = 5, exclude_id: Optional[int] = None,
+              allowed_ids: Optional[set] = None) -> List[Tuple[int, float]]:
+        """
+        返回与文本最相似的 k 个病例
+
+        Args:
+            text: 查询文本
+            k: 返回数量
+            exclude_id: 排除的病例ID（通常为查询病例本身）
+            allowed_ids: 仅在这些病例中查找（None 表示不限）
+
+        Returns:
+            [(病例ID, 余弦相似度)]，按相似度降序
+        """
+        query_vector = vectorize(text, self.dim)
+        with self._lock:
+            if self._size == 0 or not query_vector.any():
+                return []
+            idf = (np.log((1.0 + self._size) / (1.0 + self._doc_freq)) + 1.0).astype(np.float32)
+            matrix = self._matrix[:self._size] * idf
+            row_ids = self._row_ids[:self._size].copy()
+
+        weighted_query = query_vector * idf
+        norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(weighted_query)
+        norms[norms == 0] = 1.0
+        scores = (matrix @ weighted_query) / norms
+
+        mask = np.ones(len(row_ids), dtype=bool)
+        if exclude_id is not None:
+            mask &= row_ids != exclude_id
+        if allowed_ids is not None:
+            mask &= np.isin(row_ids, np.fromiter(allowed_ids, dtype=np.int64, count=len(allowed_ids)))
+        candidates = np.flatnonzero(mask)
+        if len(candidates) == 0:
+            return []
+
+        k = min(k, len(candidates))
+        top = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+        top = top[np.argsort(-scores[top])]
+        return [(int(row_ids[i]), float(scores[i])) for i in top]
+
+    def build(self, db: Session) -> None:
+        """从数据库全量构建索引"""
+        with self._lock:
+            self._reset()
+            last_id = 0
+            while True:
+                rows = db.query(MedicalCase.id, MedicalCase.raw_report).filter(
+                    MedicalCase.id > last_id
+                ).order_by(MedicalCase.id).limit(BUILD_BATCH_SIZE).all()
+                if not rows:
+                    break
+                for case_id, raw_report in rows:
+                    self.upsert(case_id, raw_report or "")
+                last_id = rows[-1][0]
+            self.built = True
+
+
+# 进程内共享的相似病例索引
+similar_case_index = SimilarCaseIndex()
+
+
+def get_similar_case_index(db: Session) -> SimilarCaseIndex:
+    """获取相似病例索引（首次调用时从数据库构建）"""
+    if not similar_case_index.built:
+        similar_case_index.build(db)
+    return similar_case_index
+
+
+# 会话上待提交后写入索引的变更：[(病例ID, 病历全文；None 表示删除)]
+_PENDING_KEY = "similarity_index_pending"
+
+
+def _defer(target, raw_report: Optional[str]) -> None:
+    """记录变更，提交后写入索引（见 _apply_pending）"""
+    session = object_session(target)
+    if session is None or not similar_case_index.built:
+        return
+    session.info.setdefault(_PENDING_KEY, []).append((target.id, raw_report))
+
+
+@event.listens_for(MedicalCase, "after_insert")
+def _index_inserted_case(mapper, connection, target):
+    _defer(target, target.raw_report or "")
+
+
+@event.listens_for(MedicalCase, "after_update")
+def _index_updated_case(mapper, connection, target):
+    if sa_inspect(target).attrs.raw_report.history.has_changes():
+        _defer(target, target.raw_report or "")
+
+
+@event.listens_for(MedicalCase, "after_delete")
+def _unindex_deleted_case(mapper, connection, target):
+    _defer(target, None)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_pending(session):
+    pending = session.info.pop(_PENDING_KEY, None)
+    if not pending or not similar_case_index.built:
+        return
+    for case_id, raw_report in pending:
+        if raw_report is None:
+            similar_case_index.remove(case_id)
+        else:
+            similar_case_index.upsert(case_id, raw_report)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending(session):
+    session.info.pop(_PENDING_KEY, None)
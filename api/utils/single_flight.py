@@ -0,0 +1,181 @@
+"""
+单飞（single-flight）请求合并
+
+多名医生同时打开同一病例并点击"运行诊断"时，参数完全相同的请求只执行一次，
+其余请求等待这次执行并共享其结果（只产生一条诊断历史记录）。
+
+- 进程内：以请求键登记一个 Future，后到的相同请求直接等待该 Future
+- 跨进程（可选，DIAGNOSIS_SINGLE_FLIGHT_DB_LOCK=true）：在 single_flight_locks 表中
+  插入锁记录，抢到锁的进程执行并写回结果，其他进程轮询读取结果
+
+执行失败时异常会传给所有等待者；执行者被取消（如客户端断开）时，
+等待者将重新竞争执行权，而不是一起失败。
+
+使用方式：
+    result, shared = await DIAGNOSIS_SINGLE_FLIGHT.do(key, coroutine_function)
+"""
+import asyncio
+import concurrent.futures
+import json
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from api.db.database import SessionLocal
+from api.models.single_flight import SingleFlightLock
+
+
+class _LeaderCancelled(Exception):
+    """执行者被取消，等待者需要重新竞争执行权"""
+
+
+class SingleFlight:
+    """
+    单飞执行器
+
+    Args:
+        db_lock: 是否启用跨进程数据库锁
+        poll_interval: 跨进程等待时轮询锁记录的间隔（秒）
+        lock_timeout: running 状态的锁超过该时长视为持有者已中断，允许接管（秒）
+        result_ttl: 执行完成后结果在锁表中保留的时长，供其他进程读取（秒）
+    """
+
+    def __init__(self, db_lock: bool = False, poll_interval: float = 0.5,
+                 lock_timeout: int = 900, result_ttl: int = 60):
+        self.db_lock = db_lock
+        self.poll_interval = poll_interval
+        self.lock_timeout = lock_timeout
+        self.result_ttl = result_ttl
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._calls: Dict[str, concurrent.futures.Future] = {}
+        self._mutex = threading.Lock()
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        执行 fn 或等待相同键的正在进行的执行
+
+        Returns:
+            (结果, 是否为共享结果)；跨进程共享时结果为 JSON 反序列化后的值
+        """
+        while True:
+            with self._mutex:
+                future = self._calls.get(key)
+                leader = future is None
+                if leader:
+                    future = concurrent.futures.Future()
+                    self._calls[key] = future
+
+            if not leader:
+                try:
+                    # shield：等待者被取消不影响执行者
+                    return await asyncio.shield(asyncio.wrap_future(future)), True
+                except _LeaderCancelled:
+                    continue
+
+            try:
+                if self.db_lock:
+                    result, shared = await self._do_with_db_lock(key, fn)
+                else:
+                    result, shared = await fn(), False
+            except Exception as e:
+                future.set_exception(e)
+                raise
+            except BaseException:
+                future.set_exception(_LeaderCancelled())
+                raise
+            else:
+                future.set_result(result)
+                return result, shared
+            finally:
+                with self._mutex:
+                    self._calls.pop(key, None)
+
+    def in_flight(self, key: str) -> bool:
+        """本进程内是否有该键正在执行"""
+        with self._mutex:
+            return key in self._calls
+
+    async def _do_with_db_lock(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """通过锁表在多个进程之间合并执行"""
+        while True:
+            acquired, done_result = self._try_acquire(key)
+            if done_result is not None:
+                return json.loads(done_result), True
+            if acquired:
+                break
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            result = await fn()
+        except BaseException:
+            self._release(key)
+            raise
+        self._store_result(key, result)
+        return result, False
+
+    def _try_acquire(self, key: str) -> Tuple[bool, Optional[str]]:
+        """尝试加锁，返回 (是否加锁成功, 其他进程已完成的结果)"""
+        db = SessionLocal()
+        try:
+            now = datetime.utcnow()
+            db.query(SingleFlightLock).filter(SingleFlightLock.expires_at < now).delete(synchronize_session=False)
+            db.commit()
+
+            lock = db.query(SingleFlightLock).filter(SingleFlightLock.flight_key == key).first()
+            if lock is not None:
+                if lock.status == "done":
+                    return False, lock.result
+                if lock.created_at and lock.created_at >= now - timedelta(seconds=self.lock_timeout):
+                    return False, None
+                # 持有者长时间未完成（进程中断等），删除后重新竞争
+                db.delete(lock)
+                db.commit()
+
+            db.add(SingleFlightLock(flight_key=key, owner=self._owner, status="running", created_at=now))
+            try:
+                db.commit()
+            except IntegrityError:
+                db.rollback()
+                return False, None
+            return True, None
+        finally:
+            db.close()
+
+    def _store_result(self, key: str, result: Any) -> None:
+        """写回执行结果，供其他进程的等待者读取"""
+        db = SessionLocal()
+        try:
+            db.query(SingleFlightLock).filter(
+                SingleFlightLock.flight_key == key,
+                SingleFlightLock.owner == self._owner
+            ).update({
+                "status": "done",
+                "result": json.dumps(result, ensure_ascii=False),
+                "expires_at": datetime.utcnow() + timedelta(seconds=self.result_ttl),
+            }, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def _release(self, key: str) -> None:
+        """执行失败时释放锁，其他进程的等待者将重新竞争执行权"""
+        db = SessionLocal()
+        try:
+            db.query(SingleFlightLock).filter(
+                SingleFlightLock.flight_key == key,
+                SingleFlightLock.owner == self._owner
+            ).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+
+# 诊断请求的单飞执行器（键：病例ID + 模型 + 语言 + 病历原文）
+DIAGNOSIS_SINGLE_FLIGHT = SingleFlight(
+    db_lock=os.getenv("DIAGNOSIS_SINGLE_FLIGHT_DB_LOCK", "false").lower() == "true",
+    lock_timeout=int(os.getenv("DIAGNOSIS_SINGLE_FLIGHT_LOCK_TIMEOUT", "900")),
+)
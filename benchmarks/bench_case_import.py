@@ -0,0 +1,116 @@
+"""
+病例导入基准测试：逐条导入与批量导入的导入速率（病例/秒）
+
+- 逐条导入（原实现）：每个病例一次 SELECT 查重 + ORM 写入 + commit
+- 批量导入（api/utils/case_import.py）：先校验全部记录、批量分配编号，再按块 executemany 插入
+
+两种方式都写入全文索引（逐条导入经由 ORM 事件），编号都由 case_id_sequences 分配，
+原实现同一分钟内相同性别年龄的编号冲突在这里不计入对比。
+
+使用临时目录中的 SQLite 数据库（与服务相同的 WAL / synchronous 配置），不会修改项目数据库。
+
+运行方式：
+    python benchmarks/bench_case_import.py [--sizes 1000,10000] [--chunk-size 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api.db.database import Base, apply_sqlite_pragmas
+from api.models.case import MedicalCase
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+from api.utils.case_formatter import CaseFormatter
+from api.utils.case_id_generator import allocate_case_id
+from api.utils.case_import import IMPORT_CHUNK_SIZE, import_case_records
+
+COMPLAINTS = ["反复胸痛三天", "头晕伴恶心", "发热咳嗽一周", "Palpitations at night", "Shortness of breath"]
+HISTORIES = ["高血压病史10年", "2型糖尿病", "No significant history", "Smoker, 20 pack-years", "甲状腺结节"]
+
+
+def make_records(size: int, rng: random.Random) -> list:
+    return [
+        {
+            "patient_name": f"Patient {i}",
+            "age": rng.randint(18, 90),
+            "gender": rng.choice(["male", "female"]),
+            "chief_complaint": rng.choice(COMPLAINTS),
+            "medical_history": rng.choice(HISTORIES),
+            "lab_results": "TnI 0.01 ng/mL; LDL 3.2 mmol/L",
+        }
+        for i in range(size)
+    ]
+
+
+def legacy_import(db, records: list, created_by: int) -> int:
+    """原实现：逐条查重、写入、提交"""
+    success_count = 0
+    for case_data in records:
+        patient_id = allocate_case_id(db, case_data['gender'], case_data['age'])
+        db.query(MedicalCase).filter(MedicalCase.patient_id == patient_id).first()
+        raw_report = CaseFormatter.format_case_report(
+            patient_id=patient_id,
+            patient_name=case_data['patient_name'],
+            age=case_data['age'],
+            gender=case_data['gender'],
+            chief_complaint=case_data['chief_complaint'],
+            medical_history=case_data.get('medical_history'),
+            lab_results=case_data.get('lab_results'),
+        )
+        db.add(MedicalCase(
+            patient_id=patient_id,
+            patient_name=case_data['patient_name'],
+            age=case_data['age'],
+            gender=case_data['gender'],
+            chief_complaint=case_data['chief_complaint'],
+            raw_report=raw_report,
+            created_by=created_by,
+        ))
+        db.commit()
+        success_count += 1
+    return success_count
+
+
+def run(path: str, func, records: list) -> float:
+    engine = create_engine(f"sqlite:///{path}")
+    apply_sqlite_pragmas(engine)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    try:
+        started = time.perf_counter()
+        func(session, records)
+        elapsed = time.perf_counter() - started
+    finally:
+        session.close()
+        engine.dispose()
+    return len(records) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="病例导入速率基准测试")
+    parser.add_argument("--sizes", default="1000,10000", help="每次导入的病例数（逗号分隔）")
+    parser.add_argument("--chunk-size", type=int, default=IMPORT_CHUNK_SIZE, help="批量导入每个事务的病例数")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'cases':>8}{'legacy/s':>12}{'bulk/s':>12}{'speedup':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            records = make_records(size, rng)
+            legacy = run(os.path.join(tmp, f"legacy_{size}.db"), lambda db, r: legacy_import(db, r, 1), records)
+            bulk = run(os.path.join(tmp, f"bulk_{size}.db"),
+                       lambda db, r: import_case_records(db, r, 1, args.chunk_size), records)
+            print(f"{size:>8}{legacy:>12.0f}{bulk:>12.0f}{bulk / legacy:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+全文检索基准测试：FTS5 检索延迟随数据量的变化
+
+在不同规模的病例库上，对比 /api/search 的病例检索（FTS5 MATCH + bm25 排序 + 摘要）
+与 get_all_diagnoses 现有的 LIKE '%...%' 过滤（全表扫描，只能匹配病历号 / 姓名等短字段）。
+
+使用临时目录中的 SQLite 数据库，不会修改项目数据库。
+
+运行方式：
+    python benchmarks/bench_fulltext_search.py [--sizes 1000,10000,50000] [--repeat 20]
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from api.db.database import Base
+from api.db.fulltext import build_match_query
+from api.models.case import MedicalCase
+from api.models.user import User
+import api.models.settings  # noqa: F401  确保所有表注册到 Base.metadata
+from api.routes.search import _search_cases
+
+COMPLAINTS = ["反复胸痛三天", "头晕伴恶心", "发热咳嗽一周", "Palpitations at night", "Shortness of breath",
+              "Chronic fatigue", "间断心悸两月", "Abdominal pain after meals"]
+FINDINGS = ["心电图提示窦性心律", "血常规未见异常", "胸片示双肺纹理增粗", "Troponin within normal range",
+            "Holter shows paroxysmal atrial fibrillation", "TSH mildly elevated", "肝肾功能正常",
+            "Echocardiogram normal", "血压 150/95 mmHg", "D-dimer negative", "甲状腺功能亢进待排"]
+# 稀有词（约 1% 病例包含），接近真实检索场景
+RARE_TERMS = ["嗜铬细胞瘤", "Brugada", "Takotsubo", "主动脉夹层"]
+QUERIES = ["胸痛", "fibrillation", "Brugada", "主动脉夹层", "甲状腺 elevated"]
+
+
+def seed(session, size: int, rng: random.Random) -> None:
+    session.add_all([
+        MedicalCase(
+            patient_id=f"P{i:08d}", patient_name=f"Patient {i}", chief_complaint=rng.choice(COMPLAINTS),
+            raw_report="。".join(rng.choices(FINDINGS, k=30))
+            + ("。" + rng.choice(RARE_TERMS) if rng.random() < 0.01 else ""),
+            created_by=1,
+        )
+        for i in range(size)
+    ])
+    session.commit()
+
+
+def median_ms(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FTS5 全文检索延迟基准测试")
+    parser.add_argument("--sizes", default="1000,10000,50000", help="病例数（逗号分隔）")
+    parser.add_argument("--repeat", type=int, default=20, help="每个查询的重复次数（取中位数）")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    print(f"{'cases':>8}  {'query':<16}{'fts ms':>9}{'like ms':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in [int(s) for s in args.sizes.split(",")]:
+            engine = create_engine(f"sqlite:///{os.path.join(tmp, f'search_{size}.db')}")
+            Base.metadata.create_all(bind=engine)
+            session = sessionmaker(bind=engine)()
+            user = User(id=1, username="bench", email="bench@example.com", hashed_password="x", is_superuser=True)
+            session.add(user)
+            seed(session, size, rng)
+
+            for q in QUERIES:
+                match = build_match_query(q)
+                fts = median_ms(lambda: _search_cases(session, match, user, 20), args.repeat)
+                like = median_ms(lambda: session.query(MedicalCase.id).filter(
+                    MedicalCase.patient_name.like(f"%{q}%")).limit(20).all(), args.repeat)
+                print(f"{size:>8}  {q:<16}{fts:>9.2f}{like:>9.2f}")
+            session.close()
+            engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
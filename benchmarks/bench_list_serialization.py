@@ -0,0 +1,141 @@
+"""
+列表接口序列化开销基准测试
+
+对比 list_cases、get_all_diagnoses、list_users 在标准路径（Pydantic 模型 + response_model 校验）
+与快速路径（行元组 + orjson，fast=true）下的单行开销。
+
+使用内存 SQLite 数据库与 TestClient，不依赖外部服务，也不会修改项目数据库。
+
+运行方式：
+    python benchmarks/bench_list_serialization.py [--rows 2000] [--repeat 5]
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from api.db.database import Base, get_db
+from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.user import User, Role
+import api.models.settings  # noqa: F401  确保所有表注册到 Base.metadata
+from api.auth.dependencies import get_current_user
+from api.main import app
+
+
+def build_session_factory(rows: int):
+    """创建内存数据库并写入测试数据"""
+    engine = create_engine(
+        "sqlite://",
+        connect_args={"check_same_thread": False},
+        poolclass=StaticPool,
+    )
+    Base.metadata.create_all(bind=engine)
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = SessionLocal()
+    roles = [Role(name=name, display_name=name) for name in ("admin", "doctor", "viewer")]
+    db.add_all(roles)
+    admin = User(username="bench_admin", email="bench@example.com", hashed_password="x", is_superuser=True)
+    admin.roles = [roles[0]]
+    db.add(admin)
+    for i in range(rows):
+        user = User(username=f"user{i}", email=f"user{i}@example.com", hashed_password="x", full_name=f"User {i}")
+        user.roles = [roles[i % 3]]
+        db.add(user)
+    db.flush()
+
+    base_time = datetime(2025, 1, 1)
+    for i in range(rows):
+        case = MedicalCase(
+            patient_id=f"P{i:08d}",
+            patient_name=f"Patient {i}",
+            age=20 + i % 60,
+            gender="male" if i % 2 else "female",
+            chief_complaint="Persistent cough and shortness of breath " * 2,
+            raw_report="Medical Case Report\n" + "Lab results within normal range. " * 200,
+            created_by=admin.id,
+            created_at=base_time + timedelta(minutes=i),
+        )
+        db.add(case)
+        db.flush()
+        db.add(DiagnosisHistory(
+            case_id=case.id,
+            diagnosis_markdown="# Multidisciplinary Diagnosis\n" + "- Possible issue with reasoning. " * 150,
+            model_name="gpt-4o",
+            run_timestamp=base_time + timedelta(minutes=i),
+            execution_time_ms=12000,
+        ))
+    db.commit()
+    admin_id = admin.id
+    db.close()
+    return SessionLocal, admin_id
+
+
+def time_request(client: TestClient, url: str, params: dict, repeat: int) -> float:
+    """返回多次请求中的最短耗时（秒）"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.get(url, params=params)
+        elapsed = time.perf_counter() - start
+        assert response.status_code == 200, response.text
+        best = min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="列表接口序列化开销基准测试")
+    parser.add_argument("--rows", type=int, default=2000, help="每个列表的行数")
+    parser.add_argument("--repeat", type=int, default=5, help="每种路径的重复次数（取最小值）")
+    args = parser.parse_args()
+
+    SessionLocal, admin_id = build_session_factory(args.rows)
+
+    def override_get_db():
+        db = SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    def override_current_user():
+        db = SessionLocal()
+        try:
+            return db.query(User).filter(User.id == admin_id).first()
+        finally:
+            db.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = override_current_user
+    client = TestClient(app)
+
+    endpoints = [
+        ("list_cases", "/api/cases", {"limit": min(args.rows, 500)}, min(args.rows, 500)),
+        ("get_all_diagnoses", "/api/diagnoses/all", {"page_size": 200, "count_mode": "none"}, 200),
+        ("list_users", "/api/users", {"limit": args.rows}, args.rows),
+    ]
+
+    print(f"{'endpoint':<20}{'rows':>6}{'standard ms':>14}{'fast ms':>10}{'std us/row':>12}{'fast us/row':>13}{'speedup':>9}")
+    for name, url, params, rows in endpoints:
+        standard = time_request(client, url, params, args.repeat)
+        fast = time_request(client, url, {**params, "fast": "true"}, args.repeat)
+        print(
+            f"{name:<20}{rows:>6}{standard * 1000:>14.1f}{fast * 1000:>10.1f}"
+            f"{standard / rows * 1e6:>12.1f}{fast / rows * 1e6:>13.1f}{standard / fast:>8.2f}x"
+        )
+
+    app.dependency_overrides.clear()
+
+
+if __name__ == "__main__":
+    main()
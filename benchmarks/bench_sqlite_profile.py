@@ -0,0 +1,145 @@
+"""
+SQLite 存储配置基准测试：混合读写吞吐
+
+对比两种配置在并发写入诊断记录 + 并发统计查询下的吞吐与 "database is locked" 错误数：
+- default：单个引擎、默认连接池、默认 PRAGMA（回滚日志，synchronous=FULL，无 busy_timeout）
+- profile：api/db/database.py 的存储配置（WAL、synchronous=NORMAL、busy_timeout、mmap、cache_size，
+           单写者连接池 + 只读连接池）
+
+使用临时目录中的数据库文件，不会修改项目数据库。
+
+运行方式：
+    python benchmarks/bench_sqlite_profile.py [--seconds 5] [--writers 4] [--readers 8] [--rows 5000]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+# 添加项目根目录到 Python 路径
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+
+from api.db.database import Base, create_sqlite_engines
+from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.user import User
+import api.models.settings  # noqa: F401  确保所有表注册到 Base.metadata
+
+MODEL_NAMES = ["gpt-4o", "claude-sonnet-4.5", "gemini-2.5-flash"]
+
+
+def seed(engine, rows: int) -> list:
+    """写入测试病例与诊断记录，返回病例ID列表"""
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    user = User(username="bench", email="bench@example.com", hashed_password="x", is_superuser=True)
+    db.add(user)
+    db.flush()
+    base_time = datetime(2025, 1, 1)
+    cases = []
+    for i in range(max(1, rows // 5)):
+        case = MedicalCase(patient_id=f"P{i:08d}", patient_name=f"Patient {i}", age=20 + i % 60,
+                           gender="male" if i % 2 else "female", chief_complaint="Cough",
+                           raw_report="Lab results within normal range. " * 50, created_by=user.id)
+        cases.append(case)
+    db.add_all(cases)
+    db.flush()
+    case_ids = [case.id for case in cases]
+    db.add_all([
+        DiagnosisHistory(case_id=case_ids[i % len(case_ids)], diagnosis_markdown="# Diagnosis\n" + "- item. " * 100,
+                         model_name=MODEL_NAMES[i % len(MODEL_NAMES)], execution_time_ms=10000 + i % 5000,
+                         run_timestamp=base_time + timedelta(minutes=i))
+        for i in range(rows)
+    ])
+    db.commit()
+    db.close()
+    return case_ids
+
+
+def run_workload(write_factory, read_factory, case_ids, seconds, writers, readers) -> dict:
+    """并发执行写入与统计查询，返回各类操作计数"""
+    counts = {"writes": 0, "reads": 0, "locked": 0, "other_errors": 0}
+    lock = threading.Lock()
+    stop_at = time.perf_counter() + seconds
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer(index):
+        i = 0
+        while time.perf_counter() < stop_at:
+            db = write_factory()
+            try:
+                db.add(DiagnosisHistory(case_id=case_ids[(index + i) % len(case_ids)],
+                                        diagnosis_markdown="# Diagnosis\n" + "- new item. " * 100,
+                                        model_name=MODEL_NAMES[i % len(MODEL_NAMES)], execution_time_ms=12000))
+                db.commit()
+                bump("writes")
+            except OperationalError as e:
+                db.rollback()
+                bump("locked" if "locked" in str(e) else "other_errors")
+            finally:
+                db.close()
+            i += 1
+
+    def reader():
+        while time.perf_counter() < stop_at:
+            db = read_factory()
+            try:
+                db.query(DiagnosisHistory.model_name, func.count(DiagnosisHistory.id),
+                         func.avg(DiagnosisHistory.execution_time_ms)).group_by(DiagnosisHistory.model_name).all()
+                db.query(DiagnosisHistory.id, DiagnosisHistory.diagnosis_preview).order_by(
+                    DiagnosisHistory.run_timestamp.desc()).limit(20).all()
+                bump("reads")
+            except OperationalError as e:
+                bump("locked" if "locked" in str(e) else "other_errors")
+            finally:
+                db.close()
+
+    threads = [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQLite 存储配置混合读写基准测试")
+    parser.add_argument("--seconds", type=float, default=5, help="每种配置的运行时长（秒）")
+    parser.add_argument("--writers", type=int, default=4, help="写线程数")
+    parser.add_argument("--readers", type=int, default=8, help="读线程数")
+    parser.add_argument("--rows", type=int, default=5000, help="预置诊断记录数")
+    args = parser.parse_args()
+
+    print(f"{'profile':<10}{'writes/s':>10}{'reads/s':>10}{'locked':>8}{'errors':>8}")
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for name in ("default", "profile"):
+            url = f"sqlite:///{os.path.join(tmpdir, name + '.db')}"
+            if name == "default":
+                engine = create_engine(url, connect_args={"check_same_thread": False})
+                engines = [engine]
+                write_factory = read_factory = sessionmaker(bind=engine)
+            else:
+                writer, reader = create_sqlite_engines(url, reader_pool_size=args.readers)
+                engines = [writer, reader]
+                write_factory = sessionmaker(bind=writer)
+                read_factory = sessionmaker(bind=reader)
+            case_ids = seed(engines[0], args.rows)
+            counts = run_workload(write_factory, read_factory, case_ids, args.seconds, args.writers, args.readers)
+            print(f"{name:<10}{counts['writes'] / args.seconds:>10.1f}{counts['reads'] / args.seconds:>10.1f}"
+                  f"{counts['locked']:>8}{counts['other_errors']:>8}")
+            for engine in engines:
+                engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
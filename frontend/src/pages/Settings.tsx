@@ -491,6 +491,7 @@ const ProviderModal = ({ provider, templates, onClose, onSave }: ProviderModalPr
   const [formData, setFormData] = useState<ProviderCreate>({
     name: provider?.name || '',
     base_url: provider?.base_url || '',
+    provider_type: provider?.provider_type || 'openai',
     api_key: '',
     is_enabled: provider?.is_enabled ?? true,
     is_default: provider?.is_default ?? false,
@@ -506,6 +507,7 @@ const ProviderModal = ({ provider, templates, onClose, onSave }: ProviderModalPr
       ...prev,
       name: template.name,
       base_url: template.base_url,
+      provider_type: template.provider_type || 'openai',
     }));
   };
 
@@ -515,7 +517,8 @@ const ProviderModal = ({ provider, templates, onClose, onSave }: ProviderModalPr
       setError(t('settings.fillRequired'));
       return;
     }
-    if (!provider && !formData.api_key) {
+    // 本地 Ollama 不需要 API Key
+    if (!provider && !formData.api_key && formData.provider_type !== 'ollama') {
       setError(t('settings.apiKeyRequired'));
       return;
     }
@@ -528,6 +531,7 @@ const ProviderModal = ({ provider, templates, onClose, onSave }: ProviderModalPr
         const updateData: ProviderUpdate = {
           name: formData.name,
           base_url: formData.base_url,
+          provider_type: formData.provider_type,
           is_enabled: formData.is_enabled,
           is_default: formData.is_default,
         };
@@ -630,7 +634,7 @@ const ProviderModal = ({ provider, templates, onClose, onSave }: ProviderModalPr
           {/* API Key */}
           <div>
             <label className="block text-sm font-medium text-gray-700 mb-1.5">
-              API Key {!provider && <span className="text-red-500">*</span>}
+              API Key {!provider && formData.provider_type !== 'ollama' && <span className="text-red-500">*</span>}
             </label>
             <div className="relative">
               <input
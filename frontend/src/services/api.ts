@@ -1,5 +1,5 @@
 import axios from 'axios';
-import type { Case, CaseDetail, DiagnosisResponse, CreateCaseRequest, CreateCaseResponse, UpdateCaseRequest, DiagnosisHistoryResponse, DiagnosisDetail, AllDiagnosisResponse, DiagnosisFilters } from '../types';
+import type { Case, CaseDetail, DiagnosisResponse, CompareDiagnosisResponse, TranslateDiagnosisResponse, SimilarCaseItem, CreateCaseRequest, CreateCaseResponse, UpdateCaseRequest, DiagnosisHistoryResponse, DiagnosisDetail, AllDiagnosisResponse, DiagnosisFilters } from '../types';
 import type {
   OverviewData,
   DemographicsData,
@@ -92,6 +92,32 @@ export const caseApi = {
     return response.data;
   },
 
+  // 查找相似病例
+  getSimilarCases: async (caseId: number, k = 5, minScore = 0): Promise<SimilarCaseItem[]> => {
+    const response = await api.get<SimilarCaseItem[]>(`/api/cases/${caseId}/similar`, {
+      params: { k, min_score: minScore }
+    });
+    return response.data;
+  },
+
+  // 多模型对比诊断
+  compareDiagnosis: async (caseId: number, models: string[], language?: string): Promise<CompareDiagnosisResponse> => {
+    const response = await api.post<CompareDiagnosisResponse>(
+      `/api/cases/${caseId}/compare`,
+      { models, language }
+    );
+    return response.data;
+  },
+
+  // 将已有诊断翻译为另一种语言（已翻译过则直接返回）
+  translateDiagnosis: async (caseId: number, diagnosisId: number, targetLanguage: string): Promise<TranslateDiagnosisResponse> => {
+    const response = await api.post<TranslateDiagnosisResponse>(
+      `/api/cases/${caseId}/diagnoses/${diagnosisId}/translate`,
+      { target_language: targetLanguage }
+    );
+    return response.data;
+  },
+
   // 新增病例
   createCase: async (data: CreateCaseRequest): Promise<CreateCaseResponse> => {
     const response = await api.post<CreateCaseResponse>('/api/cases', data);
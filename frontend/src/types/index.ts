@@ -31,6 +31,51 @@ export interface CaseDetail {
 export interface DiagnosisResponse {
   case_id: number;
   diagnosis_markdown: string;
+  // reuse_similar 模式复用相似病例诊断时的来源信息
+  reused_from_case_id?: number | null;
+  reused_from_diagnosis_id?: number | null;
+  similarity?: number | null;
+}
+
+// 相似病例
+export interface SimilarCaseItem {
+  case_id: number;
+  patient_id: string;
+  patient_name: string | null;
+  chief_complaint: string | null;
+  similarity: number;
+  latest_diagnosis_id: number | null;
+  latest_diagnosis_model: string | null;
+  latest_diagnosis_preview: string | null;
+}
+
+// 单个智能体调用的耗时与 token 用量
+export interface AgentUsageItem {
+  agent: string;
+  model: string;
+  status: string;
+  elapsed_ms: number;
+  input_tokens: number | null;
+  output_tokens: number | null;
+}
+
+export interface CompareDiagnosisItem {
+  diagnosis_id: number | null; // 该模型失败时为 null
+  model_name: string;
+  diagnosis_markdown: string | null;
+  error: string | null; // 该模型失败时的错误信息
+  execution_time_ms: number;
+  input_tokens: number | null;
+  output_tokens: number | null;
+  stages: AgentUsageItem[];
+}
+
+// 多模型对比诊断响应
+export interface CompareDiagnosisResponse {
+  case_id: number;
+  comparison_group_id: string;
+  total_time_ms: number;
+  results: CompareDiagnosisItem[];
 }
 
 export interface CreateCaseRequest {
@@ -78,6 +123,21 @@ export interface DiagnosisHistoryItem {
   execution_time_ms: number;
   diagnosis_preview: string;
   diagnosis_full: string | null;
+  comparison_group_id?: string | null; // 多模型对比分组ID
+  language?: string | null; // 诊断结果语言
+  source_diagnosis_id?: number | null; // 翻译来源诊断ID
+}
+
+// 诊断翻译响应
+export interface TranslateDiagnosisResponse {
+  diagnosis_id: number;
+  source_diagnosis_id: number;
+  case_id: number;
+  language: string;
+  model_name: string;
+  diagnosis_markdown: string;
+  execution_time_ms: number | null;
+  cached: boolean;
 }
 
 export interface DiagnosisHistoryResponse {
@@ -117,6 +177,7 @@ export interface AllDiagnosisResponse {
   page: number;
   page_size: number;
   items: AllDiagnosisItem[];
+  next_cursor?: string | null;
 }
 
 export interface DiagnosisFilters {
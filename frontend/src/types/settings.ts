@@ -2,11 +2,15 @@
  * 系统设置相关类型定义
  */
 
+// 供应商接口类型：OpenAI 兼容接口 / 本地 Ollama
+export type ProviderType = 'openai' | 'ollama';
+
 // 供应商
 export interface Provider {
   id: number;
   name: string;
   base_url: string;
+  provider_type: ProviderType;
   api_key_masked: string;
   is_enabled: boolean;
   is_default: boolean;
@@ -18,6 +22,7 @@ export interface Provider {
 export interface ProviderCreate {
   name: string;
   base_url: string;
+  provider_type?: ProviderType;
   api_key: string;
   is_enabled?: boolean;
   is_default?: boolean;
@@ -26,6 +31,7 @@ export interface ProviderCreate {
 export interface ProviderUpdate {
   name?: string;
   base_url?: string;
+  provider_type?: ProviderType;
   api_key?: string;
   is_enabled?: boolean;
   is_default?: boolean;
@@ -34,6 +40,7 @@ export interface ProviderUpdate {
 export interface ProviderTemplate {
   name: string;
   base_url: string;
+  provider_type?: ProviderType;
 }
 
 export interface TestConnectionResult {
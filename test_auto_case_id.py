@@ -46,20 +46,21 @@ def create_case_without_id(token, patient_name, age, gender):
 
 def validate_case_id_format(patient_id: str, expected_gender: str, expected_age: int) -> bool:
     """验证病例编号格式是否正确"""
-    if len(patient_id) != 15:
-        print(f"  ❌ 病例编号长度错误: {len(patient_id)} (期望15位)")
+    prefix, _, sequence = patient_id.partition("-")
+    if len(prefix) < 15 or not prefix.isdigit() or not sequence.isdigit():
+        print(f"  ❌ 病例编号格式错误: {patient_id} (期望至少15位数字前缀 + \"-\" + 序号)")
         return False
 
     # 解析编号
-    year = patient_id[0:4]
-    month = patient_id[4:6]
-    day = patient_id[6:8]
-    hour = patient_id[8:10]
-    minute = patient_id[10:12]
-    gender_code = patient_id[12]
-    age = patient_id[13:15]
-
-    print(f"  📋 解析结果: {year}-{month}-{day} {hour}:{minute}, 性别码={gender_code}, 年龄={age}")
+    year = prefix[0:4]
+    month = prefix[4:6]
+    day = prefix[6:8]
+    hour = prefix[8:10]
+    minute = prefix[10:12]
+    gender_code = prefix[12]
+    age = prefix[13:]
+
+    print(f"  📋 解析结果: {year}-{month}-{day} {hour}:{minute}, 性别码={gender_code}, 年龄={age}, 序号={sequence}")
 
     # 验证性别码
     expected_gender_code = "1" if expected_gender in ["male", "男"] else "0"
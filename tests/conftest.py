@@ -0,0 +1,66 @@
+"""
+接口测试公共夹具
+
+- api_db：临时 SQLite 数据库（与服务相同的读写分离连接池，get_db 使用的会话工厂替换为该数据库），
+  返回一个独立连接的会话供测试准备数据、检查结果（不占用服务的写连接）
+- client：携带超级管理员令牌的 TestClient
+"""
+
+import sys
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+@pytest.fixture
+def api_db(tmp_path, monkeypatch):
+    from api.db import database
+    from api.db.database import Base, create_sqlite_engines
+    from api.models.user import User
+    import api.models.settings  # noqa: F401  确保所有表注册到 Base.metadata
+    import api.models.idempotency  # noqa: F401
+    import api.models.single_flight  # noqa: F401
+    import api.main as main
+    import api.utils.single_flight as single_flight
+    from api.utils.similarity import similar_case_index
+
+    url = f"sqlite:///{tmp_path / 'api.db'}"
+    writer, reader = create_sqlite_engines(url)
+    Base.metadata.create_all(bind=writer)
+    session_factory = sessionmaker(autocommit=False, autoflush=False, bind=writer)
+    read_session_factory = sessionmaker(autocommit=False, autoflush=False, bind=reader)
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    monkeypatch.setattr(database, "ReadSessionLocal", read_session_factory)
+    monkeypatch.setattr(main, "ReadSessionLocal", read_session_factory)
+    monkeypatch.setattr(single_flight, "SessionLocal", session_factory)
+    main.DIAGNOSIS_COUNT_CACHE.clear()
+    similar_case_index._reset()
+
+    engine = create_engine(url, connect_args={"check_same_thread": False}, poolclass=NullPool)
+    db = sessionmaker(bind=engine)()
+    db.add(User(id=1, username="admin", email="admin@example.com", hashed_password="-",
+                full_name="Admin", is_superuser=True))
+    db.commit()
+    yield db
+    db.close()
+    engine.dispose()
+    writer.dispose()
+    reader.dispose()
+    similar_case_index._reset()
+
+
+@pytest.fixture
+def client(api_db):
+    from fastapi.testclient import TestClient
+    from api.auth.security import create_access_token
+    from api.main import app
+
+    token = create_access_token({"sub": "admin"})
+    with TestClient(app, headers={"Authorization": f"Bearer {token}"}) as test_client:
+        yield test_client
@@ -0,0 +1,169 @@
+"""
+诊断历史归档（冷热分离）测试
+"""
+
+import sys
+import os
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, func, text
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base, apply_sqlite_pragmas
+from api.models.archive import ArchivedDiagnosis, reserve_archived_ids
+from api.models.case import MedicalCase, DiagnosisHistory, check_case_counters
+from api.models.content import ContentBlob
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+from api.utils.archive import (
+    archive_diagnoses, delete_archived_diagnoses, get_case_diagnosis, get_diagnoses_by_ids, list_case_diagnoses,
+    reclaim_free_pages,
+)
+
+CUTOFF = datetime(2025, 1, 1)
+OLD = datetime(2024, 6, 1)
+NEW = datetime(2025, 6, 1)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    apply_sqlite_pragmas(engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    session.add(MedicalCase(id=1, patient_id="A1", raw_report="report"))
+    session.commit()
+    yield session
+    session.close()
+
+
+def _add(db, run_timestamp, markdown="# Diagnosis\n\nbody", **kwargs):
+    record = DiagnosisHistory(case_id=1, diagnosis_markdown=markdown, run_timestamp=run_timestamp, **kwargs)
+    db.add(record)
+    db.commit()
+    return record.id
+
+
+def _hot_ids(db):
+    return [row.id for row in db.query(DiagnosisHistory.id).order_by(DiagnosisHistory.id)]
+
+
+class TestArchive:
+    def test_moves_old_rows(self, db):
+        old = [_add(db, OLD, f"# Old {i}\n\nbody") for i in range(3)]
+        new = _add(db, NEW)
+        assert archive_diagnoses(db, CUTOFF) == 3
+        assert _hot_ids(db) == [new]
+        assert db.query(func.count(ArchivedDiagnosis.id)).scalar() == 3
+        # 分段引用已释放、已移出全文索引；病例统计包含归档记录
+        assert db.query(func.count(ContentBlob.hash)).scalar() == 1
+        assert db.execute(text("SELECT rowid FROM diagnoses_fts")).scalars().all() == [new]
+        assert db.get(MedicalCase, 1).diagnosis_count == 4
+        assert check_case_counters(db.connection()) == []
+        # 重复运行不会重复归档
+        assert archive_diagnoses(db, CUTOFF) == 0
+        assert old == sorted(get_diagnoses_by_ids(db, old))
+
+    def test_archived_ids_not_reused(self, db):
+        archived = _add(db, OLD)
+        newest = _add(db, NEW)
+        assert archive_diagnoses(db, CUTOFF) == 1
+        # 删除最新的主库记录后，新诊断的 ID 仍不与已归档的 ID 重复
+        db.delete(db.get(DiagnosisHistory, newest))
+        db.commit()
+        assert _add(db, NEW) == newest + 1 > archived
+
+    def test_sequence_seeded_from_archive(self, db):
+        old = _add(db, OLD)
+        assert archive_diagnoses(db, CUTOFF) == 1
+        # 序号丢失（如未使用 AUTOINCREMENT 时建立的库迁移后）也由归档库的最大 ID 补齐
+        db.execute(text("DELETE FROM sqlite_sequence WHERE name = 'diagnosis_history'"))
+        reserve_archived_ids(db.connection())
+        db.commit()
+        assert _add(db, NEW) == old + 1
+
+    def test_id_conflict_is_error(self, db):
+        old = _add(db, OLD)
+        archive_diagnoses(db, CUTOFF)
+        db.execute(text("UPDATE archive.diagnosis_history SET case_id = 2"))
+        db.execute(text("INSERT INTO diagnosis_history (id, case_id, model_name, run_timestamp) "
+                        "VALUES (:id, 1, 'gpt-4o', :ts)"), {"id": old, "ts": OLD})
+        db.commit()
+        with pytest.raises(RuntimeError):
+            archive_diagnoses(db, CUTOFF)
+        # 冲突的主库记录不会被删除
+        assert _hot_ids(db) == [old]
+
+    def test_requires_autoincrement(self, engine, db):
+        with engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE diagnosis_sections")
+            connection.exec_driver_sql("ALTER TABLE diagnosis_history RENAME TO diagnosis_history_old")
+            connection.exec_driver_sql("CREATE TABLE diagnosis_history (id INTEGER PRIMARY KEY, case_id INTEGER)")
+        with pytest.raises(RuntimeError):
+            archive_diagnoses(db, CUTOFF)
+
+    def test_translations_follow_source(self, db):
+        source = _add(db, OLD, language="en")
+        _add(db, OLD, language="zh", source_diagnosis_id=source)
+        pending_source = _add(db, OLD, language="en")
+        recent_translation = _add(db, NEW, language="zh", source_diagnosis_id=pending_source)
+        assert archive_diagnoses(db, CUTOFF) == 2
+        assert _hot_ids(db) == [pending_source, recent_translation]
+
+    def test_reclaims_free_pages(self, engine, db):
+        for i in range(200):
+            _add(db, OLD, f"# Report {i}\n\n" + os.urandom(2000).hex())
+        _add(db, NEW)
+        archive_diagnoses(db, CUTOFF)
+        db.close()
+        reclaimed = reclaim_free_pages(engine)
+        assert reclaimed["main"] > 0
+        with engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+
+
+class TestTransparentReads:
+    def test_reads_include_archived(self, db):
+        markdown = "# Old\n\nArchived body"
+        old = _add(db, OLD, markdown)
+        new = _add(db, NEW)
+        archive_diagnoses(db, CUTOFF)
+        db.expunge_all()
+
+        records = list_case_diagnoses(db, 1, include_full=True)
+        assert [record.id for record in records] == [new, old]
+        assert isinstance(records[1], ArchivedDiagnosis)
+        assert records[1].diagnosis_markdown == markdown
+        assert get_case_diagnosis(db, 1, old).diagnosis_markdown == markdown
+        assert get_case_diagnosis(db, 2, old) is None
+
+    def test_reads_without_archive(self, db):
+        new = _add(db, NEW)
+        assert [record.id for record in list_case_diagnoses(db, 1)] == [new]
+        assert get_case_diagnosis(db, 1, new + 1) is None
+
+    def test_delete_recounts_archived(self, db):
+        _add(db, OLD)
+        latest_archived = _add(db, OLD)
+        new = _add(db, NEW)
+        archive_diagnoses(db, CUTOFF)
+        db.delete(db.get(DiagnosisHistory, new))
+        db.commit()
+        db.expire_all()
+        # 删除主库记录后按主库 + 归档库重新计算
+        case = db.get(MedicalCase, 1)
+        assert (case.diagnosis_count, case.latest_diagnosis_id) == (2, latest_archived)
+
+        delete_archived_diagnoses(db, 1)
+        db.commit()
+        assert db.query(func.count(ArchivedDiagnosis.id)).scalar() == 0
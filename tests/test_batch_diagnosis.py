@@ -0,0 +1,118 @@
+"""
+Batch API 诊断后端单元测试（本地桩服务，不访问网络）
+"""
+
+import json
+import sys
+import os
+
+import httpx
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Utils.Agents import render_prompt
+from Utils.BatchDiagnosis import BatchAPIClient, BatchError, run_batch_diagnosis
+
+
+class StubBatchServer:
+    """实现 /files、/batches 端点的内存桩服务：每个请求回复 "<角色> for <custom_id>" """
+
+    def __init__(self, fail_custom_ids=(), final_status="completed", pending_polls=1):
+        self.files = {}
+        self.batches = {}
+        self.submitted = []  # 每个批处理的请求行
+        self.fail_custom_ids = set(fail_custom_ids)
+        self.final_status = final_status
+        self.pending_polls = pending_polls
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        assert request.headers["Authorization"] == "Bearer test-key"
+        path = request.url.path
+        if request.method == "POST" and path == "/v1/files":
+            content = request.read()
+            body = content[content.index(b"\r\n\r\n", content.index(b'filename="')) + 4:]
+            body = body[:body.rindex(b"\r\n--")]
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = body.decode("utf-8")
+            return httpx.Response(200, json={"id": file_id, "purpose": "batch"})
+        if request.method == "POST" and path == "/v1/batches":
+            payload = json.loads(request.content)
+            assert payload["endpoint"] == "/v1/chat/completions"
+            lines = [json.loads(line) for line in self.files[payload["input_file_id"]].splitlines()]
+            self.submitted.append(lines)
+            batch_id = f"batch-{len(self.batches) + 1}"
+            self.batches[batch_id] = {"id": batch_id, "status": "validating", "polls": 0, "lines": lines}
+            return httpx.Response(200, json={"id": batch_id, "status": "validating"})
+        if request.method == "GET" and path.startswith("/v1/batches/"):
+            batch = self.batches[path.rsplit("/", 1)[1]]
+            batch["polls"] += 1
+            if batch["polls"] <= self.pending_polls:
+                return httpx.Response(200, json={"id": batch["id"], "status": "in_progress"})
+            output_id = f"file-out-{batch['id']}"
+            self.files[output_id] = "\n".join(json.dumps(self._result(line)) for line in batch["lines"])
+            return httpx.Response(200, json={"id": batch["id"], "status": self.final_status,
+                                             "output_file_id": output_id})
+        if request.method == "GET" and path.startswith("/v1/files/") and path.endswith("/content"):
+            return httpx.Response(200, text=self.files[path.split("/")[3]])
+        return httpx.Response(404)
+
+    def _result(self, line):
+        custom_id = line["custom_id"]
+        if custom_id in self.fail_custom_ids:
+            return {"custom_id": custom_id, "response": {"status_code": 500, "body": {}}, "error": None}
+        role = custom_id.rsplit(":", 1)[1]
+        body = {"choices": [{"message": {"role": "assistant", "content": f"{role} for {custom_id}"}}]}
+        return {"custom_id": custom_id, "response": {"status_code": 200, "body": body}, "error": None}
+
+
+def _client(server):
+    return BatchAPIClient(base_url="http://stub/v1", api_key="test-key",
+                          transport=httpx.MockTransport(server.handler))
+
+
+class TestBatchDiagnosis:
+    """两轮批处理（专科 + MDT）测试"""
+
+    def test_two_stage_batches(self):
+        server = StubBatchServer()
+        with _client(server) as client:
+            results = run_batch_diagnosis(client, {1: "report one", 2: "report two"}, "gpt-4o",
+                                          language="en", poll_interval=0)
+
+        assert len(server.submitted) == 2
+        specialists, mdt = server.submitted
+        assert len(specialists) == 6
+        assert specialists[0]["body"]["model"] == "gpt-4o"
+        assert specialists[0]["body"]["messages"][0]["content"] == render_prompt(
+            "Cardiologist", "en", medical_report="report one")
+        assert [line["custom_id"] for line in mdt] == ["1:MultidisciplinaryTeam", "2:MultidisciplinaryTeam"]
+        assert "Cardiologist for 1:Cardiologist" in mdt[0]["body"]["messages"][0]["content"]
+
+        assert set(results) == {"1", "2"}
+        markdown = results["1"]["diagnosis_markdown"]
+        assert "MultidisciplinaryTeam for 1:MultidisciplinaryTeam" in markdown
+        assert "Pulmonologist for 1:Pulmonologist" in markdown
+
+    def test_failed_requests(self):
+        """单条请求失败记为缺失报告；三个专科都失败的病例不提交 MDT"""
+        failed = {"1:Psychologist", "2:Cardiologist", "2:Psychologist", "2:Pulmonologist"}
+        server = StubBatchServer(fail_custom_ids=failed)
+        with _client(server) as client:
+            results = run_batch_diagnosis(client, {1: "a", 2: "b"}, "gpt-4o", poll_interval=0)
+
+        assert [line["custom_id"] for line in server.submitted[1]] == ["1:MultidisciplinaryTeam"]
+        assert set(results) == {"1"}
+        assert results["1"]["responses"]["Psychologist"] is None
+        assert "No psychologist report" in results["1"]["diagnosis_markdown"]
+
+    def test_expired_batch_raises(self):
+        server = StubBatchServer(final_status="expired")
+        with _client(server) as client:
+            try:
+                run_batch_diagnosis(client, {1: "a"}, "gpt-4o", poll_interval=0)
+            except BatchError:
+                pass
+            else:
+                raise AssertionError("批处理过期时应抛出 BatchError")
+        assert len(server.submitted) == 1
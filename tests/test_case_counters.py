@@ -0,0 +1,107 @@
+"""
+病例诊断统计冗余字段测试
+"""
+
+import sys
+import os
+from datetime import datetime
+
+import pytest
+from alembic import command
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base
+from api.db.migrate import alembic_config
+from api.models.case import MedicalCase, DiagnosisHistory, check_case_counters, refresh_case_counters
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(MedicalCase(id=1, patient_id="C1", raw_report="report", updated_at=datetime(2025, 1, 1)))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _add(db, run_timestamp):
+    record = DiagnosisHistory(case_id=1, diagnosis_markdown="d", run_timestamp=run_timestamp)
+    db.add(record)
+    db.commit()
+    return record.id
+
+
+def _counters(db):
+    db.expire_all()
+    case = db.get(MedicalCase, 1)
+    return case.diagnosis_count, case.last_diagnosis_at, case.latest_diagnosis_id
+
+
+class TestCaseCounters:
+    def test_insert(self, db):
+        assert _counters(db) == (0, None, None)
+        first = _add(db, datetime(2025, 3, 1))
+        assert _counters(db) == (1, datetime(2025, 3, 1), first)
+        # 运行时间更早的记录（如导入历史数据）不替换最新诊断
+        _add(db, datetime(2025, 2, 1))
+        assert _counters(db) == (2, datetime(2025, 3, 1), first)
+        latest = _add(db, datetime(2025, 4, 1))
+        assert _counters(db) == (3, datetime(2025, 4, 1), latest)
+        # 统计字段的维护不修改病例的 updated_at
+        assert db.get(MedicalCase, 1).updated_at == datetime(2025, 1, 1)
+
+    def test_delete(self, db):
+        first = _add(db, datetime(2025, 3, 1))
+        latest = _add(db, datetime(2025, 4, 1))
+        db.delete(db.get(DiagnosisHistory, latest))
+        db.commit()
+        assert _counters(db) == (1, datetime(2025, 3, 1), first)
+        db.delete(db.get(DiagnosisHistory, first))
+        db.commit()
+        assert _counters(db) == (0, None, None)
+
+    def test_check_and_refresh(self, db):
+        latest = _add(db, datetime(2025, 3, 1))
+        assert check_case_counters(db.connection()) == []
+        db.execute(text("UPDATE medical_cases SET diagnosis_count = 5, latest_diagnosis_id = NULL"))
+        rows = check_case_counters(db.connection())
+        assert [(row["id"], row["actual_diagnosis_count"], row["actual_latest_diagnosis_id"]) for row in rows] == [
+            (1, 1, latest)
+        ]
+        assert refresh_case_counters(db.connection(), [1]) == 1
+        db.commit()
+        assert check_case_counters(db.connection()) == []
+        assert _counters(db) == (1, datetime(2025, 3, 1), latest)
+
+
+class TestMigration:
+    def test_backfill(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'counters.db'}"
+        config = alembic_config(url)
+        command.upgrade(config, "0014")
+        engine = create_engine(url)
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO medical_cases (id, patient_id, raw_report) VALUES (1, 'M1', 'r')"))
+            connection.execute(text("INSERT INTO medical_cases (id, patient_id, raw_report) VALUES (2, 'M2', 'r')"))
+            for diagnosis_id, run_timestamp in [(1, "2025-03-01 00:00:00"), (2, "2025-02-01 00:00:00")]:
+                connection.execute(text(
+                    "INSERT INTO diagnosis_history (id, case_id, run_timestamp) VALUES (:id, 1, :ts)"
+                ), {"id": diagnosis_id, "ts": run_timestamp})
+        command.upgrade(config, "head")
+        with engine.connect() as connection:
+            rows = connection.execute(text(
+                "SELECT id, diagnosis_count, latest_diagnosis_id FROM medical_cases ORDER BY id"
+            )).all()
+            assert check_case_counters(connection) == []
+        engine.dispose()
+        assert [tuple(row) for row in rows] == [(1, 2, 1), (2, 0, None)]
@@ -0,0 +1,99 @@
+"""
+病例编号分配测试
+"""
+
+import sys
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base, apply_sqlite_pragmas
+from api.models.case import CaseIdSequence
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+from api.utils.case_id_generator import allocate_case_id, generate_case_id, parse_case_id, reserve_case_ids
+
+NOW = datetime(2025, 12, 11, 15, 30, 45)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    apply_sqlite_pragmas(engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+class TestFormat:
+    def test_prefix(self):
+        assert generate_case_id("male", 55, NOW) == "202512111530155"
+        assert generate_case_id("女", 8, NOW) == "202512111530008"
+
+    def test_parse_both_formats(self):
+        legacy = parse_case_id("202512111530155")
+        assert (legacy["age"], legacy["sequence"]) == (55, None)
+        current = parse_case_id("202512111530028-12")
+        assert (current["gender"], current["age"], current["sequence"]) == ("女", 28, 12)
+        assert "error" in parse_case_id("202512111530155-x")
+        assert "error" in parse_case_id("2025121115301-01")
+
+    def test_parse_age_over_99(self, db):
+        case_id = allocate_case_id(db, "male", 105, NOW)
+        assert case_id == "2025121115301105-01"
+        parsed = parse_case_id(case_id)
+        assert (parsed["gender"], parsed["age"], parsed["sequence"]) == ("男", 105, 1)
+        assert parse_case_id("2025121115300100")["age"] == 100
+
+
+class TestAllocate:
+    def test_sequence_per_prefix(self, db):
+        assert allocate_case_id(db, "male", 55, NOW) == "202512111530155-01"
+        assert allocate_case_id(db, "male", 55, NOW) == "202512111530155-02"
+        assert allocate_case_id(db, "female", 55, NOW) == "202512111530055-01"
+        db.commit()
+        assert db.get(CaseIdSequence, "202512111530155").last_value == 2
+
+    def test_rollback_releases_sequence(self, db):
+        allocate_case_id(db, "male", 55, NOW)
+        db.rollback()
+        assert allocate_case_id(db, "male", 55, NOW) == "202512111530155-01"
+
+    def test_reserve_block_one_statement_per_prefix(self, engine, db):
+        allocate_case_id(db, "male", 55, NOW)
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        ids = reserve_case_ids(db, [("male", 55), ("female", 30), ("male", 55), ("male", 55)], NOW)
+        assert ids == ["202512111530155-02", "202512111530030-01", "202512111530155-03", "202512111530155-04"]
+        assert len([s for s in statements if "case_id_sequences" in s]) == 2
+
+    def test_concurrent_sessions_never_collide(self, engine):
+        factory = sessionmaker(bind=engine)
+
+        def allocate(_):
+            session = factory()
+            try:
+                ids = reserve_case_ids(session, [("male", 40)] * 5, NOW)
+                session.commit()
+                return ids
+            finally:
+                session.close()
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = [case_id for batch in pool.map(allocate, range(16)) for case_id in batch]
+        assert len(set(ids)) == 80
+        assert max(parse_case_id(case_id)["sequence"] for case_id in ids) == 80
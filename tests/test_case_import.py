@@ -0,0 +1,92 @@
+"""
+病例批量导入测试
+"""
+
+import sys
+import os
+
+import pytest
+from sqlalchemy import create_engine, event, func, text
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base, apply_sqlite_pragmas
+from api.models.case import MedicalCase
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+import api.utils.case_import as case_import
+from api.utils.case_import import import_case_records
+
+
+def _record(i, **kwargs):
+    return {"patient_name": f"Patient {i}", "age": 40, "gender": "male", "chief_complaint": f"chest pain {i}",
+            **kwargs}
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'main.db'}")
+    apply_sqlite_pragmas(engine)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def db(engine):
+    session = sessionmaker(bind=engine)()
+    yield session
+    session.close()
+
+
+class TestImportCaseRecords:
+    def test_chunked_insert(self, engine, db):
+        statements = []
+        event.listen(engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+        success_count, failed = import_case_records(db, [_record(i) for i in range(25)], 1, chunk_size=10)
+        assert (success_count, failed) == (25, [])
+        assert len([s for s in statements if s.startswith("INSERT INTO medical_cases")]) == 3
+
+        case = db.query(MedicalCase).filter(MedicalCase.patient_name == "Patient 7").one()
+        assert case.patient_id.endswith("-08")
+        assert case.created_by == 1 and case.diagnosis_count == 0
+        assert case.report_summary and "Patient 7" in case.raw_report
+        # 批量插入同步写入全文索引
+        assert db.execute(text("SELECT count(*) FROM cases_fts")).scalar() == 25
+
+    def test_reports_invalid_records(self, db):
+        records = [_record(0), {"patient_name": "B"}, "not an object", _record(3, age="x"), _record(4, age="41")]
+        success_count, failed = import_case_records(db, records, 1)
+        assert success_count == 2
+        assert [f["index"] for f in failed] == [1, 2, 3]
+        assert "缺少必填字段" in failed[0]["error"]
+        assert db.query(MedicalCase.age).filter(MedicalCase.patient_name == "Patient 4").scalar() == 41
+
+    def test_provided_ids(self, db):
+        db.add(MedicalCase(patient_id="P1", raw_report="report"))
+        db.commit()
+        records = [_record(0, patient_id="P1"), _record(1, patient_id="P2"), _record(2, patient_id="P2")]
+        assert import_case_records(db, records, 1) == (3, [])
+        ids = [row.patient_id for row in db.query(MedicalCase.patient_id).order_by(MedicalCase.id)]
+        # 与已有病例或文件中前面的病例重复的编号改为自动分配
+        assert ids[0] == "P1" and ids[2] == "P2"
+        assert ids[1].endswith("-01") and ids[3].endswith("-02")
+
+    def test_chunk_failure_falls_back_to_rows(self, db, monkeypatch):
+        assign = case_import._assign_patient_ids
+
+        def assign_then_conflict(session, valid_cases):
+            patient_ids = assign(session, valid_cases)
+            # 模拟并发导入在分配编号之后写入了相同的编号
+            session.add(MedicalCase(patient_id=patient_ids[1], raw_report="report"))
+            session.commit()
+            return patient_ids
+
+        monkeypatch.setattr(case_import, "_assign_patient_ids", assign_then_conflict)
+        success_count, failed = import_case_records(db, [_record(i) for i in range(4)], 1)
+        assert success_count == 3
+        assert [f["index"] for f in failed] == [1]
+        assert db.query(func.count(MedicalCase.id)).scalar() == 4
+        assert db.execute(text("SELECT count(*) FROM cases_fts")).scalar() == 4
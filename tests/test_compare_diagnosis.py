@@ -0,0 +1,118 @@
+"""
+多模型对比诊断测试（POST /api/cases/{case_id}/compare）与 MDT 提示模板
+"""
+
+import sys
+import os
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.main as main
+from api.models.case import MedicalCase, DiagnosisHistory
+from Utils.Agents import get_prompt_template, render_prompt
+
+COMPARE_URL = "/api/cases/1/compare"
+MDT_REPORT_KEYS = ("cardiologist_report", "psychologist_report", "pulmonologist_report")
+
+
+@pytest.fixture
+def case(api_db):
+    api_db.add(MedicalCase(id=1, patient_id="P1", raw_report="Chest pain for three days.", created_by=1))
+    api_db.commit()
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """替换多智能体诊断流水线：每个模型写入两条用量记录；failing 中的模型抛出异常"""
+    state = {"calls": [], "failing": set()}
+
+    async def fake_diagnosis(raw_report, model_name=None, language="en", usage=None, **kwargs):
+        state["calls"].append(model_name)
+        usage.append({"agent": "Cardiologist", "model": model_name, "status": "ok", "elapsed_ms": 5,
+                      "input_tokens": 100, "output_tokens": 20})
+        if model_name in state["failing"]:
+            raise RuntimeError("provider unavailable")
+        usage.append({"agent": "MultidisciplinaryTeam", "model": model_name, "status": "ok", "elapsed_ms": 7,
+                      "input_tokens": 300, "output_tokens": None})
+        return f"# {model_name} ({language})"
+
+    monkeypatch.setattr(main, "arun_multi_agent_diagnosis", fake_diagnosis)
+    return state
+
+
+class TestCompareDiagnosis:
+    def test_one_row_per_model_with_shared_group(self, client, api_db, case, pipeline):
+        response = client.post(COMPARE_URL, json={"models": ["gpt-4o", "claude-sonnet-4.5", "gpt-4o"], "language": "zh"})
+        assert response.status_code == 200
+        data = response.json()
+        assert [r["model_name"] for r in data["results"]] == ["gpt-4o", "claude-sonnet-4.5"]
+
+        rows = api_db.query(DiagnosisHistory).order_by(DiagnosisHistory.id).all()
+        assert [row.model_name for row in rows] == ["gpt-4o", "claude-sonnet-4.5"]
+        assert {row.comparison_group_id for row in rows} == {data["comparison_group_id"]}
+        assert {row.language for row in rows} == {"zh"}
+        assert [r["diagnosis_id"] for r in data["results"]] == [row.id for row in rows]
+        assert rows[0].diagnosis_markdown == "# gpt-4o (zh)"
+
+    def test_usage_rows_are_returned(self, client, case, pipeline):
+        data = client.post(COMPARE_URL, json={"models": ["gpt-4o", "gemini-2.5-flash"]}).json()
+        for result in data["results"]:
+            assert [stage["agent"] for stage in result["stages"]] == ["Cardiologist", "MultidisciplinaryTeam"]
+            assert {stage["model"] for stage in result["stages"]} == {result["model_name"]}
+            assert result["input_tokens"] == 400
+            assert result["output_tokens"] == 20
+
+    def test_one_model_failing_keeps_the_others(self, client, api_db, case, pipeline):
+        pipeline["failing"] = {"claude-sonnet-4.5"}
+        response = client.post(COMPARE_URL, json={"models": ["gpt-4o", "claude-sonnet-4.5"]})
+        assert response.status_code == 200
+        ok, failed = response.json()["results"]
+        assert ok["diagnosis_id"] is not None and ok["error"] is None
+        assert failed["diagnosis_id"] is None and failed["diagnosis_markdown"] is None
+        assert "provider unavailable" in failed["error"]
+        # 失败前产生的用量照常返回
+        assert [stage["agent"] for stage in failed["stages"]] == ["Cardiologist"]
+        assert [row.model_name for row in api_db.query(DiagnosisHistory)] == ["gpt-4o"]
+
+    def test_all_models_failing_returns_502(self, client, api_db, case, pipeline):
+        pipeline["failing"] = {"gpt-4o", "claude-sonnet-4.5"}
+        response = client.post(COMPARE_URL, json={"models": ["gpt-4o", "claude-sonnet-4.5"]})
+        assert response.status_code == 502
+        assert api_db.query(DiagnosisHistory).count() == 0
+
+    def test_unknown_model_rejected_before_any_call(self, client, api_db, case, pipeline):
+        response = client.post(COMPARE_URL, json={"models": ["gpt-4o", "no-such-model"]})
+        assert response.status_code == 400
+        assert "no-such-model" in response.json()["detail"]
+        assert client.post(COMPARE_URL, json={"models": ["gpt-4o", "gpt-4o"]}).status_code == 400
+        assert pipeline["calls"] == []
+        assert api_db.query(DiagnosisHistory).count() == 0
+
+
+def _legacy_mdt_prompt(language, extra_info):
+    """改用模板变量之前的渲染方式：f-string 直接插入 extra_info.get(key, '')"""
+    text = get_prompt_template("MultidisciplinaryTeam", language).template
+    for key in MDT_REPORT_KEYS:
+        text = text.replace("{" + key + "}", f"{extra_info.get(key, '')}")
+    return text
+
+
+class TestMdtPrompt:
+    @pytest.mark.parametrize("language", ["en", "zh"])
+    def test_renders_same_prompt_as_fstring(self, language):
+        extra_info = {
+            "cardiologist_report": "Stable angina.\nECG: ST depression.",
+            "psychologist_report": None,  # 专科智能体未返回结果
+            "pulmonologist_report": "No findings {none}",
+        }
+        assert render_prompt("MultidisciplinaryTeam", language, extra_info=extra_info) == \
+            _legacy_mdt_prompt(language, extra_info)
+
+    def test_missing_reports_render_empty(self):
+        extra_info = {"cardiologist_report": "Stable angina."}
+        prompt = render_prompt("MultidisciplinaryTeam", "en", extra_info=extra_info)
+        assert prompt == _legacy_mdt_prompt("en", extra_info)
+        assert "Psychologist Report: \n" in prompt
@@ -0,0 +1,113 @@
+"""
+大文本列压缩存储测试
+"""
+
+import sys
+import os
+import zlib
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base
+from api.db.compressed_text import (
+    DEFAULT_DICTIONARY_ID, HEADER, MAGIC, column_stats, compress_text, decompress_text, rewrite_column,
+    train_dictionary,
+)
+from api.models.case import MedicalCase, DiagnosisHistory
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+
+REPORT = """Medical Case Report
+Patient ID: 100233
+Name: James Carter
+Age: 45
+Gender: Male
+
+Chief Complaint:
+The patient reports difficulty falling asleep and frequent awakenings during the night.
+
+Medical History:
+Family History: Father had hypertension. Mother had insomnia.
+Lifestyle Factors: Drinks 3-4 cups of coffee daily.
+"""
+
+
+class TestCodec:
+    """编解码"""
+
+    def test_round_trip_with_default_dictionary(self):
+        stored = compress_text(REPORT)
+        _, codec, dict_number = HEADER.unpack_from(stored)
+        assert stored[0] == MAGIC
+        assert dict_number == int(DEFAULT_DICTIONARY_ID, 16)
+        assert len(stored) < len(REPORT.encode("utf-8"))
+        assert decompress_text(stored) == REPORT
+
+    def test_dictionary_improves_ratio(self):
+        assert len(compress_text(REPORT)) < len(compress_text(REPORT, dict_id="none"))
+
+    def test_short_text_stored_as_plain_utf8(self):
+        assert compress_text("ok") == b"ok"
+        assert compress_text("") == b""
+        assert decompress_text(b"ok") == "ok"
+
+    def test_legacy_values_read_as_is(self):
+        """迁移前的原文（TEXT 或未加前缀的 UTF-8 字节）原样读取"""
+        assert decompress_text("旧数据") == "旧数据"
+        assert decompress_text("旧数据".encode("utf-8")) == "旧数据"
+
+    def test_unknown_dictionary(self):
+        stored = HEADER.pack(MAGIC, 1, 0xDEADBEEF) + zlib.compress(b"x")
+        with pytest.raises(ValueError):
+            decompress_text(stored)
+
+
+class TestTrainDictionary:
+    def test_keeps_shared_segments_only(self):
+        samples = [REPORT.replace("James Carter", name) for name in ("Anna Thompson", "Kevin Adams")]
+        dictionary = train_dictionary(samples, size=4096)
+        assert b"Chief Complaint:" in dictionary
+        assert b"Anna Thompson" not in dictionary
+        assert len(dictionary) <= 4096
+
+
+class TestCompressedColumns:
+    """ORM 透明读写与历史数据重写"""
+
+    @pytest.fixture
+    def session(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        yield session
+        session.close()
+        engine.dispose()
+
+    def test_orm_round_trip(self, session):
+        case = MedicalCase(patient_id="C1", raw_report=REPORT)
+        session.add(case)
+        session.flush()
+        session.add(DiagnosisHistory(case_id=case.id, diagnosis_markdown="## Diagnosis\n" + REPORT))
+        session.commit()
+        session.expire_all()
+
+        stored = session.execute(text("SELECT raw_report FROM medical_cases")).scalar()
+        assert isinstance(stored, bytes) and stored[0] == MAGIC
+        assert session.get(MedicalCase, case.id).raw_report == REPORT
+        assert session.query(DiagnosisHistory).one().diagnosis_markdown.startswith("## Diagnosis")
+
+    def test_rewrite_legacy_rows(self, session):
+        session.execute(text("INSERT INTO medical_cases (id, patient_id, raw_report, created_at) "
+                             "VALUES (1, 'L1', :report, CURRENT_TIMESTAMP)"), {"report": REPORT})
+        connection = session.connection()
+        assert rewrite_column(connection, "medical_cases", "raw_report", batch_size=1)[0] == 1
+        rows, raw_bytes, stored_bytes = column_stats(connection, "medical_cases", "raw_report")
+        assert (rows, raw_bytes) == (1, len(REPORT.encode("utf-8")))
+        assert stored_bytes < raw_bytes
+        assert session.get(MedicalCase, 1).raw_report == REPORT
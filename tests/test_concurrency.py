@@ -0,0 +1,218 @@
+"""
+本地模型调度器单元测试
+"""
+
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Utils.Concurrency import AIMDLimiter, ModelBatchScheduler
+
+
+async def _run_requests(scheduler, models, log, duration=0.01):
+    """按顺序提交请求，记录实际执行顺序与最大并发"""
+    state = {"running": 0, "max_running": 0, "models": set()}
+
+    async def request(model):
+        async with scheduler.slot(model):
+            state["running"] += 1
+            state["models"].add(model)
+            state["max_running"] = max(state["max_running"], state["running"])
+            assert len(state["models"]) == 1, "不同模型不应同时运行"
+            log.append(model)
+            await asyncio.sleep(duration)
+            state["running"] -= 1
+            if state["running"] == 0:
+                state["models"].clear()
+
+    await asyncio.gather(*[request(model) for model in models])
+    return state["max_running"]
+
+
+class TestModelBatchScheduler:
+    """按模型成批调度测试"""
+
+    def test_requests_are_grouped_by_model(self):
+        """交替到达的两个模型的请求被成批处理，而不是来回切换"""
+        scheduler = ModelBatchScheduler(per_model_concurrency=1, max_batch=8)
+        log = []
+        asyncio.run(_run_requests(scheduler, ["a", "b", "a", "b", "a", "b"], log))
+        assert log == ["a", "a", "a", "b", "b", "b"]
+
+    def test_per_model_concurrency_limit(self):
+        scheduler = ModelBatchScheduler(per_model_concurrency=2, max_batch=8)
+        log = []
+        max_running = asyncio.run(_run_requests(scheduler, ["a"] * 6, log))
+        assert max_running == 2
+        assert len(log) == 6
+
+    def test_max_batch_lets_other_models_run(self):
+        """当前模型连续处理 max_batch 个请求后切换到等待中的模型"""
+        scheduler = ModelBatchScheduler(per_model_concurrency=1, max_batch=2)
+        log = []
+        asyncio.run(_run_requests(scheduler, ["a", "a", "a", "a", "b"], log))
+        assert log == ["a", "a", "b", "a", "a"]
+
+    def test_cancelled_waiter_does_not_block_queue(self):
+        scheduler = ModelBatchScheduler(per_model_concurrency=1, max_batch=8)
+
+        async def run():
+            async def hold(model, seconds):
+                async with scheduler.slot(model):
+                    await asyncio.sleep(seconds)
+                return model
+
+            first = asyncio.create_task(hold("a", 0.05))
+            await asyncio.sleep(0)
+            waiting = asyncio.create_task(hold("a", 0))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            other = asyncio.create_task(hold("b", 0))
+            return await asyncio.gather(first, other)
+
+        assert asyncio.run(run()) == ["a", "b"]
+        assert scheduler.stats()["running"] == 0
+
+
+class _RateLimitError(Exception):
+    status_code = 429
+
+
+class TimeoutException(Exception):
+    """与 httpx.TimeoutException 同名（服务端超时按类名识别）"""
+
+
+class _ProviderTimeout(TimeoutException):
+    pass
+
+
+def _limiter(**kwargs):
+    options = dict(initial_limit=2, min_limit=1, max_limit=8, increase=1.0,
+                   decrease_factor=0.5, latency_spike_factor=3.0)
+    options.update(kwargs)
+    return AIMDLimiter(**options)
+
+
+async def _call(limiter, seconds=0.0, error=None):
+    async with limiter.slot():
+        await asyncio.sleep(seconds)
+        if error is not None:
+            raise error
+
+
+class TestAIMDLimiter:
+    """自适应并发控制测试"""
+
+    def test_limit_grows_additively_when_saturated(self):
+        # 1ms 的调用受调度抖动影响耗时可能翻几倍，关闭延迟突增检测，只验证加性增长
+        limiter = _limiter(latency_spike_factor=1000.0)
+
+        async def run():
+            for _ in range(10):
+                await asyncio.gather(*[_call(limiter, 0.001) for _ in range(int(limiter.limit))])
+
+        asyncio.run(run())
+        assert 4 <= limiter.limit <= 6
+        assert limiter.stats()["increases"] > 0
+
+    def test_limit_does_not_grow_when_idle(self):
+        """并发未用满时上限不增长"""
+        limiter = _limiter(initial_limit=4)
+
+        async def run():
+            for _ in range(10):
+                await _call(limiter)
+
+        asyncio.run(run())
+        assert limiter.limit == 4
+
+    def test_rate_limit_halves_once_per_burst(self):
+        """同一批并发调用同时收到 429 只下调一次"""
+        limiter = _limiter(initial_limit=8)
+
+        async def run():
+            await asyncio.gather(
+                *[_call(limiter, 0.01, _RateLimitError()) for _ in range(8)],
+                return_exceptions=True,
+            )
+
+        asyncio.run(run())
+        assert limiter.limit == 4
+        stats = limiter.stats()
+        assert stats["rate_limited"] == 8
+        assert stats["decreases"] == 1
+        assert stats["in_flight"] == 0
+
+    def test_latency_spike_decreases(self):
+        limiter = _limiter(initial_limit=8)
+
+        async def run():
+            for _ in range(5):
+                await _call(limiter, 0.005)
+            await _call(limiter, 0.1)  # 超过基线 3 倍
+
+        asyncio.run(run())
+        stats = limiter.stats()
+        assert stats["latency_spike"] == 1
+        assert stats["decreases"] == 1
+        assert limiter.limit == 4
+
+    def test_provider_timeout_decreases(self):
+        limiter = _limiter(initial_limit=8)
+        try:
+            asyncio.run(_call(limiter, 0, _ProviderTimeout()))
+        except _ProviderTimeout:
+            pass
+        assert limiter.stats()["timeout"] == 1
+        assert limiter.limit == 4
+
+    def test_caller_deadline_is_neutral(self):
+        """调用方的时间预算用完（名额内外的 wait_for）不下调共享的上限"""
+        limiter = _limiter(initial_limit=8)
+
+        async def inside():
+            async with limiter.slot():
+                await asyncio.wait_for(asyncio.sleep(1), timeout=0.01)
+
+        async def outside():
+            await asyncio.wait_for(_call(limiter, 1), timeout=0.01)
+
+        for run in (inside, outside):
+            try:
+                asyncio.run(run())
+            except asyncio.TimeoutError:
+                pass
+        stats = limiter.stats()
+        assert stats["timeout"] == 0 and stats["decreases"] == 0
+        assert limiter.limit == 8
+        assert stats["in_flight"] == 0
+
+    def test_ordinary_errors_do_not_decrease(self):
+        limiter = _limiter(initial_limit=4)
+        try:
+            asyncio.run(_call(limiter, 0, ValueError("bad request")))
+        except ValueError:
+            pass
+        assert limiter.limit == 4
+        assert limiter.stats()["error"] == 1
+
+    def test_limit_caps_concurrency(self):
+        limiter = _limiter(initial_limit=2, max_limit=2)
+        state = {"running": 0, "max_running": 0}
+
+        async def request():
+            async with limiter.slot():
+                state["running"] += 1
+                state["max_running"] = max(state["max_running"], state["running"])
+                await asyncio.sleep(0.01)
+                state["running"] -= 1
+
+        async def run():
+            await asyncio.gather(*[request() for _ in range(6)])
+
+        asyncio.run(run())
+        assert state["max_running"] == 2
+        assert limiter.stats()["in_flight"] == 0
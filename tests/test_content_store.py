@@ -0,0 +1,149 @@
+"""
+诊断分段去重存储测试
+"""
+
+import sys
+import os
+
+import pytest
+from alembic import command
+from sqlalchemy import create_engine, event, func, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base
+from api.db.compressed_text import decompress_text
+from api.db.migrate import alembic_config
+from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.content import ContentBlob, DiagnosisSection, release_diagnoses, split_sections
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+
+from Main import build_diagnosis_markdown
+
+RESPONSES = {
+    "Cardiologist": "Possible arrhythmia.\n\n#### Next steps\nHolter monitoring.",
+    "Psychologist": "Panic disorder is likely.",
+    "Pulmonologist": "No respiratory cause found.",
+}
+DIAGNOSIS = build_diagnosis_markdown(RESPONSES, "Panic disorder with palpitations.")
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(MedicalCase(id=1, patient_id="D1", raw_report="report"))
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _add(db, markdown):
+    record = DiagnosisHistory(case_id=1, diagnosis_markdown=markdown, model_name="gpt-4o")
+    db.add(record)
+    db.commit()
+    return record.id
+
+
+def _reload(db, diagnosis_id):
+    db.expunge_all()
+    return db.get(DiagnosisHistory, diagnosis_id)
+
+
+def _ref_counts(db):
+    return dict(db.query(ContentBlob.hash, ContentBlob.ref_count).all())
+
+
+class TestSplitSections:
+    def test_lossless(self):
+        sections = split_sections(DIAGNOSIS)
+        assert "".join(sections) == DIAGNOSIS
+        # 标题、最终诊断、专科报告标题、三个专科
+        assert len(sections) == 6
+        assert sections[3].startswith("### Cardiologist") and "#### Next steps" in sections[3]
+
+    def test_without_headings(self):
+        assert split_sections("plain text") == ["plain text"]
+        assert split_sections("") == []
+
+
+class TestContentStore:
+    def test_round_trip(self, db):
+        diagnosis_id = _add(db, DIAGNOSIS)
+        record = _reload(db, diagnosis_id)
+        assert record.diagnosis_markdown == DIAGNOSIS
+        assert record.diagnosis_preview == DIAGNOSIS[:200] + "..."
+        assert db.query(DiagnosisSection).filter_by(diagnosis_id=diagnosis_id).count() == 6
+
+    def test_repeat_runs_share_blobs(self, db):
+        _add(db, DIAGNOSIS)
+        blobs_after_first = db.query(func.count(ContentBlob.hash)).scalar()
+        # 第二次诊断仅 MDT 汇总不同，其余分段复用
+        _add(db, DIAGNOSIS)
+        _add(db, build_diagnosis_markdown(RESPONSES, "Generalized anxiety."))
+        assert db.query(func.count(ContentBlob.hash)).scalar() == blobs_after_first + 1
+        assert sorted(_ref_counts(db).values()) == [1, 2, 3, 3, 3, 3, 3]
+
+    def test_delete_releases_blobs(self, db):
+        first = _add(db, DIAGNOSIS)
+        second = _add(db, DIAGNOSIS)
+        db.delete(db.get(DiagnosisHistory, first))
+        db.commit()
+        assert set(_ref_counts(db).values()) == {1}
+        assert _reload(db, second).diagnosis_markdown == DIAGNOSIS
+
+        release_diagnoses(db.connection(), [second])
+        db.query(DiagnosisHistory).filter(DiagnosisHistory.id == second).delete()
+        db.commit()
+        assert _ref_counts(db) == {}
+        assert db.query(DiagnosisSection).count() == 0
+
+    def test_update_replaces_sections(self, db):
+        diagnosis_id = _add(db, DIAGNOSIS)
+        record = _reload(db, diagnosis_id)
+        record.diagnosis_markdown = "# Updated\n\nbody"
+        db.commit()
+        assert _reload(db, diagnosis_id).diagnosis_markdown == "# Updated\n\nbody"
+        assert list(_ref_counts(db).values()) == [1]
+
+    def test_store_adds_refs_in_upsert(self, db):
+        _add(db, DIAGNOSIS)
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute", lambda *args: statements.append(args[2]))
+        _add(db, DIAGNOSIS)
+        # 引用计数随插入一起增加，不再单独 UPDATE（并发释放删除了内容块时 UPDATE 会落空）
+        assert not [s for s in statements if s.startswith("UPDATE content_blobs")]
+        assert set(_ref_counts(db).values()) == {2}
+
+
+class TestMigration:
+    def test_existing_rows_moved_to_sections(self, tmp_path):
+        url = f"sqlite:///{tmp_path / 'sections.db'}"
+        config = alembic_config(url)
+        command.upgrade(config, "0012")
+        engine = create_engine(url)
+        with engine.begin() as connection:
+            connection.execute(text("INSERT INTO medical_cases (id, patient_id, raw_report) VALUES (1, 'M1', 'r')"))
+            for _ in range(3):
+                connection.execute(text("INSERT INTO diagnosis_history (case_id, diagnosis_markdown) VALUES (1, :md)"),
+                                   {"md": DIAGNOSIS.encode("utf-8")})
+        command.upgrade(config, "head")
+
+        session = sessionmaker(bind=engine)()
+        try:
+            assert [d.diagnosis_markdown for d in session.query(DiagnosisHistory)] == [DIAGNOSIS] * 3
+            assert set(_ref_counts(session).values()) == {3}
+        finally:
+            session.close()
+
+        command.downgrade(config, "0012")
+        with engine.connect() as connection:
+            stored = connection.execute(text("SELECT diagnosis_markdown FROM diagnosis_history")).scalars().all()
+        engine.dispose()
+        assert [decompress_text(value) for value in stored] == [DIAGNOSIS] * 3
@@ -0,0 +1,108 @@
+"""
+读写分离连接池测试
+
+- GET 请求使用只读连接池（query_only 连接），其他请求使用写连接池
+- 写连接池只有一个连接：写请求在等待耗时操作前须归还连接，并发写请求排队而不是互相等待到超时
+"""
+
+import asyncio
+import sys
+import os
+import threading
+
+import httpx
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from starlette.requests import Request
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.main as main
+from api.auth.security import create_access_token
+from api.db import database
+from api.models.case import MedicalCase
+
+
+def _session_for(method):
+    generator = database.get_db(Request({"type": "http", "method": method, "headers": []}))
+    return generator, next(generator)
+
+
+def _async_client():
+    token = create_access_token({"sub": "admin"})
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test",
+                             headers={"Authorization": f"Bearer {token}"})
+
+
+def _case_body(i):
+    return {"patient_name": f"Patient {i}", "age": 40, "gender": "male", "chief_complaint": "cough"}
+
+
+class TestPoolSelection:
+    def test_get_uses_query_only_connection(self, api_db):
+        generator, db = _session_for("GET")
+        try:
+            assert db.execute(text("PRAGMA query_only")).scalar() == 1
+            with pytest.raises(OperationalError):
+                db.execute(text("DELETE FROM users"))
+        finally:
+            generator.close()
+
+    def test_post_uses_writer(self, api_db):
+        generator, db = _session_for("POST")
+        try:
+            assert db.execute(text("PRAGMA query_only")).scalar() == 0
+            assert db.get_bind() is database.SessionLocal.kw["bind"]
+        finally:
+            generator.close()
+
+
+class TestConcurrentWrites:
+    def test_concurrent_creates_complete(self, api_db):
+        async def run():
+            async with _async_client() as http:
+                return await asyncio.wait_for(
+                    asyncio.gather(*[http.post("/api/cases", json=_case_body(i)) for i in range(8)]), timeout=20
+                )
+
+        responses = asyncio.run(run())
+        assert [r.status_code for r in responses] == [200] * 8
+        assert len({r.json()["patient_id"] for r in responses}) == 8
+        assert api_db.query(MedicalCase).count() == 8
+
+    def test_similarity_lookup_does_not_hold_writer(self, api_db, monkeypatch):
+        """reuse_similar 检索期间其他写请求可以完成（检索在只读会话中执行）"""
+        api_db.add(MedicalCase(id=1, patient_id="P1", raw_report="Chest pain for three days.", created_by=1))
+        api_db.commit()
+        lookup_started, release = threading.Event(), threading.Event()
+        state = {}
+
+        def slow_lookup(db, case_id, raw_report, creator_id, k, min_score=0.0):
+            state["query_only"] = db.execute(text("PRAGMA query_only")).scalar()
+            lookup_started.set()
+            state["released"] = release.wait(timeout=5)
+            return []
+
+        async def fake_diagnosis(raw_report, **kwargs):
+            return "# Diagnosis"
+
+        monkeypatch.setattr(main, "find_similar_cases", slow_lookup)
+        monkeypatch.setattr(main, "arun_multi_agent_diagnosis", fake_diagnosis)
+
+        async def run():
+            async with _async_client() as http:
+                diagnosis = asyncio.create_task(http.post(
+                    "/api/cases/1/run-diagnosis", json={"model": "gpt-4o", "reuse_similar": True}
+                ))
+                await asyncio.to_thread(lookup_started.wait, 5)
+                created = await http.post("/api/cases", json=_case_body(1))
+                release.set()
+                return created, await diagnosis
+
+        created, diagnosis = asyncio.run(run())
+        assert created.status_code == 200
+        assert diagnosis.status_code == 200
+        # 写请求在检索结束之前完成，检索使用只读连接
+        assert state == {"query_only": 1, "released": True}
@@ -0,0 +1,135 @@
+"""
+截止时间与客户端断开取消单元测试
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+import time
+from contextlib import asynccontextmanager
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+import Utils.Agents as agents
+from Utils.Deadline import Deadline
+from api.utils.disconnect import cancel_on_disconnect
+
+
+class FakeRequest:
+    """模拟在若干次轮询后断开的客户端"""
+
+    def __init__(self, disconnect_after: int):
+        self.polls = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.polls >= self.disconnect_after
+
+
+class TestDeadline:
+    """截止时间测试"""
+
+    def test_no_timeout_means_no_deadline(self):
+        assert Deadline.from_timeout_ms(None) is None
+
+    def test_remaining_decreases_and_expires(self):
+        deadline = Deadline.from_timeout_ms(50)
+        assert 0 < deadline.remaining() <= 0.05
+        assert not deadline.expired
+        expired = Deadline(0)
+        assert expired.remaining() == 0
+        assert expired.expired
+
+
+class TestAgentTimeout:
+    """智能体时间预算测试"""
+
+    def test_queue_wait_counts_toward_budget(self, monkeypatch):
+        """名额一直不可用时，排队时间同样受时间预算限制"""
+        monkeypatch.setenv("OPENAI_API_KEY", "test")
+
+        @asynccontextmanager
+        async def blocked_slot(*args):
+            await asyncio.Event().wait()
+            yield
+
+        monkeypatch.setattr(agents, "llm_slot", blocked_slot)
+        agent = agents.Cardiologist("report")
+        started = time.perf_counter()
+        assert asyncio.run(agent.arun(timeout=0.05)) is None
+        assert time.perf_counter() - started < 1
+        assert agent.usage["status"] == "timeout"
+
+
+class TestCancelOnDisconnect:
+    """客户端断开取消测试"""
+
+    def test_returns_result_when_connected(self):
+        async def work():
+            await asyncio.sleep(0.02)
+            return "ok"
+
+        request = FakeRequest(disconnect_after=1000)
+        assert asyncio.run(cancel_on_disconnect(request, work(), poll_interval=0.01)) == "ok"
+
+    def test_cancels_work_on_disconnect(self):
+        cancelled = []
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        request = FakeRequest(disconnect_after=2)
+        with pytest.raises(HTTPException) as exc:
+            asyncio.run(cancel_on_disconnect(request, work(), poll_interval=0.01))
+        assert exc.value.status_code == 499
+        assert cancelled == [True]
+
+
+class _FakeAgent:
+    """记录模型与供应商的假智能体"""
+    created = []
+
+    def __init__(self, *args, model_name=None, language="en", provider=None, **kwargs):
+        self.model_name = model_name
+        self.provider = provider
+        self.usage = {}
+        _FakeAgent.created.append(self)
+
+    def prompt_overhead_tokens(self):
+        return 10
+
+    async def arun(self, timeout=None):
+        return "report"
+
+
+class TestFastModelFallback:
+    """截止时间不足时 MDT 改用快速模型"""
+
+    def _run_mdt(self, monkeypatch, provider, fast_model_runtime):
+        import Main
+        monkeypatch.setenv("LLM_FAST_MODEL", "fast-remote")
+        for name in ("Cardiologist", "Psychologist", "Pulmonologist", "MultidisciplinaryTeam"):
+            monkeypatch.setattr(Main, name, _FakeAgent)
+        _FakeAgent.created = []
+        asyncio.run(Main.arun_multi_agent_diagnosis(
+            "report", model_name="local-model", deadline=Deadline(10),
+            provider=provider, fast_model_runtime=fast_model_runtime,
+        ))
+        return _FakeAgent.created[-1]
+
+    def test_same_provider_switches(self, monkeypatch):
+        mdt = self._run_mdt(monkeypatch, None, {"provider": None, "context_window": None})
+        assert mdt.model_name == "fast-remote"
+
+    def test_other_provider_keeps_model(self, monkeypatch):
+        ollama = {"provider_type": "ollama", "base_url": "http://localhost:11434"}
+        mdt = self._run_mdt(monkeypatch, ollama, {"provider": None, "context_window": 128000})
+        assert (mdt.model_name, mdt.provider) == ("local-model", ollama)
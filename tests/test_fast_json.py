@@ -0,0 +1,79 @@
+"""
+列表接口快速序列化路径测试
+
+fast=true 与标准路径返回的 JSON 完全一致（字段、日期时间格式、空值），
+分别在安装 orjson 与回退到标准库 json 时验证
+"""
+
+import sys
+import os
+from datetime import datetime
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.utils.fast_json as fast_json
+from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.user import User, Role
+
+
+@pytest.fixture(params=["orjson", "json"])
+def serializer(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(fast_json, "orjson", None)
+    return request.param
+
+
+@pytest.fixture
+def records(api_db):
+    """时间含/不含微秒，各可空字段均有为空的记录"""
+    doctor = Role(id=1, name="doctor", display_name="医生")
+    viewer = Role(id=2, name="viewer", display_name="访客")
+    api_db.add_all([doctor, viewer])
+    api_db.add(User(id=2, username="dr", email="dr@example.com", hashed_password="-", full_name=None,
+                    created_at=datetime(2025, 1, 2, 3, 4, 5, 678901), last_login=datetime(2025, 2, 1),
+                    roles=[viewer, doctor]))
+    api_db.add(User(id=3, username="new", email="new@example.com", hashed_password="-", full_name="New User",
+                    is_active=False, created_at=datetime(2025, 1, 3), last_login=None))
+    api_db.add(MedicalCase(id=1, patient_id="P1", patient_name="张三", age=40, gender="male",
+                           chief_complaint="胸痛", raw_report="Chest pain. " * 50, created_by=2,
+                           created_at=datetime(2025, 3, 1, 8, 0, 0, 5)))
+    api_db.add(MedicalCase(id=2, patient_id="P2", patient_name=None, age=None, gender=None,
+                           chief_complaint=None, raw_report="r", created_by=None,
+                           created_at=datetime(2025, 3, 2)))
+    api_db.add(DiagnosisHistory(id=1, case_id=1, diagnosis_markdown="# Angina\n" + "detail " * 60,
+                                model_name="gpt-4o", execution_time_ms=1200,
+                                run_timestamp=datetime(2025, 3, 1, 9, 30, 0, 250000)))
+    api_db.add(DiagnosisHistory(id=2, case_id=2, diagnosis_markdown="# Short", model_name="claude-sonnet-4.5",
+                                execution_time_ms=None, run_timestamp=datetime(2025, 3, 2)))
+    api_db.commit()
+
+
+def _both(client, url, params=None):
+    standard = client.get(url, params={**(params or {}), "fast": False})
+    fast = client.get(url, params={**(params or {}), "fast": True})
+    assert standard.status_code == fast.status_code == 200
+    assert standard.headers.get("X-Next-Cursor") == fast.headers.get("X-Next-Cursor")
+    return standard.json(), fast.json()
+
+
+class TestFastPathMatchesStandard:
+    def test_list_cases(self, client, records, serializer):
+        standard, fast = _both(client, "/api/cases")
+        assert len(standard) == 2
+        assert fast == standard
+        paged_standard, paged_fast = _both(client, "/api/cases", {"limit": 1})
+        assert paged_fast == paged_standard
+
+    def test_all_diagnoses(self, client, records, serializer):
+        for params in ({}, {"page_size": 1}, {"sort": "model_name", "order": "asc"}, {"count_mode": "none"}):
+            standard, fast = _both(client, "/api/diagnoses/all", params)
+            assert fast == standard
+        assert len(_both(client, "/api/diagnoses/all")[0]["items"]) == 2
+
+    def test_list_users(self, client, records, serializer):
+        standard, fast = _both(client, "/api/users")
+        assert [user["id"] for user in standard] == [1, 2, 3]
+        assert fast == standard
@@ -0,0 +1,131 @@
+"""
+全文检索（SQLite FTS5）测试
+"""
+
+import asyncio
+import sys
+import os
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base
+from api.db.fulltext import (
+    build_match_query, format_snippet, rank_window_start, rebuild_fulltext_index, remove_diagnoses, segment
+)
+from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.user import User
+import api.models.settings  # noqa: F401  确保所有表注册到 Base.metadata
+from api.routes.search import search
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add_all([
+        User(id=1, username="admin", email="admin@example.com", hashed_password="x", is_superuser=True),
+        User(id=2, username="owner", email="owner@example.com", hashed_password="x"),
+    ])
+    session.add_all([
+        MedicalCase(id=1, patient_id="P001", patient_name="张三", chief_complaint="反复胸痛三天",
+                    raw_report="心电图提示房颤，建议动态心电监测。", created_by=1),
+        MedicalCase(id=2, patient_id="P002", patient_name="John Smith", chief_complaint="Palpitations",
+                    raw_report="Episodes of arrhythmia during exercise.", created_by=2),
+    ])
+    session.flush()
+    session.add_all([
+        DiagnosisHistory(id=1, case_id=1, diagnosis_markdown="# 诊断\n\n考虑冠心病心绞痛。", model_name="gpt-4o"),
+        DiagnosisHistory(id=2, case_id=2, diagnosis_markdown="# Diagnosis\n\nPanic disorder with arrhythmia.",
+                         model_name="gpt-4o"),
+    ])
+    session.commit()
+    yield session
+    session.close()
+    engine.dispose()
+
+
+def _search(db, user_id, q, type="all"):
+    response = asyncio.run(search(q=q, type=type, limit=20, db=db, current_user=db.get(User, user_id)))
+    return [(item.type, item.diagnosis_id or item.case_id) for item in response.items], response
+
+
+class TestQuery:
+    def test_segment(self):
+        assert segment("胸痛 ECG") == " 胸  痛  ECG"
+
+    def test_build_match_query(self):
+        assert build_match_query("胸痛 arrhyth") == '"胸 痛" AND "arrhyth"*'
+        # 标点被忽略，不会产生 FTS5 语法错误
+        assert build_match_query('"AND" (x') == '"AND"* AND "x"*'
+        assert build_match_query("  ?? ") is None
+
+    def test_format_snippet(self):
+        assert format_snippet(" 反  复 \x02 胸 \x03\x02 痛 \x03 <b>") == "反复<mark>胸痛</mark> &lt;b&gt;"
+
+
+class TestSearch:
+    def test_chinese_substring(self, db):
+        hits, response = _search(db, 1, "胸痛")
+        assert hits == [("case", 1)]
+        assert "<mark>胸痛</mark>" in response.items[0].snippet
+
+    def test_english_prefix_in_cases_and_diagnoses(self, db):
+        hits, _ = _search(db, 1, "arrhythm")
+        assert sorted(hits) == [("case", 2), ("diagnosis", 2)]
+        hits, _ = _search(db, 1, "arrhythm", type="diagnoses")
+        assert hits == [("diagnosis", 2)]
+
+    def test_all_terms_required(self, db):
+        assert _search(db, 1, "冠心病 arrhythmia")[0] == []
+        assert _search(db, 1, "冠心病 心绞痛")[0] == [("diagnosis", 1)]
+
+    def test_access_filter(self, db):
+        # 普通用户只能检索自己创建的病例，且无 diagnosis:read 权限时不返回诊断
+        assert _search(db, 2, "胸痛")[0] == []
+        assert _search(db, 2, "arrhythmia")[0] == [("case", 2)]
+
+    def test_rank_window(self, db):
+        match = build_match_query("arrhythmia")
+        # 命中数不超过窗口时不截断；超过时只保留最新的命中
+        assert rank_window_start(db, "cases_fts", match, window=2) is None
+        assert rank_window_start(db, "cases_fts", build_match_query("P00"), window=1) == 2
+
+    def test_empty_query_rejected(self, db):
+        with pytest.raises(HTTPException) as exc:
+            _search(db, 1, "??")
+        assert exc.value.status_code == 400
+
+
+class TestIndexSync:
+    def test_update_and_delete(self, db):
+        case = db.get(MedicalCase, 2)
+        case.chief_complaint = "Syncope"
+        db.commit()
+        assert _search(db, 1, "palpitations")[0] == []
+        assert _search(db, 1, "syncope")[0] == [("case", 2)]
+
+        db.delete(case)
+        db.commit()
+        assert _search(db, 1, "arrhythmia")[0] == []
+
+    def test_bulk_delete(self, db):
+        remove_diagnoses(db.connection(), [1])
+        db.query(DiagnosisHistory).filter(DiagnosisHistory.id == 1).delete()
+        db.commit()
+        assert _search(db, 1, "心绞痛")[0] == []
+
+    def test_rebuild(self, db):
+        db.execute(text("DELETE FROM cases_fts"))
+        db.execute(text("DELETE FROM diagnoses_fts"))
+        assert _search(db, 1, "arrhythmia")[0] == []
+        assert rebuild_fulltext_index(db.connection()) == (2, 2)
+        db.commit()
+        assert sorted(_search(db, 1, "arrhythmia")[0]) == [("case", 2), ("diagnosis", 2)]
@@ -0,0 +1,185 @@
+"""
+HTTP 条件请求与响应压缩工具单元测试
+"""
+
+import asyncio
+import gzip
+import sys
+import os
+from datetime import datetime
+
+import pytest
+from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from fastapi.testclient import TestClient
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.utils.http_cache import compute_etag, etag_matches
+from api.utils.compression import CompressionMiddleware, select_encoding, compress_body
+from api.models.case import MedicalCase, DiagnosisHistory
+
+
+class TestEtag:
+    """ETag 生成与比较测试"""
+
+    def test_etag_is_stable_and_quoted(self):
+        """相同输入生成相同的强 ETag"""
+        ts = datetime(2025, 1, 15, 10, 30)
+        etag = compute_etag("case", 1, ts)
+        assert etag == compute_etag("case", 1, ts)
+        assert etag.startswith('"') and etag.endswith('"')
+
+    def test_etag_changes_with_updated_at(self):
+        """updated_at 变化后 ETag 随之变化"""
+        assert compute_etag("case", 1, datetime(2025, 1, 15)) != compute_etag("case", 1, datetime(2025, 1, 16))
+
+    def test_if_none_match_variants(self):
+        """支持多值、通配符、弱校验前缀和压缩后缀"""
+        etag = compute_etag("case", 1)
+        assert etag_matches(etag, etag)
+        assert etag_matches(f'"other", {etag}', etag)
+        assert etag_matches("*", etag)
+        assert etag_matches(f"W/{etag}", etag)
+        assert etag_matches(f'{etag[:-1]}-gzip"', etag)
+        assert not etag_matches(None, etag)
+        assert not etag_matches('"other"', etag)
+
+
+class TestCompression:
+    """压缩算法选择测试"""
+
+    def test_select_gzip(self):
+        """仅支持 gzip 时选择 gzip"""
+        assert select_encoding("gzip, deflate") == "gzip"
+
+    def test_select_none(self):
+        """不支持或显式拒绝时不压缩"""
+        assert select_encoding("identity") is None
+        assert select_encoding("gzip;q=0") is None
+
+    def test_gzip_roundtrip(self):
+        """gzip 压缩结果可以还原"""
+        body = b'{"raw_report": "' + b"cough " * 500 + b'"}'
+        compressed = compress_body(body, "gzip")
+        assert len(compressed) < len(body)
+        assert gzip.decompress(compressed) == body
+
+
+BIG_TEXT = "cough " * 500
+
+
+@pytest.fixture
+def compressing_client():
+    app = FastAPI()
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+
+    @app.get("/big")
+    def big():
+        return PlainTextResponse(BIG_TEXT, headers={"ETag": '"v1"'})
+
+    @app.get("/small")
+    def small():
+        return PlainTextResponse("ok")
+
+    @app.get("/stream")
+    def stream():
+        return StreamingResponse(iter([BIG_TEXT.encode()] * 3), media_type="text/plain")
+
+    with TestClient(app) as client:
+        yield client
+
+
+class TestCompressionMiddleware:
+    """压缩中间件测试"""
+
+    def test_compresses_large_response(self, compressing_client):
+        response = compressing_client.get("/big", headers={"Accept-Encoding": "gzip"})
+        assert response.headers["Content-Encoding"] == "gzip"
+        assert response.headers["Vary"] == "Accept-Encoding"
+        assert response.headers["ETag"] == '"v1-gzip"'
+        assert int(response.headers["Content-Length"]) < len(BIG_TEXT)
+        assert response.text == BIG_TEXT
+
+    def test_vary_on_uncompressed_responses(self, compressing_client):
+        """低于阈值或客户端不支持压缩时不压缩，但仍声明 Vary"""
+        small = compressing_client.get("/small", headers={"Accept-Encoding": "gzip"})
+        identity = compressing_client.get("/big", headers={"Accept-Encoding": "identity"})
+        for response in (small, identity):
+            assert "Content-Encoding" not in response.headers
+            assert response.headers["Vary"] == "Accept-Encoding"
+        assert identity.headers["ETag"] == '"v1"'
+
+    def test_streaming_passes_through(self, compressing_client):
+        """长度未知的流式响应原样转发，不压缩"""
+        response = compressing_client.get("/stream", headers={"Accept-Encoding": "gzip"})
+        assert "Content-Encoding" not in response.headers
+        assert "Vary" not in response.headers
+        assert response.text == BIG_TEXT * 3
+
+    def test_streaming_chunks_not_buffered(self):
+        """流式响应的每个分块到达即转发"""
+        sent = []
+
+        async def app(scope, receive, send):
+            await send({"type": "http.response.start", "status": 200,
+                        "headers": [(b"content-type", b"text/plain")]})
+            for _ in range(3):
+                await send({"type": "http.response.body", "body": BIG_TEXT.encode(), "more_body": True})
+                # 下一分块产生之前，上一分块已经发出
+                assert sent[-1]["body"] == BIG_TEXT.encode()
+            await send({"type": "http.response.body", "body": b""})
+
+        async def send(message):
+            sent.append(message)
+
+        async def receive():
+            return {"type": "http.request", "body": b""}
+
+        scope = {"type": "http", "method": "GET", "headers": [(b"accept-encoding", b"gzip")]}
+        asyncio.run(CompressionMiddleware(app, minimum_size=1024)(scope, receive, send))
+        assert [m["type"] for m in sent] == ["http.response.start"] + ["http.response.body"] * 4
+
+
+class TestDiagnosisHistoryEtag:
+    """诊断历史接口的条件请求"""
+
+    URL = "/api/cases/1/diagnoses"
+
+    @pytest.fixture
+    def case(self, api_db):
+        api_db.add(MedicalCase(id=1, patient_id="P1", raw_report="report", created_by=1))
+        api_db.add(DiagnosisHistory(case_id=1, diagnosis_markdown="# First", model_name="gpt-4o",
+                                    execution_time_ms=1000, run_timestamp=datetime(2024, 6, 1)))
+        api_db.commit()
+
+    def test_if_none_match_returns_304(self, client, case):
+        first = client.get(self.URL)
+        assert first.status_code == 200
+        etag = first.headers["ETag"]
+        cached = client.get(self.URL, headers={"If-None-Match": etag})
+        assert cached.status_code == 304
+        assert cached.headers["ETag"] == etag
+        assert cached.content == b""
+
+    def test_etag_changes_after_new_diagnosis(self, client, api_db, case):
+        etag = client.get(self.URL).headers["ETag"]
+        api_db.add(DiagnosisHistory(case_id=1, diagnosis_markdown="# Second", model_name="gpt-4o",
+                                    execution_time_ms=1000))
+        api_db.commit()
+
+        response = client.get(self.URL, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.json()["total_diagnoses"] == 2
+
+    def test_etag_changes_after_archiving(self, client, api_db, case):
+        from api.utils.archive import archive_diagnoses
+        etag = client.get(self.URL).headers["ETag"]
+        assert archive_diagnoses(api_db, datetime(2025, 1, 1)) == 1
+
+        response = client.get(self.URL, headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert [item["archived"] for item in response.json()["history"]] == [True]
@@ -0,0 +1,163 @@
+"""
+幂等请求测试（Idempotency-Key 请求头，run-diagnosis 与病例导入）
+"""
+
+import asyncio
+import json
+import sys
+import os
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.main as main
+import api.utils.idempotency as idempotency
+from api.auth.security import create_access_token
+from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.idempotency import IdempotencyRecord
+from api.utils.idempotency import compute_fingerprint
+
+MODEL = main.AVAILABLE_MODELS[0]["id"]
+RUN_URL = "/api/cases/1/run-diagnosis"
+RUN_BODY = {"model": MODEL, "language": "en"}
+
+
+@pytest.fixture
+def case(api_db):
+    api_db.add(MedicalCase(id=1, patient_id="P1", raw_report="Chest pain for three days.", created_by=1))
+    api_db.commit()
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """替换多智能体诊断流水线，记录调用次数；设置 gate 后调用在 gate 放行前保持运行"""
+    state = {"calls": 0, "gate": None, "started": None, "error": None}
+
+    async def fake_diagnosis(raw_report, **kwargs):
+        state["calls"] += 1
+        if state["started"] is not None:
+            state["started"].set()
+        if state["gate"] is not None:
+            await state["gate"].wait()
+        if state["error"] is not None:
+            error, state["error"] = state["error"], None
+            raise error
+        return f"# Diagnosis {state['calls']}"
+
+    monkeypatch.setattr(main, "arun_multi_agent_diagnosis", fake_diagnosis)
+    return state
+
+
+def _async_client():
+    token = create_access_token({"sub": "admin"})
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://test",
+                             headers={"Authorization": f"Bearer {token}"})
+
+
+def _records(db):
+    db.expire_all()
+    records = db.query(IdempotencyRecord).all()
+    db.commit()
+    return records
+
+
+class TestRunDiagnosisIdempotency:
+    def test_completed_key_is_replayed(self, client, api_db, case, pipeline):
+        headers = {"Idempotency-Key": "retry-1"}
+        first = client.post(RUN_URL, json=RUN_BODY, headers=headers)
+        second = client.post(RUN_URL, json=RUN_BODY, headers=headers)
+        assert first.status_code == second.status_code == 200
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.json() == first.json()
+        assert pipeline["calls"] == 1
+        assert api_db.query(DiagnosisHistory).count() == 1
+        assert [r.status for r in _records(api_db)] == ["completed"]
+
+    def test_concurrent_duplicate_waits_for_replay(self, api_db, case, pipeline):
+        async def run():
+            pipeline["gate"], pipeline["started"] = asyncio.Event(), asyncio.Event()
+            async with _async_client() as http:
+                headers = {"Idempotency-Key": "retry-2"}
+                first = asyncio.create_task(http.post(RUN_URL, json=RUN_BODY, headers=headers))
+                await pipeline["started"].wait()
+                second = asyncio.create_task(http.post(RUN_URL, json=RUN_BODY, headers=headers))
+                await asyncio.sleep(0.2)
+                # 重复请求在原请求完成前一直等待
+                assert not second.done()
+                pipeline["gate"].set()
+                return await first, await second
+
+        first, second = asyncio.run(run())
+        assert first.status_code == second.status_code == 200
+        assert "Idempotent-Replayed" not in first.headers
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert second.json() == first.json()
+        assert pipeline["calls"] == 1
+
+    def test_fingerprint_mismatch_returns_422(self, client, case, pipeline):
+        headers = {"Idempotency-Key": "retry-3"}
+        assert client.post(RUN_URL, json=RUN_BODY, headers=headers).status_code == 200
+        response = client.post(RUN_URL, json={**RUN_BODY, "language": "zh"}, headers=headers)
+        assert response.status_code == 422
+        assert pipeline["calls"] == 1
+
+    def test_failure_deletes_key(self, client, api_db, case, pipeline):
+        headers = {"Idempotency-Key": "retry-4"}
+        pipeline["error"] = main.HTTPException(status_code=502, detail="upstream failed")
+        assert client.post(RUN_URL, json=RUN_BODY, headers=headers).status_code == 502
+        assert _records(api_db) == []
+        assert idempotency._in_flight_events == {}
+
+        # 同一幂等键重试时重新执行
+        response = client.post(RUN_URL, json=RUN_BODY, headers=headers)
+        assert response.status_code == 200
+        assert "Idempotent-Replayed" not in response.headers
+        assert pipeline["calls"] == 2
+
+    def test_cancelled_request_deletes_key(self, api_db, case, pipeline):
+        """请求被取消（CancelledError 不是 Exception 的子类）时同样删除登记记录"""
+        async def run():
+            pipeline["gate"], pipeline["started"] = asyncio.Event(), asyncio.Event()
+            async with _async_client() as http:
+                task = asyncio.create_task(http.post(RUN_URL, json=RUN_BODY, headers={"Idempotency-Key": "retry-5"}))
+                await pipeline["started"].wait()
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+        asyncio.run(run())
+        assert _records(api_db) == []
+        assert idempotency._in_flight_events == {}
+
+    def test_stale_record_is_taken_over(self, client, api_db, case, pipeline):
+        """in_progress 记录超过 IDEMPOTENCY_IN_FLIGHT_TIMEOUT 视为原请求已中断，由新请求接管"""
+        started = datetime.utcnow() - timedelta(seconds=idempotency.IDEMPOTENCY_IN_FLIGHT_TIMEOUT + 1)
+        api_db.add(IdempotencyRecord(
+            idempotency_key="retry-6", user_id=1, endpoint="POST /api/cases/{case_id}/run-diagnosis",
+            fingerprint=compute_fingerprint(1, MODEL, "en"), status="in_progress",
+            created_at=started, expires_at=started + timedelta(days=1),
+        ))
+        api_db.commit()
+
+        response = client.post(RUN_URL, json=RUN_BODY, headers={"Idempotency-Key": "retry-6"})
+        assert response.status_code == 200
+        assert pipeline["calls"] == 1
+        records = _records(api_db)
+        assert [r.status for r in records] == ["completed"]
+        assert json.loads(records[0].response_body)["diagnosis_markdown"] == "# Diagnosis 1"
+
+
+class TestImportIdempotency:
+    def test_import_is_replayed(self, client, api_db):
+        content = json.dumps([{"patient_name": "A", "age": 40, "gender": "male", "chief_complaint": "cough"}])
+        headers = {"Idempotency-Key": "import-1"}
+        files = {"file": ("cases.json", content, "application/json")}
+        first = client.post("/api/cases/import", files=files, headers=headers)
+        second = client.post("/api/cases/import", files=files, headers=headers)
+        assert first.status_code == second.status_code == 200
+        assert second.headers["Idempotent-Replayed"] == "true"
+        assert api_db.query(MedicalCase).count() == 1
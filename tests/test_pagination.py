@@ -0,0 +1,207 @@
+"""
+游标分页工具单元测试
+"""
+
+import pytest
+import sys
+import os
+from datetime import datetime
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from fastapi import HTTPException
+from api.utils.pagination import CountCache, encode_cursor, decode_cursor, normalize_order
+
+
+class TestCursor:
+    """游标编解码测试"""
+
+    def test_datetime_roundtrip(self):
+        """datetime 排序值可以无损往返"""
+        ts = datetime(2025, 12, 11, 15, 30, 45, 123456)
+        cursor = encode_cursor("created_at", "desc", ts, 42)
+        decoded = decode_cursor(cursor, "created_at", "desc")
+        assert decoded == {"value": ts, "id": 42}
+
+    def test_string_roundtrip(self):
+        """字符串排序值（含中文）可以往返"""
+        cursor = encode_cursor("patient_id", "asc", "202512111530155", 7)
+        assert decode_cursor(cursor, "patient_id", "asc")["value"] == "202512111530155"
+
+    def test_mismatched_sort_rejected(self):
+        """游标与当前排序参数不一致时返回 400"""
+        cursor = encode_cursor("created_at", "desc", datetime(2025, 1, 1), 1)
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor(cursor, "patient_id", "desc")
+        assert exc.value.status_code == 400
+
+    def test_invalid_cursor_rejected(self):
+        """非法游标返回 400"""
+        with pytest.raises(HTTPException) as exc:
+            decode_cursor("not-a-cursor", "created_at", "desc")
+        assert exc.value.status_code == 400
+
+    def test_normalize_order(self):
+        """排序方向默认降序"""
+        assert normalize_order("ASC") == "asc"
+        assert normalize_order(None) == "desc"
+        assert normalize_order("whatever") == "desc"
+
+
+def _walk(client, url, params, limit):
+    """沿 X-Next-Cursor 翻完所有页，返回每页的结果"""
+    pages, cursor = [], None
+    while True:
+        page_params = {**params, "limit": limit}
+        if cursor:
+            page_params["cursor"] = cursor
+        response = client.get(url, params=page_params)
+        assert response.status_code == 200, response.text
+        pages.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return pages
+        assert len(pages) <= 50, "游标未前进"
+
+
+class TestCaseListPagination:
+    """病例列表游标翻页"""
+
+    @pytest.fixture
+    def cases(self, api_db):
+        from api.models.case import MedicalCase
+        # 创建时间大量重复、部分年龄为空，翻页依赖 id 作为第二排序键
+        for i in range(1, 24):
+            api_db.add(MedicalCase(id=i, patient_id=f"P{i:03d}", raw_report="r", created_by=1,
+                                   age=None if i % 4 == 0 else 30 + i % 3,
+                                   created_at=datetime(2025, 1, 1 + i % 3)))
+        api_db.commit()
+        return set(range(1, 24))
+
+    @pytest.mark.parametrize("sort", ["created_at", "patient_id", "age"])
+    @pytest.mark.parametrize("order", ["asc", "desc"])
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_walk_returns_every_case_once(self, client, cases, sort, order, fast):
+        pages = _walk(client, "/api/cases", {"sort": sort, "order": order, "fast": fast}, limit=5)
+        ids = [case["id"] for page in pages for case in page]
+        assert len(ids) == len(cases)
+        assert set(ids) == cases
+        assert all(len(page) == 5 for page in pages[:-1])
+        # 整体顺序与不分页的结果一致
+        assert ids == [case["id"] for case in client.get("/api/cases", params={"sort": sort, "order": order}).json()]
+
+
+class TestCountCache:
+    """总数缓存测试"""
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        from api.utils import pagination
+        now = [1000.0]
+        monkeypatch.setattr(pagination.time, "monotonic", lambda: now[0])
+        return now
+
+    def test_reused_within_ttl(self, clock):
+        cache, calls = CountCache(ttl_seconds=60), []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        assert cache.get_or_compute("k", compute) == 1
+        clock[0] += 59
+        assert cache.get_or_compute("k", compute) == 1
+        clock[0] += 2
+        assert cache.get_or_compute("k", compute) == 2
+        # 不同键分别缓存
+        assert cache.get_or_compute("other", compute) == 3
+
+    def test_clear(self, clock):
+        cache = CountCache(ttl_seconds=60)
+        cache.get_or_compute("k", lambda: 1)
+        cache.clear()
+        assert cache.get_or_compute("k", lambda: 2) == 2
+
+    def test_evicts_when_full(self, clock):
+        cache = CountCache(ttl_seconds=60, max_entries=2)
+        cache.get_or_compute("a", lambda: 1)
+        clock[0] += 1
+        cache.get_or_compute("b", lambda: 2)
+        cache.get_or_compute("c", lambda: 3)
+        # 最早过期的 a 被淘汰，b 仍然命中
+        assert cache.get_or_compute("b", lambda: 0) == 2
+        assert cache.get_or_compute("a", lambda: 0) == 0
+
+
+ALL_DIAGNOSES_URL = "/api/diagnoses/all"
+
+
+class TestAllDiagnosesPagination:
+    """全局诊断历史的游标翻页与总数"""
+
+    @pytest.fixture
+    def diagnoses(self, api_db):
+        from api.models.case import MedicalCase, DiagnosisHistory
+        for case_id in (1, 2, 3):
+            api_db.add(MedicalCase(id=case_id, patient_id=f"P{case_id}", raw_report="r", created_by=1))
+        # 运行时间与模型大量重复，翻页依赖 id 作为第二排序键
+        for i in range(1, 20):
+            api_db.add(DiagnosisHistory(id=i, case_id=1 + i % 3, diagnosis_markdown=f"# {i}",
+                                        model_name=("gpt-4o", "claude-sonnet-4.5")[i % 2],
+                                        run_timestamp=datetime(2025, 1, 1 + i % 4)))
+        api_db.commit()
+        return set(range(1, 20))
+
+    @pytest.mark.parametrize("sort", ["run_timestamp", "model_name", "patient_id"])
+    @pytest.mark.parametrize("order", ["asc", "desc"])
+    @pytest.mark.parametrize("fast", [False, True])
+    def test_walk_returns_every_diagnosis_once(self, client, diagnoses, sort, order, fast):
+        pages, cursor = [], None
+        while True:
+            params = {"sort": sort, "order": order, "fast": fast, "page_size": 4, "count_mode": "none"}
+            if cursor:
+                params["cursor"] = cursor
+            response = client.get(ALL_DIAGNOSES_URL, params=params)
+            assert response.status_code == 200, response.text
+            pages.append(response.json())
+            cursor = pages[-1]["next_cursor"]
+            if cursor is None:
+                break
+            assert len(pages) <= 50, "游标未前进"
+
+        ids = [item["id"] for page in pages for item in page["items"]]
+        assert len(ids) == len(diagnoses)
+        assert set(ids) == diagnoses
+        assert {page["total"] for page in pages} == {-1}
+        # 整体顺序与 OFFSET 分页一致
+        everything = client.get(ALL_DIAGNOSES_URL, params={"sort": sort, "order": order, "page_size": 200}).json()
+        assert ids == [item["id"] for item in everything["items"]]
+
+    def test_cursor_from_other_sort_rejected(self, client, diagnoses):
+        cursor = client.get(ALL_DIAGNOSES_URL, params={"page_size": 4}).json()["next_cursor"]
+        response = client.get(ALL_DIAGNOSES_URL, params={"page_size": 4, "cursor": cursor, "sort": "model_name"})
+        assert response.status_code == 400
+
+    def test_cached_total_invalidated_after_insert(self, client, api_db, diagnoses):
+        from sqlalchemy import text
+        from api.models.case import DiagnosisHistory
+
+        def total(mode="cached"):
+            return client.get(ALL_DIAGNOSES_URL, params={"count_mode": mode}).json()["total"]
+
+        assert total() == 19
+        # 绕过 ORM 的写入不会触发失效，TTL 内仍返回缓存值
+        api_db.execute(text("INSERT INTO diagnosis_history (id, case_id, model_name, run_timestamp) "
+                            "VALUES (20, 1, 'gpt-4o', '2025-01-01 00:00:00')"))
+        api_db.commit()
+        assert total() == 19
+        assert total("exact") == 20
+
+        api_db.add(DiagnosisHistory(id=21, case_id=1, diagnosis_markdown="# 21", model_name="gpt-4o"))
+        api_db.commit()
+        assert total() == 21
+
+        api_db.delete(api_db.get(DiagnosisHistory, 21))
+        api_db.commit()
+        assert total() == 20
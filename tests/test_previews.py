@@ -0,0 +1,131 @@
+"""
+预览列测试
+
+- medical_cases.report_summary / diagnosis_history.diagnosis_preview（String(255)）在写入与修改全文时同步生成并截断
+- 列表接口只读取预览列，不加载延迟加载的病历全文与诊断全文分段
+"""
+
+import sys
+import os
+
+import pytest
+from sqlalchemy import event, inspect
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db import database
+from api.models.case import MedicalCase, DiagnosisHistory, PREVIEW_LENGTH, make_preview
+
+LONG_REPORT = "患者胸痛三天，活动后加重。" * 40
+LONG_DIAGNOSIS = "# 稳定型心绞痛\n\n" + "建议完善冠脉造影检查。" * 40
+
+
+def _stored(db, model, record_id, column):
+    """从数据库重新读取预览列（不使用会话中的对象状态）"""
+    db.expire_all()
+    return db.query(getattr(model, column)).filter(model.id == record_id).scalar()
+
+
+class TestReportSummary:
+    def test_set_and_truncated_on_insert(self, api_db):
+        api_db.add_all([
+            MedicalCase(id=1, patient_id="P1", raw_report=LONG_REPORT),
+            MedicalCase(id=2, patient_id="P2", raw_report="Short report."),
+        ])
+        api_db.commit()
+        summary = _stored(api_db, MedicalCase, 1, "report_summary")
+        assert summary == LONG_REPORT[:PREVIEW_LENGTH] + "..."
+        assert len(summary) <= 255
+        assert _stored(api_db, MedicalCase, 2, "report_summary") == "Short report."
+
+    def test_updated_with_raw_report(self, api_db):
+        api_db.add(MedicalCase(id=1, patient_id="P1", raw_report="Short report."))
+        api_db.commit()
+        api_db.get(MedicalCase, 1).raw_report = LONG_REPORT
+        api_db.commit()
+        assert _stored(api_db, MedicalCase, 1, "report_summary") == LONG_REPORT[:PREVIEW_LENGTH] + "..."
+
+        api_db.get(MedicalCase, 1).raw_report = "Rewritten."
+        api_db.commit()
+        assert _stored(api_db, MedicalCase, 1, "report_summary") == "Rewritten."
+
+    def test_api_create_and_update(self, client, api_db):
+        body = {"patient_name": "张三", "age": 40, "gender": "male", "chief_complaint": "胸痛",
+                "medical_history": "高血压十年。" * 50}
+        case_id = client.post("/api/cases", json=body).json()["id"]
+        case = api_db.get(MedicalCase, case_id)
+        assert case.report_summary == case.raw_report[:PREVIEW_LENGTH] + "..."
+
+        assert client.put(f"/api/cases/{case_id}", json={"chief_complaint": "气短"}).status_code == 200
+        api_db.expire_all()
+        case = api_db.get(MedicalCase, case_id)
+        assert "气短" in case.raw_report
+        assert case.report_summary == make_preview(case.raw_report)
+
+
+class TestDiagnosisPreview:
+    @pytest.fixture
+    def case(self, api_db):
+        api_db.add(MedicalCase(id=1, patient_id="P1", raw_report="report"))
+        api_db.commit()
+
+    def test_set_and_truncated_on_insert(self, api_db, case):
+        api_db.add_all([
+            DiagnosisHistory(id=1, case_id=1, diagnosis_markdown=LONG_DIAGNOSIS, model_name="gpt-4o"),
+            DiagnosisHistory(id=2, case_id=1, diagnosis_markdown="# Short", model_name="gpt-4o"),
+        ])
+        api_db.commit()
+        preview = _stored(api_db, DiagnosisHistory, 1, "diagnosis_preview")
+        assert preview == LONG_DIAGNOSIS[:PREVIEW_LENGTH] + "..."
+        assert len(preview) <= 255
+        assert _stored(api_db, DiagnosisHistory, 2, "diagnosis_preview") == "# Short"
+
+    def test_updated_with_markdown(self, api_db, case):
+        api_db.add(DiagnosisHistory(id=1, case_id=1, diagnosis_markdown="# Short", model_name="gpt-4o"))
+        api_db.commit()
+        api_db.get(DiagnosisHistory, 1).diagnosis_markdown = LONG_DIAGNOSIS
+        api_db.commit()
+        assert _stored(api_db, DiagnosisHistory, 1, "diagnosis_preview") == LONG_DIAGNOSIS[:PREVIEW_LENGTH] + "..."
+        assert api_db.get(DiagnosisHistory, 1).diagnosis_markdown == LONG_DIAGNOSIS
+
+
+class TestListsSkipLargeColumns:
+    """列表接口不读取 raw_report 与诊断全文分段"""
+
+    @pytest.fixture
+    def records(self, api_db):
+        for case_id in (1, 2):
+            api_db.add(MedicalCase(id=case_id, patient_id=f"P{case_id}", raw_report=LONG_REPORT, created_by=1))
+            api_db.add(DiagnosisHistory(case_id=case_id, diagnosis_markdown=LONG_DIAGNOSIS, model_name="gpt-4o",
+                                        execution_time_ms=1000))
+        api_db.commit()
+
+    @pytest.fixture
+    def statements(self, api_db):
+        statements = []
+        reader = database.ReadSessionLocal.kw["bind"]
+
+        def capture(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(reader, "before_cursor_execute", capture)
+        yield statements
+        event.remove(reader, "before_cursor_execute", capture)
+
+    @pytest.mark.parametrize("url", [
+        "/api/cases", "/api/cases?fast=true", "/api/cases?limit=1",
+        "/api/diagnoses/all", "/api/diagnoses/all?fast=true", "/api/cases/1/diagnoses",
+    ])
+    def test_no_large_columns_in_sql(self, client, records, statements, url):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert statements
+        for statement in statements:
+            assert "raw_report" not in statement, statement
+            assert "diagnosis_sections" not in statement and "content_blobs" not in statement, statement
+
+    def test_report_not_loaded_on_list_query(self, api_db, records):
+        case = api_db.query(MedicalCase).filter(MedicalCase.id == 1).one()
+        assert "raw_report" in inspect(case).unloaded
+        assert case.report_summary == LONG_REPORT[:PREVIEW_LENGTH] + "..."
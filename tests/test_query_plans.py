@@ -0,0 +1,195 @@
+"""
+迁移与查询计划测试
+
+- Alembic 迁移升级到最新版本后的表结构与模型定义一致
+- 高频查询走组合索引（EXPLAIN QUERY PLAN 中出现全表扫描或临时排序即失败）
+"""
+
+import sys
+import os
+from datetime import datetime
+
+import pytest
+from alembic import command
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base
+from api.db.migrate import alembic_config, include_name, upgrade_database
+from api.models.case import MedicalCase, DiagnosisHistory
+from api.models.user import User
+import api.models.settings  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.idempotency  # noqa: F401
+import api.models.single_flight  # noqa: F401
+
+
+@pytest.fixture
+def db_url(tmp_path):
+    return f"sqlite:///{tmp_path / 'migrations.db'}"
+
+
+@pytest.fixture
+def migrated(db_url):
+    assert upgrade_database(db_url)
+    engine = create_engine(db_url)
+    yield engine
+    engine.dispose()
+
+
+def explain(session, query) -> str:
+    """返回查询的 EXPLAIN QUERY PLAN 结果（每步一行）"""
+    statement = query.statement.compile(dialect=session.bind.dialect, compile_kwargs={"literal_binds": True})
+    rows = session.execute(text(f"EXPLAIN QUERY PLAN {statement}")).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+class TestMigrations:
+    """迁移脚本测试"""
+
+    def test_head_matches_models(self, migrated):
+        with migrated.connect() as connection:
+            diff = compare_metadata(
+                MigrationContext.configure(connection, opts={"include_name": include_name}), Base.metadata
+            )
+        assert diff == []
+
+    def test_upgrade_backfills_existing_rows(self, db_url):
+        """旧版本数据库升级时回填预览列"""
+        config = alembic_config(db_url)
+        command.upgrade(config, "0004")
+        engine = create_engine(db_url)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO medical_cases (id, patient_id, raw_report) VALUES (1, 'P1', :report)"
+            ), {"report": "x" * 300})
+            connection.execute(text(
+                "INSERT INTO diagnosis_history (case_id, diagnosis_markdown) VALUES (1, 'short')"
+            ))
+            connection.execute(text(
+                "INSERT INTO diagnosis_history (case_id, diagnosis_markdown) VALUES (1, :markdown)"
+            ), {"markdown": "诊" * 300})
+        command.upgrade(config, "head")
+        with engine.connect() as connection:
+            summary = connection.execute(text("SELECT report_summary FROM medical_cases")).scalar()
+            previews = connection.execute(text("SELECT diagnosis_preview FROM diagnosis_history ORDER BY id")).scalars().all()
+        engine.dispose()
+        assert summary == "x" * 200 + "..."
+        assert previews == ["short", "诊" * 200 + "..."]
+
+    def test_upgrade_backfills_null_created_at(self, db_url):
+        """created_at 为空的旧病例升级时回填（优先取 updated_at），之后不再允许为空"""
+        config = alembic_config(db_url)
+        command.upgrade(config, "0017")
+        engine = create_engine(db_url)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO medical_cases (id, patient_id, raw_report, updated_at) VALUES (1, 'P1', 'r', :ts)"
+            ), {"ts": datetime(2025, 3, 1)})
+            connection.execute(text("INSERT INTO medical_cases (id, patient_id, raw_report) VALUES (2, 'P2', 'r')"))
+        command.upgrade(config, "head")
+        session = sessionmaker(bind=engine)()
+        created = {case.id: case.created_at for case in session.query(MedicalCase)}
+        session.close()
+        engine.dispose()
+        assert created[1] == datetime(2025, 3, 1)
+        assert isinstance(created[2], datetime)
+
+    def test_upgrade_backfills_null_diagnosis_sort_keys(self, db_url):
+        """运行时间、模型为空的旧诊断升级时回填，病例最新诊断随之更新，AUTOINCREMENT 序号不回落"""
+        config = alembic_config(db_url)
+        command.upgrade(config, "0018")
+        engine = create_engine(db_url)
+        with engine.begin() as connection:
+            connection.execute(text(
+                "INSERT INTO medical_cases (id, patient_id, raw_report, created_at) VALUES (1, 'P1', 'r', :ts)"
+            ), {"ts": datetime(2025, 3, 1)})
+            connection.execute(text(
+                "INSERT INTO diagnosis_history (id, case_id, model_name, run_timestamp) VALUES (1, 1, 'gpt-4o', :ts)"
+            ), {"ts": datetime(2025, 2, 1)})
+            connection.execute(text("INSERT INTO diagnosis_history (id, case_id) VALUES (2, 1)"))
+            connection.execute(text("INSERT INTO diagnosis_history (id, case_id) VALUES (5, 1)"))
+            connection.execute(text("DELETE FROM diagnosis_history WHERE id = 5"))
+        command.upgrade(config, "head")
+        session = sessionmaker(bind=engine)()
+        legacy = session.get(DiagnosisHistory, 2)
+        assert (legacy.model_name, legacy.run_timestamp) == ("unknown", datetime(2025, 3, 1))
+        case = session.get(MedicalCase, 1)
+        assert (case.last_diagnosis_at, case.latest_diagnosis_id) == (datetime(2025, 3, 1), 2)
+        session.add(DiagnosisHistory(case_id=1, diagnosis_markdown="d"))
+        session.commit()
+        assert max(row.id for row in session.query(DiagnosisHistory)) == 6
+        session.close()
+        engine.dispose()
+
+    def test_downgrade_to_base(self, db_url):
+        config = alembic_config(db_url)
+        command.upgrade(config, "head")
+        command.downgrade(config, "base")
+        engine = create_engine(db_url)
+        with engine.connect() as connection:
+            # sqlite_sequence（AUTOINCREMENT 序号表）由 SQLite 维护，无法删除
+            tables = {row[0] for row in connection.execute(text(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%'"
+            ))}
+        engine.dispose()
+        assert tables == {"alembic_version"}
+
+
+class TestQueryPlans:
+    """高频查询的索引使用"""
+
+    @pytest.fixture
+    def session(self, migrated):
+        session = sessionmaker(bind=migrated)()
+        user = User(username="plan", email="plan@example.com", hashed_password="x")
+        session.add(user)
+        session.flush()
+        for i in range(50):
+            case = MedicalCase(patient_id=f"P{i}", raw_report="r", created_by=user.id)
+            session.add(case)
+            session.flush()
+            session.add(DiagnosisHistory(case_id=case.id, diagnosis_markdown="d", model_name="gpt-4o",
+                                         run_timestamp=datetime(2025, 1, 1)))
+        session.commit()
+        session.execute(text("ANALYZE"))
+        yield session
+        session.close()
+
+    @staticmethod
+    def assert_uses_index(plan: str, index_name: str):
+        assert f"USING INDEX {index_name}" in plan or f"USING COVERING INDEX {index_name}" in plan, plan
+        assert "USE TEMP B-TREE FOR ORDER BY" not in plan, plan
+
+    def test_case_diagnosis_history(self, session):
+        query = session.query(DiagnosisHistory).filter(
+            DiagnosisHistory.case_id == 1
+        ).order_by(DiagnosisHistory.run_timestamp.desc())
+        self.assert_uses_index(explain(session, query), "ix_diagnosis_history_case_id_run_timestamp")
+
+    def test_cases_by_creator(self, session):
+        query = session.query(MedicalCase).filter(
+            MedicalCase.created_by == 1
+        ).order_by(MedicalCase.created_at.desc(), MedicalCase.id.desc()).limit(20)
+        self.assert_uses_index(explain(session, query), "ix_medical_cases_created_by_created_at")
+
+    def test_global_diagnoses_by_model(self, session):
+        query = session.query(DiagnosisHistory).join(
+            MedicalCase, DiagnosisHistory.case_id == MedicalCase.id
+        ).filter(
+            DiagnosisHistory.model_name == "gpt-4o"
+        ).order_by(DiagnosisHistory.run_timestamp.desc(), DiagnosisHistory.id.desc()).limit(20)
+        self.assert_uses_index(explain(session, query), "ix_diagnosis_history_model_name_run_timestamp")
+
+    def test_cases_with_diagnosis_single_table(self, session):
+        """已诊断病例筛选使用冗余的 diagnosis_count，不访问诊断表"""
+        query = session.query(MedicalCase).filter(
+            MedicalCase.created_by == 1, MedicalCase.diagnosis_count > 0
+        ).order_by(MedicalCase.created_at.desc(), MedicalCase.id.desc()).limit(20)
+        plan = explain(session, query)
+        self.assert_uses_index(plan, "ix_medical_cases_created_by_created_at")
+        assert "diagnosis_history" not in plan, plan
@@ -0,0 +1,113 @@
+"""
+相似病例索引单元测试
+"""
+
+import sys
+import os
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.db.database import Base
+from api.models.case import MedicalCase
+import api.models.user  # noqa: F401  确保所有表注册到 Base.metadata
+import api.models.settings  # noqa: F401
+from api.utils.similarity import SimilarCaseIndex, similar_case_index, tokenize
+
+
+REFERRAL = "Referral: chest pain for three days, ECG normal, troponin negative, BP 130/85"
+
+
+class TestTokenize:
+    """分词测试"""
+
+    def test_english_and_numbers(self):
+        assert tokenize("BP 120/80, Temp 36.5") == ["bp", "120", "80", "temp", "36.5"]
+
+    def test_cjk_bigrams(self):
+        assert tokenize("胸痛三天") == ["胸痛", "痛三", "三天"]
+
+
+class TestSimilarCaseIndex:
+    """索引测试"""
+
+    def build_index(self):
+        index = SimilarCaseIndex(dim=512)
+        index.upsert(1, REFERRAL)
+        index.upsert(2, REFERRAL.replace("130/85", "131/85"))
+        index.upsert(3, "Anxiety, insomnia and panic attacks at night")
+        return index
+
+    def test_near_duplicate_ranks_first(self):
+        index = self.build_index()
+        results = index.query(REFERRAL, k=2, exclude_id=1)
+        assert results[0][0] == 2
+        assert results[0][1] > 0.8
+        assert results[1][0] == 3
+        assert results[1][1] < 0.2
+
+    def test_update_and_remove(self):
+        index = self.build_index()
+        index.upsert(3, REFERRAL)
+        assert index.query(REFERRAL, k=1, exclude_id=1)[0][1] > 0.99
+
+        index.remove(1)
+        assert len(index) == 2
+        assert {case_id for case_id, _ in index.query(REFERRAL, k=5)} == {2, 3}
+
+    def test_allowed_ids_filter(self):
+        index = self.build_index()
+        results = index.query(REFERRAL, k=5, allowed_ids={3})
+        assert [case_id for case_id, _ in results] == [3]
+
+    def test_empty_query(self):
+        assert self.build_index().query("", k=3) == []
+
+    def test_build_keeps_lock(self):
+        index = self.build_index()
+        lock = index._lock
+        session = sessionmaker(bind=create_engine("sqlite://"))()
+        Base.metadata.create_all(bind=session.get_bind())
+        index.build(session)
+        assert index._lock is lock
+        assert len(index) == 0 and index.built
+
+
+class TestIndexSync:
+    """ORM 写入与索引同步测试"""
+
+    @pytest.fixture
+    def db(self):
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        Base.metadata.create_all(bind=engine)
+        session = sessionmaker(bind=engine)()
+        similar_case_index._reset()
+        similar_case_index.built = True
+        yield session
+        session.close()
+        similar_case_index._reset()
+        engine.dispose()
+
+    def test_applied_after_commit(self, db):
+        case = MedicalCase(patient_id="A", raw_report=REFERRAL)
+        db.add(case)
+        db.flush()
+        assert len(similar_case_index) == 0
+        db.commit()
+        assert [case_id for case_id, _ in similar_case_index.query(REFERRAL, k=1)] == [case.id]
+
+        db.delete(case)
+        db.commit()
+        assert len(similar_case_index) == 0
+
+    def test_rollback_leaves_no_vectors(self, db):
+        db.add(MedicalCase(patient_id="A", raw_report=REFERRAL))
+        db.flush()
+        db.rollback()
+        db.commit()
+        assert len(similar_case_index) == 0
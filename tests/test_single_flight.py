@@ -0,0 +1,94 @@
+"""
+单飞请求合并单元测试
+"""
+
+import asyncio
+import pytest
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from api.utils.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """进程内单飞测试"""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """相同键的并发调用只执行一次并共享结果"""
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"value": 42}
+
+        async def run():
+            return await asyncio.gather(*[flight.do("k", work) for _ in range(5)])
+
+        results = asyncio.run(run())
+        assert len(calls) == 1
+        assert [r[0] for r in results] == [{"value": 42}] * 5
+        assert sorted(r[1] for r in results) == [False, True, True, True, True]
+        assert not flight.in_flight("k")
+
+    def test_different_keys_run_separately(self):
+        """不同键互不合并"""
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return len(calls)
+
+        async def run():
+            return await asyncio.gather(flight.do("a", work), flight.do("b", work))
+
+        asyncio.run(run())
+        assert len(calls) == 2
+
+    def test_error_propagates_to_waiters(self):
+        """执行失败时所有等待者收到同一异常，之后可重新执行"""
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        async def run():
+            return await asyncio.gather(*[flight.do("k", fail) for _ in range(3)], return_exceptions=True)
+
+        results = asyncio.run(run())
+        assert all(isinstance(r, ValueError) for r in results)
+
+        async def ok():
+            return "ok"
+
+        assert asyncio.run(flight.do("k", ok)) == ("ok", False)
+
+    def test_leader_cancelled_waiter_takes_over(self):
+        """执行者被取消时，等待者重新竞争并执行"""
+        flight = SingleFlight()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return "done"
+
+        async def run():
+            leader = asyncio.create_task(flight.do("k", work))
+            await asyncio.sleep(0.01)
+            waiter = asyncio.create_task(flight.do("k", work))
+            await asyncio.sleep(0.01)
+            leader.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await leader
+            return await waiter
+
+        assert asyncio.run(run()) == ("done", False)
+        assert len(calls) == 2
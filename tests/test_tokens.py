@@ -0,0 +1,55 @@
+"""
+token 估算与病历分块单元测试
+"""
+
+import pytest
+import sys
+import os
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from Utils.Tokens import estimate_tokens, split_into_chunks, truncate_to_tokens
+
+
+class TestEstimateTokens:
+    """token 估算测试"""
+
+    def test_empty(self):
+        assert estimate_tokens("") == 0
+        assert estimate_tokens(None) == 0
+
+    def test_english_about_four_chars_per_token(self):
+        assert estimate_tokens("a" * 400) == 100
+
+    def test_cjk_counts_one_token_per_char(self):
+        """中文按每字 1 个 token 估算，远高于按字符数 / 4"""
+        assert estimate_tokens("患者胸痛三天") == 6
+        assert estimate_tokens("患者 BP 120/80") == 2 + 3
+
+
+class TestSplitIntoChunks:
+    """分块测试"""
+
+    def test_short_text_single_chunk(self):
+        assert split_into_chunks("short report", 100) == ["short report"]
+
+    def test_chunks_respect_budget_and_keep_content(self):
+        text = "\n\n".join(f"Paragraph {i}: " + "lab value normal. " * 30 for i in range(20))
+        chunks = split_into_chunks(text, 200)
+        assert len(chunks) > 1
+        assert all(estimate_tokens(c) <= 200 for c in chunks)
+        assert "".join(chunks) == text
+
+    def test_long_single_line_is_hard_split(self):
+        text = "化验结果" * 500
+        chunks = split_into_chunks(text, 300)
+        assert all(estimate_tokens(c) <= 300 for c in chunks)
+        assert "".join(chunks) == text
+
+    def test_invalid_budget(self):
+        with pytest.raises(ValueError):
+            split_into_chunks("text", 0)
+
+    def test_truncate(self):
+        assert estimate_tokens(truncate_to_tokens("x" * 1000, 10)) <= 10
@@ -0,0 +1,91 @@
+"""
+诊断翻译接口测试（POST /api/cases/{case_id}/diagnoses/{diagnosis_id}/translate）
+"""
+
+import sys
+import os
+
+import pytest
+
+# 添加项目根目录到路径
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import api.main as main
+from api.models.case import MedicalCase, DiagnosisHistory
+
+
+@pytest.fixture
+def translator(monkeypatch):
+    """替换翻译智能体，记录调用次数"""
+    calls = []
+
+    class FakeTranslator:
+        def __init__(self, diagnosis_markdown, model_name=None, language="en", provider=None):
+            self.diagnosis_markdown = diagnosis_markdown
+            self.model_name = model_name or "translation-model"
+            self.language = language
+
+        async def arun(self):
+            calls.append((self.diagnosis_markdown, self.language))
+            return f"[{self.language}] {self.diagnosis_markdown}"
+
+    monkeypatch.setattr(main, "Translator", FakeTranslator)
+    return calls
+
+
+@pytest.fixture
+def diagnoses(api_db):
+    """病例 1：英文诊断（id=1）与未记录语言的历史诊断（id=2）"""
+    api_db.add(MedicalCase(id=1, patient_id="P1", raw_report="report", created_by=1))
+    api_db.add(DiagnosisHistory(id=1, case_id=1, diagnosis_markdown="# Angina", model_name="gpt-4o", language="en"))
+    api_db.add(DiagnosisHistory(id=2, case_id=1, diagnosis_markdown="# Legacy", model_name="gpt-4o", language=None))
+    api_db.commit()
+
+
+def _translate(client, diagnosis_id, language):
+    return client.post(f"/api/cases/1/diagnoses/{diagnosis_id}/translate", json={"target_language": language})
+
+
+class TestTranslateDiagnosis:
+    def test_repeat_call_reuses_translation(self, client, api_db, diagnoses, translator):
+        first = _translate(client, 1, "zh")
+        assert first.status_code == 200
+        assert first.json()["cached"] is False
+        assert first.json()["diagnosis_markdown"] == "[zh] # Angina"
+
+        second = _translate(client, 1, "zh")
+        assert second.json()["cached"] is True
+        assert second.json()["diagnosis_id"] == first.json()["diagnosis_id"]
+        assert len(translator) == 1
+        assert api_db.query(DiagnosisHistory).filter(DiagnosisHistory.source_diagnosis_id == 1).count() == 1
+
+    def test_translating_translation_keys_on_original(self, client, diagnoses, translator):
+        translation_id = _translate(client, 1, "zh").json()["diagnosis_id"]
+
+        again = _translate(client, translation_id, "zh")
+        assert again.status_code == 200
+        assert again.json()["cached"] is True
+        assert again.json()["diagnosis_id"] == translation_id
+        assert again.json()["source_diagnosis_id"] == 1
+        # 译文转回原语言即原诊断本身
+        assert _translate(client, translation_id, "en").status_code == 400
+        assert len(translator) == 1
+
+    def test_same_language_rejected(self, client, diagnoses, translator):
+        assert _translate(client, 1, "en").status_code == 400
+        # 未记录语言的历史诊断按英文处理
+        assert _translate(client, 2, "en").status_code == 400
+        assert translator == []
+
+        legacy = _translate(client, 2, "zh")
+        assert legacy.status_code == 200
+        assert legacy.json()["source_diagnosis_id"] == 2
+
+    def test_missing_source_returns_404(self, client, api_db, diagnoses, translator):
+        # 译文的原诊断已归档或删除
+        api_db.add(DiagnosisHistory(id=3, case_id=1, diagnosis_markdown="# 心绞痛", model_name="gpt-4o",
+                                    language="zh", source_diagnosis_id=99))
+        api_db.commit()
+        assert _translate(client, 3, "en").status_code == 404
+        assert _translate(client, 42, "zh").status_code == 404
+        assert translator == []